@@ -1,5 +1,4 @@
 import asyncio
-import json
 import logging
 import os
 import traceback
@@ -18,6 +17,7 @@ from langgraph.checkpoint.memory import InMemorySaver
 from agent.middleware.customer_middleware import log_before_model
 from common.llm_util import get_llm
 from common.minio_util import MinioUtils
+from common.sse_writer import sse_frame
 from constants.code_enum import DataTypeEnum, IntentEnum
 from services.user_service import add_user_record, decode_jwt_token
 
@@ -85,7 +85,7 @@ class CommonReactAgent:
             "data": {"messageType": message_type, "content": content},
             "dataType": data_type,
         }
-        return "data:" + json.dumps(res, ensure_ascii=False) + "\n\n"
+        return sse_frame(res)
 
     async def run_agent(
         self,
@@ -366,9 +366,7 @@ class CommonReactAgent:
                 content = message_chunk.content
                 t02_answer_data.append(content)
                 await response.write(self._create_response(content))
-                # 确保实时输出
-                if hasattr(response, "flush"):
-                    await response.flush()
+                # 逐 token 的消息由 SSEWriter 在合并窗口内批量写出，这里不再逐条 flush
                 await asyncio.sleep(0)
 
     async def cancel_task(self, task_id: str) -> bool:
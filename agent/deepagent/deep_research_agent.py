@@ -1,5 +1,4 @@
 import asyncio
-import json
 import logging
 import os
 import traceback
@@ -20,6 +19,7 @@ from common.datasource_util import (
     DatasourceConnectionUtil,
 )
 from common.llm_util import get_llm
+from common.sse_writer import sse_frame
 from constants.code_enum import DataTypeEnum, IntentEnum
 from model.db_connection_pool import get_db_pool
 from services.datasource_service import DatasourceService
@@ -102,7 +102,7 @@ class DeepAgent:
             "data": {"messageType": message_type, "content": content},
             "dataType": data_type,
         }
-        return "data:" + json.dumps(res, ensure_ascii=False) + "\n\n"
+        return sse_frame(res)
 
     def _create_sql_deep_agent(self, datasource_id: int = None):
         """创建并返回一个 text-to-SQL Deep Agent"""
@@ -337,7 +337,7 @@ class DeepAgent:
                 "dataType": DataTypeEnum.STEP_PROGRESS.value[0],
             }
             await response.write(
-                "data:" + json.dumps(formatted_message, ensure_ascii=False) + "\n\n"
+                sse_frame(formatted_message)
             )
 
     async def _stream_agent_response(
@@ -15,6 +15,7 @@ from agent.excel.excel_duckdb_manager import (
     get_chat_duckdb_manager,
 )
 from agent.excel.excel_graph import create_excel_graph
+from common.sse_writer import sse_frame
 from constants.code_enum import DataTypeEnum
 from services.user_service import (
     add_user_record,
@@ -736,7 +737,7 @@ class ExcelAgent:
                 "dataType": DataTypeEnum.STEP_PROGRESS.value[0],
             }
             await response.write(
-                "data:" + json.dumps(formatted_message, ensure_ascii=False) + "\n\n"
+                sse_frame(formatted_message)
             )
 
     @staticmethod
@@ -767,7 +768,7 @@ class ExcelAgent:
                 formatted_message = {"data": content, "dataType": data_type}
 
             await response.write(
-                "data:" + json.dumps(formatted_message, ensure_ascii=False) + "\n\n"
+                sse_frame(formatted_message)
             )
 
     @staticmethod
@@ -783,7 +784,7 @@ class ExcelAgent:
             "data": {"messageType": message_type, "content": content},
             "dataType": data_type,
         }
-        return "data:" + json.dumps(res, ensure_ascii=False) + "\n\n"
+        return sse_frame(res)
 
     async def cancel_task(self, task_id: str) -> bool:
         """
@@ -0,0 +1,320 @@
+"""
+表格文件列式缓存
+上传的 Excel/CSV 文件按内容指纹只解析一次，每个 Sheet 转换为 Parquet 文件并记录清单（manifest.json），
+后续提问直接在 DuckDB 中创建指向 Parquet 的视图，无需重新下载和解析整个工作簿。
+缓存目录在同一主机的多个 worker 之间共享：任意 worker 都可以只读挂载其他 worker 生成的文件，
+数据不驻留在各 worker 的内存中；同一文件同时只由一个 worker 转换（文件锁）。
+
+挂载了视图的会话对清单文件持有共享锁，直到会话关闭或移除该文件；回收时先获取转换锁，
+再对清单文件加排他锁，加锁失败（仍有会话的视图指向这些 Parquet 文件）时跳过，
+按最近使用时间（清单文件的修改时间）删除过期缓存，并在总大小超出上限时继续删除最久未使用的缓存。
+
+目录结构：
+    {EXCEL_ARTIFACT_DIR}/{content_hash}/manifest.json
+    {EXCEL_ARTIFACT_DIR}/{content_hash}/{table_name}.parquet
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import time
+import uuid
+from contextlib import contextmanager
+from typing import IO, Dict, List, Optional, Tuple
+
+import duckdb
+import pandas as pd
+
+from agent.excel.excel_agent_state import SheetInfo
+
+# 跨进程文件锁（仅类 Unix 系统可用）
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# 列式缓存根目录
+ARTIFACT_ROOT_DIR = os.path.abspath(os.getenv("EXCEL_ARTIFACT_DIR", "./excel_artifacts"))
+
+# 等待其他 worker 完成转换的最长时间（秒），超时后不再等待直接转换
+ARTIFACT_BUILD_LOCK_TIMEOUT = int(os.getenv("EXCEL_ARTIFACT_LOCK_TIMEOUT", "300"))
+
+# 缓存最长保留时间（秒），超过该时间未被使用时删除，0 表示不按时间回收
+ARTIFACT_MAX_AGE = int(os.getenv("EXCEL_ARTIFACT_MAX_AGE", "604800"))
+# 缓存目录总大小上限（MB），超出时删除最久未使用的缓存，0 表示不限制
+ARTIFACT_MAX_SIZE_MB = int(os.getenv("EXCEL_ARTIFACT_MAX_SIZE_MB", "10240"))
+
+MANIFEST_FILE = "manifest.json"
+# 清单格式版本，转换逻辑变化时递增，旧缓存会被重新生成
+MANIFEST_VERSION = 1
+
+
+class ExcelArtifactStore:
+    """
+    表格文件列式缓存（进程无关，多个 worker 可共享同一目录）
+    """
+
+    @staticmethod
+    def normalize_hash(content_hash: str) -> str:
+        """规范化内容指纹，只保留可用于目录名的字符"""
+        return re.sub(r"[^0-9A-Za-z_-]", "", content_hash or "")
+
+    @staticmethod
+    def _artifact_dir(content_hash: str) -> str:
+        return os.path.join(ARTIFACT_ROOT_DIR, ExcelArtifactStore.normalize_hash(content_hash))
+
+    @staticmethod
+    def load_manifest(content_hash: str) -> Optional[Dict]:
+        """
+        读取已转换文件的清单，不存在或已损坏时返回 None
+        """
+        if not ExcelArtifactStore.normalize_hash(content_hash):
+            return None
+        artifact_dir = ExcelArtifactStore._artifact_dir(content_hash)
+        manifest_path = os.path.join(artifact_dir, MANIFEST_FILE)
+        if not os.path.exists(manifest_path):
+            return None
+        try:
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            if manifest.get("version") != MANIFEST_VERSION:
+                return None
+            for sheet in manifest.get("sheets", []):
+                if not os.path.exists(os.path.join(artifact_dir, sheet["parquet"])):
+                    return None
+            manifest["dir"] = artifact_dir
+            return manifest
+        except Exception as e:
+            logger.warning(f"读取表格缓存清单失败 {manifest_path}: {e}")
+            return None
+
+    @staticmethod
+    @contextmanager
+    def build_lock(content_hash: Optional[str], blocking: bool = True):
+        """
+        跨进程转换锁：同一文件同时只由一个 worker 下载、转换或回收，其余 worker 等待后直接复用结果
+        未提供内容指纹或系统不支持文件锁时不加锁
+
+        :param blocking: 是否等待其他 worker 释放锁，False 时锁被占用立即返回
+        :return: 上下文变量为是否已持有锁
+        """
+        if not content_hash or fcntl is None or not ExcelArtifactStore.normalize_hash(content_hash):
+            yield False
+            return
+
+        os.makedirs(ARTIFACT_ROOT_DIR, exist_ok=True)
+        lock_path = f"{ExcelArtifactStore._artifact_dir(content_hash)}.lock"
+        with open(lock_path, "a") as lock_file:
+            locked = False
+            deadline = time.time() + (ARTIFACT_BUILD_LOCK_TIMEOUT if blocking else 0)
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    locked = True
+                    break
+                except BlockingIOError:
+                    if not blocking:
+                        break
+                    if time.time() >= deadline:
+                        logger.warning(f"等待表格缓存转换锁超时，直接转换: {lock_path}")
+                        break
+                    time.sleep(0.2)
+            try:
+                yield locked
+            finally:
+                if locked:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def acquire(manifest: Dict) -> Optional[IO]:
+        """
+        登记会话正在使用该缓存（对清单文件加共享锁，并刷新最近使用时间），需在持有转换锁时调用
+        返回的文件对象需通过 release 释放；系统不支持文件锁时返回 None
+        """
+        if fcntl is None:
+            return None
+        manifest_path = os.path.join(manifest["dir"], MANIFEST_FILE)
+        try:
+            handle = open(manifest_path, "r")
+        except OSError as e:
+            logger.warning(f"登记表格缓存使用失败 {manifest_path}: {e}")
+            return None
+        fcntl.flock(handle, fcntl.LOCK_SH)
+        try:
+            os.utime(manifest_path)
+        except OSError:
+            pass
+        return handle
+
+    @staticmethod
+    def release(handle: Optional[IO]):
+        """释放 acquire 登记的缓存使用（关闭文件即释放共享锁）"""
+        if handle is not None:
+            handle.close()
+
+    @staticmethod
+    def build(
+        content_hash: str, file_name: str, tables: List[Tuple[SheetInfo, pd.DataFrame]]
+    ) -> Dict:
+        """
+        将已清理列名的 DataFrame 写入 Parquet 并生成清单
+        先写入临时目录再整体重命名，多个进程同时转换同一文件时只保留先完成的结果
+
+        :param content_hash: 文件内容指纹
+        :param file_name: 原始文件名
+        :param tables: [(SheetInfo, DataFrame)]，SheetInfo 中的 catalog_name 会在挂载时重新指定
+        :return: 清单
+        """
+        artifact_dir = ExcelArtifactStore._artifact_dir(content_hash)
+        tmp_dir = f"{artifact_dir}.tmp-{uuid.uuid4().hex}"
+        os.makedirs(tmp_dir, exist_ok=True)
+
+        try:
+            sheets = []
+            conn = duckdb.connect(database=":memory:")
+            try:
+                for sheet_info, df in tables:
+                    parquet_name = f"{len(sheets)}_{sheet_info.table_name}.parquet"
+                    parquet_path = os.path.join(tmp_dir, parquet_name)
+                    conn.register("sheet_df", df)
+                    conn.execute(
+                        f"COPY (SELECT * FROM sheet_df) TO '{_escape_path(parquet_path)}' "
+                        f"(FORMAT PARQUET, COMPRESSION ZSTD)"
+                    )
+                    conn.unregister("sheet_df")
+                    # 缓存文件由多个 worker 共享只读使用
+                    os.chmod(parquet_path, 0o444)
+                    sheets.append({**sheet_info.model_dump(exclude={"catalog_name"}), "parquet": parquet_name})
+            finally:
+                conn.close()
+
+            manifest = {
+                "version": MANIFEST_VERSION,
+                "content_hash": content_hash,
+                "file_name": file_name,
+                "sheets": sheets,
+            }
+            with open(os.path.join(tmp_dir, MANIFEST_FILE), "w", encoding="utf-8") as f:
+                json.dump(manifest, f, ensure_ascii=False, default=str)
+
+            try:
+                os.rename(tmp_dir, artifact_dir)
+                logger.info(f"✅ 表格文件已转换为列式缓存: {file_name} -> {artifact_dir}（{len(sheets)} 个表）")
+            except OSError:
+                # 其他进程已完成转换，使用已有结果
+                shutil.rmtree(tmp_dir, ignore_errors=True)
+                existing = ExcelArtifactStore.load_manifest(content_hash)
+                if existing:
+                    return existing
+                raise
+        except Exception:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+        manifest["dir"] = artifact_dir
+        return manifest
+
+    @staticmethod
+    def parquet_path(manifest: Dict, sheet: Dict) -> str:
+        """清单中某个 Sheet 的 Parquet 绝对路径"""
+        return os.path.join(manifest["dir"], sheet["parquet"])
+
+    @staticmethod
+    def remove(content_hash: str) -> bool:
+        """
+        删除指定文件的列式缓存；其他 worker 正在转换，或仍有会话的视图指向该缓存时跳过
+        系统不支持文件锁时无法确认缓存是否在使用，不删除
+
+        :return: 是否已删除
+        """
+        if fcntl is None or not ExcelArtifactStore.normalize_hash(content_hash):
+            return False
+        artifact_dir = ExcelArtifactStore._artifact_dir(content_hash)
+        with ExcelArtifactStore.build_lock(content_hash, blocking=False) as locked:
+            if not locked:
+                return False
+            manifest_path = os.path.join(artifact_dir, MANIFEST_FILE)
+            if os.path.exists(manifest_path):
+                with open(manifest_path, "r") as manifest_file:
+                    try:
+                        fcntl.flock(manifest_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        return False
+                    shutil.rmtree(artifact_dir, ignore_errors=True)
+            else:
+                shutil.rmtree(artifact_dir, ignore_errors=True)
+            # 持有锁时删除锁文件；此前已打开旧锁文件的 worker 最多重复转换一次（build 以先完成者为准）
+            _remove_path(f"{artifact_dir}.lock")
+        return True
+
+    @staticmethod
+    def evict(max_age: int = ARTIFACT_MAX_AGE, max_size_mb: int = ARTIFACT_MAX_SIZE_MB) -> int:
+        """
+        回收列式缓存：删除超过 max_age 未使用的缓存，总大小超出 max_size_mb 时继续删除最久未使用的缓存，
+        正在使用的缓存不删除；同时清理遗留的临时目录
+
+        :return: 删除的缓存数量
+        """
+        if fcntl is None or not os.path.isdir(ARTIFACT_ROOT_DIR):
+            return 0
+
+        now = time.time()
+        artifacts = []
+        for entry in os.scandir(ARTIFACT_ROOT_DIR):
+            if entry.name.endswith(".lock") and entry.is_file(follow_symlinks=False):
+                # 转换失败后没有对应缓存目录的锁文件
+                content_hash = entry.name[: -len(".lock")]
+                if not os.path.exists(os.path.join(ARTIFACT_ROOT_DIR, content_hash)):
+                    artifacts.append((entry.stat().st_mtime, 0, content_hash))
+                continue
+            if not entry.is_dir(follow_symlinks=False) or entry.name.startswith("_"):
+                continue
+            if ".tmp-" in entry.name:
+                # 转换中断遗留的临时目录
+                if now - entry.stat().st_mtime > ARTIFACT_BUILD_LOCK_TIMEOUT:
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                continue
+            manifest_path = os.path.join(entry.path, MANIFEST_FILE)
+            try:
+                last_used = os.path.getmtime(manifest_path) if os.path.exists(manifest_path) else entry.stat().st_mtime
+                size = sum(f.stat().st_size for f in os.scandir(entry.path) if f.is_file(follow_symlinks=False))
+            except OSError:
+                continue
+            artifacts.append((last_used, size, entry.name))
+
+        artifacts.sort()
+        total_size = sum(size for _, size, _ in artifacts)
+        max_size = max_size_mb * 1024 * 1024
+        removed = 0
+        for last_used, size, content_hash in artifacts:
+            expired = max_age > 0 and now - last_used > max_age
+            oversized = max_size > 0 and total_size > max_size
+            if not expired and not oversized:
+                continue
+            if ExcelArtifactStore.remove(content_hash):
+                total_size -= size
+                removed += 1
+
+        if removed:
+            logger.info(
+                f"表格列式缓存回收完成，删除 {removed} 个，剩余约 {total_size / 1024 / 1024:.1f}MB"
+            )
+        return removed
+
+
+def _escape_path(path: str) -> str:
+    """转义 SQL 字符串字面量中的路径"""
+    return path.replace("'", "''")
+
+
+def _remove_path(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+    except OSError as e:
+        logger.warning(f"删除文件失败 {path}: {e}")
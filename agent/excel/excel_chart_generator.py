@@ -6,47 +6,21 @@
 
 import json
 import logging
+import os
 import traceback
-from decimal import Decimal
-from datetime import datetime, date
-from typing import Dict, Any, Optional, List
 
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from agent.excel.excel_agent_state import ExcelAgentState
 from agent.excel.template.prompt_builder import ExcelPromptBuilder
+from common.chart_recommender import recommend_chart
 from common.llm_util import get_llm
+from common.result_profiler import format_result_digest
 
 logger = logging.getLogger(__name__)
 
-
-def convert_value_for_json(v):
-    """
-    转换数据类型为JSON可序列化的格式
-    用于在转换为JSON之前处理Decimal、datetime等类型
-    """
-    if isinstance(v, Decimal):
-        return float(v)
-    elif isinstance(v, (datetime,)):
-        return v.strftime("%Y-%m-%d %H:%M:%S")
-    elif isinstance(v, date):
-        return v.strftime("%Y-%m-%d")
-    else:
-        return v
-
-
-def prepare_data_for_json(data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """
-    准备数据用于JSON序列化
-    转换所有值，确保可以正确序列化
-    """
-    converted_data = []
-    for row in data:
-        converted_row = {}
-        for key, value in row.items():
-            converted_row[key] = convert_value_for_json(value)
-        converted_data.append(converted_row)
-    return converted_data
+# 图表提示词中结果摘要的字符预算
+CHART_DIGEST_MAX_CHARS = int(os.getenv("CHART_DIGEST_MAX_CHARS", "3000"))
 
 
 def excel_chart_generator(state: ExcelAgentState) -> ExcelAgentState:
@@ -79,15 +53,23 @@ def excel_chart_generator(state: ExcelAgentState) -> ExcelAgentState:
         
         # 使用图表类型（包括 table 类型，table 类型也需要生成图表配置以获取字段映射）
         chart_type_simple = chart_type
+
+        # 常见结果形态（时间趋势、单维度对比/占比等）由规则直接生成配置，只有形态不明确时才调用 LLM
+        try:
+            rule_config = recommend_chart(data, chart_type=chart_type, question=user_query)
+        except Exception as e:
+            logger.warning(f"规则图表推荐失败，使用 LLM 生成: {e}", exc_info=True)
+            rule_config = None
+        if rule_config:
+            state["chart_config"] = rule_config
+            logger.info(f"图表配置由规则生成，类型: {rule_config['type']}")
+            return state
         
         # 使用 PromptBuilder 构建图表生成提示词
         prompt_builder = ExcelPromptBuilder()
         
-        # 将数据转换为字符串（限制数据量，避免提示词过长）
-        data_preview = data[:10]  # 只使用前10条数据作为示例
-        # 转换Decimal、datetime等类型为JSON可序列化的格式
-        data_preview_converted = prepare_data_for_json(data_preview)
-        data_str = json.dumps(data_preview_converted, ensure_ascii=False, indent=2)
+        # 使用结果摘要（列角色、基数、数值范围与 10 条抽样行）代替原始数据，提示词长度不随行数增长
+        data_str = format_result_digest(data, sample_rows=10, max_chars=CHART_DIGEST_MAX_CHARS)
         
         system_prompt, user_prompt = prompt_builder.build_chart_prompt(
             sql=generated_sql or "",
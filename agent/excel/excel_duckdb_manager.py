@@ -3,20 +3,58 @@ DuckDB 连接管理器
 统一管理 Excel Agent 中的 DuckDB 连接和数据注册，避免重复创建和注册
 """
 
+import asyncio
+import functools
+import hashlib
 import logging
+import os
 import re
+import shutil
+import threading
 import time
 import traceback
+import uuid
 from datetime import datetime
-from typing import Dict, List, Optional, Tuple
+from typing import Any, Dict, List, Optional, Tuple
 
 import duckdb
 import pandas as pd
 
 from agent.excel.excel_agent_state import FileInfo, SheetInfo
+from agent.excel.excel_artifact_store import ExcelArtifactStore
+from agent.excel.excel_loader import fetch_file_bytes, load_workbook_sheets
 
 logger = logging.getLogger(__name__)
 
+# 单个会话连接的内存上限与线程数
+DUCKDB_SESSION_MEMORY_LIMIT = os.getenv("DUCKDB_SESSION_MEMORY_LIMIT", "512MB")
+DUCKDB_SESSION_THREADS = int(os.getenv("DUCKDB_SESSION_THREADS", "2"))
+# 当前进程所有会话的内存预算（MB），超出时按最近最少使用将会话转存到磁盘
+DUCKDB_MEMORY_BUDGET_MB = int(os.getenv("DUCKDB_MEMORY_BUDGET_MB", "2048"))
+# 会话空闲超过该时间（秒）后转存到磁盘
+DUCKDB_SESSION_IDLE_SPILL = int(os.getenv("DUCKDB_SESSION_IDLE_SPILL", "600"))
+# 会话过期时间（秒），过期后关闭并删除磁盘文件
+DUCKDB_SESSION_TIMEOUT = int(os.getenv("DUCKDB_SESSION_TIMEOUT", "36000"))
+# 后台回收任务执行间隔（秒）
+DUCKDB_REAPER_INTERVAL = int(os.getenv("DUCKDB_REAPER_INTERVAL", "60"))
+# 表格列式缓存回收间隔（秒），由会话回收任务执行
+EXCEL_ARTIFACT_EVICT_INTERVAL = int(os.getenv("EXCEL_ARTIFACT_EVICT_INTERVAL", "600"))
+# 会话转存目录
+DUCKDB_SPILL_DIR = os.path.abspath(
+    os.getenv("DUCKDB_SPILL_DIR", os.path.join(os.getenv("EXCEL_ARTIFACT_DIR", "./excel_artifacts"), "_sessions"))
+)
+
+
+def _synchronized(method):
+    """会话级互斥：查询、注册与转存不能同时操作同一连接"""
+
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self._lock:
+            return method(self, *args, **kwargs)
+
+    return wrapper
+
 
 class ExcelDuckDBManager:
     """
@@ -30,15 +68,37 @@ class ExcelDuckDBManager:
         self._connection: Optional[duckdb.DuckDBPyConnection] = None
         self._registered_catalogs: Dict[str, str] = {}  # {catalog_name: file_path}
         self._registered_tables: Dict[str, SheetInfo] = {}  # {table_name: SheetInfo}
+        # {source_file_key: {"content_hash", "catalog_name", "file_info", "tables"}}，用于判断文件集合是否变化
+        self._registered_files: Dict[str, Dict[str, Any]] = {}
         self._session_id: str = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._lock = threading.RLock()
+        # 会话转存到磁盘后的数据库文件，再次使用时直接打开
+        self._spill_path: Optional[str] = None
+        # 会话独立的溢写临时目录（多个 DuckDB 实例共用同一 temp_directory 会互相覆盖临时文件），关闭时删除
+        self._temp_dir: str = os.path.join(DUCKDB_SPILL_DIR, f"tmp_{os.getpid()}_{uuid.uuid4().hex}")
+        # 最近一次统计的内存占用（字节）
+        self._memory_usage: int = 0
+        # 以视图挂载的列式缓存 {catalog_name: 缓存使用登记}，会话关闭或移除文件前缓存不会被回收
+        self._artifact_refs: Dict[str, Any] = {}
 
     def _get_connection(self) -> duckdb.DuckDBPyConnection:
         """
-        获取 DuckDB 连接，延迟初始化
+        获取 DuckDB 连接，延迟初始化；会话已转存到磁盘时从磁盘文件恢复
         """
         if self._connection is None:
-            logger.info("创建新的 DuckDB 连接")
-            self._connection = duckdb.connect(database=":memory:")
+            if self._spill_path and os.path.exists(self._spill_path):
+                logger.info(f"从磁盘恢复 DuckDB 会话: {self._spill_path}")
+                self._connection = duckdb.connect(database=self._spill_path)
+            else:
+                logger.info("创建新的 DuckDB 连接")
+                self._spill_path = None
+                self._connection = duckdb.connect(database=":memory:")
+
+            # 限制单个会话的内存与线程，超出内存上限的算子溢写到临时目录
+            os.makedirs(self._temp_dir, exist_ok=True)
+            self._connection.execute(f"SET memory_limit = '{DUCKDB_SESSION_MEMORY_LIMIT}'")
+            self._connection.execute(f"SET threads = {DUCKDB_SESSION_THREADS}")
+            self._connection.execute(f"SET temp_directory = '{self._temp_dir.replace(chr(39), chr(39) * 2)}'")
 
             # 安装并加载必要的扩展
             # self._connection.execute("INSTALL httpfs")
@@ -48,6 +108,68 @@ class ExcelDuckDBManager:
 
         return self._connection
 
+    @property
+    def is_loaded(self) -> bool:
+        """连接是否处于打开状态（占用内存）"""
+        return self._connection is not None
+
+    def memory_usage(self) -> int:
+        """
+        统计当前连接的内存占用（字节），连接正在使用时返回上次统计值
+        """
+        if self._connection is None:
+            return 0
+        if not self._lock.acquire(blocking=False):
+            return self._memory_usage
+        try:
+            if self._connection is not None:
+                row = self._connection.execute(
+                    "SELECT COALESCE(SUM(memory_usage_bytes), 0) FROM duckdb_memory()"
+                ).fetchone()
+                self._memory_usage = int(row[0]) if row else 0
+        except Exception as e:
+            logger.debug(f"统计 DuckDB 内存占用失败: {e}")
+        finally:
+            self._lock.release()
+        return self._memory_usage
+
+    def spill(self) -> bool:
+        """
+        将会话转存到磁盘并释放连接内存，下次使用时自动从磁盘恢复
+        连接正在使用时跳过
+
+        :return: 是否已释放
+        """
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if self._connection is None:
+                return False
+
+            if self._spill_path is None:
+                os.makedirs(DUCKDB_SPILL_DIR, exist_ok=True)
+                spill_path = os.path.join(DUCKDB_SPILL_DIR, f"{os.getpid()}_{uuid.uuid4().hex}.duckdb")
+                escaped_path = spill_path.replace("'", "''")
+                try:
+                    self._connection.execute(f"ATTACH '{escaped_path}' AS spill_db")
+                    self._connection.execute("COPY FROM DATABASE memory TO spill_db")
+                    self._connection.execute("DETACH spill_db")
+                except Exception:
+                    _remove_file(spill_path)
+                    raise
+                self._spill_path = spill_path
+
+            self._connection.close()
+            self._connection = None
+            self._memory_usage = 0
+            logger.info(f"DuckDB 会话 {self._session_id} 已转存到磁盘: {self._spill_path}")
+            return True
+        except Exception as e:
+            logger.warning(f"DuckDB 会话 {self._session_id} 转存失败: {e}")
+            return False
+        finally:
+            self._lock.release()
+
     def _sanitize_catalog_name(self, file_name: str) -> str:
         """
         清理文件名，生成合法的 DuckDB catalog 名称
@@ -91,23 +213,54 @@ class ExcelDuckDBManager:
             col_name = f"column_{col_name}"
         return col_name or "unknown_column"
 
+    def _build_sheet_info(
+        self, sheet_name: str, table_name: str, catalog_name: str, df: pd.DataFrame
+    ) -> SheetInfo:
+        """
+        根据已清理列名的 DataFrame 生成 SheetInfo
+        """
+        # 获取列信息
+        columns_info = {}
+        for col in df.columns:
+            dtype = str(df[col].dtype)
+            sql_type = self._map_pandas_dtype_to_sql(dtype)
+            columns_info[col] = {"comment": col, "type": sql_type}
+
+        return SheetInfo(
+            sheet_name=sheet_name,
+            table_name=table_name,
+            catalog_name=catalog_name,
+            row_count=len(df),
+            column_count=len(df.columns),
+            columns_info=columns_info,
+            # 获取样本数据（前5行）
+            sample_data=df.head(5).to_dict("records"),
+        )
+
     def _register_dataframes_to_catalog(
-        self, dataframes: List[Tuple[str, pd.DataFrame]], catalog_name: str, file_name: str
+        self,
+        dataframes: List[Tuple[str, pd.DataFrame]],
+        catalog_name: str,
+        file_name: str,
+        content_hash: Optional[str] = None,
     ) -> Dict[str, SheetInfo]:
         """
         将多个 DataFrame 注册到指定的 catalog 中
+        提供内容指纹时先转换为列式缓存（Parquet）再以视图方式挂载，后续提问可直接复用
 
         :param dataframes: List[(sheet_name, DataFrame)] - 表名和数据框的列表
         :param catalog_name: 目标 catalog 名称
         :param file_name: 源文件名（用于日志）
+        :param content_hash: 文件内容指纹
         :return: {table_name: SheetInfo}
         """
         conn = self._get_connection()
-        registered_tables = {}
 
         # 创建schema（如果不存在）
         conn.execute(f"CREATE SCHEMA IF NOT EXISTS {catalog_name}")
 
+        prepared: List[Tuple[SheetInfo, pd.DataFrame]] = []
+        prepared_names = set()
         for sheet_name, df in dataframes:
             try:
                 # 生成表名
@@ -115,7 +268,7 @@ class ExcelDuckDBManager:
                 full_table_name = f'"{catalog_name}"."{table_name}"'
 
                 # 检查表是否已注册
-                if full_table_name in self._registered_tables:
+                if full_table_name in self._registered_tables or table_name in prepared_names:
                     logger.warning(f"表 '{full_table_name}' 已存在，跳过注册")
                     continue
 
@@ -126,47 +279,86 @@ class ExcelDuckDBManager:
                 # 清理列名
                 df.columns = [self._sanitize_column_name(col) for col in df.columns]
 
+                prepared.append((self._build_sheet_info(sheet_name, table_name, catalog_name, df), df))
+                prepared_names.add(table_name)
+
+            except Exception as e:
+                logger.error(f"注册表 '{sheet_name}' 失败: {str(e)}")
+                traceback.print_exception(e)
+                continue
+
+        if content_hash:
+            try:
+                manifest = ExcelArtifactStore.build(content_hash, file_name, prepared)
+                return self._attach_artifact(manifest, catalog_name)
+            except Exception as e:
+                logger.warning(f"生成列式缓存失败，改为直接加载到内存: {file_name}, 错误: {e}")
+
+        registered_tables = {}
+        for sheet_info, df in prepared:
+            full_table_name = f'"{catalog_name}"."{sheet_info.table_name}"'
+            try:
                 # 创建表并插入数据
                 create_sql = f"CREATE TABLE {full_table_name} AS SELECT * FROM df"
                 conn.execute(create_sql)
 
-                # 获取表信息
-                row_count = len(df)
-                column_count = len(df.columns)
-
-                # 获取列信息
-                columns_info = {}
-                for col in df.columns:
-                    dtype = str(df[col].dtype)
-                    sql_type = self._map_pandas_dtype_to_sql(dtype)
-                    columns_info[col] = {"comment": col, "type": sql_type}
-
-                # 获取样本数据（前5行）
-                sample_data = df.head(5).to_dict("records")
-
-                # 创建 SheetInfo
-                sheet_info = SheetInfo(
-                    sheet_name=sheet_name,
-                    table_name=table_name,
-                    catalog_name=catalog_name,
-                    row_count=row_count,
-                    column_count=column_count,
-                    columns_info=columns_info,
-                    sample_data=sample_data,
-                )
-
-                registered_tables[table_name] = sheet_info
+                registered_tables[sheet_info.table_name] = sheet_info
                 self._registered_tables[full_table_name] = sheet_info
 
-                logger.debug(f"  注册表: {full_table_name} ({row_count} 行, {column_count} 列)")
+                logger.debug(
+                    f"  注册表: {full_table_name} ({sheet_info.row_count} 行, {sheet_info.column_count} 列)"
+                )
 
             except Exception as e:
-                logger.error(f"注册表 '{sheet_name}' 失败: {str(e)}")
+                logger.error(f"注册表 '{sheet_info.sheet_name}' 失败: {str(e)}")
                 traceback.print_exception(e)
                 continue
 
         return registered_tables
 
+    def _attach_artifact(self, manifest: Dict, catalog_name: str) -> Dict[str, SheetInfo]:
+        """
+        将列式缓存以视图方式挂载到指定 catalog，只读取 Parquet 元数据，不加载数据
+
+        :param manifest: ExcelArtifactStore 清单
+        :param catalog_name: 目标 catalog 名称
+        :return: {table_name: SheetInfo}
+        """
+        conn = self._get_connection()
+        conn.execute(f"CREATE SCHEMA IF NOT EXISTS {catalog_name}")
+
+        registered_tables = {}
+        for sheet in manifest.get("sheets", []):
+            sheet_info = SheetInfo(
+                **{k: v for k, v in sheet.items() if k != "parquet"}, catalog_name=catalog_name
+            )
+            full_table_name = f'"{catalog_name}"."{sheet_info.table_name}"'
+            if full_table_name in self._registered_tables:
+                logger.warning(f"表 '{full_table_name}' 已存在，跳过注册")
+                continue
+
+            parquet_path = ExcelArtifactStore.parquet_path(manifest, sheet).replace("'", "''")
+            conn.execute(f"CREATE OR REPLACE VIEW {full_table_name} AS SELECT * FROM read_parquet('{parquet_path}')")
+
+            registered_tables[sheet_info.table_name] = sheet_info
+            self._registered_tables[full_table_name] = sheet_info
+            logger.debug(f"  挂载表: {full_table_name} ({sheet_info.row_count} 行, {sheet_info.column_count} 列)")
+
+        # 调用方持有转换锁，登记期间缓存不会被其他 worker 回收
+        self._release_artifact(catalog_name)
+        self._artifact_refs[catalog_name] = ExcelArtifactStore.acquire(manifest)
+        return registered_tables
+
+    def _release_artifact(self, catalog_name: Optional[str] = None):
+        """
+        释放列式缓存的使用登记
+
+        :param catalog_name: 为 None 时释放全部
+        """
+        catalog_names = list(self._artifact_refs) if catalog_name is None else [catalog_name]
+        for name in catalog_names:
+            ExcelArtifactStore.release(self._artifact_refs.pop(name, None))
+
     def _get_unique_catalog_name(self, file_name: str) -> str:
         """
         获取唯一的 catalog 名称
@@ -185,35 +377,42 @@ class ExcelDuckDBManager:
 
         return catalog_name
 
-    def register_excel_file(self, file_path: str, file_name: str) -> Tuple[str, Dict[str, SheetInfo]]:
+    @_synchronized
+    def register_excel_file(
+        self, file_path: str, file_name: str, content_hash: Optional[str] = None
+    ) -> Tuple[str, Dict[str, SheetInfo]]:
         """
         注册 Excel 文件到 DuckDB，返回 catalog 名称和表信息
 
         :param file_path: 文件路径或URL
         :param file_name: 文件名
+        :param content_hash: 文件内容指纹，提供时优先挂载已转换的列式缓存
         :return: (catalog_name, {table_name: SheetInfo})
         """
         catalog_name = self._get_unique_catalog_name(file_name)
         logger.info(f"开始注册Excel文件到 catalog '{catalog_name}': {file_name}")
 
         try:
-            # 读取 Excel 文件的所有 sheet
-            excel_file_data = pd.ExcelFile(file_path)
-            sheet_names = excel_file_data.sheet_names
-
-            # 构建数据框列表
-            dataframes = []
-            for sheet_name in sheet_names:
-                df = pd.read_excel(file_path, sheet_name=sheet_name)
-                dataframes.append((sheet_name, df))
+            # 其他 worker 正在转换同一文件时等待其完成，然后直接挂载结果
+            with ExcelArtifactStore.build_lock(content_hash):
+                manifest = ExcelArtifactStore.load_manifest(content_hash) if content_hash else None
+                if manifest:
+                    # 命中列式缓存，无需下载和解析
+                    registered_tables = self._attach_artifact(manifest, catalog_name)
+                else:
+                    # 只下载一次，从同一缓冲区解析全部 sheet
+                    dataframes = load_workbook_sheets(fetch_file_bytes(file_path), file_name)
 
-            # 注册到 catalog
-            registered_tables = self._register_dataframes_to_catalog(dataframes, catalog_name, file_name)
+                    # 注册到 catalog
+                    registered_tables = self._register_dataframes_to_catalog(
+                        dataframes, catalog_name, file_name, content_hash
+                    )
 
             # 记录 catalog 信息
             self._registered_catalogs[catalog_name] = file_path
             logger.info(
                 f"成功注册Excel文件: {file_name} -> catalog '{catalog_name}' ({len(registered_tables)} 个表)"
+                f"{'（命中列式缓存）' if manifest else ''}"
             )
 
         except Exception as e:
@@ -223,37 +422,56 @@ class ExcelDuckDBManager:
 
         return catalog_name, registered_tables
 
-    def register_csv_file(self, file_path: str, file_name: str) -> Tuple[str, Dict[str, SheetInfo]]:
+    @_synchronized
+    def register_csv_file(
+        self, file_path: str, file_name: str, content_hash: Optional[str] = None
+    ) -> Tuple[str, Dict[str, SheetInfo]]:
         """
         注册 CSV 文件到 DuckDB
 
         :param file_path: 文件路径或URL
         :param file_name: 文件名
+        :param content_hash: 文件内容指纹，提供时优先挂载已转换的列式缓存
         :return: (catalog_name, {table_name: SheetInfo})
         """
         catalog_name = self._get_unique_catalog_name(file_name)
         logger.info(f"开始注册CSV文件到 catalog '{catalog_name}': {file_name}")
 
-        try:
-            # 读取 CSV 文件
-            df = pd.read_csv(file_path)
+        # 生成表名（使用文件名去掉扩展名）
+        table_name = self._sanitize_table_name(file_name.rsplit(".", 1)[0])
+        # CSV 的表名来自文件名，缓存键需同时包含表名
+        if content_hash:
+            content_hash = f"{content_hash}-{hashlib.md5(table_name.encode('utf-8')).hexdigest()[:8]}"
 
-            if df.empty:
-                logger.warning(f"CSV文件 '{file_name}' 为空")
-                return catalog_name, {}
+        try:
+            # 其他 worker 正在转换同一文件时等待其完成，然后直接挂载结果
+            with ExcelArtifactStore.build_lock(content_hash):
+                manifest = ExcelArtifactStore.load_manifest(content_hash) if content_hash else None
+                if manifest:
+                    # 命中列式缓存，无需下载和解析
+                    registered_tables = self._attach_artifact(manifest, catalog_name)
+                else:
+                    # 读取 CSV 文件
+                    df = pd.read_csv(file_path)
 
-            # 生成表名（使用文件名去掉扩展名）
-            table_name = self._sanitize_table_name(file_name.rsplit(".", 1)[0])
+                    if df.empty:
+                        logger.warning(f"CSV文件 '{file_name}' 为空")
+                        return catalog_name, {}
 
-            # 构建数据框列表
-            dataframes = [(table_name, df)]
+                    # 构建数据框列表
+                    dataframes = [(table_name, df)]
 
-            # 注册到 catalog
-            registered_tables = self._register_dataframes_to_catalog(dataframes, catalog_name, file_name)
+                    # 注册到 catalog
+                    registered_tables = self._register_dataframes_to_catalog(
+                        dataframes, catalog_name, file_name, content_hash
+                    )
 
             # 记录 catalog 信息
             self._registered_catalogs[catalog_name] = file_path
-            logger.info(f"成功注册CSV文件: {file_name} -> catalog '{catalog_name}' ({len(registered_tables)} 个表)")
+            logger.info(
+                f"成功注册CSV文件: {file_name} -> catalog '{catalog_name}' ({len(registered_tables)} 个表)"
+                f"{'（命中列式缓存）' if manifest else ''}"
+            )
 
         except Exception as e:
             logger.error(f"注册CSV文件 '{file_name}' 失败: {str(e)}")
@@ -465,6 +683,7 @@ class ExcelDuckDBManager:
         
         return fixed_sql
 
+    @_synchronized
     def execute_sql(self, sql: str) -> Tuple[List[str], List[Dict]]:
         """
         执行 SQL 查询
@@ -570,6 +789,70 @@ class ExcelDuckDBManager:
         """
         return self._registered_tables.copy()
 
+    def get_registered_file(self, file_key: str) -> Optional[Dict[str, Any]]:
+        """
+        获取已注册文件的登记信息
+
+        :param file_key: 文件标识（source_file_key）
+        :return: {"content_hash", "catalog_name", "file_info", "tables"}，未注册返回 None
+        """
+        return self._registered_files.get(file_key)
+
+    def get_registered_file_keys(self) -> List[str]:
+        """
+        获取已注册的文件标识列表
+        """
+        return list(self._registered_files.keys())
+
+    def track_registered_file(
+        self,
+        file_key: str,
+        content_hash: Optional[str],
+        file_info: FileInfo,
+        tables: Dict[str, SheetInfo],
+    ):
+        """
+        登记文件与其注册结果，后续提问文件未变化时直接复用
+
+        :param file_key: 文件标识（source_file_key）
+        :param content_hash: 文件内容指纹
+        :param file_info: 文件信息
+        :param tables: {table_name: SheetInfo}
+        """
+        self._registered_files[file_key] = {
+            "content_hash": content_hash,
+            "catalog_name": file_info.catalog_name,
+            "file_info": file_info,
+            "tables": tables,
+        }
+
+    @_synchronized
+    def unregister_file(self, file_key: str) -> bool:
+        """
+        删除单个文件注册的 catalog 及其全部表
+
+        :param file_key: 文件标识（source_file_key）
+        :return: 是否删除
+        """
+        entry = self._registered_files.pop(file_key, None)
+        if not entry:
+            return False
+
+        catalog_name = entry["catalog_name"]
+        if catalog_name:
+            try:
+                self._get_connection().execute(f"DROP SCHEMA IF EXISTS {catalog_name} CASCADE")
+            except Exception as e:
+                logger.warning(f"删除 catalog 失败: {catalog_name}, 错误: {str(e)}")
+            self._registered_catalogs.pop(catalog_name, None)
+            for full_table_name, sheet_info in list(self._registered_tables.items()):
+                if sheet_info.catalog_name == catalog_name:
+                    del self._registered_tables[full_table_name]
+            self._release_artifact(catalog_name)
+
+        logger.info(f"已移除文件 {file_key} 注册的 catalog '{catalog_name}'")
+        return True
+
     def get_table_schema_info(self) -> List[Dict]:
         """
         获取所有表的架构信息，用于SQL生成
@@ -590,15 +873,23 @@ class ExcelDuckDBManager:
 
         return schema_info
 
+    @_synchronized
     def close(self):
         """
-        关闭 DuckDB 连接
+        关闭 DuckDB 连接，并删除会话的磁盘转存文件和溢写临时目录
         """
         if self._connection is not None:
             self._connection.close()
             self._connection = None
             logger.info("DuckDB 连接已关闭")
-
+        if self._spill_path:
+            _remove_file(self._spill_path)
+            self._spill_path = None
+        shutil.rmtree(self._temp_dir, ignore_errors=True)
+        self._release_artifact()
+        self._memory_usage = 0
+
+    @_synchronized
     def clear_registered_tables(self):
         """
         清理已注册的表（删除DuckDB中的表，但保持连接）
@@ -612,18 +903,21 @@ class ExcelDuckDBManager:
             conn = self._get_connection()
             table_count = len(self._registered_tables)
             
-            for full_table_name in list(self._registered_tables.keys()):
+            # 表可能是内存表或指向列式缓存的视图，按 catalog 整体删除
+            catalog_names = set(self._registered_catalogs.keys())
+            catalog_names.update(info.catalog_name for info in self._registered_tables.values())
+            for catalog_name in catalog_names:
                 try:
-                    # 删除表
-                    drop_sql = f"DROP TABLE IF EXISTS {full_table_name}"
-                    conn.execute(drop_sql)
-                    logger.debug(f"已删除表: {full_table_name}")
+                    conn.execute(f"DROP SCHEMA IF EXISTS {catalog_name} CASCADE")
+                    logger.debug(f"已删除 catalog: {catalog_name}")
                 except Exception as e:
-                    logger.warning(f"删除表失败: {full_table_name}, 错误: {str(e)}")
+                    logger.warning(f"删除 catalog 失败: {catalog_name}, 错误: {str(e)}")
             
             # 清理管理器中的注册信息
             self._registered_tables.clear()
             self._registered_catalogs.clear()
+            self._registered_files.clear()
+            self._release_artifact()
             logger.info(f"已清理 {table_count} 个已注册的表")
         except Exception as e:
             logger.error(f"清理已注册表时出错: {str(e)}")
@@ -636,6 +930,7 @@ class ExcelDuckDBManager:
         self.close()
         self._registered_catalogs.clear()
         self._registered_tables.clear()
+        self._registered_files.clear()
         logger.info(f"会话 {self._session_id} 数据已清理")
 
     def _map_pandas_dtype_to_sql(self, dtype: str) -> str:
@@ -669,19 +964,35 @@ class ExcelDuckDBManager:
             return "VARCHAR(255)"
 
 
+def _remove_file(path: str):
+    """删除 DuckDB 数据库文件及其 WAL 文件"""
+    for file_path in (path, f"{path}.wal"):
+        try:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            logger.warning(f"删除 DuckDB 文件失败: {file_path}, 错误: {e}")
+
+
 class ChatDuckDBManager:
     """
     聊天级别的DuckDB管理器
     为每个chat_id维护独立的ExcelDuckDBManager实例
+    - 空闲会话转存到磁盘，再次提问时自动恢复
+    - 进程内所有会话的内存超出预算时，按最近最少使用转存
+    - 过期会话关闭并删除磁盘文件
     """
 
     def __init__(self):
         # {chat_id: ExcelDuckDBManager}
         self._chat_managers: Dict[str, ExcelDuckDBManager] = {}
         # 会话清理时间配置（秒）
-        self._session_timeout = 36000  # 10小时
+        self._session_timeout = DUCKDB_SESSION_TIMEOUT
         # {chat_id: 最后访问时间}
         self._last_access: Dict[str, float] = {}
+        # 上次回收表格列式缓存的时间
+        self._last_artifact_evict: float = 0.0
+        self._lock = threading.Lock()
         logger.info("初始化聊天级别DuckDB管理器")
 
     def get_manager(self, chat_id: str) -> ExcelDuckDBManager:
@@ -691,15 +1002,23 @@ class ChatDuckDBManager:
         :param chat_id: 聊天ID
         :return: ExcelDuckDBManager实例
         """
-        # 检查是否已存在该chat_id的管理器
-        if chat_id not in self._chat_managers:
-            self._chat_managers[chat_id] = ExcelDuckDBManager()
-            logger.info(f"为chat_id '{chat_id}' 创建新的DuckDB管理器实例")
+        with self._lock:
+            # 检查是否已存在该chat_id的管理器
+            manager = self._chat_managers.get(chat_id)
+            created = manager is None
+            if created:
+                manager = ExcelDuckDBManager()
+                self._chat_managers[chat_id] = manager
+                logger.info(f"为chat_id '{chat_id}' 创建新的DuckDB管理器实例")
+
+            # 更新最后访问时间
+            self._last_access[chat_id] = time.time()
 
-        # 更新最后访问时间
-        self._last_access[chat_id] = time.time()
+        if created or not manager.is_loaded:
+            # 新会话或即将从磁盘恢复的会话会占用内存，先为其腾出预算
+            self.enforce_memory_budget(exclude_chat_id=chat_id)
 
-        return self._chat_managers[chat_id]
+        return manager
 
     def close_manager(self, chat_id: str) -> bool:
         """
@@ -708,33 +1027,98 @@ class ChatDuckDBManager:
         :param chat_id: 聊天ID
         :return: 是否成功关闭
         """
-        if chat_id in self._chat_managers:
-            try:
-                self._chat_managers[chat_id].close()
-                del self._chat_managers[chat_id]
-                if chat_id in self._last_access:
-                    del self._last_access[chat_id]
-                logger.info(f"已关闭chat_id '{chat_id}' 的DuckDB管理器实例")
-                return True
-            except Exception as e:
-                logger.error(f"关闭chat_id '{chat_id}' 的DuckDB管理器失败: {str(e)}")
-                return False
-        return False
+        with self._lock:
+            manager = self._chat_managers.pop(chat_id, None)
+            self._last_access.pop(chat_id, None)
+        if manager is None:
+            return False
+        try:
+            manager.close()
+            logger.info(f"已关闭chat_id '{chat_id}' 的DuckDB管理器实例")
+            return True
+        except Exception as e:
+            logger.error(f"关闭chat_id '{chat_id}' 的DuckDB管理器失败: {str(e)}")
+            return False
+
+    def _lru_sessions(self) -> List[Tuple[str, ExcelDuckDBManager, float]]:
+        """按最后访问时间从旧到新返回会话列表"""
+        with self._lock:
+            sessions = [
+                (chat_id, manager, self._last_access.get(chat_id, 0.0))
+                for chat_id, manager in self._chat_managers.items()
+            ]
+        return sorted(sessions, key=lambda item: item[2])
 
     def cleanup_expired_sessions(self):
         """
         清理过期的会话
         """
         current_time = time.time()
-        expired_chats = []
-
-        for chat_id, last_access in self._last_access.items():
+        for chat_id, _, last_access in self._lru_sessions():
             if current_time - last_access > self._session_timeout:
-                expired_chats.append(chat_id)
+                logger.info(f"清理过期会话: {chat_id}")
+                self.close_manager(chat_id)
 
-        for chat_id in expired_chats:
-            logger.info(f"清理过期会话: {chat_id}")
-            self.close_manager(chat_id)
+    def spill_idle_sessions(self) -> int:
+        """
+        将空闲超时的会话转存到磁盘
+
+        :return: 转存的会话数量
+        """
+        current_time = time.time()
+        spilled = 0
+        for chat_id, manager, last_access in self._lru_sessions():
+            if manager.is_loaded and current_time - last_access > DUCKDB_SESSION_IDLE_SPILL:
+                if manager.spill():
+                    spilled += 1
+        return spilled
+
+    def enforce_memory_budget(self, exclude_chat_id: Optional[str] = None) -> int:
+        """
+        进程内会话内存超出预算时，按最近最少使用将会话转存到磁盘
+
+        :param exclude_chat_id: 不参与转存的会话（当前正在使用的会话）
+        :return: 转存的会话数量
+        """
+        budget = DUCKDB_MEMORY_BUDGET_MB * 1024 * 1024
+        if budget <= 0:
+            return 0
+
+        sessions = [item for item in self._lru_sessions() if item[1].is_loaded]
+        usage = {chat_id: manager.memory_usage() for chat_id, manager, _ in sessions}
+        total = sum(usage.values())
+        if total <= budget:
+            return 0
+
+        spilled = 0
+        for chat_id, manager, _ in sessions:
+            if total <= budget:
+                break
+            if chat_id == exclude_chat_id:
+                continue
+            if manager.spill():
+                total -= usage[chat_id]
+                spilled += 1
+        logger.info(
+            f"DuckDB 会话内存超出预算（{DUCKDB_MEMORY_BUDGET_MB}MB），已转存 {spilled} 个会话，"
+            f"当前约 {total / 1024 / 1024:.1f}MB"
+        )
+        return spilled
+
+    def reap(self):
+        """
+        后台回收：清理过期会话、转存空闲会话、检查内存预算，并定期回收表格列式缓存
+        """
+        self.cleanup_expired_sessions()
+        self.spill_idle_sessions()
+        self.enforce_memory_budget()
+
+        if time.time() - self._last_artifact_evict >= EXCEL_ARTIFACT_EVICT_INTERVAL:
+            self._last_artifact_evict = time.time()
+            try:
+                ExcelArtifactStore.evict()
+            except Exception as e:
+                logger.warning(f"表格列式缓存回收失败: {e}")
 
     def get_active_chat_count(self) -> int:
         """
@@ -823,3 +1207,17 @@ def close_duckdb_manager(chat_id: str = None):
             get_default_duckdb_manager._default_manager.close()
             get_default_duckdb_manager._default_manager = None
             logger.info("默认全局DuckDB管理器已关闭")
+
+
+async def run_session_reaper():
+    """
+    DuckDB 会话后台回收任务（每个 worker 一个），由 serv.py 在 worker 启动后注册
+    """
+    logger.info(f"✅ DuckDB 会话回收任务已启动，间隔 {DUCKDB_REAPER_INTERVAL} 秒")
+    loop = asyncio.get_running_loop()
+    while True:
+        await asyncio.sleep(DUCKDB_REAPER_INTERVAL)
+        try:
+            await loop.run_in_executor(None, get_chat_duckdb_manager().reap)
+        except Exception as e:
+            logger.warning(f"DuckDB 会话回收失败: {e}")
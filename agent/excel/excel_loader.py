@@ -0,0 +1,105 @@
+"""
+Excel 工作簿加载器
+文件只下载一次，所有 Sheet 从同一份内存缓冲区中一次解析完成；
+安装了 python-calamine 时使用其流式读取器（比 openpyxl 快数倍），Sheet 较多时可选多进程并行解析。
+"""
+
+import io
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from threading import Lock
+from typing import List, Optional, Sequence, Tuple
+
+import pandas as pd
+import requests
+
+logger = logging.getLogger(__name__)
+
+# 并行解析的进程数（0/1 表示不启用多进程）
+EXCEL_LOAD_WORKERS = int(os.getenv("EXCEL_LOAD_WORKERS", "0"))
+# Sheet 数量达到该值时才启用多进程解析
+EXCEL_PARALLEL_MIN_SHEETS = int(os.getenv("EXCEL_PARALLEL_MIN_SHEETS", "4"))
+# 下载超时时间（秒）
+EXCEL_DOWNLOAD_TIMEOUT = int(os.getenv("EXCEL_DOWNLOAD_TIMEOUT", "120"))
+
+# 可选依赖：Rust 实现的流式读取器，支持 xlsx/xls/ods
+try:
+    import python_calamine  # noqa: F401
+
+    _CALAMINE_AVAILABLE = True
+except ImportError:
+    _CALAMINE_AVAILABLE = False
+
+_process_pool: Optional[ProcessPoolExecutor] = None
+_process_pool_lock = Lock()
+
+
+def _get_engine() -> Optional[str]:
+    """选择解析引擎，未安装 calamine 时由 pandas 按文件格式自动选择"""
+    return "calamine" if _CALAMINE_AVAILABLE else None
+
+
+def _get_process_pool() -> ProcessPoolExecutor:
+    """获取解析进程池（spawn 方式，避免在多线程进程中 fork）"""
+    global _process_pool
+    with _process_pool_lock:
+        if _process_pool is None:
+            _process_pool = ProcessPoolExecutor(
+                max_workers=EXCEL_LOAD_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            logger.info(f"✅ 创建 Excel 解析进程池，进程数: {EXCEL_LOAD_WORKERS}")
+    return _process_pool
+
+
+def fetch_file_bytes(file_path: str) -> bytes:
+    """
+    读取文件完整内容（支持 URL 与本地路径），整个加载过程只下载一次
+    """
+    if file_path.startswith(("http://", "https://")):
+        response = requests.get(file_path, timeout=EXCEL_DOWNLOAD_TIMEOUT)
+        response.raise_for_status()
+        return response.content
+    with open(file_path, "rb") as f:
+        return f.read()
+
+
+def _parse_sheets(data: bytes, sheet_names: Sequence[str], engine: Optional[str]) -> List[Tuple[str, pd.DataFrame]]:
+    """从同一缓冲区解析指定的 Sheet（进程池任务，需为模块级函数）"""
+    frames = pd.read_excel(io.BytesIO(data), sheet_name=list(sheet_names), engine=engine)
+    return [(name, frames[name]) for name in sheet_names]
+
+
+def load_workbook_sheets(data: bytes, file_name: str = "") -> List[Tuple[str, pd.DataFrame]]:
+    """
+    解析工作簿的全部 Sheet，保持 Sheet 原有顺序
+
+    :param data: 工作簿内容
+    :param file_name: 文件名（用于日志）
+    :return: [(sheet_name, DataFrame)]
+    """
+    engine = _get_engine()
+
+    if EXCEL_LOAD_WORKERS > 1:
+        with pd.ExcelFile(io.BytesIO(data), engine=engine) as excel_file:
+            sheet_names = list(excel_file.sheet_names)
+
+        if len(sheet_names) >= EXCEL_PARALLEL_MIN_SHEETS:
+            # Sheet 按轮询方式分组，每个进程解析一组
+            groups = [sheet_names[i::EXCEL_LOAD_WORKERS] for i in range(EXCEL_LOAD_WORKERS)]
+            groups = [group for group in groups if group]
+            pool = _get_process_pool()
+            futures = [pool.submit(_parse_sheets, data, group, engine) for group in groups]
+
+            parsed = {}
+            for future in futures:
+                parsed.update(dict(future.result()))
+            logger.info(f"并行解析工作簿 {file_name}: {len(sheet_names)} 个 Sheet，{len(groups)} 个进程")
+            return [(name, parsed[name]) for name in sheet_names]
+
+    # 单次解析全部 Sheet（sheet_name=None），工作簿只解压一次
+    frames = pd.read_excel(io.BytesIO(data), sheet_name=None, engine=engine)
+    logger.info(f"解析工作簿 {file_name}: {len(frames)} 个 Sheet（引擎: {engine or 'default'}）")
+    return list(frames.items())
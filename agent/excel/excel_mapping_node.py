@@ -47,17 +47,11 @@ def read_excel_columns(state: ExcelAgentState) -> ExcelAgentState:
         # 获取DuckDB管理器实例
         duckdb_manager = get_duckdb_manager(chat_id=chat_id)
 
-        # 重新执行时，先清理旧的表，然后重新注册
-        # 获取已注册的表，如果存在则先清理
-        registered_tables = duckdb_manager.get_registered_tables()
-        if registered_tables:
-            logger.info(f"检测到已注册的表（{len(registered_tables)} 个），清理旧表以重新注册")
-            # 清理已注册的表
-            try:
-                duckdb_manager.clear_registered_tables()
-                logger.debug(f"  已清理 {len(registered_tables)} 个旧表")
-            except Exception as e:
-                logger.warning(f"清理旧表时出错: {str(e)}，将继续注册新表")
+        # 只移除本次文件列表中已不存在的文件，未变化的文件直接复用已注册的表
+        current_file_keys = {f.get("source_file_key") for f in file_list if f.get("source_file_key")}
+        for file_key in duckdb_manager.get_registered_file_keys():
+            if file_key not in current_file_keys:
+                duckdb_manager.unregister_file(file_key)
 
         logger.info(f"开始处理文件: 共 {len(file_list)} 个文件")
 
@@ -71,7 +65,6 @@ def read_excel_columns(state: ExcelAgentState) -> ExcelAgentState:
 
                 # 获取文件信息
                 file_name = os.path.basename(source_file_key)
-                file_url = minio_utils.get_file_url_by_key(object_key=source_file_key)
 
                 # 解析文件扩展名
                 path_parts = source_file_key.split(".")
@@ -82,28 +75,54 @@ def read_excel_columns(state: ExcelAgentState) -> ExcelAgentState:
                     logger.warning(f"文件 {file_name} 扩展名不支持: {extension}，跳过")
                     continue
 
-                # 创建文件信息
-                file_info_obj = FileInfo(
-                    file_name=file_name,
-                    file_path=file_url,
-                    catalog_name="",  # 将在注册后填充
-                    sheet_count=0,  # 将在注册后填充
-                    upload_time=datetime.now().isoformat(),
-                )
-
-                registered_tables = {}
-                catalog_name = ""
-                if extension in ["xlsx", "xls"]:
-                    # 注册到 DuckDB 管理器
-                    catalog_name, registered_tables = duckdb_manager.register_excel_file(file_url, file_name)
-
-                elif extension == "csv":
-                    # 注册到 DuckDB 管理器
-                    catalog_name, registered_tables = duckdb_manager.register_csv_file(file_url, file_name)
-
-                # 更新文件信息
-                file_info_obj.catalog_name = catalog_name
-                file_info_obj.sheet_count = len(registered_tables)
+                # 文件内容指纹（MinIO ETag），用于判断文件是否变化并复用已转换的列式缓存
+                content_hash = minio_utils.get_object_etag(object_key=source_file_key)
+
+                registered_file = duckdb_manager.get_registered_file(source_file_key)
+                if registered_file and (content_hash is None or registered_file["content_hash"] == content_hash):
+                    # 文件未变化，直接复用当前会话中已注册的表
+                    file_info_obj = registered_file["file_info"]
+                    catalog_name = registered_file["catalog_name"]
+                    registered_tables = registered_file["tables"]
+                    logger.info(f"文件 {file_name} 未变化，复用已注册的 catalog '{catalog_name}'")
+                else:
+                    if registered_file:
+                        # 文件内容已变化，移除旧的注册结果
+                        duckdb_manager.unregister_file(source_file_key)
+
+                    file_url = minio_utils.get_file_url_by_key(object_key=source_file_key)
+
+                    # 创建文件信息
+                    file_info_obj = FileInfo(
+                        file_name=file_name,
+                        file_path=file_url,
+                        catalog_name="",  # 将在注册后填充
+                        sheet_count=0,  # 将在注册后填充
+                        upload_time=datetime.now().isoformat(),
+                    )
+
+                    registered_tables = {}
+                    catalog_name = ""
+                    if extension in ["xlsx", "xls"]:
+                        # 注册到 DuckDB 管理器
+                        catalog_name, registered_tables = duckdb_manager.register_excel_file(
+                            file_url, file_name, content_hash=content_hash
+                        )
+
+                    elif extension == "csv":
+                        # 注册到 DuckDB 管理器
+                        catalog_name, registered_tables = duckdb_manager.register_csv_file(
+                            file_url, file_name, content_hash=content_hash
+                        )
+
+                    # 更新文件信息
+                    file_info_obj.catalog_name = catalog_name
+                    file_info_obj.sheet_count = len(registered_tables)
+
+                    # 登记文件，后续提问时文件未变化可直接复用
+                    duckdb_manager.track_registered_file(
+                        source_file_key, content_hash, file_info_obj, registered_tables
+                    )
 
                 # 合并表元数据
                 sheet_metadata.update(registered_tables)
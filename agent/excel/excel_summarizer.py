@@ -12,6 +12,7 @@ from decimal import Decimal
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from common.llm_util import get_llm
+from common.result_profiler import format_result_digest
 from agent.excel.excel_agent_state import ExcelAgentState
 from agent.excel.template.prompt_builder import ExcelPromptBuilder
 
@@ -76,8 +77,10 @@ def summarize(state: ExcelAgentState) -> ExcelAgentState:
         
         data_result = execution_result.data
         
-        # 如果数据是字典或列表，转换为JSON字符串
-        if isinstance(data_result, (dict, list)):
+        # 结果行列表转换为固定长度的统计摘要（列统计、趋势与抽样行），提示词长度不随行数增长
+        if isinstance(data_result, (list, tuple)):
+            data_result_str = format_result_digest(data_result)
+        elif isinstance(data_result, dict):
             data_result_str = json.dumps(data_result, ensure_ascii=False, indent=2, cls=DecimalEncoder)
         else:
             data_result_str = str(data_result)
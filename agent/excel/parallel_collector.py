@@ -7,7 +7,8 @@ import logging
 import threading
 from typing import Dict, Any, Optional
 from concurrent.futures import ThreadPoolExecutor
-from copy import deepcopy
+
+from common.state_view import TaskStateView, build_shared_state
 
 from agent.excel.excel_agent_state import ExcelAgentState
 from agent.excel.excel_chart_generator import excel_chart_generator
@@ -50,10 +51,9 @@ def parallel_collect(
     
     logger.info(f"🔄 开始并行执行任务: {tasks}")
     
-    # 创建状态的深拷贝，确保并行任务不会互相影响
-    state_copies = {}
-    for task in tasks:
-        state_copies[task] = deepcopy(state)
+    # 各任务共享只读的基础状态，写入落在各自的覆盖层中，不再为每个任务深拷贝全部结果行
+    shared_state = build_shared_state(state)
+    state_copies = {task: TaskStateView(shared_state) for task in tasks}
     
     # 定义任务函数映射
     task_functions = {
@@ -5,217 +5,14 @@
 import json
 import logging
 import traceback
-from decimal import Decimal
-from datetime import datetime, date
 from typing import Dict, Any, List, Optional, Tuple
 
-import sqlglot
-from sqlglot import parse
-
+from agent.text2sql.analysis.sql_analysis import SqlAnalysis, get_sql_analysis
 from agent.text2sql.state.agent_state import AgentState, ExecutionResult
+from common.columnar_render import render_records
 
 logger = logging.getLogger(__name__)
 
-# 数据库类型到 sqlglot 方言的映射
-# 对于 sqlglot 不直接支持的数据源，映射到最接近的兼容方言
-DB_TYPE_TO_DIALECT = {
-    "mysql": "mysql",
-    "postgresql": "postgres",
-    "pg": "postgres",
-    "oracle": "oracle",
-    "sqlserver": "tsql",
-    "mssql": "tsql",
-    "clickhouse": "clickhouse",
-    "ck": "clickhouse",
-    "redshift": "redshift",
-    "elasticsearch": "mysql",  # Elasticsearch 使用 MySQL 兼容语法
-    "es": "mysql",
-    "starrocks": "mysql",  # StarRocks 兼容 MySQL 协议
-    "doris": "mysql",  # Doris 兼容 MySQL 协议
-    "dm": "oracle",  # 达梦数据库兼容 Oracle
-    "kingbase": "postgres",  # 人大金仓兼容 PostgreSQL
-    "excel": "postgres",  # Excel 使用 PostgreSQL 规则
-}
-
-
-def convert_value(v):
-    """转换数据类型"""
-    if isinstance(v, Decimal):
-        return float(v)
-    elif isinstance(v, (datetime,)):
-        return v.strftime("%Y-%m-%d %H:%M:%S")
-    elif isinstance(v, date):
-        return v.strftime("%Y-%m-%d")
-    else:
-        return v
-
-
-def extract_table_names_sqlglot(sql: str, db_type: str = "mysql") -> List[str]:
-    """
-    使用 sqlglot 提取 SQL 中的所有表名
-    
-    Args:
-        sql: SQL 语句
-        db_type: 数据库类型，默认为 mysql
-    """
-    try:
-        # 将数据库类型映射到 sqlglot 方言
-        dialect = DB_TYPE_TO_DIALECT.get(db_type.lower(), "mysql")
-        
-        expression = parse(sql, read=dialect)[0]
-        tables = set()
-        for table in expression.find_all(sqlglot.exp.Table):
-            tables.add(table.name)
-        return list(tables)
-    except Exception as e:
-        logger.warning(f"SQL 解析错误: {e}")
-        return []
-
-
-def extract_table_alias_mapping(sql: str, db_type: str = "mysql") -> Dict[str, str]:
-    """
-    提取SQL中的表别名映射关系
-    
-    Args:
-        sql: SQL语句
-        db_type: 数据库类型，默认为 mysql
-    
-    Returns:
-        别名到真实表名的映射字典 {alias: table_name}
-    """
-    alias_mapping = {}
-    try:
-        # 将数据库类型映射到 sqlglot 方言
-        dialect = DB_TYPE_TO_DIALECT.get(db_type.lower(), "mysql")
-        
-        expressions = parse(sql, read=dialect)
-        
-        # 方法1: 直接从表表达式中提取
-        for expression in expressions:
-            if expression:
-                for table_exp in expression.find_all(sqlglot.exp.Table):
-                    if hasattr(table_exp, "alias") and table_exp.alias:
-                        alias_mapping[table_exp.alias] = table_exp.name
-        
-        # 方法2: 从FROM和JOIN子句中提取（更可靠的方法）
-        for expression in expressions:
-            if expression:
-                # 处理 FROM 子句
-                for from_exp in expression.find_all(sqlglot.exp.From):
-                    if hasattr(from_exp, "expressions"):
-                        for expr in from_exp.expressions:
-                            if isinstance(expr, sqlglot.exp.Alias) and hasattr(expr.this, "name"):
-                                alias_mapping[expr.alias] = expr.this.name
-                            elif hasattr(expr, "name") and hasattr(expr, "alias") and expr.alias:
-                                alias_mapping[expr.alias] = expr.name
-                
-                # 处理 JOIN 子句
-                for join_exp in expression.find_all(sqlglot.exp.Join):
-                    if hasattr(join_exp, "this"):
-                        join_table = join_exp.this
-                        if isinstance(join_table, sqlglot.exp.Alias) and hasattr(join_table.this, "name"):
-                            alias_mapping[join_table.alias] = join_table.this.name
-                        elif hasattr(join_table, "name") and hasattr(join_table, "alias") and join_table.alias:
-                            alias_mapping[join_table.alias] = join_table.name
-    except Exception as e:
-        logger.warning(f"提取表别名映射失败: {e}")
-    
-    logger.debug(f"表别名映射: {alias_mapping}")
-    return alias_mapping
-
-
-def extract_select_columns(sql: str, db_type: str = "mysql", table_alias_mapping: Optional[Dict[str, str]] = None) -> List[Dict[str, Any]]:
-    """
-    从 SQL 中提取 SELECT 列的详细信息
-    返回格式: [{"name": "column_name", "alias": "alias_name", "table": "table_name", "is_aggregate": False}, ...]
-    
-    Args:
-        sql: SQL 语句
-        db_type: 数据库类型，默认为 mysql
-        table_alias_mapping: 表别名映射字典，如果提供，会将别名转换为真实表名
-    """
-    try:
-        # 将数据库类型映射到 sqlglot 方言
-        dialect = DB_TYPE_TO_DIALECT.get(db_type.lower(), "mysql")
-        
-        expressions = parse(sql, read=dialect)
-        column_info_list = []
-
-        for expression in expressions:
-            if not expression:
-                continue
-
-            # 查找 SELECT 表达式
-            selects = expression.find_all(sqlglot.exp.Select)
-            for select in selects:
-                projections = select.expressions
-                for proj in projections:
-                    col_info = {
-                        "name": "",
-                        "alias": "",
-                        "table": "",
-                        "is_aggregate": False,
-                    }
-
-                    # 检查是否是聚合函数
-                    if isinstance(proj, (sqlglot.exp.AggFunc, sqlglot.exp.Sum, sqlglot.exp.Count, sqlglot.exp.Avg, sqlglot.exp.Max, sqlglot.exp.Min)):
-                        col_info["is_aggregate"] = True
-                        col_info["name"] = str(proj)
-                    elif isinstance(proj, sqlglot.exp.Column):
-                        col_info["name"] = proj.name
-                        table_ref = proj.table or ""
-                        # 如果有表别名映射，将别名转换为真实表名
-                        if table_ref and table_alias_mapping:
-                            col_info["table"] = table_alias_mapping.get(table_ref, table_ref)
-                        else:
-                            col_info["table"] = table_ref
-                    elif isinstance(proj, sqlglot.exp.Star):
-                        col_info["name"] = "*"
-                    else:
-                        col_info["name"] = str(proj)
-
-                    # 获取别名（去掉外层的反引号、双引号、方括号）
-                    def clean_alias(alias_str: str) -> str:
-                        """清理别名：去掉反引号、双引号、方括号"""
-                        if not alias_str:
-                            return alias_str
-                        # 去掉反引号、双引号、方括号
-                        alias_str = alias_str.strip()
-                        # 去掉外层的反引号
-                        if alias_str.startswith('`') and alias_str.endswith('`'):
-                            alias_str = alias_str[1:-1]
-                        # 去掉外层的双引号
-                        if alias_str.startswith('"') and alias_str.endswith('"'):
-                            alias_str = alias_str[1:-1]
-                        # 去掉外层的方括号（SQL Server）
-                        if alias_str.startswith('[') and alias_str.endswith(']'):
-                            alias_str = alias_str[1:-1]
-                        return alias_str.strip()
-                    
-                    if isinstance(proj, sqlglot.exp.Alias):
-                        col_info["alias"] = clean_alias(proj.alias)
-                        # 检查内部的表达式是否为聚合函数
-                        if hasattr(proj, "this"):
-                            if isinstance(proj.this, (sqlglot.exp.AggFunc, sqlglot.exp.Sum, sqlglot.exp.Count, sqlglot.exp.Avg, sqlglot.exp.Max, sqlglot.exp.Min)):
-                                col_info["is_aggregate"] = True
-                                if isinstance(proj.this, sqlglot.exp.Column):
-                                    col_info["name"] = proj.this.name
-                                    table_ref = proj.this.table or ""
-                                    # 如果有表别名映射，将别名转换为真实表名
-                                    if table_ref and table_alias_mapping:
-                                        col_info["table"] = table_alias_mapping.get(table_ref, table_ref)
-                                    else:
-                                        col_info["table"] = table_ref
-                    elif hasattr(proj, "alias") and proj.alias:
-                        col_info["alias"] = clean_alias(proj.alias)
-
-                    column_info_list.append(col_info)
-
-        return column_info_list
-    except Exception as e:
-        logger.warning(f"提取 SELECT 列信息失败: {e}")
-        return []
-
 
 def extract_chart_config_mapping(chart_config: Optional[Dict[str, Any]]) -> Dict[str, str]:
     """
@@ -240,7 +37,8 @@ def extract_chart_config_mapping(chart_config: Optional[Dict[str, Any]]) -> Dict
                 if isinstance(col, dict):
                     value = col.get("value", "").strip().lower()
                     name = col.get("name", "").strip()
-                    if value and name:
+                    # 名称与列名相同（如规则生成的配置中没有注释的列）时不覆盖表结构注释
+                    if value and name and name.lower() != value:
                         mapping[value] = name
         
         # 处理axis字段（图表类型）
@@ -251,7 +49,7 @@ def extract_chart_config_mapping(chart_config: Optional[Dict[str, Any]]) -> Dict
                 if isinstance(axis_item, dict):
                     value = axis_item.get("value", "").strip().lower()
                     name = axis_item.get("name", "").strip()
-                    if value and name:
+                    if value and name and name.lower() != value:
                         mapping[value] = name
         
         logger.debug(f"从chart_config提取的映射: {mapping}")
@@ -307,7 +105,8 @@ def get_column_comment_from_schema(db_info: Dict[str, Dict[str, Any]], table_nam
 
 def map_columns_to_comments(
     sql: str, db_info: Dict[str, Dict[str, Any]], actual_columns: List[str], 
-    db_type: str = "mysql", chart_config: Optional[Dict[str, Any]] = None
+    db_type: str = "mysql", chart_config: Optional[Dict[str, Any]] = None,
+    analysis: Optional[SqlAnalysis] = None,
 ) -> Tuple[List[str], Dict[str, str]]:
     """
     将 SQL 查询结果的列名映射为中文注释（优先使用chart_config中的name）
@@ -324,6 +123,7 @@ def map_columns_to_comments(
         actual_columns: 实际列名列表
         db_type: 数据库类型，默认为 mysql
         chart_config: 图表配置（可选），包含columns/axis中的name和value映射
+        analysis: SQL 解析结果（可选），未提供时按 sql 和 db_type 获取
     
     Returns:
         (column_names_chinese, column_mapping)
@@ -334,20 +134,17 @@ def map_columns_to_comments(
         # 优先从chart_config中提取映射
         chart_config_mapping = extract_chart_config_mapping(chart_config)
         
-        # 提取表别名映射（将别名转换为真实表名）
-        table_alias_mapping = extract_table_alias_mapping(sql, db_type)
-        
-        # 提取 SELECT 列的详细信息（使用表别名映射）
-        column_info_list = extract_select_columns(sql, db_type, table_alias_mapping)
-        
-        # 获取表名（真实表名）
-        table_names = extract_table_names_sqlglot(sql, db_type)
+        # SQL 只解析一次，表名、别名（已转换为真实表名）、SELECT 列都来自同一个解析结果
+        if analysis is None or analysis.sql != sql:
+            analysis = get_sql_analysis(sql, db_type)
+        column_info_list = analysis.select_columns
+        table_names = analysis.tables
         
         column_mapping = {}
         column_names_chinese = []
 
         # 如果有 SELECT * 的情况,需要特殊处理
-        has_select_all = any(info.get("name") == "*" for info in column_info_list)
+        has_select_all = analysis.has_select_all
 
         if has_select_all:
             # SELECT * 的情况,使用第一个表的 schema
@@ -498,20 +295,8 @@ async def data_render_ant(state: AgentState):
                 sample_col_info = first_table_columns.get(sample_col, {})
                 logger.info(f"示例列 {sample_col} 的信息: {sample_col_info}")
         
-        # 获取数据库类型（用于 SQL 解析）
-        datasource_id = state.get("datasource_id")
-        db_type = "mysql"  # 默认类型
-        if datasource_id:
-            try:
-                from model.db_connection_pool import get_db_pool
-                from services.datasource_service import DatasourceService
-                db_pool = get_db_pool()
-                with db_pool.get_session() as session:
-                    ds = DatasourceService.get_datasource_by_id(session, datasource_id)
-                    if ds:
-                        db_type = ds.type
-            except Exception as e:
-                logger.warning(f"获取数据源类型失败: {e}，使用默认值 mysql")
+        # 获取数据库类型（用于 SQL 解析），由前面的节点写入 state，不再查询元数据库
+        db_type = state.get("db_type") or "mysql"
 
         # 获取实际的列名(从第一条数据中提取)
         actual_columns = list(data[0].keys()) if data else []
@@ -527,7 +312,7 @@ async def data_render_ant(state: AgentState):
         
         # 映射列名为中文注释（优先使用chart_config中的name）
         column_names_chinese, column_mapping = map_columns_to_comments(
-            generated_sql, db_info, actual_columns, db_type, chart_config
+            generated_sql, db_info, actual_columns, db_type, chart_config, analysis=state.get("sql_analysis")
         )
         
         logger.info(f"列名映射结果: 中文列名数量={len(column_names_chinese)}, 映射字典大小={len(column_mapping)}")
@@ -536,22 +321,14 @@ async def data_render_ant(state: AgentState):
         else:
             logger.warning(f"列名映射失败或返回空，使用原始列名。actual_columns={actual_columns[:3]}")
 
-        # 转换数据格式: 将英文列名映射为中文列名
-        formatted_data = []
-        for row in data:
-            formatted_row = {}
-            for col_name, value in row.items():
-                chinese_col_name = column_mapping.get(col_name, col_name)
-                formatted_row[chinese_col_name] = convert_value(value)
-            formatted_data.append(formatted_row)
-
-        # 确保 columns 字段与 formatted_data 的 key 一致（使用中文列名）
-        # 从 formatted_data 的第一行提取实际使用的中文列名，确保顺序和内容完全匹配
-        if formatted_data and len(formatted_data) > 0:
-            actual_chinese_columns = list(formatted_data[0].keys())
-            # 使用 formatted_data 中的实际列名，确保与数据完全匹配
-            column_names_chinese = actual_chinese_columns
-            logger.info(f"从 formatted_data 提取的实际中文列名: {actual_chinese_columns[:5] if len(actual_chinese_columns) > 5 else actual_chinese_columns}")
+        # 转换数据格式: 按列转换取值类型并将英文列名映射为中文列名
+        # columns 字段使用转换结果中的实际列名，确保与 formatted_data 的 key 顺序和内容完全匹配
+        column_names_chinese, formatted_data = render_records(
+            data,
+            columns=actual_columns,
+            names=[column_mapping.get(col_name, col_name) for col_name in actual_columns],
+        )
+        logger.info(f"转换后的实际中文列名: {column_names_chinese[:5] if len(column_names_chinese) > 5 else column_names_chinese}")
 
         # 确定图表类型 (template_code)
         chart_type = state.get("chart_type", "")
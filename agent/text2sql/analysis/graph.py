@@ -1,4 +1,6 @@
 import logging
+from threading import Lock
+from typing import Dict, Optional
 
 from langgraph.graph import StateGraph, END
 from langgraph.graph.state import CompiledStateGraph
@@ -10,15 +12,20 @@ from agent.text2sql.analysis.parallel_collector import (
 )
 from agent.text2sql.analysis.early_recommender_helper import start_early_recommender
 from agent.text2sql.analysis.unified_collector import unified_collect
-from agent.text2sql.database.db_service import DatabaseService
+from agent.text2sql.database.db_service import get_database_service, invalidate_database_service
 from agent.text2sql.sql.generator import sql_generate
 from agent.text2sql.permission.filter_injector import permission_filter_injector
 from agent.text2sql.chart.generator import chart_generator
 from agent.text2sql.datasource.selector import datasource_selector
 from agent.text2sql.state.agent_state import AgentState
+from common.invalidation_bus import InvalidationTopic, subscribe
 
 logger = logging.getLogger(__name__)
 
+# 已编译图缓存（按数据源复用，避免每次问答重新构建和编译 StateGraph）
+_graph_cache: Dict[Optional[int], CompiledStateGraph] = {}
+_graph_cache_lock = Lock()
+
 
 def data_render_condition(state: AgentState) -> str:
     """
@@ -64,7 +71,7 @@ def create_graph(datasource_id: int = None):
     :return:
     """
     graph = StateGraph(AgentState)
-    db_service = DatabaseService(datasource_id)
+    db_service = get_database_service(datasource_id)
 
     graph.add_node("datasource_selector", datasource_selector)
     graph.add_node("error_handler", handle_datasource_error)
@@ -108,3 +115,39 @@ def create_graph(datasource_id: int = None):
 
     graph_compiled: CompiledStateGraph = graph.compile()
     return graph_compiled
+
+
+def get_graph(datasource_id: int = None) -> CompiledStateGraph:
+    """
+    获取数据源对应的已编译图（进程内复用）
+    数据源或 AI 模型配置变更时需调用 invalidate_graph 使缓存失效
+    :param datasource_id: 数据源ID
+    :return: 已编译的图
+    """
+    with _graph_cache_lock:
+        graph_compiled = _graph_cache.get(datasource_id)
+    if graph_compiled is not None:
+        return graph_compiled
+
+    graph_compiled = create_graph(datasource_id)
+    with _graph_cache_lock:
+        return _graph_cache.setdefault(datasource_id, graph_compiled)
+
+
+def invalidate_graph(datasource_id: int = None):
+    """
+    使已编译图及其 DatabaseService 缓存失效
+    :param datasource_id: 数据源ID，为 None 时清空全部缓存
+    """
+    with _graph_cache_lock:
+        if datasource_id is None:
+            _graph_cache.clear()
+        else:
+            _graph_cache.pop(datasource_id, None)
+    invalidate_database_service(datasource_id)
+    logger.info(f"已编译图缓存已失效: datasource_id={datasource_id}")
+
+
+# 数据源元数据变更只影响对应数据源，AI 模型配置变更影响全部数据源
+subscribe(InvalidationTopic.DATASOURCE, lambda event: invalidate_graph(event.get("ds_id")))
+subscribe(InvalidationTopic.AI_MODEL, lambda event: invalidate_graph())
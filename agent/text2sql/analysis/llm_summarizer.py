@@ -7,6 +7,7 @@ from decimal import Decimal
 from langchain_core.messages import SystemMessage, HumanMessage
 
 from common.llm_util import get_llm
+from common.result_profiler import format_result_digest
 from agent.text2sql.state.agent_state import AgentState
 from agent.text2sql.template.prompt_builder import PromptBuilder
 
@@ -68,8 +69,11 @@ def summarize(state: AgentState):
         # 获取数据结果
         data_result = state["execution_result"].data
         
-        # 如果数据是字典或列表，转换为JSON字符串
-        if isinstance(data_result, (dict, list)):
+        # 结果行列表转换为固定长度的统计摘要（列统计、趋势与抽样行），提示词长度不随行数增长；
+        # 结果被截断时摘要中会注明，避免把部分数据当作全量数据进行统计
+        if isinstance(data_result, (list, tuple)):
+            data_result_str = format_result_digest(data_result, truncated=state["execution_result"].truncated)
+        elif isinstance(data_result, dict):
             data_result_str = json.dumps(data_result, ensure_ascii=False, indent=2, cls=DecimalEncoder)
         else:
             data_result_str = str(data_result)
@@ -7,7 +7,8 @@ import logging
 import threading
 from typing import Dict, Any, Optional
 from concurrent.futures import ThreadPoolExecutor
-from copy import deepcopy
+
+from common.state_view import TaskStateView, build_shared_state
 
 from agent.text2sql.state.agent_state import AgentState
 from agent.text2sql.chart.generator import chart_generator
@@ -51,10 +52,9 @@ def parallel_collect(
     
     logger.info(f"🔄 开始并行执行任务: {tasks}")
     
-    # 创建状态的深拷贝，确保并行任务不会互相影响
-    state_copies = {}
-    for task in tasks:
-        state_copies[task] = deepcopy(state)
+    # 各任务共享只读的基础状态，写入落在各自的覆盖层中，不再为每个任务深拷贝全部结果行
+    shared_state = build_shared_state(state)
+    state_copies = {task: TaskStateView(shared_state) for task in tasks}
     
     # 定义任务函数映射
     task_functions = {
@@ -173,7 +173,7 @@ def wait_and_merge_early_recommender(state: AgentState) -> AgentState:
             return state
         # 否则直接生成
         try:
-            result_state = question_recommender(deepcopy(state))
+            result_state = question_recommender(TaskStateView(state))
             if "recommended_questions" in result_state:
                 state["recommended_questions"] = result_state.get("recommended_questions", [])
         except Exception as e:
@@ -191,7 +191,7 @@ def wait_and_merge_early_recommender(state: AgentState) -> AgentState:
         # 超时或失败，回退到直接生成
         logger.warning("⚠️ 早期推荐问题任务超时或失败，回退到直接生成")
         try:
-            result_state = question_recommender(deepcopy(state))
+            result_state = question_recommender(TaskStateView(state))
             if "recommended_questions" in result_state:
                 state["recommended_questions"] = result_state.get("recommended_questions", [])
             else:
@@ -0,0 +1,240 @@
+"""
+SQL 解析结果共享
+生成的 SQL 在权限注入、列权限过滤、数据渲染等节点中都需要语法树信息（表名、别名、SELECT 列、聚合列），
+这里每条 SQL 按方言只解析一次，解析结果封装为 SqlAnalysis，各项信息在首次访问时计算并缓存。
+SqlAnalysis 按 (方言, SQL) 保存在进程内 LRU 中，重复的查询直接复用；改写后的 SQL（注入权限后）
+由改写得到的语法树直接构造并登记到缓存，后续节点读取时无需重新解析。
+
+SqlAnalysis 在请求间共享，其语法树和各项结果都是只读的，需要改写语法树时使用 copy_expressions()。
+"""
+
+import logging
+import os
+from collections import OrderedDict
+from functools import cached_property
+from threading import Lock
+from typing import Any, Dict, List, Optional, Tuple
+
+import sqlglot
+from sqlglot import parse
+
+logger = logging.getLogger(__name__)
+
+# 数据库类型到 sqlglot 方言的映射
+# 对于 sqlglot 不直接支持的数据源，映射到最接近的兼容方言
+DB_TYPE_TO_DIALECT = {
+    "mysql": "mysql",
+    "postgresql": "postgres",
+    "pg": "postgres",
+    "oracle": "oracle",
+    "sqlserver": "tsql",
+    "mssql": "tsql",
+    "clickhouse": "clickhouse",
+    "ck": "clickhouse",
+    "redshift": "redshift",
+    "elasticsearch": "mysql",  # Elasticsearch 使用 MySQL 兼容语法
+    "es": "mysql",
+    "starrocks": "mysql",  # StarRocks 兼容 MySQL 协议
+    "doris": "mysql",  # Doris 兼容 MySQL 协议
+    "dm": "oracle",  # 达梦数据库兼容 Oracle
+    "kingbase": "postgres",  # 人大金仓兼容 PostgreSQL
+    "excel": "postgres",  # Excel 使用 PostgreSQL 规则
+}
+
+# SQL 解析结果缓存的最大条目数（0 表示禁用缓存）
+SQL_ANALYSIS_CACHE_SIZE = int(os.getenv("SQL_ANALYSIS_CACHE_SIZE", "256"))
+
+AGGREGATE_TYPES = (
+    sqlglot.exp.AggFunc,
+    sqlglot.exp.Sum,
+    sqlglot.exp.Count,
+    sqlglot.exp.Avg,
+    sqlglot.exp.Max,
+    sqlglot.exp.Min,
+)
+
+_analysis_cache: "OrderedDict[Tuple[str, str], SqlAnalysis]" = OrderedDict()
+_analysis_lock = Lock()
+
+
+def get_dialect(db_type: Optional[str]) -> str:
+    """将数据库类型映射到 sqlglot 方言，未知类型按 mysql 处理"""
+    return DB_TYPE_TO_DIALECT.get(db_type.lower() if db_type else "mysql", "mysql")
+
+
+def _clean_alias(alias_str: str) -> str:
+    """清理别名：去掉反引号、双引号、方括号"""
+    if not alias_str:
+        return alias_str
+    alias_str = alias_str.strip()
+    # 去掉外层的反引号
+    if alias_str.startswith("`") and alias_str.endswith("`"):
+        alias_str = alias_str[1:-1]
+    # 去掉外层的双引号
+    if alias_str.startswith('"') and alias_str.endswith('"'):
+        alias_str = alias_str[1:-1]
+    # 去掉外层的方括号（SQL Server）
+    if alias_str.startswith("[") and alias_str.endswith("]"):
+        alias_str = alias_str[1:-1]
+    return alias_str.strip()
+
+
+class SqlAnalysis:
+    """
+    一条 SQL 的解析结果（只读，多个节点、多个请求共享）
+    """
+
+    def __init__(self, sql: str, dialect: str, expressions: Optional[List[sqlglot.exp.Expression]] = None):
+        self.sql = sql
+        self.dialect = dialect
+        # 解析失败时的异常信息
+        self.error: Optional[str] = None
+        if expressions is None:
+            try:
+                expressions = [e for e in parse(sql, read=dialect) if e is not None]
+            except Exception as e:
+                self.error = str(e)
+                expressions = []
+        self.expressions: List[sqlglot.exp.Expression] = expressions
+
+    @property
+    def ok(self) -> bool:
+        """是否解析成功"""
+        return self.error is None and bool(self.expressions)
+
+    def copy_expressions(self) -> List[sqlglot.exp.Expression]:
+        """返回语法树副本（用于改写，避免修改共享的语法树）"""
+        return [e.copy() for e in self.expressions]
+
+    @cached_property
+    def tables(self) -> List[str]:
+        """SQL 中的所有表名（去重，按出现顺序）"""
+        tables: Dict[str, None] = {}
+        for expression in self.expressions:
+            for table in expression.find_all(sqlglot.exp.Table):
+                if table.name:
+                    tables.setdefault(table.name, None)
+        return list(tables)
+
+    @cached_property
+    def alias_mapping(self) -> Dict[str, str]:
+        """表别名映射 {alias: table_name}"""
+        alias_mapping = {}
+        # 方法1: 直接从表表达式中提取
+        for expression in self.expressions:
+            for table_exp in expression.find_all(sqlglot.exp.Table):
+                if table_exp.alias:
+                    alias_mapping[table_exp.alias] = table_exp.name
+
+        # 方法2: 从FROM和JOIN子句中提取（更可靠的方法）
+        for expression in self.expressions:
+            for from_exp in expression.find_all(sqlglot.exp.From):
+                for expr in from_exp.expressions:
+                    if isinstance(expr, sqlglot.exp.Alias) and hasattr(expr.this, "name"):
+                        alias_mapping[expr.alias] = expr.this.name
+                    elif hasattr(expr, "name") and hasattr(expr, "alias") and expr.alias:
+                        alias_mapping[expr.alias] = expr.name
+
+            for join_exp in expression.find_all(sqlglot.exp.Join):
+                join_table = join_exp.this
+                if isinstance(join_table, sqlglot.exp.Alias) and hasattr(join_table.this, "name"):
+                    alias_mapping[join_table.alias] = join_table.this.name
+                elif hasattr(join_table, "name") and hasattr(join_table, "alias") and join_table.alias:
+                    alias_mapping[join_table.alias] = join_table.name
+        return alias_mapping
+
+    @cached_property
+    def select_columns(self) -> List[Dict[str, Any]]:
+        """
+        SELECT 列的详细信息（表别名已转换为真实表名）
+        格式: [{"name": "column_name", "alias": "alias_name", "table": "table_name", "is_aggregate": False}, ...]
+        """
+        alias_mapping = self.alias_mapping
+        column_info_list = []
+        for expression in self.expressions:
+            for select in expression.find_all(sqlglot.exp.Select):
+                for proj in select.expressions:
+                    col_info = {"name": "", "alias": "", "table": "", "is_aggregate": False}
+
+                    # 检查是否是聚合函数
+                    if isinstance(proj, AGGREGATE_TYPES):
+                        col_info["is_aggregate"] = True
+                        col_info["name"] = str(proj)
+                    elif isinstance(proj, sqlglot.exp.Column):
+                        col_info["name"] = proj.name
+                        table_ref = proj.table or ""
+                        col_info["table"] = alias_mapping.get(table_ref, table_ref) if table_ref else ""
+                    elif isinstance(proj, sqlglot.exp.Star):
+                        col_info["name"] = "*"
+                    else:
+                        col_info["name"] = str(proj)
+
+                    if isinstance(proj, sqlglot.exp.Alias):
+                        col_info["alias"] = _clean_alias(proj.alias)
+                        # 检查内部的表达式是否为聚合函数
+                        if isinstance(proj.this, AGGREGATE_TYPES):
+                            col_info["is_aggregate"] = True
+                    elif proj.alias:
+                        col_info["alias"] = _clean_alias(proj.alias)
+
+                    column_info_list.append(col_info)
+        return column_info_list
+
+    @cached_property
+    def aggregates(self) -> List[Dict[str, Any]]:
+        """SELECT 中的聚合列"""
+        return [col for col in self.select_columns if col["is_aggregate"]]
+
+    @cached_property
+    def has_select_all(self) -> bool:
+        """是否包含 SELECT *"""
+        return any(col["name"] == "*" for col in self.select_columns)
+
+
+def _store(analysis: SqlAnalysis):
+    if SQL_ANALYSIS_CACHE_SIZE <= 0:
+        return
+    key = (analysis.dialect, analysis.sql)
+    with _analysis_lock:
+        _analysis_cache[key] = analysis
+        _analysis_cache.move_to_end(key)
+        while len(_analysis_cache) > SQL_ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+
+
+def get_sql_analysis(sql: str, db_type: Optional[str] = "mysql") -> SqlAnalysis:
+    """
+    获取 SQL 的解析结果（按方言 + SQL 缓存，解析失败的结果同样缓存，error 字段记录原因）
+
+    :param sql: SQL 语句
+    :param db_type: 数据库类型
+    :return: SqlAnalysis
+    """
+    dialect = get_dialect(db_type)
+    key = (dialect, sql or "")
+    with _analysis_lock:
+        analysis = _analysis_cache.get(key)
+        if analysis is not None:
+            _analysis_cache.move_to_end(key)
+            return analysis
+
+    analysis = SqlAnalysis(sql or "", dialect)
+    if analysis.error:
+        logger.warning(f"SQL 解析错误: {analysis.error}")
+    _store(analysis)
+    return analysis
+
+
+def register_rewritten_sql(expressions: List[sqlglot.exp.Expression], dialect: str) -> SqlAnalysis:
+    """
+    将改写后的语法树序列化为 SQL，并以改写结果构造 SqlAnalysis 登记到缓存（后续节点读取时无需重新解析）
+    序列化失败时抛出异常，由调用方处理
+
+    :param expressions: 改写后的语法树（登记后不应再修改）
+    :param dialect: sqlglot 方言
+    :return: 改写后 SQL 的 SqlAnalysis
+    """
+    sql = "; ".join(e.sql(dialect=dialect) for e in expressions if e)
+    analysis = SqlAnalysis(sql, dialect, [e for e in expressions if e])
+    _store(analysis)
+    return analysis
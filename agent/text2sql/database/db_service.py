@@ -1,25 +1,29 @@
 import warnings
 
-from sqlalchemy import create_engine
-
-from common.datasource_util import DatasourceConfigUtil, DatasourceConnectionUtil, DB, ConnectType
+from common.datasource_util import (
+    DatasourceConfigUtil,
+    DatasourceConnectionUtil,
+    DatasourceEngineRegistry,
+    DB,
+    QueryResultBudget,
+    ConnectType,
+)
+from common.embedding_cache import get_or_compute_embedding
+from common.vector_util import decode_vector_matrix
 from model import Datasource
 
 warnings.filterwarnings("ignore", message=".*pkg_resources.*deprecated.*")
 
-import json
 import logging
 import os
-import re
 import time
+from collections import OrderedDict
 from typing import Dict, List, Tuple, Optional
 from threading import Lock
 from concurrent.futures import ThreadPoolExecutor
 
 import faiss
-import jieba
 import numpy as np
-import pandas as pd
 import requests
 
 # Langfuse OpenAI 延迟导入，避免在模块加载时触发 Langfuse 客户端初始化
@@ -28,12 +32,19 @@ from rank_bm25 import BM25Okapi
 from sqlalchemy.inspection import inspect
 from sqlalchemy.sql.expression import text
 
+from agent.text2sql.database.retrieval_index import (
+    TableRetrievalIndex,
+    build_document,
+    get_retrieval_index,
+    tokenize_text,
+)
+from agent.text2sql.database.schema_cache import SchemaCache, project_schema
+from agent.text2sql.database.schema_introspector import fetch_schema_bulk
 from agent.text2sql.state.agent_state import AgentState, ExecutionResult
 from model.db_connection_pool import get_db_pool
-from model.db_models import TAiModel, TDsPermission, TDsRules
 from model.datasource_models import DatasourceTable, DatasourceField
-from agent.text2sql.permission.permission_retriever import get_user_permission_filters
-from sqlalchemy import select
+from agent.text2sql.permission.permission_retriever import get_user_column_permissions, get_user_permission_filters
+from services.model_client_registry import ModelClientRegistry
 
 # 日志配置
 logger = logging.getLogger(__name__)
@@ -46,60 +57,11 @@ db_pool = get_db_pool()
 TABLE_RETURN_COUNT = int(os.getenv("TABLE_RETURN_COUNT", "6"))
 
 # 缓存配置
-_table_info_cache: Dict[Tuple[int, Optional[int]], Tuple[Dict[str, Dict], float]] = {}
-_cache_lock = Lock()
-CACHE_TTL = int(os.getenv("TABLE_INFO_CACHE_TTL", "300"))  # 缓存有效期（秒），默认5分钟
-
-
-# 嵌入模型配置
-def get_embedding_model_config():
-    """
-    获取嵌入模型配置
-    只查找 Embedding 类型的模型（model_type=2），不回退到 LLM
-    如果没有配置，返回 None（将使用离线模型）
-    """
-    with db_pool.get_session() as session:
-        # model_type: 2 -> Embedding
-        model = session.query(TAiModel).filter(TAiModel.model_type == 2, TAiModel.default_model == True).first()
-        
-        if not model:
-            # 尝试查找任何 embedding 模型
-            model = session.query(TAiModel).filter(TAiModel.model_type == 2).first()
-        
-        if not model:
-            # 没有找到在线模型，返回 None（将使用离线模型）
-            return None
-        
-        # 处理 base_url，确保包含协议前缀
-        base_url = (model.api_domain or "").strip()
-        if not base_url:
-            logger.warning("表结构检索使用的 embedding 模型 API Domain 为空，将使用离线模型")
-            return None
-        
-        if not base_url.startswith(("http://", "https://")):
-            # 本地地址默认 http，其它默认 https
-            if base_url.startswith(("localhost", "127.0.0.1", "0.0.0.0")):
-                base_url = f"http://{base_url}"
-            else:
-                base_url = f"https://{base_url}"
-        
-        return {"name": model.base_model, "api_key": model.api_key, "base_url": base_url}
-
-
-# 重排模型配置
-def get_rerank_model_config():
-    with db_pool.get_session() as session:
-        # model_type: 3 -> Rerank
-        model = session.query(TAiModel).filter(TAiModel.model_type == 3, TAiModel.default_model == True).first()
-
-        if not model:
-            # Fallback
-            model = session.query(TAiModel).filter(TAiModel.model_type == 3).first()
-
-        if not model:
-            return None
+VECTOR_INDEX_CACHE_SIZE = int(os.getenv("VECTOR_INDEX_CACHE_SIZE", "8"))  # 每个数据源缓存的向量索引数量
 
-        return {"name": model.base_model, "api_key": model.api_key, "base_url": model.api_domain}
+# DatabaseService 实例缓存（按数据源复用，避免每次请求解密配置、查询模型配置、创建客户端）
+_service_cache: Dict[Optional[int], "DatabaseService"] = {}
+_service_cache_lock = Lock()
 
 
 # 全局变量占位，实际使用时动态获取或在 init 中初始化
@@ -131,12 +93,8 @@ class DatabaseService:
                         db_enum = DB.get_db(ds.type, default_if_none=True)
                         if db_enum.connect_type == ConnectType.sqlalchemy:
                             config = DatasourceConfigUtil.decrypt_config(ds.configuration)
-                            uri = DatasourceConnectionUtil.build_connection_uri(ds.type, config)
-                            # SQL Server 2022 需要禁用加密以兼容 pymssql
-                            if ds.type == "sqlServer":
-                                self._engine = create_engine(uri, connect_args={"encryption": "off"})
-                            else:
-                                self._engine = create_engine(uri)
+                            # 复用进程级连接池，避免每次请求新建 engine
+                            self._engine = DatasourceEngineRegistry.get_engine(ds.type, config, datasource_id)
                             logger.info(f"Initialized DatabaseService with datasource_id: {datasource_id}")
                         else:
                             # 对于使用原生驱动的数据库（如 Doris），不创建 SQLAlchemy engine
@@ -147,57 +105,17 @@ class DatabaseService:
         if not self._engine:
             self._engine = db_pool.get_engine()
 
-        self._faiss_index: Optional[faiss.Index] = None
-        self._table_names: List[str] = []
-        self._corpus: List[str] = []
-        self._tokenized_corpus: List[List[str]] = []
-        self._index_initialized: bool = False
-        self.USE_RERANKER: bool = True  # 是否启用重排序器
-
-        # Initialize clients lazily or now
-        emb_config = get_embedding_model_config()
-        if emb_config:
-            # 使用在线 embedding 模型
-            try:
-                # 延迟导入，避免在模块加载时触发 Langfuse 客户端初始化
-                from langfuse.openai import OpenAI
-                self.embedding_model_name = emb_config["name"]
-                self.embedding_client = OpenAI(api_key=emb_config["api_key"] or "empty", base_url=emb_config["base_url"])
-                self.use_local_embedding = False
-                logger.info(f"✅ 使用在线 embedding 模型: {self.embedding_model_name}")
-            except Exception as e:
-                logger.error(f"初始化在线嵌入模型失败: {e}，将使用离线模型")
-                self.embedding_client = None
-                self.use_local_embedding = True
-        else:
-            # 没有配置在线模型，使用离线模型
-            logger.info("未配置在线 embedding 模型，将使用离线 CPU 模型")
-            self.embedding_client = None
-            self.embedding_model_name = None
-            self.use_local_embedding = True
-
-        try:
-            rerank_config = get_rerank_model_config()
-            if rerank_config:
-                self.rerank_model_name = rerank_config["name"]
-                self.rerank_api_key = rerank_config["api_key"]
-                self.rerank_base_url = rerank_config["base_url"]
-                self.USE_RERANKER = True
-            else:
-                self.USE_RERANKER = False
-                logger.warning("未配置重排模型，重排功能将被禁用")
-        except Exception as e:
-            logger.error(f"初始化重排模型失败: {e}")
-            self.USE_RERANKER = False
+        # 向量索引按表集合缓存（不同用户的权限过滤结果可能不同），实例会被多个请求共享
+        self._vector_indexes: "OrderedDict[Tuple[str, ...], Optional[faiss.Index]]" = OrderedDict()
+        self._index_lock = Lock()
+        self.USE_RERANKER: bool = True  # 是否启用重排序器（需同时配置了重排模型）
 
     @staticmethod
     def _tokenize_text(text_str: str) -> List[str]:
         """
         对中文/英文文本进行分词，过滤标点符号。
         """
-        filtered_text = re.sub(r"[^\u4e00-\u9fa5a-zA-Z0-9]", " ", text_str)
-        tokens = jieba.lcut(filtered_text, cut_all=False)
-        return [token.strip() for token in tokens if token.strip()]
+        return tokenize_text(text_str)
 
     def _get_table_comment(self, table_name: str) -> str:
         """
@@ -336,198 +254,166 @@ class DatabaseService:
         """
         构建用于检索的文档文本（表名 + 注释 + 字段名 + 字段注释）。
         """
-        parts = [table_name]
-        if table_info.get("table_comment"):
-            parts.append(table_info["table_comment"])
-        for col_name, col_info in table_info.get("columns", {}).items():
-            parts.append(col_name)
-            if col_info.get("comment"):
-                parts.append(col_info["comment"])
-        return " ".join(parts)
+        columns = [(col_name, col_info.get("comment")) for col_name, col_info in table_info.get("columns", {}).items()]
+        return build_document(table_name, table_info.get("table_comment"), columns)
 
     def _fetch_all_table_info(self, user_id: Optional[int] = None, use_cache: bool = True) -> Dict[str, Dict]:
         """
         获取数据库中所有表的结构信息（带权限过滤和缓存）。
+        数据源的原始表结构只加载一次并进入两级缓存（进程内 + Redis），用户列权限在读取时作为投影应用。
 
         Args:
             user_id: 用户ID，用于权限过滤（管理员不应用权限过滤）
             use_cache: 是否使用缓存
 
         Returns:
-            表信息字典
+            表信息字典（每次调用返回新的字典，可自由修改）
         """
         from common.permission_util import is_admin
 
-        # 检查缓存
-        cache_key = (self._datasource_id or 0, user_id)
-        if use_cache:
-            with _cache_lock:
-                if cache_key in _table_info_cache:
-                    cached_data, cached_time = _table_info_cache[cache_key]
-                    if time.time() - cached_time < CACHE_TTL:
-                        logger.debug(f"✅ 使用缓存的表结构信息 (datasource_id={self._datasource_id}, user_id={user_id})")
-                        return cached_data
-
-        start_time = time.time()
-
         # 检查数据源是否使用原生驱动（非 SQLAlchemy）
         use_native_driver = False
         if self._datasource_type and self._datasource_id:
             db_enum = DB.get_db(self._datasource_type, default_if_none=True)
             use_native_driver = db_enum.connect_type == ConnectType.py_driver
 
-        if use_native_driver and self._datasource_id:
-            # 对于原生驱动的数据库（如 Doris、StarRocks 等），从 t_datasource_table 获取表结构
-            return self._fetch_table_info_from_metadata(user_id, use_cache, start_time)
+        cache_key = self._datasource_id or 0
+        schema = SchemaCache.get(cache_key) if use_cache else None
+        if schema is not None:
+            logger.debug(f"✅ 使用缓存的表结构信息 (datasource_id={self._datasource_id}, user_id={user_id})")
+        else:
+            if use_native_driver:
+                # 对于原生驱动的数据库（如 Doris、StarRocks 等），从 t_datasource_table 获取表结构
+                schema = self._fetch_table_info_from_metadata()
+            else:
+                schema = self._fetch_schema_from_engine()
+            if schema is None:
+                return {}
+            if use_cache:
+                SchemaCache.set(cache_key, schema)
 
-        inspector = inspect(self._engine)
-        table_names = inspector.get_table_names()
-        logger.info(f"🔍 开始加载 {len(table_names)} 张表的 schema 信息...")
+        # 原生驱动模式的表结构来自已勾选的元数据，不再应用列权限
+        if use_native_driver:
+            return project_schema(schema)
 
-        # 获取列权限配置（集成完整的权限系统）
+        # 列权限来自已编译的权限快照，未配置列权限的表只返回已勾选的字段
         column_permissions = {}
         if user_id and not is_admin(user_id) and self._datasource_id:
-            try:
-                with db_pool.get_session() as session:
-                    # 获取该数据源下所有表
-                    tables = session.query(DatasourceTable).filter(
-                        DatasourceTable.ds_id == self._datasource_id,
-                        DatasourceTable.table_name.in_(table_names)
-                    ).all()
-                    
-                    # 获取所有规则
-                    rules_stmt = select(TDsRules).where(TDsRules.enable == True)
-                    rules = session.execute(rules_stmt).scalars().all()
-                    
-                    for table in tables:
-                        allowed_fields = set()
-                        
-                        # 如果有规则，查询列权限配置
-                        if rules:
-                            permissions_stmt = select(TDsPermission).where(
-                                TDsPermission.table_id == table.id,
-                                TDsPermission.type == 'column',
-                                TDsPermission.enable == True
-                            )
-                            column_perms = session.execute(permissions_stmt).scalars().all()
-                            
-                            if column_perms:
-                                # 检查权限是否与用户匹配
-                                matching_permissions = []
-                                for permission in column_perms:
-                                    for rule in rules:
-                                        perm_ids = []
-                                        if rule.permission_list:
-                                            try:
-                                                perm_ids = json.loads(rule.permission_list)
-                                            except:
-                                                pass
-                                        
-                                        user_ids = []
-                                        if rule.user_list:
-                                            try:
-                                                user_ids = json.loads(rule.user_list)
-                                            except:
-                                                pass
-                                        
-                                        if perm_ids and user_ids:
-                                            if permission.id in perm_ids and (
-                                                user_id in user_ids or str(user_id) in user_ids
-                                            ):
-                                                matching_permissions.append(permission)
-                                                break
-                                
-                                # 解析列权限配置
-                                for perm in matching_permissions:
-                                    if perm.permissions:
-                                        try:
-                                            perm_config = json.loads(perm.permissions)
-                                            if isinstance(perm_config, list):
-                                                for field_perm in perm_config:
-                                                    if field_perm.get("enable", False):
-                                                        field_name = field_perm.get("field_name")
-                                                        if field_name:
-                                                            allowed_fields.add(field_name)
-                                        except Exception as e:
-                                            logger.debug(f"解析列权限配置失败: {e}, permission_id={perm.id}")
-                        
-                        # 如果没有匹配的权限配置，使用 checked 字段作为基础
-                        if not allowed_fields:
-                            fields = session.query(DatasourceField).filter(
-                                DatasourceField.ds_id == self._datasource_id,
-                                DatasourceField.table_id == table.id,
-                                DatasourceField.checked == True
-                            ).all()
-                            allowed_fields = {field.field_name for field in fields}
-                        
-                        if allowed_fields:
-                            column_permissions[table.table_name] = allowed_fields
-                            
-            except Exception as e:
-                logger.warning(f"⚠️ 获取列权限失败: {e}", exc_info=True)
+            column_permissions = self._fetch_column_permissions(user_id, schema)
 
-        table_info = {}
-        for table_name in table_names:
-            try:
-                columns = {}
-                for col in inspector.get_columns(table_name):
-                    # 权限过滤：如果配置了列权限，只返回有权限的字段
-                    if table_name in column_permissions:
-                        if col["name"] not in column_permissions[table_name]:
-                            continue
-                    
-                    columns[col["name"]] = {
-                        "type": str(col["type"]),
-                        "comment": str(col["comment"] or ""),
-                    }
+        return project_schema(schema, column_permissions)
 
-                # 如果过滤后没有字段，跳过该表
-                if not columns:
-                    logger.debug(f"⚠️ 表 {table_name} 无可用字段（权限过滤后），跳过")
-                    continue
+    def _has_column_permissions(self, user_id: Optional[int]) -> bool:
+        """用户在当前数据源上是否配置了列权限（管理员不应用权限过滤）"""
+        from common.permission_util import is_admin
 
-                foreign_keys = [
-                    f"{fk['constrained_columns'][0]} -> {fk['referred_table']}.{fk['referred_columns'][0]}"
-                    for fk in inspector.get_foreign_keys(table_name)
-                ]
+        if not user_id or not self._datasource_id or is_admin(user_id):
+            return False
+        return bool(get_user_column_permissions(self._datasource_id, user_id))
+
+    def _fetch_column_permissions(self, user_id: int, schema: Dict[str, Dict]) -> Dict[str, set]:
+        """
+        获取用户在当前数据源上的列权限。
+
+        Args:
+            user_id: 用户ID
+            schema: 数据源的原始表结构
+
+        Returns:
+            表名 -> 允许访问的字段集合：配置了列权限的表使用权限快照中的字段，
+            其它表使用已勾选的字段（未同步到元数据的表不限制）
+        """
+        snapshot_permissions = get_user_column_permissions(self._datasource_id, user_id, list(schema.keys()))
+        column_permissions = {}
+        for table_name, table_schema in schema.items():
+            allowed_fields = snapshot_permissions.get(table_name) or table_schema.get("checked_fields")
+            if allowed_fields:
+                column_permissions[table_name] = set(allowed_fields)
+        return column_permissions
+
+    def _fetch_checked_fields(self) -> Dict[str, List[str]]:
+        """
+        一次查询读取已同步到元数据的表中已勾选的字段
+
+        Returns:
+            表名 -> 已勾选的字段列表（没有勾选字段的表不出现）
+        """
+        checked_fields: Dict[str, List[str]] = {}
+        if not self._datasource_id:
+            return checked_fields
+        try:
+            with db_pool.get_session() as session:
+                rows = (
+                    session.query(DatasourceTable.table_name, DatasourceField.field_name)
+                    .join(DatasourceField, DatasourceField.table_id == DatasourceTable.id)
+                    .filter(
+                        DatasourceTable.ds_id == self._datasource_id,
+                        DatasourceField.checked == True,
+                    )
+                    .all()
+                )
+            for table_name, field_name in rows:
+                checked_fields.setdefault(table_name, []).append(field_name)
+        except Exception as e:
+            logger.warning(f"⚠️ 获取已勾选字段失败: {e}", exc_info=True)
+        return checked_fields
 
-                table_comment = self._get_table_comment(table_name)
+    def _fetch_schema_from_engine(self) -> Dict[str, Dict]:
+        """
+        通过 SQLAlchemy 读取数据源全部表的原始结构（不应用权限），格式见 schema_cache 模块说明。
+        """
+        start_time = time.time()
+        inspector = inspect(self._engine)
+        table_names = inspector.get_table_names()
+        logger.info(f"🔍 开始加载 {len(table_names)} 张表的 schema 信息...")
+
+        # 优先按方言批量读取字段/注释/外键，不支持的方言回退到 Inspector 逐表读取
+        bulk_schema = fetch_schema_bulk(self._engine, table_names)
+        checked_fields = self._fetch_checked_fields()
 
-                table_info[table_name] = {
+        schema = {}
+        for table_name in table_names:
+            try:
+                if bulk_schema is not None:
+                    table_schema = bulk_schema[table_name]
+                    columns = [list(col) for col in table_schema["columns"]]
+                    foreign_keys = list(table_schema["foreign_keys"])
+                    table_comment = table_schema["table_comment"]
+                else:
+                    columns = [
+                        [col["name"], str(col["type"]), str(col["comment"] or "")]
+                        for col in inspector.get_columns(table_name)
+                    ]
+                    foreign_keys = [
+                        f"{fk['constrained_columns'][0]} -> {fk['referred_table']}.{fk['referred_columns'][0]}"
+                        for fk in inspector.get_foreign_keys(table_name)
+                    ]
+                    table_comment = self._get_table_comment(table_name)
+
+                schema[table_name] = {
                     "columns": columns,
                     "foreign_keys": foreign_keys,
                     "table_comment": table_comment,
                 }
+                if table_name in checked_fields:
+                    schema[table_name]["checked_fields"] = checked_fields[table_name]
             except Exception as e:
                 logger.error(f"❌ 读取表 {table_name} 结构失败: {e}")
 
         elapsed = time.time() - start_time
-        logger.info(f"✅ 成功加载 {len(table_info)} 张表，耗时 {elapsed:.2f}s")
-        
-        # 更新缓存
-        if use_cache:
-            with _cache_lock:
-                _table_info_cache[cache_key] = (table_info, time.time())
-        
-        return table_info
+        logger.info(f"✅ 成功加载 {len(schema)} 张表，耗时 {elapsed:.2f}s")
+        return schema
 
-    def _fetch_table_info_from_metadata(self, user_id: Optional[int], use_cache: bool, start_time: float) -> Dict[str, Dict]:
+    def _fetch_table_info_from_metadata(self) -> Optional[Dict[str, Dict]]:
         """
         从 t_datasource_table 和 t_datasource_field 获取表结构信息。
         用于原生驱动的数据库（如 Doris、StarRocks 等），这些数据库不能通过 SQLAlchemy inspect 获取表结构。
 
-        Args:
-            user_id: 用户ID，用于权限过滤
-            use_cache: 是否使用缓存
-            start_time: 开始时间，用于计算耗时
-
         Returns:
-            表信息字典
+            原始表结构（格式见 schema_cache 模块说明），读取失败时返回 None
         """
-        from common.permission_util import is_admin
-
-        cache_key = (self._datasource_id or 0, user_id)
-        table_info = {}
+        start_time = time.time()
+        schema = {}
 
         try:
             with db_pool.get_session() as session:
@@ -561,37 +447,27 @@ class DatabaseService:
                         logger.debug(f"⚠️ 表 {table.table_name} 无可用字段，跳过")
                         continue
 
-                    columns = {}
-                    for field in table_fields:
-                        columns[field.field_name] = {
-                            "type": field.field_type or "",
-                            "comment": field.custom_comment or field.field_comment or "",
-                        }
-
-                    table_info[table.table_name] = {
-                        "columns": columns,
+                    schema[table.table_name] = {
+                        "columns": [
+                            [field.field_name, field.field_type or "", field.custom_comment or field.field_comment or ""]
+                            for field in table_fields
+                        ],
                         "foreign_keys": [],  # 原生驱动暂不支持外键信息
                         "table_comment": table.custom_comment or table.table_comment or "",
                     }
 
         except Exception as e:
             logger.error(f"❌ 从元数据获取表结构失败: {e}", exc_info=True)
-            return {}
+            return None
 
         elapsed = time.time() - start_time
-        logger.info(f"✅ 成功加载 {len(table_info)} 张表（原生驱动模式），耗时 {elapsed:.2f}s")
-
-        # 更新缓存
-        if use_cache:
-            with _cache_lock:
-                _table_info_cache[cache_key] = (table_info, time.time())
-
-        return table_info
+        logger.info(f"✅ 成功加载 {len(schema)} 张表（原生驱动模式），耗时 {elapsed:.2f}s")
+        return schema
 
     def _get_precomputed_embeddings(self, table_info: Dict[str, Dict]) -> Tuple[Optional[np.ndarray], List[str], List[str]]:
         """
         尝试从数据库获取预计算的 embedding。
-        仅从 t_datasource_table.embedding 字段读取，不做任何实时计算。
+        仅从 t_datasource_table.embedding_vector 字段读取（float32 二进制），整批解码为矩阵，不做任何实时计算。
 
         Returns:
             (预计算的 embedding 数组, 有预计算 embedding 的表名列表, 需要计算的表名列表)
@@ -601,47 +477,30 @@ class DatabaseService:
         
         try:
             with db_pool.get_session() as session:
-                # 查询数据源下的所有表（不再按表名过滤，避免大小写不一致导致漏查）
-                tables = (
-                    session.query(DatasourceTable)
+                # 查询数据源下的所有表（不再按表名过滤，避免大小写不一致导致漏查），只取表名和向量列
+                rows = (
+                    session.query(DatasourceTable.table_name, DatasourceTable.embedding_vector)
                     .filter(DatasourceTable.ds_id == self._datasource_id)
                     .all()
                 )
-                
-                # 构建表名到表的映射（不区分大小写，兼容 Oracle 等会返回大写表名的数据库）
-                table_map = {str(table.table_name).upper(): table for table in tables}
-                
-                # 收集有预计算 embedding 的表
-                precomputed_embeddings = []
-                precomputed_table_names = []
-                missing_table_names = []
-                
-                for table_name, info in table_info.items():
-                    # 统一按大写匹配，避免 T_ALARM_INFO / t_alarm_info 不一致导致无法命中
-                    table = table_map.get(str(table_name).upper())
-                    # 检查是否有 embedding 字段（通过 hasattr 检查，避免字段不存在时报错）
-                    if table and hasattr(table, 'embedding') and table.embedding:
-                        try:
-                            embedding_vec = json.loads(table.embedding)
-                            if isinstance(embedding_vec, list) and len(embedding_vec) > 0:
-                                precomputed_embeddings.append(embedding_vec)
-                                precomputed_table_names.append(table_name)
-                            else:
-                                missing_table_names.append(table_name)
-                        except Exception as e:
-                            logger.debug(f"解析表 {table_name} 的 embedding 失败: {e}")
-                            missing_table_names.append(table_name)
-                    else:
-                        missing_table_names.append(table_name)
-                
-                if precomputed_embeddings:
-                    embeddings_array = np.array(precomputed_embeddings).astype("float32")
-                    faiss.normalize_L2(embeddings_array)
-                    logger.info(f"✅ 从数据库加载了 {len(precomputed_embeddings)} 个预计算的 embedding")
-                    return embeddings_array, precomputed_table_names, missing_table_names
-                else:
-                    return None, [], missing_table_names
-                    
+
+            # 构建表名到向量的映射（不区分大小写，兼容 Oracle 等会返回大写表名的数据库）
+            vector_map = {str(name).upper(): raw for name, raw in rows}
+
+            # 统一按大写匹配，避免 T_ALARM_INFO / t_alarm_info 不一致导致无法命中
+            table_names = list(table_info.keys())
+            embeddings_array, valid = decode_vector_matrix(vector_map.get(str(name).upper()) for name in table_names)
+            precomputed_table_names = [name for name, ok in zip(table_names, valid) if ok]
+            missing_table_names = [name for name, ok in zip(table_names, valid) if not ok]
+
+            if embeddings_array is None:
+                return None, [], missing_table_names
+
+            embeddings_array = np.ascontiguousarray(embeddings_array[np.asarray(valid, dtype=bool)])
+            faiss.normalize_L2(embeddings_array)
+            logger.info(f"✅ 从数据库加载了 {len(precomputed_table_names)} 个预计算的 embedding")
+            return embeddings_array, precomputed_table_names, missing_table_names
+
         except Exception as e:
             logger.warning(f"⚠️ 获取预计算 embedding 失败: {e}")
             return None, [], list(table_info.keys())
@@ -654,32 +513,19 @@ class DatabaseService:
         注意：该方法不在在线检索路径中调用，仅用于离线预计算工具
         或强制重建索引等管理场景中使用。
         """
-        if self.use_local_embedding or not self.embedding_client:
-            # 使用离线模型
-            from common.local_embedding import generate_embedding_local_sync
+        embedding_client = ModelClientRegistry.get_embedding_client()
+        if not embedding_client:
+            # 使用离线模型（按微批次推理）
+            from common.local_embedding import generate_embeddings_local_batch
             logger.info("🖥️ 使用离线 CPU 模型生成 embedding...")
             start_time = time.time()
-            embeddings = []
-            embedding_dim = None  # 动态获取维度
-            
-            for doc in texts:
-                try:
-                    embedding = generate_embedding_local_sync(doc)
-                    if embedding:
-                        if embedding_dim is None:
-                            embedding_dim = len(embedding)
-                        embeddings.append(embedding)
-                    else:
-                        logger.warning(f"⚠️ 离线模型生成 embedding 失败 ({doc[:30]}...)，使用零向量")
-                        if embedding_dim is None:
-                            embedding_dim = 768  # 默认维度
-                        embeddings.append([0.0] * embedding_dim)
-                except Exception as e:
-                    logger.error(f"❌ 离线模型嵌入生成失败 ({doc[:30]}...): {e}")
-                    if embedding_dim is None:
-                        embedding_dim = 768  # 默认维度
-                    embeddings.append([0.0] * embedding_dim)
-            
+            results = generate_embeddings_local_batch(texts)
+            embedding_dim = next((len(vec) for vec in results if vec), 768)  # 动态获取维度，全部失败时使用默认维度
+            failed_count = sum(1 for vec in results if not vec)
+            if failed_count:
+                logger.warning(f"⚠️ 离线模型有 {failed_count} 条文本生成 embedding 失败，使用零向量")
+            embeddings = [vec if vec else [0.0] * embedding_dim for vec in results]
+
             if not embeddings:
                 logger.error("❌ 所有 embedding 生成都失败")
                 return np.array([])
@@ -689,38 +535,66 @@ class DatabaseService:
             logger.info(f"✅ 离线模型嵌入生成完成，耗时 {time.time() - start_time:.2f}s，维度: {embedding_dim}")
             return embeddings
         
-        # 使用在线模型
-        logger.info(f"🌐 调用在线嵌入模型 {self.embedding_model_name}...")
+        # 使用在线模型（分批请求）
+        logger.info(f"🌐 调用在线嵌入模型 {embedding_client.model_name}...")
         start_time = time.time()
-        embeddings = []
-        for doc in texts:
-            try:
-                response = self.embedding_client.embeddings.create(model=self.embedding_model_name, input=doc)
-                embeddings.append(response.data[0].embedding)
-            except Exception as e:
-                logger.error(f"❌ 在线模型嵌入生成失败 ({doc[:30]}...): {e}")
-                embeddings.append(np.zeros(1024))  # 占位符
+        try:
+            results = embedding_client.embed_documents(texts)
+        except Exception as e:
+            logger.error(f"❌ 在线模型嵌入生成失败: {e}")
+            results = [None] * len(texts)
+        embedding_dim = next((len(vec) for vec in results if vec), 1024)
+        embeddings = [vec if vec else np.zeros(embedding_dim) for vec in results]  # 失败的文本使用零向量占位
 
         embeddings = np.array(embeddings).astype("float32")
         faiss.normalize_L2(embeddings)
         logger.info(f"✅ 在线模型嵌入生成完成，耗时 {time.time() - start_time:.2f}s")
         return embeddings
 
-    def _initialize_vector_index(self, table_info: Dict[str, Dict]):
+    def _initialize_vector_index(
+        self, table_info: Dict[str, Dict], retrieval_index: Optional[TableRetrievalIndex] = None
+    ) -> Optional[faiss.Index]:
         """
-        初始化 FAISS 向量索引：从数据库读取预计算的 embedding 并构建内存索引。
+        初始化 FAISS 向量索引：优先使用预构建检索索引中的表向量，否则从数据库读取预计算的 embedding。
         仅使用预计算的 embedding，不在检索时做实时计算。
+        索引按表集合（及检索索引版本）缓存，返回的索引顺序与 table_info 的表顺序一致。
+        """
+        index_key = (retrieval_index.version if retrieval_index else None,) + tuple(table_info.keys())
+        with self._index_lock:
+            if index_key in self._vector_indexes:
+                self._vector_indexes.move_to_end(index_key)
+                return self._vector_indexes[index_key]
+
+        faiss_index = self._build_vector_index(table_info, retrieval_index)
+
+        with self._index_lock:
+            self._vector_indexes[index_key] = faiss_index
+            while len(self._vector_indexes) > VECTOR_INDEX_CACHE_SIZE:
+                self._vector_indexes.popitem(last=False)
+        return faiss_index
+
+    def _build_vector_index(
+        self, table_info: Dict[str, Dict], retrieval_index: Optional[TableRetrievalIndex] = None
+    ) -> Optional[faiss.Index]:
+        """
+        构建 FAISS 内存索引，无可用 embedding 时返回 None。
         """
-        if self._index_initialized:
-            return
+        start_time = time.time()
+
+        # 预构建检索索引中已有归一化后的表向量，直接装载
+        if retrieval_index is not None:
+            embeddings = retrieval_index.vector_matrix(list(table_info.keys()))
+            if embeddings is not None and embeddings.size > 0:
+                faiss_index = faiss.IndexFlatIP(embeddings.shape[1])  # 内积 = 余弦相似度
+                faiss_index.add(np.ascontiguousarray(embeddings))
+                logger.info(
+                    f"🎉 向量索引装载完成（预构建检索索引），共 {len(table_info)} 张表，"
+                    f"耗时 {time.time() - start_time:.2f}s"
+                )
+                return faiss_index
 
         # 构建新索引
         logger.info("🏗️ 开始构建向量索引（从数据库读取 embedding）...")
-        start_time = time.time()
-
-        # 记录所有表名和语料（用于 BM25 等）
-        self._table_names = list(table_info.keys())
-        self._corpus = [self._build_document(name, info) for name, info in table_info.items()]
 
         # 从数据库获取预计算的 embedding（不会做任何实时计算）
         precomputed_embeddings, precomputed_table_names, missing_table_names = self._get_precomputed_embeddings(
@@ -730,9 +604,7 @@ class DatabaseService:
         # 如果没有任何预计算 embedding，则禁用向量索引（仅使用 BM25）
         if precomputed_embeddings is None or len(precomputed_table_names) == 0:
             logger.warning("⚠️ 未找到任何预计算的表结构 embedding，向量检索将被禁用，仅使用 BM25")
-            self._faiss_index = None
-            self._index_initialized = True
-            return
+            return None
 
         # 如果存在缺失的 embedding，为避免索引和表顺序不一致，这里直接禁用向量检索
         if len(missing_table_names) > 0:
@@ -740,38 +612,37 @@ class DatabaseService:
                 f"⚠️ 共有 {len(missing_table_names)} 张表缺少预计算 embedding，"
                 "为保证索引与表顺序一致，本次禁用向量检索，仅使用 BM25"
             )
-            self._faiss_index = None
-            self._index_initialized = True
-            return
+            return None
 
-        # 此时说明所有表都存在预计算 embedding，顺序与 self._table_names 一致
+        # 此时说明所有表都存在预计算 embedding，顺序与 table_info 的表顺序一致
         embeddings = precomputed_embeddings
 
         if embeddings.size == 0:
             logger.error("❌ 无法生成嵌入，索引构建失败")
-            return
+            return None
 
         # 初始化 FAISS 索引（仅在内存中）
         dimension = embeddings.shape[1]
-        self._faiss_index = faiss.IndexFlatIP(dimension)  # 内积 = 余弦相似度
-        self._faiss_index.add(embeddings)
+        faiss_index = faiss.IndexFlatIP(dimension)  # 内积 = 余弦相似度
+        faiss_index.add(embeddings)
 
         elapsed = time.time() - start_time
-        logger.info(f"🎉 向量索引构建完成，共 {len(self._table_names)} 张表，耗时 {elapsed:.2f}s")
-        self._index_initialized = True
+        logger.info(f"🎉 向量索引构建完成，共 {len(table_info)} 张表，耗时 {elapsed:.2f}s")
+        return faiss_index
 
-    def _retrieve_by_vector(self, query: str, top_k: int = 10) -> List[int]:
+    def _retrieve_by_vector(self, query: str, faiss_index: Optional[faiss.Index], top_k: int = 10) -> List[int]:
         """
         使用向量相似度检索最相关的表。
         优先使用在线模型，如果没有配置则使用离线模型。
         """
-        if not self._faiss_index:
+        if not faiss_index:
             logger.error("❌ 向量索引未初始化")
             return []
 
         try:
             # 生成查询向量
-            if self.use_local_embedding or not self.embedding_client:
+            embedding_client = ModelClientRegistry.get_embedding_client()
+            if not embedding_client:
                 # 使用离线模型
                 from common.local_embedding import generate_embedding_local_sync
                 embedding = generate_embedding_local_sync(query)
@@ -780,13 +651,16 @@ class DatabaseService:
                     return []
                 query_vec = np.array([embedding]).astype("float32")
             else:
-                # 使用在线模型
-                response = self.embedding_client.embeddings.create(model=self.embedding_model_name, input=query)
-                query_vec = np.array([response.data[0].embedding]).astype("float32")
+                # 使用在线模型（与术语、训练示例检索共用查询向量缓存）
+                embedding = get_or_compute_embedding(embedding_client.model_key, query, embedding_client.embed_query)
+                if not embedding:
+                    logger.warning("⚠️ 在线模型生成 embedding 失败，跳过向量检索")
+                    return []
+                query_vec = np.array([embedding]).astype("float32")
             
             # 检查维度是否匹配
             query_dim = query_vec.shape[1]
-            index_dim = self._faiss_index.d
+            index_dim = faiss_index.d
             if query_dim != index_dim:
                 logger.error(
                     f"❌ 向量维度不匹配：查询向量维度={query_dim}，索引维度={index_dim}。"
@@ -796,25 +670,37 @@ class DatabaseService:
                 return []
             
             faiss.normalize_L2(query_vec)
-            _, indices = self._faiss_index.search(query_vec, top_k)
+            _, indices = faiss_index.search(query_vec, top_k)
             return indices[0].tolist()
         except Exception as e:
             logger.error(f"❌ 向量检索失败: {e}", exc_info=True)
             return []
 
-    def _retrieve_by_bm25(self, table_info: Dict[str, Dict], user_query: str) -> List[int]:
+    def _retrieve_by_bm25(
+        self,
+        table_info: Dict[str, Dict],
+        user_query: str,
+        retrieval_index: Optional[TableRetrievalIndex] = None,
+    ) -> List[int]:
         """
         使用 BM25 算法进行关键词匹配检索。
+        优先使用预构建检索索引（已分词），索引未覆盖全部表时回退到实时分词。
         """
         if not user_query or not table_info:
             return list(range(len(table_info)))
 
+        if retrieval_index is not None:
+            ranked = retrieval_index.bm25_rank(self._tokenize_text(user_query), list(table_info.keys()))
+            if ranked is not None:
+                logger.info("🔄 执行 BM25 检索（预构建索引）...")
+                return ranked
+
         logger.info("🔄 执行 BM25 检索...")
-        self._corpus = [self._build_document(name, info) for name, info in table_info.items()]
-        self._tokenized_corpus = [self._tokenize_text(doc) for doc in self._corpus]
+        corpus = [self._build_document(name, info) for name, info in table_info.items()]
+        tokenized_corpus = [self._tokenize_text(doc) for doc in corpus]
         query_tokens = self._tokenize_text(user_query)
 
-        bm25 = BM25Okapi(self._tokenized_corpus)
+        bm25 = BM25Okapi(tokenized_corpus)
         doc_scores = bm25.get_scores(query_tokens)
 
         # 增强：若查询词出现在表注释中，则提升分数
@@ -847,97 +733,27 @@ class DatabaseService:
 
     def _rerank_with_dashscope(self, query: str, candidate_tables: Dict[str, Dict]) -> List[Tuple[str, float]]:
         """
-        使用 DashScope 重排 API 对候选表进行重排序。
+        使用重排模型（DashScope 或通用 rerank API）对候选表进行重排序。
+        客户端由 ModelClientRegistry 统一管理（连接复用、结果缓存）。
         """
-        if not self.USE_RERANKER:
-            logger.debug("⏭️ Reranker 已禁用或配置不完整，跳过重排序")
+        rerank_client = ModelClientRegistry.get_rerank_client() if self.USE_RERANKER else None
+        if not rerank_client:
+            logger.debug("⏭️ Reranker 已禁用或未配置重排模型，跳过重排序")
             return [(name, 1.0) for name in candidate_tables.keys()]
 
         try:
-            documents = []
-            name_to_text = {}
-            for table_name, info in candidate_tables.items():
-                doc_text = self._build_document(table_name, info)
-                documents.append(doc_text)
-                name_to_text[table_name] = doc_text
-
+            table_names = list(candidate_tables.keys())
+            documents = [self._build_document(name, candidate_tables[name]) for name in table_names]
             if not documents:
                 return []
 
-            logger.info(f"🔁 调用重排模型 {self.rerank_model_name} 进行重排序...")
+            logger.info(f"🔁 调用重排模型 {rerank_client.model_name} 进行重排序...")
+            ranked = rerank_client.rerank(query, documents)
+            if ranked is None:
+                return [(name, 1.0) for name in table_names]
 
-            # 根据API类型选择不同的请求结构
-            if "aliyuncs" in self.rerank_base_url or "Qwen" in self.rerank_model_name:
-                # 阿里云 DashScope 格式
-                payload = {
-                    "model": self.rerank_model_name,
-                    "input": {"query": query, "documents": documents},
-                    "parameters": {"top_n": len(documents), "return_documents": False},
-                }
-            else:
-                # 其他格式（如本地模型或通用rerank API）
-                payload = {"query": query, "documents": documents}
-
-            # 设置请求头
-            headers = {"Authorization": f"Bearer {self.rerank_api_key}", "Content-Type": "application/json"}
-
-            # 调用重排 API
-            response = requests.post(self.rerank_base_url, headers=headers, json=payload, timeout=30)
-
-            # 检查响应状态
-            if response.status_code != 200:
-                logger.warning(f"⚠️ Rerank API 调用失败: {response.status_code} - {response.text}")
-                return [(name, 1.0) for name in candidate_tables.keys()]
-
-            # 解析响应
-            result_data = response.json()
-
-            # 根据API类型解析响应
-            if "aliyuncs" in self.rerank_base_url or "Qwen" in self.rerank_model_name:
-                # 阿里云格式响应
-                if "output" in result_data and "results" in result_data["output"]:
-                    results = []
-                    for item in result_data["output"]["results"]:
-                        idx = item["index"]
-                        score = item["relevance_score"]
-                        table_name = next(name for name, text in name_to_text.items() if text == documents[idx])
-                        results.append((table_name, score))
-
-                    results.sort(key=lambda x: x[1], reverse=True)
-                    logger.info("✅ Rerank 完成")
-                    return results
-            else:
-                # 通用格式响应 - 假设直接返回排序结果
-                if "results" in result_data:
-                    results = []
-                    for item in result_data["results"]:
-                        if "index" in item and "relevance_score" in item:  # 使用relevance_score
-                            idx = item["index"]
-                            score = item["relevance_score"]  # 使用relevance_score字段
-                            # 从document对象中提取文本
-                            if "document" in item and "text" in item["document"]:
-                                doc_text = item["document"]["text"]
-                                table_name = next(name for name, text in name_to_text.items() if text == doc_text)
-                            else:
-                                table_name = next(name for name, text in name_to_text.items() if text == documents[idx])
-                            results.append((table_name, score))
-                    results.sort(key=lambda x: x[1], reverse=True)
-                    logger.info("✅ Rerank 完成")
-                    return results
-                elif isinstance(result_data, list):
-                    # 假设直接返回了排序后的索引列表
-                    results = []
-                    for i, item in enumerate(result_data):
-                        if isinstance(item, dict) and "index" in item:
-                            idx = item["index"]
-                            score = item.get("score", 1.0 - i * 0.01)  # 默认分数递减
-                            table_name = next(name for name, text in name_to_text.items() if text == documents[idx])
-                            results.append((table_name, score))
-                    logger.info("✅ Rerank 完成")
-                    return results
-
-            logger.warning("⚠️ Rerank API 返回格式异常")
-            return [(name, 1.0) for name in candidate_tables.keys()]
+            logger.info("✅ Rerank 完成")
+            return [(table_names[idx], score) for idx, score in ranked if 0 <= idx < len(table_names)]
 
         except requests.exceptions.RequestException as e:
             logger.error(f"❌ Rerank API 请求失败: {e}")
@@ -1153,6 +969,9 @@ class DatabaseService:
         try:
             logger.info("🔍 开始获取数据库表 schema 信息")
             user_id = state.get("user_id")
+            # 数据源类型随服务实例缓存，写入 state 供 SQL 解析、权限注入、数据渲染等节点使用
+            if self._datasource_type and self._datasource_id == state.get("datasource_id"):
+                state["db_type"] = self._datasource_type
             all_table_info = self._fetch_all_table_info(user_id=user_id)
 
             user_query = state.get("user_query", "").strip()
@@ -1177,16 +996,23 @@ class DatabaseService:
             # 确保 user_query 也在返回的 state 中（虽然它应该已经在初始 state 中了）
             state["user_query"] = user_query
 
-            # 初始化向量索引
-            self._initialize_vector_index(all_table_info)
+            # 加载预构建的检索索引（首次使用时从磁盘加载或根据元数据构建）
+            retrieval_index = get_retrieval_index(self._datasource_id) if self._datasource_id else None
+            # 预构建的 BM25 语料和 IDF 基于全部已勾选字段；用户配置了列权限时按投影后的表结构实时打分，
+            # 避免无权访问的字段参与检索
+            bm25_index = None if self._has_column_permissions(user_id) else retrieval_index
+
+            # 初始化向量索引（索引顺序与 all_table_info 的表顺序一致）
+            table_names = list(all_table_info.keys())
+            faiss_index = self._initialize_vector_index(all_table_info, retrieval_index)
 
             # 混合检索 - 并行执行 BM25 和向量检索以提高性能
             logger.info("🔍 开始混合检索：BM25 + 向量检索（并行执行）")
             
             # 使用线程池并行执行 BM25 和向量检索
             with ThreadPoolExecutor(max_workers=2) as executor:
-                bm25_future = executor.submit(self._retrieve_by_bm25, all_table_info, user_query)
-                vector_future = executor.submit(self._retrieve_by_vector, user_query, 20)
+                bm25_future = executor.submit(self._retrieve_by_bm25, all_table_info, user_query, bm25_index)
+                vector_future = executor.submit(self._retrieve_by_vector, user_query, faiss_index, 20)
                 
                 # 等待两个任务完成
                 bm25_top_indices = bm25_future.result()
@@ -1218,7 +1044,7 @@ class DatabaseService:
                 if score >= 0.01 and len(selected_indices) < 10:
                     selected_indices.append(idx)
 
-            candidate_table_names = [self._table_names[i] for i in selected_indices]
+            candidate_table_names = [table_names[i] for i in selected_indices]
             candidate_table_info = {name: all_table_info[name] for name in candidate_table_names}
 
             # 重排序
@@ -1235,8 +1061,8 @@ class DatabaseService:
             logger.info("🔍 用户查询: %s", user_query)
             logger.info("📊 检索与排序结果:")
             for i, table_name in enumerate(final_table_names[:TABLE_RETURN_COUNT]):
-                if table_name in self._table_names:
-                    bm25_idx = self._table_names.index(table_name)
+                if table_name in table_names:
+                    bm25_idx = table_names.index(table_name)
                     bm25_rank = bm25_top_indices.index(bm25_idx) + 1 if bm25_idx in bm25_top_indices else "-"
                     vector_rank = vector_top_indices.index(bm25_idx) + 1 if bm25_idx in vector_top_indices else "-"
                     rerank_score = next((score for name, score in reranked_results if name == table_name), 0.0)
@@ -1270,6 +1096,13 @@ class DatabaseService:
         优先使用权限过滤后的SQL（filtered_sql），如果没有则使用原始生成的SQL（generated_sql）。
         支持 SQLAlchemy 驱动和原生驱动两种执行方式。
         """
+        # 行权限条件无法注入时拒绝执行（不能回退到原始 SQL）
+        permission_error = state.get("permission_error")
+        if permission_error:
+            logger.warning(f"⚠️ {permission_error}")
+            state["execution_result"] = ExecutionResult(success=False, error=permission_error)
+            return state
+
         # 优先使用权限过滤后的SQL，如果没有则使用原始生成的SQL
         sql_to_execute = state.get("filtered_sql") or state.get("generated_sql", "")
         sql_to_execute = sql_to_execute.strip() if sql_to_execute else ""
@@ -1295,25 +1128,60 @@ class DatabaseService:
                 use_native_driver = db_enum.connect_type == ConnectType.py_driver
 
             if use_native_driver and self._datasource_config:
-                # 对于原生驱动的数据库，使用 DatasourceConnectionUtil.execute_query
+                # 对于原生驱动的数据库，使用 DatasourceConnectionUtil 流式读取
                 logger.info(f"使用原生驱动执行 SQL（数据源类型: {self._datasource_type}）")
                 config = DatasourceConfigUtil.decrypt_config(self._datasource_config)
-                result_data = DatasourceConnectionUtil.execute_query(
-                    self._datasource_type, config, sql_to_execute
+                result_data, truncated = DatasourceConnectionUtil.execute_query_bounded(
+                    self._datasource_type, config, sql_to_execute, self._datasource_id
                 )
-                state["execution_result"] = ExecutionResult(success=True, data=result_data)
-                logger.info(f"✅ SQL 执行成功（原生驱动），返回 {len(result_data)} 条记录")
             else:
-                # 对于 SQLAlchemy 驱动的数据库，使用 engine 执行
-                with self._engine.connect() as connection:
-                    result = connection.execute(text(sql_to_execute))
-                    result_data = result.fetchall()
-                    columns = result.keys()
-                    frame = pd.DataFrame(result_data, columns=columns)
-                    state["execution_result"] = ExecutionResult(success=True, data=frame.to_dict(orient="records"))
-                    logger.info(f"✅ SQL 执行成功，返回 {len(result_data)} 条记录")
+                # 对于 SQLAlchemy 驱动的数据库，使用服务端游标分批读取，保留驱动返回的原始类型
+                result_data, truncated = DatasourceConnectionUtil.collect_batches(
+                    DatasourceConnectionUtil.iter_engine_batches(self._engine, sql_to_execute, convert=False)
+                )
+
+            state["execution_result"] = ExecutionResult(success=True, data=result_data, truncated=truncated)
+            if truncated:
+                logger.warning(
+                    f"⚠️ SQL 结果超出预算已截断，仅返回前 {len(result_data)} 条记录"
+                    f"（QUERY_RESULT_MAX_ROWS={QueryResultBudget.MAX_ROWS}, QUERY_RESULT_MAX_BYTES={QueryResultBudget.MAX_BYTES}）"
+                )
+            else:
+                logger.info(f"✅ SQL 执行成功，返回 {len(result_data)} 条记录")
         except Exception as e:
             error_msg = f"执行 SQL 失败: {e}"
             logger.error(error_msg, exc_info=True)
             state["execution_result"] = ExecutionResult(success=False, error=str(e))
         return state
+
+
+def get_database_service(datasource_id: Optional[int] = None) -> DatabaseService:
+    """
+    获取数据源对应的 DatabaseService（进程内复用）
+    :param datasource_id: 数据源ID
+    :return: DatabaseService 实例
+    """
+    with _service_cache_lock:
+        service = _service_cache.get(datasource_id)
+    if service:
+        return service
+
+    # 构建过程涉及元数据库查询和客户端初始化，不在锁内执行
+    service = DatabaseService(datasource_id)
+    if datasource_id and not service._datasource_type:
+        # 数据源加载失败（不存在或元数据库异常）时不缓存，下次请求重新加载
+        return service
+    with _service_cache_lock:
+        return _service_cache.setdefault(datasource_id, service)
+
+
+def invalidate_database_service(datasource_id: Optional[int] = None):
+    """
+    使 DatabaseService 缓存失效
+    :param datasource_id: 数据源ID，为 None 时清空全部缓存（如 AI 模型配置变更）
+    """
+    with _service_cache_lock:
+        if datasource_id is None:
+            _service_cache.clear()
+        else:
+            _service_cache.pop(datasource_id, None)
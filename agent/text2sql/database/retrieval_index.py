@@ -0,0 +1,415 @@
+"""
+数据源表检索索引
+在表同步时预先构建（BM25 分词结果 + 表结构向量），持久化到本地磁盘，检索时按需懒加载，
+单表注释/字段变更时增量更新。检索阶段只需对问题分词、向量化并打分，不再重复分词整个表语料。
+"""
+
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import jieba
+import numpy as np
+from rank_bm25 import BM25Okapi
+
+from common.invalidation_bus import InvalidationTopic, subscribe
+from common.vector_util import decode_vector, decode_vector_matrix
+from model.datasource_models import DatasourceField, DatasourceTable
+from model.db_connection_pool import get_db_pool
+
+logger = logging.getLogger(__name__)
+
+db_pool = get_db_pool()
+
+# 索引持久化目录（与向量索引共用根目录）
+INDEX_ROOT_DIR = os.path.join(os.getenv("VECTOR_INDEX_DIR", "./vector_index"), "table_retrieval")
+# 索引文件格式版本，格式变化时旧索引会被自动重建（2: 只索引已勾选的字段；3: 元数据与向量合并为单个文件）
+INDEX_FORMAT_VERSION = 3
+
+# 元数据与向量保存在同一个文件中，整体原子替换，其它 worker 不会读到新旧混合的索引
+_INDEX_FILE = "index.npz"
+# 旧格式的索引文件（保存时清理）
+_LEGACY_FILES = ("index.json", "vectors.npy")
+
+# 已加载的索引（ds_id -> 索引）
+_loaded_indexes: Dict[int, "TableRetrievalIndex"] = {}
+_index_lock = Lock()
+
+
+def tokenize_text(text_str: str) -> List[str]:
+    """
+    对中文/英文文本进行分词，过滤标点符号。
+    """
+    filtered_text = re.sub(r"[^\u4e00-\u9fa5a-zA-Z0-9]", " ", text_str or "")
+    tokens = jieba.lcut(filtered_text, cut_all=False)
+    return [token.strip() for token in tokens if token.strip()]
+
+
+def build_document(table_name: str, table_comment: str, columns: Iterable[Tuple[str, str]]) -> str:
+    """
+    构建用于检索的文档文本（表名 + 注释 + 字段名 + 字段注释）。
+    """
+    parts = [table_name]
+    if table_comment:
+        parts.append(table_comment)
+    for col_name, col_comment in columns:
+        parts.append(col_name)
+        if col_comment:
+            parts.append(col_comment)
+    return " ".join(parts)
+
+
+class TableRetrievalIndex:
+    """
+    单个数据源的表检索索引
+    表名按大写匹配（兼容 Oracle 等返回大写表名的数据库）
+    """
+
+    def __init__(
+        self,
+        ds_id: int,
+        table_names: List[str],
+        tokens: List[List[str]],
+        comment_tokens: List[List[str]],
+        vectors: Optional[np.ndarray],
+        has_vector: List[bool],
+        version: float = 0.0,
+    ):
+        self.ds_id = ds_id
+        self.table_names = table_names
+        self.tokens = tokens
+        self.comment_tokens = comment_tokens
+        # 已做 L2 归一化的 float32 矩阵，行与 table_names 对齐；缺失向量的行为零向量
+        self.vectors = vectors
+        self.has_vector = has_vector
+        # 磁盘文件的修改时间，用于多 worker 间感知索引更新
+        self.version = version
+        self._positions = {str(name).upper(): i for i, name in enumerate(table_names)}
+        self._bm25 = BM25Okapi(tokens) if tokens else None
+
+    def _positions_of(self, table_names: List[str]) -> Optional[List[int]]:
+        """获取表在索引中的位置，任意一张表不在索引中时返回 None"""
+        positions = []
+        for name in table_names:
+            pos = self._positions.get(str(name).upper())
+            if pos is None:
+                return None
+            positions.append(pos)
+        return positions
+
+    def bm25_rank(self, query_tokens: List[str], table_names: List[str]) -> Optional[List[int]]:
+        """
+        BM25 打分并排序
+        :return: table_names 的下标按得分降序排列；索引未覆盖全部表时返回 None
+        """
+        positions = self._positions_of(table_names)
+        if positions is None or self._bm25 is None:
+            return None
+
+        doc_scores = self._bm25.get_scores(query_tokens)[positions]
+
+        # 增强：若查询词出现在表注释中，则提升分数
+        enhanced_scores = doc_scores.copy()
+        query_token_set = set(query_tokens)
+        for i, (pos, score) in enumerate(zip(positions, doc_scores)):
+            if score <= 0:
+                continue
+            overlap = query_token_set & set(self.comment_tokens[pos])
+            if overlap:
+                overlap_ratio = len(overlap) / len(query_token_set)
+                enhanced_scores[i] += score * overlap_ratio * 1.5
+
+        return [int(idx) for idx in np.argsort(-enhanced_scores, kind="stable")]
+
+    def vector_matrix(self, table_names: List[str]) -> Optional[np.ndarray]:
+        """
+        获取与 table_names 顺序对齐的表向量矩阵
+        :return: 归一化后的向量矩阵；索引未覆盖全部表或存在缺失向量时返回 None
+        """
+        if self.vectors is None:
+            return None
+        positions = self._positions_of(table_names)
+        if positions is None or not all(self.has_vector[pos] for pos in positions):
+            return None
+        return self.vectors[positions]
+
+    def clone(self) -> "TableRetrievalIndex":
+        """复制索引，增量更新在副本上进行，避免影响正在检索的请求"""
+        return TableRetrievalIndex(
+            self.ds_id,
+            list(self.table_names),
+            list(self.tokens),
+            list(self.comment_tokens),
+            None if self.vectors is None else self.vectors.copy(),
+            list(self.has_vector),
+            self.version,
+        )
+
+    def upsert(self, table_name: str, tokens: List[str], comment_tokens: List[str], vector: Optional[np.ndarray]):
+        """新增或更新单张表的索引数据"""
+        pos = self._positions.get(str(table_name).upper())
+        if pos is None:
+            pos = len(self.table_names)
+            self.table_names.append(table_name)
+            self.tokens.append(tokens)
+            self.comment_tokens.append(comment_tokens)
+            self.has_vector.append(False)
+            self._positions[str(table_name).upper()] = pos
+            if self.vectors is not None:
+                self.vectors = np.vstack([self.vectors, np.zeros((1, self.vectors.shape[1]), dtype="float32")])
+        else:
+            self.table_names[pos] = table_name
+            self.tokens[pos] = tokens
+            self.comment_tokens[pos] = comment_tokens
+
+        vec = _normalize_vector(vector)
+        if vec is not None and self.vectors is None:
+            self.vectors = np.zeros((len(self.table_names), vec.shape[0]), dtype="float32")
+        if vec is not None and vec.shape[0] == self.vectors.shape[1]:
+            self.vectors[pos] = vec
+            self.has_vector[pos] = True
+        else:
+            self.has_vector[pos] = False
+
+        self._bm25 = BM25Okapi(self.tokens) if self.tokens else None
+
+    def save(self):
+        """持久化到本地磁盘（元数据与向量写入同一临时文件后原子替换，文件的修改时间作为索引版本）"""
+        index_dir = os.path.join(INDEX_ROOT_DIR, str(self.ds_id))
+        os.makedirs(index_dir, exist_ok=True)
+
+        meta = json.dumps(
+            {
+                "format_version": INDEX_FORMAT_VERSION,
+                "table_names": self.table_names,
+                "tokens": self.tokens,
+                "comment_tokens": self.comment_tokens,
+                "has_vector": self.has_vector,
+            },
+            ensure_ascii=False,
+        ).encode("utf-8")
+        arrays = {"meta": np.frombuffer(meta, dtype=np.uint8)}
+        if self.vectors is not None:
+            arrays["vectors"] = self.vectors
+
+        index_path = os.path.join(index_dir, _INDEX_FILE)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(tmp_path, index_path)
+        self.version = os.path.getmtime(index_path)
+
+        for name in _LEGACY_FILES:
+            legacy_path = os.path.join(index_dir, name)
+            if os.path.exists(legacy_path):
+                os.remove(legacy_path)
+
+    @classmethod
+    def load(cls, ds_id: int) -> Optional["TableRetrievalIndex"]:
+        """从本地磁盘加载索引，文件不存在、格式不兼容或内容不完整时返回 None（由调用方重新构建）"""
+        index_path = os.path.join(INDEX_ROOT_DIR, str(ds_id), _INDEX_FILE)
+        if not os.path.exists(index_path):
+            return None
+
+        version = os.path.getmtime(index_path)
+        with np.load(index_path, allow_pickle=False) as data:
+            meta = json.loads(data["meta"].tobytes().decode("utf-8"))
+            vectors = data["vectors"].astype("float32", copy=False) if "vectors" in data.files else None
+        if meta.get("format_version") != INDEX_FORMAT_VERSION:
+            logger.info(f"数据源 {ds_id} 的检索索引格式已过期，将重新构建")
+            return None
+
+        # 各部分的表数量必须一致，否则向量与表名会错位
+        table_count = len(meta["table_names"])
+        lengths = {len(meta["tokens"]), len(meta["comment_tokens"]), len(meta["has_vector"])}
+        if vectors is not None:
+            lengths.add(vectors.shape[0])
+        if lengths != {table_count}:
+            logger.warning(f"⚠️ 数据源 {ds_id} 的检索索引内容不一致（表数量 {table_count}），将重新构建")
+            return None
+
+        return cls(
+            ds_id,
+            meta["table_names"],
+            meta["tokens"],
+            meta["comment_tokens"],
+            vectors,
+            meta["has_vector"],
+            version,
+        )
+
+
+def _normalize_vector(vector: Optional[np.ndarray]) -> Optional[np.ndarray]:
+    """转换为 L2 归一化的 float32 向量"""
+    if vector is None or len(vector) == 0:
+        return None
+    vec = np.asarray(vector, dtype="float32")
+    norm = np.linalg.norm(vec)
+    if norm == 0:
+        return None
+    return vec / norm
+
+
+def _normalize_matrix(matrix: np.ndarray) -> np.ndarray:
+    """按行做 L2 归一化（零向量保持为零）"""
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def _load_table_entries(ds_id: int, table_ids: Optional[List[int]] = None) -> List[Tuple]:
+    """
+    从元数据库读取表的索引数据（只包含已勾选的字段，未勾选的字段不进入 BM25 语料和 IDF）
+    :return: [(table_id, 表名, 分词结果, 注释分词结果, 向量二进制)]
+    """
+    entries = []
+    with db_pool.get_session() as session:
+        # 只查询需要的列，避免加载已废弃的 JSON embedding 列
+        query = session.query(
+            DatasourceTable.id,
+            DatasourceTable.table_name,
+            DatasourceTable.table_comment,
+            DatasourceTable.custom_comment,
+            DatasourceTable.embedding_vector,
+        ).filter(DatasourceTable.ds_id == ds_id)
+        if table_ids is not None:
+            query = query.filter(DatasourceTable.id.in_(table_ids))
+        tables = query.all()
+        if not tables:
+            return entries
+
+        fields = (
+            session.query(
+                DatasourceField.table_id,
+                DatasourceField.field_name,
+                DatasourceField.field_comment,
+                DatasourceField.custom_comment,
+            )
+            .filter(
+                DatasourceField.ds_id == ds_id,
+                DatasourceField.table_id.in_([t.id for t in tables]),
+                DatasourceField.checked == True,
+            )
+            .order_by(DatasourceField.field_index)
+            .all()
+        )
+        fields_by_table: Dict[int, List[Tuple[str, str]]] = {}
+        for field in fields:
+            fields_by_table.setdefault(field.table_id, []).append(
+                (field.field_name, field.custom_comment or field.field_comment or "")
+            )
+
+        for table in tables:
+            table_comment = table.custom_comment or table.table_comment or ""
+            document = build_document(table.table_name, table_comment, fields_by_table.get(table.id, []))
+            entries.append(
+                (
+                    table.id,
+                    table.table_name,
+                    tokenize_text(document),
+                    tokenize_text(table_comment),
+                    table.embedding_vector,
+                )
+            )
+    return entries
+
+
+def build_retrieval_index(ds_id: int) -> TableRetrievalIndex:
+    """
+    根据元数据全量构建数据源的检索索引并持久化（表同步后调用）
+    """
+    start_time = time.time()
+    entries = _load_table_entries(ds_id)
+
+    table_names = [entry[1] for entry in entries]
+    # 整批拼接二进制后一次性转换为矩阵；维度不一致（如切换了 embedding 模型）的向量视为缺失
+    matrix, has_vector = decode_vector_matrix(entry[4] for entry in entries)
+    if matrix is not None:
+        matrix = _normalize_matrix(matrix)
+
+    index = TableRetrievalIndex(
+        ds_id,
+        table_names,
+        [entry[2] for entry in entries],
+        [entry[3] for entry in entries],
+        matrix,
+        has_vector,
+    )
+    index.save()
+    with _index_lock:
+        _loaded_indexes[ds_id] = index
+
+    logger.info(
+        f"✅ 数据源 {ds_id} 检索索引构建完成，共 {len(table_names)} 张表，"
+        f"{sum(has_vector)} 个向量，耗时 {time.time() - start_time:.2f}s"
+    )
+    return index
+
+
+def update_retrieval_index(ds_id: int, table_ids: List[int]):
+    """
+    增量更新指定表的检索索引（表注释、字段注释变更后调用）
+    """
+    index = get_retrieval_index(ds_id)
+    if index is None:
+        return
+
+    entries = _load_table_entries(ds_id, table_ids)
+    new_index = index.clone()
+    for _, table_name, tokens, comment_tokens, raw_vector in entries:
+        new_index.upsert(table_name, tokens, comment_tokens, decode_vector(raw_vector))
+    new_index.save()
+    with _index_lock:
+        _loaded_indexes[ds_id] = new_index
+    logger.info(f"数据源 {ds_id} 检索索引已增量更新 {len(entries)} 张表")
+
+
+def get_retrieval_index(ds_id: int) -> Optional[TableRetrievalIndex]:
+    """
+    获取数据源的检索索引：优先使用内存中的索引，磁盘上的索引更新后（如其它 worker 重建）自动重新加载，
+    磁盘上不存在时根据元数据构建。
+    """
+    if not ds_id:
+        return None
+
+    index_path = os.path.join(INDEX_ROOT_DIR, str(ds_id), _INDEX_FILE)
+    try:
+        disk_version = os.path.getmtime(index_path) if os.path.exists(index_path) else None
+        with _index_lock:
+            index = _loaded_indexes.get(ds_id)
+        if index is not None and index.version == disk_version:
+            return index
+
+        index = TableRetrievalIndex.load(ds_id) if disk_version is not None else None
+        if index is None:
+            return build_retrieval_index(ds_id)
+
+        with _index_lock:
+            _loaded_indexes[ds_id] = index
+        return index
+    except Exception as e:
+        logger.warning(f"⚠️ 加载数据源 {ds_id} 的检索索引失败: {e}")
+        return None
+
+
+def remove_retrieval_index(ds_id: int):
+    """删除数据源的检索索引（数据源删除时调用）"""
+    with _index_lock:
+        _loaded_indexes.pop(ds_id, None)
+    shutil.rmtree(os.path.join(INDEX_ROOT_DIR, str(ds_id)), ignore_errors=True)
+
+
+def _on_datasource_changed(event: Dict):
+    """其它 worker 删除数据源后，释放本进程中已加载的索引（索引更新通过磁盘版本号自动感知）"""
+    ds_id = event.get("ds_id")
+    if ds_id and event.get("deleted"):
+        with _index_lock:
+            _loaded_indexes.pop(ds_id, None)
+
+
+subscribe(InvalidationTopic.DATASOURCE, _on_datasource_changed)
@@ -0,0 +1,163 @@
+"""
+数据源表结构两级缓存
+每个数据源的原始表结构（全部表的字段/注释/外键）只保存一份：先查进程内 LRU，再查 Redis（配置了 REDIS_HOST 时启用），
+多个 Sanic worker 共享 Redis 中的同一份结构，无需各自重新读取数据库元数据。
+用户的列权限（来自 permission_retriever 的权限快照）只作为轻量的投影在读取时应用，不再为每个用户保存完整的表结构副本。
+表同步、表/字段编辑时通过缓存失效事件总线（common.invalidation_bus）在所有 worker 中失效。
+
+原始表结构格式：
+    {table_name: {"columns": [[col_name, col_type, col_comment], ...], "foreign_keys": [...], "table_comment": str,
+                  "checked_fields": [col_name, ...]}}
+    checked_fields 为元数据中已勾选的字段，仅在表已同步且存在勾选字段时出现
+"""
+
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, Optional, Set, Tuple
+
+from common.invalidation_bus import InvalidationTopic, subscribe
+from common.redis_tool import get_shared_redis_tool
+
+logger = logging.getLogger(__name__)
+
+# 进程内缓存有效期（秒），默认5分钟
+TABLE_INFO_CACHE_TTL = int(os.getenv("TABLE_INFO_CACHE_TTL", "300"))
+# 进程内缓存的数据源数量
+TABLE_INFO_CACHE_SIZE = int(os.getenv("TABLE_INFO_CACHE_SIZE", "32"))
+# Redis 中表结构的有效期（秒），元数据变更时会被显式删除，默认1天
+TABLE_INFO_REDIS_TTL = int(os.getenv("TABLE_INFO_REDIS_TTL", "86400"))
+
+REDIS_KEY_PREFIX = "aix:schema:v2:"
+
+RawSchema = Dict[str, Dict]
+ColumnPermissions = Dict[str, Set[str]]
+
+_schema_cache: "OrderedDict[int, Tuple[RawSchema, float]]" = OrderedDict()
+_cache_lock = Lock()
+
+
+class SchemaCache:
+    """
+    数据源原始表结构缓存（进程内 LRU + Redis）
+    """
+
+    @staticmethod
+    def _redis_key(ds_id: int) -> str:
+        return f"{REDIS_KEY_PREFIX}{ds_id}"
+
+    @staticmethod
+    def get(ds_id: int) -> Optional[RawSchema]:
+        """
+        读取数据源的原始表结构，两级缓存均未命中时返回 None
+        """
+        with _cache_lock:
+            cached = _schema_cache.get(ds_id)
+            if cached is not None:
+                schema, cached_time = cached
+                if time.time() - cached_time < TABLE_INFO_CACHE_TTL:
+                    _schema_cache.move_to_end(ds_id)
+                    return schema
+                _schema_cache.pop(ds_id, None)
+
+        redis_tool = get_shared_redis_tool()
+        if redis_tool is None:
+            return None
+        try:
+            payload = redis_tool.get_key(SchemaCache._redis_key(ds_id))
+            if not payload:
+                return None
+            schema = json.loads(payload)
+        except Exception as e:
+            logger.warning(f"⚠️ 从 Redis 读取表结构缓存失败 (datasource_id={ds_id}): {e}")
+            return None
+
+        logger.debug(f"✅ 命中 Redis 表结构缓存 (datasource_id={ds_id})")
+        SchemaCache._store_local(ds_id, schema)
+        return schema
+
+    @staticmethod
+    def set(ds_id: int, schema: RawSchema):
+        """
+        写入数据源的原始表结构（进程内 + Redis）
+        """
+        SchemaCache._store_local(ds_id, schema)
+
+        redis_tool = get_shared_redis_tool()
+        if redis_tool is None:
+            return
+        try:
+            redis_tool.set_key(
+                SchemaCache._redis_key(ds_id),
+                json.dumps(schema, ensure_ascii=False, default=str),
+                ex=TABLE_INFO_REDIS_TTL,
+            )
+        except Exception as e:
+            logger.warning(f"⚠️ 写入 Redis 表结构缓存失败 (datasource_id={ds_id}): {e}")
+
+    @staticmethod
+    def _store_local(ds_id: int, schema: RawSchema):
+        if TABLE_INFO_CACHE_SIZE <= 0:
+            return
+        with _cache_lock:
+            _schema_cache[ds_id] = (schema, time.time())
+            _schema_cache.move_to_end(ds_id)
+            while len(_schema_cache) > TABLE_INFO_CACHE_SIZE:
+                _schema_cache.popitem(last=False)
+
+    @staticmethod
+    def invalidate(ds_id: Optional[int] = None):
+        """
+        使表结构缓存失效
+        :param ds_id: 数据源ID，为 None 时清空全部进程内缓存（Redis 中的条目按数据源删除或等待过期）
+        """
+        with _cache_lock:
+            if ds_id is None:
+                _schema_cache.clear()
+            else:
+                _schema_cache.pop(ds_id, None)
+
+        if ds_id is None:
+            return
+        redis_tool = get_shared_redis_tool()
+        if redis_tool is None:
+            return
+        try:
+            redis_tool.delete_key(SchemaCache._redis_key(ds_id))
+        except Exception as e:
+            logger.warning(f"⚠️ 删除 Redis 表结构缓存失败 (datasource_id={ds_id}): {e}")
+
+
+def project_schema(schema: RawSchema, column_permissions: Optional[ColumnPermissions] = None) -> Dict[str, Dict]:
+    """
+    将原始表结构按列权限投影为问答链路使用的表信息
+    每次返回新的字典（外键列表也会复制），调用方可以自由修改而不影响缓存中的原始结构
+
+    :param schema: 原始表结构
+    :param column_permissions: 表名 -> 允许的字段集合，未配置的表返回全部字段
+    :return: {table_name: {"columns": {col: {"type", "comment"}}, "foreign_keys": [...], "table_comment": str}}
+    """
+    column_permissions = column_permissions or {}
+    table_info = {}
+    for table_name, table_schema in schema.items():
+        allowed = column_permissions.get(table_name)
+        columns = {
+            col_name: {"type": col_type, "comment": col_comment}
+            for col_name, col_type, col_comment in table_schema["columns"]
+            if allowed is None or col_name in allowed
+        }
+        # 权限过滤后没有字段的表不返回
+        if not columns:
+            continue
+        table_info[table_name] = {
+            "columns": columns,
+            "foreign_keys": list(table_schema.get("foreign_keys") or []),
+            "table_comment": table_schema.get("table_comment") or "",
+        }
+    return table_info
+
+
+subscribe(InvalidationTopic.DATASOURCE, lambda event: SchemaCache.invalidate(event.get("ds_id")))
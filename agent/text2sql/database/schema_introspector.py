@@ -0,0 +1,253 @@
+"""
+批量表结构读取
+按方言直接查询 information_schema / 系统目录，用少量查询一次性获取所有表的字段、注释和外键，
+替代 SQLAlchemy Inspector 逐表调用（每张表 3 次往返）。不支持的方言返回 None，由调用方回退到 Inspector。
+"""
+
+import logging
+from typing import Any, Dict, Iterable, Optional
+
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.expression import text
+
+logger = logging.getLogger(__name__)
+
+# 注意：以下查询均基于连接的默认 schema / database，与 Inspector 不指定 schema 时的行为保持一致
+
+_MYSQL_QUERIES = {
+    "columns": """
+        SELECT TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, NULL, NULL, NULL, COLUMN_COMMENT
+        FROM information_schema.COLUMNS
+        WHERE TABLE_SCHEMA = DATABASE()
+        ORDER BY TABLE_NAME, ORDINAL_POSITION
+    """,
+    "comments": """
+        SELECT TABLE_NAME, TABLE_COMMENT
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE()
+    """,
+    "foreign_keys": """
+        SELECT TABLE_NAME, COLUMN_NAME, REFERENCED_TABLE_NAME, REFERENCED_COLUMN_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE()
+          AND REFERENCED_TABLE_NAME IS NOT NULL
+          AND ORDINAL_POSITION = 1
+        ORDER BY TABLE_NAME, CONSTRAINT_NAME
+    """,
+}
+
+_POSTGRES_QUERIES = {
+    "columns": """
+        SELECT c.relname, a.attname, pg_catalog.format_type(a.atttypid, a.atttypmod), NULL, NULL, NULL,
+               col_description(c.oid, a.attnum)
+        FROM pg_catalog.pg_attribute a
+        JOIN pg_catalog.pg_class c ON a.attrelid = c.oid
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema()
+          AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+          AND a.attnum > 0
+          AND NOT a.attisdropped
+        ORDER BY c.relname, a.attnum
+    """,
+    "comments": """
+        SELECT c.relname, obj_description(c.oid, 'pg_class')
+        FROM pg_catalog.pg_class c
+        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = current_schema()
+          AND c.relkind IN ('r', 'p', 'v', 'm', 'f')
+    """,
+    "foreign_keys": """
+        SELECT cl.relname, a.attname, rcl.relname, ra.attname
+        FROM pg_catalog.pg_constraint con
+        JOIN pg_catalog.pg_class cl ON cl.oid = con.conrelid
+        JOIN pg_catalog.pg_namespace n ON n.oid = cl.relnamespace
+        JOIN pg_catalog.pg_class rcl ON rcl.oid = con.confrelid
+        JOIN pg_catalog.pg_attribute a ON a.attrelid = con.conrelid AND a.attnum = con.conkey[1]
+        JOIN pg_catalog.pg_attribute ra ON ra.attrelid = con.confrelid AND ra.attnum = con.confkey[1]
+        WHERE con.contype = 'f'
+          AND n.nspname = current_schema()
+        ORDER BY cl.relname, con.conname
+    """,
+}
+
+_ORACLE_QUERIES = {
+    "columns": """
+        SELECT col.TABLE_NAME, col.COLUMN_NAME, col.DATA_TYPE, col.CHAR_LENGTH, col.DATA_PRECISION,
+               col.DATA_SCALE, com.COMMENTS
+        FROM USER_TAB_COLUMNS col
+        LEFT JOIN USER_COL_COMMENTS com
+            ON col.TABLE_NAME = com.TABLE_NAME
+           AND col.COLUMN_NAME = com.COLUMN_NAME
+        ORDER BY col.TABLE_NAME, col.COLUMN_ID
+    """,
+    "comments": """
+        SELECT TABLE_NAME, COMMENTS
+        FROM USER_TAB_COMMENTS
+    """,
+    "foreign_keys": """
+        SELECT a.TABLE_NAME, a.COLUMN_NAME, rc.TABLE_NAME, rcc.COLUMN_NAME
+        FROM USER_CONSTRAINTS c
+        JOIN USER_CONS_COLUMNS a
+            ON a.CONSTRAINT_NAME = c.CONSTRAINT_NAME AND a.POSITION = 1
+        JOIN ALL_CONSTRAINTS rc
+            ON rc.OWNER = c.R_OWNER AND rc.CONSTRAINT_NAME = c.R_CONSTRAINT_NAME
+        JOIN ALL_CONS_COLUMNS rcc
+            ON rcc.OWNER = rc.OWNER AND rcc.CONSTRAINT_NAME = rc.CONSTRAINT_NAME AND rcc.POSITION = 1
+        WHERE c.CONSTRAINT_TYPE = 'R'
+        ORDER BY a.TABLE_NAME, c.CONSTRAINT_NAME
+    """,
+}
+
+_MSSQL_QUERIES = {
+    "columns": """
+        SELECT t.name, c.name, ty.name,
+               CASE WHEN ty.name IN ('nchar', 'nvarchar') AND c.max_length > 0
+                    THEN c.max_length / 2 ELSE c.max_length END,
+               c.precision, c.scale, CAST(ep.value AS NVARCHAR(4000))
+        FROM sys.columns c
+        JOIN sys.tables t ON t.object_id = c.object_id
+        JOIN sys.types ty ON ty.user_type_id = c.user_type_id
+        LEFT JOIN sys.extended_properties ep
+            ON ep.major_id = c.object_id
+           AND ep.minor_id = c.column_id
+           AND ep.class = 1
+           AND ep.name = 'MS_Description'
+        WHERE t.schema_id = SCHEMA_ID()
+        ORDER BY t.name, c.column_id
+    """,
+    "comments": """
+        SELECT t.name, CAST(ep.value AS NVARCHAR(4000))
+        FROM sys.tables t
+        LEFT JOIN sys.extended_properties ep
+            ON ep.major_id = t.object_id
+           AND ep.minor_id = 0
+           AND ep.class = 1
+           AND ep.name = 'MS_Description'
+        WHERE t.schema_id = SCHEMA_ID()
+    """,
+    "foreign_keys": """
+        SELECT tp.name, cp.name, tr.name, cr.name
+        FROM sys.foreign_keys fk
+        JOIN sys.foreign_key_columns fkc
+            ON fkc.constraint_object_id = fk.object_id AND fkc.constraint_column_id = 1
+        JOIN sys.tables tp ON tp.object_id = fkc.parent_object_id
+        JOIN sys.columns cp ON cp.object_id = fkc.parent_object_id AND cp.column_id = fkc.parent_column_id
+        JOIN sys.tables tr ON tr.object_id = fkc.referenced_object_id
+        JOIN sys.columns cr ON cr.object_id = fkc.referenced_object_id AND cr.column_id = fkc.referenced_column_id
+        WHERE tp.schema_id = SCHEMA_ID()
+        ORDER BY tp.name, fk.name
+    """,
+}
+
+_CLICKHOUSE_QUERIES = {
+    "columns": """
+        SELECT table, name, type, NULL, NULL, NULL, comment
+        FROM system.columns
+        WHERE database = currentDatabase()
+        ORDER BY table, position
+    """,
+    "comments": """
+        SELECT name, comment
+        FROM system.tables
+        WHERE database = currentDatabase()
+    """,
+    # ClickHouse 不支持外键
+    "foreign_keys": None,
+}
+
+# 方言名称 -> 批量查询语句
+DIALECT_QUERIES: Dict[str, Dict[str, Optional[str]]] = {
+    "mysql": _MYSQL_QUERIES,
+    "mariadb": _MYSQL_QUERIES,
+    "postgresql": _POSTGRES_QUERIES,
+    "oracle": _ORACLE_QUERIES,
+    "mssql": _MSSQL_QUERIES,
+    "clickhouse": _CLICKHOUSE_QUERIES,
+}
+
+# 需要拼接长度的字符类型
+_CHAR_TYPES = {"CHAR", "VARCHAR", "VARCHAR2", "NCHAR", "NVARCHAR", "NVARCHAR2", "BINARY", "VARBINARY"}
+# 需要拼接精度的数值类型
+_NUMERIC_TYPES = {"NUMBER", "NUMERIC", "DECIMAL"}
+
+
+def _to_str(value: Any) -> str:
+    """统一转换为字符串（SQL Server 等驱动可能返回 bytes）"""
+    if value is None:
+        return ""
+    if isinstance(value, bytes):
+        try:
+            return value.decode("utf-8")
+        except UnicodeDecodeError:
+            return value.decode("latin-1", errors="ignore")
+    return str(value)
+
+
+def _format_type(data_type: Any, length: Any, precision: Any, scale: Any) -> str:
+    """将目录中的类型信息格式化为与 Inspector 相近的类型字符串"""
+    type_name = _to_str(data_type).upper()
+    if type_name in _CHAR_TYPES and length is not None:
+        return f"{type_name}(MAX)" if int(length) < 0 else f"{type_name}({int(length)})"
+    if type_name in _NUMERIC_TYPES and precision is not None:
+        if scale:
+            return f"{type_name}({int(precision)}, {int(scale)})"
+        return f"{type_name}({int(precision)})"
+    return type_name
+
+
+def fetch_schema_bulk(engine: Engine, table_names: Iterable[str]) -> Optional[Dict[str, Dict]]:
+    """
+    批量获取表结构信息
+
+    Args:
+        engine: 数据源 engine
+        table_names: 需要读取的表名（与 Inspector.get_table_names 返回的表名一致）
+
+    Returns:
+        {表名: {"columns": [(字段名, 类型, 注释)], "foreign_keys": [...], "table_comment": str}}，
+        方言不支持或查询失败时返回 None
+    """
+    dialect = engine.dialect
+    queries = DIALECT_QUERIES.get((dialect.name or "").lower())
+    if not queries:
+        return None
+
+    # Oracle 等方言会将大写的不区分大小写标识符规范化为小写，这里保持与 Inspector 一致
+    requires_normalize = getattr(dialect, "requires_name_normalize", False)
+
+    def normalize(name: Any) -> str:
+        name = _to_str(name)
+        return dialect.normalize_name(name) if requires_normalize else name
+
+    wanted = set(table_names)
+    schema: Dict[str, Dict] = {
+        name: {"columns": [], "foreign_keys": [], "table_comment": ""} for name in wanted
+    }
+
+    try:
+        with engine.connect() as conn:
+            for row in conn.execute(text(queries["columns"])):
+                table_name = normalize(row[0])
+                if table_name not in wanted:
+                    continue
+                schema[table_name]["columns"].append(
+                    (normalize(row[1]), _format_type(row[2], row[3], row[4], row[5]), _to_str(row[6]).strip())
+                )
+
+            for row in conn.execute(text(queries["comments"])):
+                table_name = normalize(row[0])
+                if table_name in wanted:
+                    schema[table_name]["table_comment"] = _to_str(row[1]).strip()
+
+            if queries["foreign_keys"]:
+                for row in conn.execute(text(queries["foreign_keys"])):
+                    table_name = normalize(row[0])
+                    if table_name in wanted:
+                        schema[table_name]["foreign_keys"].append(
+                            f"{normalize(row[1])} -> {normalize(row[2])}.{normalize(row[3])}"
+                        )
+    except Exception as e:
+        logger.warning(f"⚠️ 批量读取表结构失败（dialect={dialect.name}），回退到 Inspector: {e}")
+        return None
+
+    return schema
@@ -1,10 +1,12 @@
 """
 权限过滤注入节点
-使用 LLM 将权限条件注入到 SQL 语句中
+基于 sqlglot 语法树将行权限条件确定性地注入到 SQL 语句中（每个受限表引用替换为带过滤条件的子查询），
+语法树无法处理的语句可通过 PERMISSION_LLM_FALLBACK 开启 LLM 改写兜底
 """
 
 import json
 import logging
+import os
 import traceback
 from typing import Dict, Any, Optional, List
 
@@ -17,17 +19,147 @@ from agent.text2sql.permission.permission_retriever import (
 )
 from agent.text2sql.template.prompt_builder import PromptBuilder
 from agent.text2sql.template.schema_formatter import get_database_engine_info
-from agent.text2sql.analysis.data_render_antv import extract_table_names_sqlglot, extract_table_alias_mapping, DB_TYPE_TO_DIALECT
+from agent.text2sql.analysis.sql_analysis import get_dialect, get_sql_analysis, register_rewritten_sql
 from common.llm_util import get_llm
 from services.datasource_service import DatasourceService
 from model.db_connection_pool import get_db_pool
 
 import sqlglot
-from sqlglot import parse
 
 logger = logging.getLogger(__name__)
 pool = get_db_pool()
 
+# 语法树注入失败时是否回退到 LLM 改写 SQL（默认关闭）
+PERMISSION_LLM_FALLBACK = os.getenv("PERMISSION_LLM_FALLBACK", "false").lower() == "true"
+
+
+def _inject_row_filters_to_sql(sql: str, db_type: str, filters: List[Dict[str, str]]) -> Optional[str]:
+    """
+    基于语法树注入行权限：将 SQL 中每个受限表的引用（包括子查询、CTE、JOIN 中的引用）
+    替换为 (SELECT * FROM 表 WHERE 过滤条件) AS 原别名，外层对别名/表名的列引用保持不变，
+    对 LEFT JOIN 等外连接也不会改变连接语义。
+
+    Args:
+        sql: 原始 SQL
+        db_type: 数据源类型
+        filters: 行权限过滤条件 [{"table": 表名, "filter": 以真实表名限定字段的条件}]
+
+    Returns:
+        注入后的 SQL；语句无法解析或包含不支持的结构（非查询语句等）时返回 None
+    """
+    dialect = get_dialect(db_type)
+
+    # 同一张表的多个过滤条件用 AND 合并
+    conditions: Dict[str, sqlglot.exp.Expression] = {}
+    try:
+        for item in filters:
+            condition = sqlglot.parse_one(item["filter"], read=dialect)
+            key = str(item["table"]).lower()
+            conditions[key] = sqlglot.exp.and_(conditions[key], condition) if key in conditions else condition
+    except Exception as e:
+        logger.warning(f"行权限：过滤条件解析失败: {e}")
+        return None
+
+    analysis = get_sql_analysis(sql, db_type)
+    if analysis.error:
+        logger.warning(f"行权限：SQL 解析失败: {analysis.error}")
+        return None
+    # 解析结果在节点间共享，在副本上改写
+    expressions = analysis.copy_expressions()
+
+    injected_tables = set()
+    for expression in expressions:
+        if expression is None:
+            continue
+        if not isinstance(expression, sqlglot.exp.Query):
+            logger.warning(f"行权限：不支持的语句类型 {type(expression).__name__}")
+            return None
+
+        # CTE 名称的引用不是真实表，真实表在 CTE 定义内部会被单独处理
+        cte_names = {cte.alias_or_name.lower() for cte in expression.find_all(sqlglot.exp.CTE)}
+
+        # 先收集再替换，避免遍历到新注入的子查询
+        for table in list(expression.find_all(sqlglot.exp.Table)):
+            key = (table.name or "").lower()
+            if key not in conditions:
+                continue
+            if not table.args.get("db") and key in cte_names:
+                continue
+
+            source = table.copy()
+            source.set("alias", None)
+            source.set("pivots", None)
+            table_alias = table.args.get("alias")
+            alias = table_alias.copy() if table_alias else sqlglot.exp.TableAlias(this=table.this.copy())
+
+            subquery = sqlglot.exp.Subquery(
+                this=sqlglot.exp.select("*").from_(source).where(conditions[key].copy()),
+                alias=alias,
+            )
+            table.replace(subquery)
+            injected_tables.add(key)
+
+    try:
+        # 改写结果登记到解析缓存，后续列权限过滤直接复用注入后的语法树
+        result = register_rewritten_sql(expressions, dialect).sql
+    except Exception as e:
+        logger.warning(f"行权限：SQL 序列化失败: {e}")
+        return None
+
+    logger.info(f"行权限：语法树注入完成，受限表: {sorted(injected_tables)}")
+    return result
+
+
+def _inject_row_filters_with_llm(sql: str, filters: List[Dict[str, str]], engine: str) -> Optional[str]:
+    """
+    使用 LLM 将权限条件注入 SQL（兜底方案，需开启 PERMISSION_LLM_FALLBACK）
+
+    Returns:
+        注入后的 SQL；LLM 返回失败或无法解析时返回 None
+    """
+    # 使用 PromptBuilder 构建权限过滤提示词
+    prompt_builder = PromptBuilder()
+
+    system_prompt, user_prompt = prompt_builder.build_permission_prompt(
+        sql=sql,
+        filters=filters,
+        engine=engine,
+        lang="简体中文",
+    )
+
+    # 构建消息列表
+    messages = [
+        SystemMessage(content=system_prompt),
+        HumanMessage(content=user_prompt),
+    ]
+
+    # 调用 LLM
+    llm = get_llm(0)
+    response = llm.invoke(messages)
+
+    # 解析响应（JSON 格式）
+    response_content = response.content.strip()
+
+    # 清理 JSON 字符串（移除可能的 markdown 代码块标记）
+    if "```json" in response_content:
+        response_content = response_content.split("```json")[1]
+    if "```" in response_content:
+        response_content = response_content.split("```")[0]
+    response_content = response_content.strip()
+
+    # 解析 JSON
+    try:
+        result = json.loads(response_content)
+    except json.JSONDecodeError as e:
+        logger.error(f"解析 LLM 响应 JSON 失败: {e}")
+        logger.error(f"响应内容: {response_content[:500]}")
+        return None
+
+    if not result.get("success", True):
+        logger.warning(f"LLM 权限过滤失败: {result.get('message', '无法注入权限过滤条件')}")
+        return None
+    return result.get("sql", sql)
+
 
 def _apply_column_permissions_to_sql(
     sql: str,
@@ -44,12 +176,13 @@ def _apply_column_permissions_to_sql(
         return sql
 
     # 使用数据库类型到 sqlglot 方言的映射，确保所有数据源类型都能正确解析
-    dialect = DB_TYPE_TO_DIALECT.get(db_type.lower() if db_type else "mysql", "mysql")
-    try:
-        expressions = parse(sql, read=dialect)
-    except Exception as e:
-        logger.warning(f"列权限：SQL 解析失败，跳过列过滤: {e}")
+    analysis = get_sql_analysis(sql, db_type)
+    if analysis.error:
+        logger.warning(f"列权限：SQL 解析失败，跳过列过滤: {analysis.error}")
         return sql
+    dialect = analysis.dialect
+    # 解析结果在节点间共享，在副本上改写
+    expressions = analysis.copy_expressions()
 
     # 反向映射：table_name -> alias（可能为空）
     table_to_alias = {v: k for k, v in (alias_to_table or {}).items()}
@@ -109,7 +242,7 @@ def _apply_column_permissions_to_sql(
 
     try:
         # 使用相同的方言映射进行序列化
-        return "; ".join([e.sql(dialect=dialect) for e in expressions if e])
+        return register_rewritten_sql(expressions, dialect).sql
     except Exception:
         # 序列化失败，回退原 SQL
         return sql
@@ -119,7 +252,7 @@ def permission_filter_injector(state: AgentState) -> AgentState:
     """
     权限过滤注入节点
     1. 获取用户的权限过滤条件
-    2. 使用 LLM 将权限条件注入 SQL
+    2. 基于语法树将权限条件注入 SQL（可选 LLM 兜底）
     3. 返回过滤后的 SQL
     
     Args:
@@ -156,17 +289,24 @@ def permission_filter_injector(state: AgentState) -> AgentState:
         
         logger.info(f"开始权限过滤：datasource_id={datasource_id}, user_id={user_id}, user_id类型={type(user_id)}")
         
-        # 获取数据源信息
-        with pool.get_session() as session:
-            datasource = DatasourceService.get_datasource_by_id(session, datasource_id)
-            if not datasource:
-                logger.warning(f"数据源不存在: {datasource_id}")
-                return state
-            
-            db_type = datasource.type or "mysql"
+        # 获取数据源类型：优先使用 state 中的类型，没有时查询数据源信息
+        db_type = state.get("db_type")
+        if not db_type:
+            with pool.get_session() as session:
+                datasource = DatasourceService.get_datasource_by_id(session, datasource_id)
+                if not datasource:
+                    logger.warning(f"数据源不存在: {datasource_id}")
+                    return state
+
+                db_type = datasource.type or "mysql"
+            state["db_type"] = db_type
         
         # 获取数据库引擎信息
         engine = get_database_engine_info(db_type)
+
+        # 生成的 SQL 只解析一次，表名、别名及后续节点（数据渲染）都使用同一个解析结果
+        sql_analysis = get_sql_analysis(generated_sql, db_type)
+        state["sql_analysis"] = sql_analysis
         
         # 获取表名列表：优先使用 state 中的 used_tables，如果为空则从 SQL 中提取
         table_names: Optional[List[str]] = state.get("used_tables")
@@ -174,7 +314,7 @@ def permission_filter_injector(state: AgentState) -> AgentState:
         if not table_names:
             # 从 SQL 中提取表名
             logger.info("state 中没有 used_tables，尝试从 SQL 中提取表名")
-            table_names = extract_table_names_sqlglot(generated_sql, db_type)
+            table_names = list(sql_analysis.tables)
             if table_names:
                 logger.info(f"从 SQL 中提取到表名: {table_names}")
             else:
@@ -184,18 +324,17 @@ def permission_filter_injector(state: AgentState) -> AgentState:
             logger.info(f"使用 state 中的表名: {table_names}")
 
         # 提取 SQL 中的表别名映射，并构建 table_name -> alias 映射
-        # data_render_antv.extract_table_alias_mapping 返回的是 {alias: table_name}
-        alias_to_table = extract_table_alias_mapping(generated_sql, db_type)
+        # sql_analysis.alias_mapping 是 {alias: table_name}
+        alias_to_table = sql_analysis.alias_mapping
         table_to_alias: Dict[str, str] = {v: k for k, v in (alias_to_table or {}).items() if v and k}
         if table_to_alias:
             logger.info(f"SQL 表别名映射(table->alias): {table_to_alias}")
         
-        # 获取权限过滤条件
+        # 获取权限过滤条件（字段以真实表名限定，由语法树注入时包装为子查询）
         filters = get_user_permission_filters(
             datasource_id=datasource_id,
             user_id=user_id,
             table_names=table_names,
-            table_alias_map=table_to_alias,
         )
         
         logger.info(f"获取到权限过滤条件数量: {len(filters) if filters else 0}")
@@ -224,76 +363,39 @@ def permission_filter_injector(state: AgentState) -> AgentState:
             state["filtered_sql"] = final_sql
             return state
         
-        # 使用 PromptBuilder 构建权限过滤提示词
-        prompt_builder = PromptBuilder()
-        
-        system_prompt, user_prompt = prompt_builder.build_permission_prompt(
-            sql=generated_sql,
-            filters=filters,
-            engine=engine,
-            lang="简体中文",
-        )
-        
-        # 构建消息列表
-        messages = [
-            SystemMessage(content=system_prompt),
-            HumanMessage(content=user_prompt),
-        ]
+        filtered_sql = _inject_row_filters_to_sql(generated_sql, db_type, filters)
         
-        # 调用 LLM
-        llm = get_llm(0)
-        response = llm.invoke(messages)
-        
-        # 解析响应（JSON 格式）
-        response_content = response.content.strip()
-        
-        # 清理 JSON 字符串（移除可能的 markdown 代码块标记）
-        if "```json" in response_content:
-            response_content = response_content.split("```json")[1]
-        if "```" in response_content:
-            response_content = response_content.split("```")[0]
-        response_content = response_content.strip()
+        if filtered_sql is None and PERMISSION_LLM_FALLBACK:
+            logger.info("语法树注入失败，回退到 LLM 注入权限条件")
+            # LLM 改写时条件字段优先使用 SQL 中的别名，避免 Unknown column 'table.col'
+            llm_filters = get_user_permission_filters(
+                datasource_id=datasource_id,
+                user_id=user_id,
+                table_names=table_names,
+                table_alias_map=table_to_alias,
+            )
+            filtered_sql = _inject_row_filters_with_llm(generated_sql, llm_filters, engine)
         
-        # 解析 JSON
-        try:
-            result = json.loads(response_content)
-            
-            if result.get("success", True):
-                filtered_sql = result.get("sql", generated_sql)
-                # 对注入后的 SQL 应用列权限过滤
-                filtered_sql = _apply_column_permissions_to_sql(
-                    filtered_sql, db_type, column_allowed, alias_to_table
-                )
-                state["filtered_sql"] = filtered_sql
-                logger.info(f"权限过滤成功，原始SQL: {generated_sql[:100]}...")
-                logger.info(f"过滤后SQL: {filtered_sql[:100]}...")
-            else:
-                error_message = result.get("message", "无法注入权限过滤条件")
-                logger.warning(f"权限过滤失败: {error_message}")
-                # 如果权限过滤失败，使用原始SQL
-                final_sql = _apply_column_permissions_to_sql(
-                    generated_sql, db_type, column_allowed, alias_to_table
-                )
-                state["filtered_sql"] = final_sql
-                
-        except json.JSONDecodeError as e:
-            logger.error(f"解析 LLM 响应 JSON 失败: {e}")
-            logger.error(f"响应内容: {response_content[:500]}")
-            # 如果解析失败，使用原始SQL
-            final_sql = _apply_column_permissions_to_sql(
-                generated_sql, db_type, column_allowed, alias_to_table
+        if filtered_sql is not None:
+            # 对注入后的 SQL 应用列权限过滤
+            filtered_sql = _apply_column_permissions_to_sql(
+                filtered_sql, db_type, column_allowed, alias_to_table
             )
-            state["filtered_sql"] = final_sql
+            state["filtered_sql"] = filtered_sql
+            logger.info(f"权限过滤成功，原始SQL: {generated_sql[:100]}...")
+            logger.info(f"过滤后SQL: {filtered_sql[:100]}...")
+        else:
+            # 存在行权限条件但无法注入时拒绝执行，不能回退到未加行权限的原始 SQL
+            logger.warning("权限过滤失败: 无法注入行权限过滤条件，拒绝执行该查询")
+            state["filtered_sql"] = None
+            state["permission_error"] = "无法为该查询应用数据权限过滤条件，已拒绝执行，请调整问题后重试"
         
     except Exception as e:
         traceback.print_exception(e)
         logger.error(f"权限过滤注入过程中发生错误: {e}", exc_info=True)
-        # 如果发生错误，使用原始SQL
-        fallback_sql = state.get("generated_sql", "No SQL query generated")
-        fallback_sql = _apply_column_permissions_to_sql(
-            fallback_sql, db_type if "db_type" in locals() else "mysql", column_allowed if "column_allowed" in locals() else {}, alias_to_table if "alias_to_table" in locals() else {}
-        )
-        state["filtered_sql"] = fallback_sql
+        # 无法确认行权限是否已生效，拒绝执行
+        state["filtered_sql"] = None
+        state["permission_error"] = "数据权限校验失败，已拒绝执行该查询"
     
     return state
 
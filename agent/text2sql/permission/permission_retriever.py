@@ -1,15 +1,22 @@
 """
 权限检索器
 获取用户的权限过滤条件
+
+每个（数据源, 用户）的权限规则只编译一次：匹配用户的行权限表达式树转换为 SQL WHERE 条件，
+列权限整理为允许字段集合，结果缓存为权限快照，在权限规则或数据源元数据变更事件到达前一直复用。
 """
 
 import json
 import logging
-from typing import List, Dict, Any, Optional
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import List, Dict, Any, Optional, Set, Tuple
 
 from sqlalchemy import and_, select
-from sqlalchemy.orm import Session
 
+from common.invalidation_bus import InvalidationTopic, subscribe
 from model.db_connection_pool import get_db_pool
 from model.db_models import TDsRules, TDsPermission
 from model.datasource_models import DatasourceTable, Datasource
@@ -19,6 +26,215 @@ from common.permission_util import is_admin
 logger = logging.getLogger(__name__)
 pool = get_db_pool()
 
+# 权限快照缓存的最大条目数（0 表示禁用缓存）
+PERMISSION_SNAPSHOT_CACHE_SIZE = int(os.getenv("PERMISSION_SNAPSHOT_CACHE_SIZE", "1024"))
+# 权限快照有效期（秒），权限变更通过失效事件即时生效，有效期只作为兜底
+PERMISSION_SNAPSHOT_TTL = int(os.getenv("PERMISSION_SNAPSHOT_TTL", "3600"))
+
+
+class PermissionSnapshot:
+    """
+    用户在某个数据源上的已编译权限（只读，多个请求共享）
+    """
+
+    __slots__ = ("db_type", "row_expression_trees", "row_filters", "column_permissions")
+
+    def __init__(
+        self,
+        db_type: str,
+        row_expression_trees: Dict[str, List[Dict[str, Any]]],
+        row_filters: Dict[str, str],
+        column_permissions: Dict[str, Set[str]],
+    ):
+        # 数据库类型
+        self.db_type = db_type
+        # 表名 -> 匹配用户的行权限表达式树（按别名重新生成条件时使用）
+        self.row_expression_trees = row_expression_trees
+        # 表名 -> 以真实表名限定字段的 SQL WHERE 条件
+        self.row_filters = row_filters
+        # 表名 -> 允许访问的字段集合（未配置列权限的表不出现）
+        self.column_permissions = column_permissions
+
+
+_EMPTY_SNAPSHOT = PermissionSnapshot("mysql", {}, {}, {})
+
+_snapshot_cache: "OrderedDict[Tuple[int, int], Tuple[PermissionSnapshot, float]]" = OrderedDict()
+_snapshot_lock = Lock()
+
+
+def _normalize_user_id(user_id) -> Optional[int]:
+    """确保 user_id 是整数，无法转换时返回 None"""
+    try:
+        return int(user_id) if not isinstance(user_id, int) else user_id
+    except (ValueError, TypeError):
+        logger.error(f"无效的 user_id: {user_id}，无法转换为整数")
+        return None
+
+
+def _load_json_list(value: Optional[str]) -> List:
+    if not value:
+        return []
+    try:
+        result = json.loads(value)
+    except Exception:
+        return []
+    return result if isinstance(result, list) else []
+
+
+def _match_user_permission_ids(rules, user_id: int) -> Set[int]:
+    """
+    汇总包含当前用户的规则所关联的权限ID
+    规则中的用户ID可能是整数或字符串，统一转换后比较
+    """
+    permission_ids: Set[int] = set()
+    for rule in rules:
+        perm_ids = _load_json_list(rule.permission_list)
+        user_ids = _load_json_list(rule.user_list)
+        if not perm_ids or not user_ids:
+            continue
+
+        user_ids_int = set()
+        for uid in user_ids:
+            try:
+                user_ids_int.add(int(uid))
+            except (ValueError, TypeError):
+                pass
+
+        if user_id in user_ids_int or str(user_id) in user_ids:
+            for perm_id in perm_ids:
+                try:
+                    permission_ids.add(int(perm_id))
+                except (ValueError, TypeError):
+                    pass
+    return permission_ids
+
+
+def _compile_permission_snapshot(datasource_id: int, user_id: int) -> PermissionSnapshot:
+    """
+    从元数据库读取规则、表和权限配置并编译为权限快照（批量查询，不再逐表查询）
+    """
+    with pool.get_session() as session:
+        # 获取数据源信息（用于获取数据库类型）
+        datasource = session.query(Datasource).filter(Datasource.id == datasource_id).first()
+        if not datasource:
+            logger.warning(f"数据源不存在: datasource_id={datasource_id}")
+            return _EMPTY_SNAPSHOT
+
+        db_type = datasource.type or "mysql"
+
+        # 获取所有规则，并计算匹配当前用户的权限ID
+        rules_stmt = select(TDsRules).where(TDsRules.enable == True)
+        rules = session.execute(rules_stmt).scalars().all()
+        matched_ids = _match_user_permission_ids(rules, user_id)
+        if not matched_ids:
+            logger.info(f"没有匹配用户的权限规则: datasource_id={datasource_id}, user_id={user_id}")
+            return PermissionSnapshot(db_type, {}, {}, {})
+
+        tables = session.execute(
+            select(DatasourceTable).where(DatasourceTable.ds_id == datasource_id)
+        ).scalars().all()
+        table_names_by_id = {table.id: table.table_name for table in tables}
+        if not table_names_by_id:
+            return PermissionSnapshot(db_type, {}, {}, {})
+
+        permissions = session.execute(
+            select(TDsPermission).where(
+                and_(
+                    TDsPermission.id.in_(matched_ids),
+                    TDsPermission.table_id.in_(list(table_names_by_id.keys())),
+                    TDsPermission.enable == True,
+                )
+            )
+        ).scalars().all()
+
+        row_expression_trees: Dict[str, List[Dict[str, Any]]] = {}
+        column_permissions: Dict[str, Set[str]] = {}
+        for permission in permissions:
+            table_name = table_names_by_id[permission.table_id]
+            if permission.type == "row":
+                if not permission.expression_tree:
+                    continue
+                try:
+                    expr_tree = json.loads(permission.expression_tree)
+                except Exception as e:
+                    logger.warning(f"解析表达式树失败: {e}, permission_id={permission.id}")
+                    continue
+                row_expression_trees.setdefault(table_name, []).append(expr_tree)
+            elif permission.type == "column":
+                # enable=false 的字段不加入 allowed_fields => 会在 SQL 中被移除
+                for field_perm in _load_json_list(permission.permissions):
+                    if isinstance(field_perm, dict) and field_perm.get("enable", False):
+                        field_name = field_perm.get("field_name")
+                        if field_name:
+                            column_permissions.setdefault(table_name, set()).add(field_name)
+
+        # 使用 trans_filter_tree 将表达式树转换为 SQL WHERE 条件
+        row_filters: Dict[str, str] = {}
+        for table_name, expression_trees in row_expression_trees.items():
+            filter_str = trans_filter_tree(
+                session=session,
+                expression_trees=expression_trees,
+                db_type=db_type,
+                table_name=table_name,
+            )
+            if filter_str:
+                row_filters[table_name] = filter_str
+
+    logger.info(
+        f"✅ 已编译权限快照: datasource_id={datasource_id}, user_id={user_id}, "
+        f"行权限表 {list(row_filters.keys())}, 列权限表 {list(column_permissions.keys())}"
+    )
+    return PermissionSnapshot(db_type, row_expression_trees, row_filters, column_permissions)
+
+
+def get_permission_snapshot(datasource_id: int, user_id: int) -> PermissionSnapshot:
+    """
+    获取用户在数据源上的权限快照（管理员返回空快照）
+
+    Args:
+        datasource_id: 数据源ID
+        user_id: 用户ID
+
+    Returns:
+        权限快照，编译失败时返回空快照（不缓存，下次重新编译）
+    """
+    key = (datasource_id, user_id)
+    with _snapshot_lock:
+        cached = _snapshot_cache.get(key)
+        if cached is not None and time.time() - cached[1] < PERMISSION_SNAPSHOT_TTL:
+            _snapshot_cache.move_to_end(key)
+            return cached[0]
+
+    if user_id and is_admin(user_id):
+        snapshot = _EMPTY_SNAPSHOT
+    else:
+        try:
+            snapshot = _compile_permission_snapshot(datasource_id, user_id)
+        except Exception as e:
+            logger.error(f"编译用户权限失败: {e}", exc_info=True)
+            return _EMPTY_SNAPSHOT
+
+    if PERMISSION_SNAPSHOT_CACHE_SIZE > 0:
+        with _snapshot_lock:
+            _snapshot_cache[key] = (snapshot, time.time())
+            _snapshot_cache.move_to_end(key)
+            while len(_snapshot_cache) > PERMISSION_SNAPSHOT_CACHE_SIZE:
+                _snapshot_cache.popitem(last=False)
+    return snapshot
+
+
+def invalidate_permission_snapshots(datasource_id: Optional[int] = None):
+    """
+    使权限快照失效
+    :param datasource_id: 数据源ID，为 None 时清空全部
+    """
+    with _snapshot_lock:
+        if datasource_id is None:
+            _snapshot_cache.clear()
+        else:
+            for key in [key for key in _snapshot_cache if key[0] == datasource_id]:
+                _snapshot_cache.pop(key, None)
+
 
 def get_user_permission_filters(
     datasource_id: int,
@@ -28,171 +244,59 @@ def get_user_permission_filters(
 ) -> List[Dict[str, str]]:
     """
     获取用户的权限过滤条件（行级权限）
-    
+
     Args:
         datasource_id: 数据源ID
         user_id: 用户ID（管理员不应用权限过滤）
         table_names: 表名列表（可选，如果为None则获取所有表的权限）
         table_alias_map: 表名到别名的映射（可选）。如果提供，将在生成过滤条件时优先使用别名，
             以适配 SQL 中使用了 FROM/JOIN 别名的场景，避免 Unknown column 'table.col'。
-    
+
     Returns:
         权限过滤条件列表，格式为 [{"table": "表名", "filter": "SQL WHERE条件字符串"}, ...]
         如果用户是管理员或没有权限，返回空列表
     """
-    # 确保 user_id 是整数
-    try:
-        user_id = int(user_id) if not isinstance(user_id, int) else user_id
-    except (ValueError, TypeError):
-        logger.error(f"无效的 user_id: {user_id}，无法转换为整数")
+    user_id = _normalize_user_id(user_id)
+    if user_id is None:
         return []
-    
-    # 管理员不应用权限过滤
-    if user_id and is_admin(user_id):
-        logger.info(f"用户ID {user_id} 是管理员，跳过权限过滤")
+
+    snapshot = get_permission_snapshot(datasource_id, user_id)
+    if not snapshot.row_filters:
         return []
-    
+
+    wanted = set(table_names) if table_names else None
+    filters = []
+    aliased = {
+        table_name: alias
+        for table_name, alias in (table_alias_map or {}).items()
+        if alias and alias != table_name and table_name in snapshot.row_expression_trees
+    }
     try:
-        with pool.get_session() as session:
-            filters = []
-            
-            # 获取数据源信息（用于获取数据库类型）
-            datasource = session.query(Datasource).filter(Datasource.id == datasource_id).first()
-            if not datasource:
-                logger.warning(f"数据源不存在: datasource_id={datasource_id}")
-                return []
-            
-            db_type = datasource.type or "mysql"
-            
-            # 获取所有规则
-            rules_stmt = select(TDsRules).where(TDsRules.enable == True)
-            rules = session.execute(rules_stmt).scalars().all()
-            
-            if not rules:
-                logger.warning(f"没有启用的规则，无法匹配权限。datasource_id={datasource_id}, user_id={user_id}")
-                return []
-            
-            logger.info(f"找到 {len(rules)} 个启用的规则")
-            
-            # 获取表信息
-            if table_names:
-                tables_stmt = select(DatasourceTable).where(
-                    and_(
-                        DatasourceTable.ds_id == datasource_id,
-                        DatasourceTable.table_name.in_(table_names)
-                    )
-                )
-            else:
-                tables_stmt = select(DatasourceTable).where(
-                    DatasourceTable.ds_id == datasource_id
-                )
-            
-            tables = session.execute(tables_stmt).scalars().all()
-            
-            if not tables:
-                logger.warning(f"没有找到表信息。datasource_id={datasource_id}, table_names={table_names}")
-                return []
-            
-            logger.info(f"找到 {len(tables)} 张表需要检查权限")
-            
-            # 对每个表获取权限过滤条件
-            for table in tables:
-                # 查询该表的行权限
-                permissions_stmt = select(TDsPermission).where(
-                    and_(
-                        TDsPermission.table_id == table.id,
-                        TDsPermission.type == 'row',
-                        TDsPermission.enable == True
-                    )
-                )
-                row_permissions = session.execute(permissions_stmt).scalars().all()
-                
-                if not row_permissions:
-                    logger.debug(f"表 {table.table_name} 没有行权限配置")
-                    continue
-                
-                logger.info(f"表 {table.table_name} 找到 {len(row_permissions)} 个行权限: {[p.id for p in row_permissions]}")
-                
-                # 检查权限是否与用户匹配（通过规则）
-                matching_permissions = []
-                for permission in row_permissions:
-                    # 检查权限是否在某个规则中，且该规则包含当前用户
-                    matched = False
-                    for rule in rules:
-                        perm_ids = []
-                        if rule.permission_list:
-                            try:
-                                perm_ids = json.loads(rule.permission_list)
-                            except:
-                                pass
-                        
-                        user_ids = []
-                        if rule.user_list:
-                            try:
-                                user_ids = json.loads(rule.user_list)
-                            except:
-                                pass
-                        
-                        # 检查权限ID和用户ID是否匹配
-                        if perm_ids and user_ids:
-                            # 用户ID可能是整数或字符串，需要统一处理
-                            # 将 user_ids 列表中的元素转换为整数进行比较
-                            user_ids_int = []
-                            for uid in user_ids:
-                                try:
-                                    user_ids_int.append(int(uid))
-                                except (ValueError, TypeError):
-                                    pass
-                            
-                            # 检查权限ID和用户ID是否匹配
-                            if permission.id in perm_ids and (user_id in user_ids_int or user_id in user_ids or str(user_id) in user_ids):
-                                matching_permissions.append(permission)
-                                matched = True
-                                logger.info(f"✅ 权限 {permission.id} ({permission.name}) 通过规则 {rule.id} 匹配用户 {user_id} (规则中的用户列表: {user_ids})")
-                                break
-                    
-                    if not matched:
-                        logger.debug(f"权限 {permission.id} ({permission.name}) 未匹配到任何规则（需要创建规则关联权限ID和用户ID）")
-                
-                # 如果有匹配的权限，构建过滤条件
-                if matching_permissions:
-                    logger.info(f"表 {table.table_name} 有 {len(matching_permissions)} 个匹配的权限: {[p.id for p in matching_permissions]}")
-                    # 收集所有表达式树
-                    expression_trees = []
-                    for perm in matching_permissions:
-                        if perm.expression_tree:
-                            try:
-                                expr_tree = json.loads(perm.expression_tree)
-                                expression_trees.append(expr_tree)
-                            except Exception as e:
-                                logger.warning(f"解析表达式树失败: {e}, permission_id={perm.id}")
-                                continue
-                    
-                    if expression_trees:
-                        # 使用 trans_filter_tree 将表达式树转换为 SQL WHERE 条件
-                        # 如果 SQL 中存在该表的别名，使用别名生成条件，避免引用真实表名导致字段找不到
-                        effective_table_name = (
-                            (table_alias_map or {}).get(table.table_name) or table.table_name
-                        )
+        if aliased:
+            # 别名场景需要以别名重新生成条件（仅 LLM 改写回退时使用）
+            with pool.get_session() as session:
+                for table_name, filter_str in snapshot.row_filters.items():
+                    if wanted is not None and table_name not in wanted:
+                        continue
+                    if table_name in aliased:
                         filter_str = trans_filter_tree(
                             session=session,
-                            expression_trees=expression_trees,
-                            db_type=db_type,
-                            table_name=effective_table_name,
+                            expression_trees=snapshot.row_expression_trees[table_name],
+                            db_type=snapshot.db_type,
+                            table_name=aliased[table_name],
                         )
-                        
-                        if filter_str:
-                            filters.append({
-                                "table": table.table_name,
-                                "filter": filter_str  # SQL WHERE 条件字符串
-                            })
-            
-            return filters
-            
+                    if filter_str:
+                        filters.append({"table": table_name, "filter": filter_str})
+        else:
+            for table_name, filter_str in snapshot.row_filters.items():
+                if wanted is None or table_name in wanted:
+                    filters.append({"table": table_name, "filter": filter_str})
     except Exception as e:
         logger.error(f"获取用户权限过滤条件失败: {e}", exc_info=True)
         return []
 
+    return filters
+
 
 def get_user_column_permissions(
     datasource_id: int,
@@ -210,112 +314,20 @@ def get_user_column_permissions(
     Returns:
         { "table_name": {"col1", "col2", ...}, ... }
     """
-    # 确保 user_id 是整数
-    try:
-        user_id = int(user_id) if not isinstance(user_id, int) else user_id
-    except (ValueError, TypeError):
-        logger.error(f"无效的 user_id: {user_id}，无法转换为整数")
+    user_id = _normalize_user_id(user_id)
+    if user_id is None:
         return {}
 
-    if user_id and is_admin(user_id):
-        return {}
-
-    try:
-        with pool.get_session() as session:
-            # 获取所有规则
-            rules_stmt = select(TDsRules).where(TDsRules.enable == True)
-            rules = session.execute(rules_stmt).scalars().all()
-            if not rules:
-                return {}
-
-            # 获取表信息
-            if table_names:
-                tables_stmt = select(DatasourceTable).where(
-                    and_(
-                        DatasourceTable.ds_id == datasource_id,
-                        DatasourceTable.table_name.in_(table_names),
-                    )
-                )
-            else:
-                tables_stmt = select(DatasourceTable).where(DatasourceTable.ds_id == datasource_id)
-
-            tables = session.execute(tables_stmt).scalars().all()
-            if not tables:
-                return {}
-
-            table_allowed_fields: Dict[str, set] = {}
-
-            for table in tables:
-                permissions_stmt = select(TDsPermission).where(
-                    and_(
-                        TDsPermission.table_id == table.id,
-                        TDsPermission.type == "column",
-                        TDsPermission.enable == True,
-                    )
-                )
-                column_permissions = session.execute(permissions_stmt).scalars().all()
-                if not column_permissions:
-                    continue
-
-                # 匹配规则（同 row 权限逻辑）
-                matching_permissions = []
-                for permission in column_permissions:
-                    matched = False
-                    for rule in rules:
-                        perm_ids = []
-                        if rule.permission_list:
-                            try:
-                                perm_ids = json.loads(rule.permission_list)
-                            except Exception:
-                                perm_ids = []
-
-                        user_ids = []
-                        if rule.user_list:
-                            try:
-                                user_ids = json.loads(rule.user_list)
-                            except Exception:
-                                user_ids = []
-
-                        if perm_ids and user_ids:
-                            user_ids_int = []
-                            for uid in user_ids:
-                                try:
-                                    user_ids_int.append(int(uid))
-                                except (ValueError, TypeError):
-                                    pass
-                            if permission.id in perm_ids and (
-                                user_id in user_ids_int or user_id in user_ids or str(user_id) in user_ids
-                            ):
-                                matching_permissions.append(permission)
-                                matched = True
-                                break
-                    if not matched:
-                        continue
+    snapshot = get_permission_snapshot(datasource_id, user_id)
+    wanted = set(table_names) if table_names else None
+    # 返回集合副本，快照在请求间共享
+    return {
+        table_name: set(fields)
+        for table_name, fields in snapshot.column_permissions.items()
+        if wanted is None or table_name in wanted
+    }
 
-                if not matching_permissions:
-                    continue
-
-                allowed_fields: set = set()
-                for perm in matching_permissions:
-                    if not perm.permissions:
-                        continue
-                    try:
-                        perm_config = json.loads(perm.permissions)
-                    except Exception:
-                        continue
-                    if isinstance(perm_config, list):
-                        for field_perm in perm_config:
-                            # enable=false 的字段不加入 allowed_fields => 会在 SQL 中被移除
-                            if field_perm.get("enable", False):
-                                field_name = field_perm.get("field_name")
-                                if field_name:
-                                    allowed_fields.add(field_name)
-
-                if allowed_fields:
-                    table_allowed_fields[table.table_name] = allowed_fields
-
-            return table_allowed_fields
-    except Exception as e:
-        logger.error(f"获取用户列权限失败: {e}", exc_info=True)
-        return {}
 
+# 权限规则或用户角色变更影响所有快照；数据源表/字段变更只影响该数据源（表名、字段名可能变化）
+subscribe(InvalidationTopic.PERMISSION, lambda event: invalidate_permission_snapshots(event.get("ds_id")))
+subscribe(InvalidationTopic.DATASOURCE, lambda event: invalidate_permission_snapshots(event.get("ds_id")))
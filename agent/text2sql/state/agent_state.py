@@ -11,6 +11,7 @@ class ExecutionResult(BaseModel):
     success: bool
     data: Optional[List[Dict[str, Any]]] = None  # 执行结果
     error: Optional[str] = None
+    truncated: bool = False  # 结果是否因超出行数/字节预算被截断
 
 
 class AgentState(TypedDict):
@@ -30,8 +31,11 @@ class AgentState(TypedDict):
     chart_config: Optional[Dict[str, Any]]  # 图表配置（AntV 格式）
     render_data: Optional[Dict[str, Any]]  # 渲染数据(包含 columns 和 data)
     datasource_id: Optional[int]  # 数据源ID
+    db_type: Optional[str]  # 数据源类型（由 schema_inspector 写入，后续节点不再查询元数据库）
     user_id: Optional[int]  # 用户ID（用于权限过滤）
     filtered_sql: Optional[str]  # 权限过滤后的SQL
+    permission_error: Optional[str]  # 行权限条件无法注入时的错误信息（设置后不再执行 SQL）
+    sql_analysis: Optional[Any]  # 生成 SQL 的解析结果（SqlAnalysis，节点间共享，只读）
     recommended_questions: Optional[List[str]]  # 推荐问题列表
     used_tables: Optional[List[str]]  # SQL 使用的表名列表
     bm25_tokens: Optional[List[str]]  # BM25 对用户问题的分词结果
@@ -8,8 +8,9 @@ from typing import Any, Dict, Optional, Union
 
 from langgraph.graph.state import CompiledStateGraph
 
-from agent.text2sql.analysis.graph import create_graph
+from agent.text2sql.analysis.graph import get_graph
 from agent.text2sql.state.agent_state import AgentState
+from common.sse_writer import sse_frame
 from constants.code_enum import DataTypeEnum, IntentEnum
 from services.user_service import add_user_record, decode_jwt_token
 
@@ -127,7 +128,7 @@ class Text2SqlAgent:
                             initial_state["datasource_id"] = (
                                 None  # 清空 datasource_id，让流程进入 error_handler
                             )
-            graph: CompiledStateGraph = create_graph(datasource_id)
+            graph: CompiledStateGraph = get_graph(datasource_id)
 
             # 标识对话状态
             task_context = {"cancelled": False}
@@ -595,6 +596,9 @@ class Text2SqlAgent:
             # ExecutionResult 为 pydantic BaseModel，直接访问属性
             success = getattr(execution_result, "success", False)
             if success:
+                if getattr(execution_result, "truncated", False):
+                    rows = len(getattr(execution_result, "data", None) or [])
+                    return f"执行sql语句成功（结果过大，仅返回前 {rows} 条记录）"
                 return "执行sql语句成功"
 
             raw_error = getattr(execution_result, "error", "") or ""
@@ -752,7 +756,7 @@ class Text2SqlAgent:
                 "dataType": DataTypeEnum.STEP_PROGRESS.value[0],
             }
             await response.write(
-                "data:" + json.dumps(formatted_message, ensure_ascii=False) + "\n\n"
+                sse_frame(formatted_message)
             )
 
     @staticmethod
@@ -783,7 +787,7 @@ class Text2SqlAgent:
                 formatted_message = {"data": content, "dataType": data_type}
 
             await response.write(
-                "data:" + json.dumps(formatted_message, ensure_ascii=False) + "\n\n"
+                sse_frame(formatted_message)
             )
 
     @staticmethod
@@ -799,7 +803,7 @@ class Text2SqlAgent:
             "data": {"messageType": message_type, "content": content},
             "dataType": data_type,
         }
-        return "data:" + json.dumps(res, ensure_ascii=False) + "\n\n"
+        return sse_frame(res)
 
     async def cancel_task(self, task_id: str) -> bool:
         """
@@ -0,0 +1,153 @@
+"""
+规则图表推荐
+根据结果列的角色（时间、类别、数值、标识）和基数为常见的结果形态直接生成图表配置，无需调用 LLM：
+    时间 + 单指标（可带一个低基数类别）      -> line
+    单类别 + 单指标                          -> column / bar（类别较多时） / pie（占比类问题）
+    两个类别 + 单指标                        -> column（基数较低的类别作为 series）
+    单行结果、无数值指标、明确要求表格        -> table
+多指标、多个时间列、高基数标识列等无法确定的形态返回 None，由 LLM 生成配置。
+生成的配置格式与 LLM 输出一致（见 template.yaml 中 chart 模板）。
+"""
+
+import logging
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from common.result_profiler import ColumnRole, infer_column_roles, to_dataframe
+
+logger = logging.getLogger(__name__)
+
+# 是否启用规则图表推荐
+CHART_RULE_ENABLED = os.getenv("CHART_RULE_ENABLED", "true").lower() == "true"
+# 饼图的最大扇区数
+PIE_MAX_SLICES = int(os.getenv("CHART_PIE_MAX_SLICES", "8"))
+# 柱状图的最大类别数，超过后使用条形图
+COLUMN_MAX_CATEGORIES = int(os.getenv("CHART_COLUMN_MAX_CATEGORIES", "12"))
+# 条形图的最大类别数，超过后使用表格
+BAR_MAX_CATEGORIES = int(os.getenv("CHART_BAR_MAX_CATEGORIES", "50"))
+# 分类（series）字段的最大基数
+SERIES_MAX_CATEGORIES = int(os.getenv("CHART_SERIES_MAX_CATEGORIES", "10"))
+
+SUPPORTED_CHART_TYPES = ("table", "column", "bar", "line", "pie")
+
+# 问题中表示占比的关键词
+_SHARE_KEYWORDS = ("占比", "比例", "比重", "构成", "份额", "饼图")
+
+
+def _column_labels(columns: Sequence[str], db_info: Optional[Dict[str, Dict]]) -> Dict[str, str]:
+    """从表结构中查找列注释作为显示名称，找不到时使用列名"""
+    comments: Dict[str, str] = {}
+    for table_info in (db_info or {}).values():
+        for col_name, col_info in (table_info.get("columns") or {}).items():
+            comment = (col_info or {}).get("comment") if isinstance(col_info, dict) else None
+            if comment:
+                comments.setdefault(str(col_name).lower(), str(comment))
+    return {column: comments.get(str(column).lower(), str(column)) for column in columns}
+
+
+def _title(question: str) -> str:
+    title = (question or "").strip().rstrip("？?。.")
+    return title[:30] if title else "查询结果"
+
+
+def _field(column: str, labels: Dict[str, str]) -> Dict[str, str]:
+    return {"name": labels[column], "value": str(column).lower()}
+
+
+def _axis_config(
+    chart_type: str, title: str, labels: Dict[str, str], y: str, x: Optional[str] = None, series: Optional[str] = None
+) -> Dict[str, Any]:
+    axis = {"y": _field(y, labels)}
+    if x is not None:
+        axis["x"] = _field(x, labels)
+    if series is not None:
+        axis["series"] = _field(series, labels)
+    return {"type": chart_type, "title": title, "axis": axis}
+
+
+def _table_config(columns: List[str], title: str, labels: Dict[str, str]) -> Dict[str, Any]:
+    return {"type": "table", "title": title, "columns": [_field(column, labels) for column in columns]}
+
+
+def recommend_chart(
+    rows: Sequence[Dict[str, Any]],
+    chart_type: Optional[str] = None,
+    question: str = "",
+    db_info: Optional[Dict[str, Dict]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    按结果形态推荐图表配置
+
+    :param rows: 结果行
+    :param chart_type: SQL 生成阶段推荐的图表类型（table/column/bar/line/pie，可为空）
+    :param question: 用户问题（用于标题和占比类问题判断）
+    :param db_info: 表结构信息（用于字段显示名称）
+    :return: 图表配置，形态不明确时返回 None（交由 LLM 生成）
+    """
+    if not CHART_RULE_ENABLED or not rows:
+        return None
+
+    df = to_dataframe(rows)
+    if df.empty or not len(df.columns):
+        return None
+
+    columns = list(df.columns)
+    roles = infer_column_roles(df)
+    labels = _column_labels(columns, db_info)
+    title = _title(question)
+    hint = (chart_type or "").strip().lower()
+    if hint not in SUPPORTED_CHART_TYPES:
+        hint = ""
+
+    temporal = [c for c in columns if roles[c] == ColumnRole.TEMPORAL]
+    measures = [c for c in columns if roles[c] == ColumnRole.NUMERIC]
+    dimensions = [c for c in columns if roles[c] in (ColumnRole.CATEGORICAL, ColumnRole.BOOLEAN)]
+    others = [c for c in columns if roles[c] in (ColumnRole.IDENTIFIER, ColumnRole.TEXT)]
+
+    # 明细查询、单行结果（指标卡）或没有数值指标时使用表格
+    if hint == "table" or len(df) == 1 or not measures:
+        return _table_config(columns, title, labels)
+
+    # 多个指标需要按问题选择值轴，标识/文本列通常意味着明细数据，交由 LLM 判断
+    if len(measures) != 1 or others:
+        return None
+    measure = measures[0]
+    cardinality = {c: int(df[c].nunique(dropna=True)) for c in temporal + dimensions}
+
+    # 时间趋势
+    if len(temporal) == 1 and len(dimensions) <= 1:
+        series = dimensions[0] if dimensions else None
+        if series is not None and cardinality[series] > SERIES_MAX_CATEGORIES:
+            return None
+        if hint == "pie":
+            return None
+        return _axis_config(hint or "line", title, labels, measure, x=temporal[0], series=series)
+
+    if temporal:
+        return None
+
+    # 单维度对比 / 占比
+    if len(dimensions) == 1:
+        dimension = dimensions[0]
+        categories = cardinality[dimension]
+        wants_share = any(keyword in (question or "") for keyword in _SHARE_KEYWORDS)
+        if hint == "pie" or (not hint and wants_share and categories <= PIE_MAX_SLICES):
+            if categories > BAR_MAX_CATEGORIES:
+                return None
+            return _axis_config("pie", title, labels, measure, series=dimension)
+        if hint in ("column", "bar", "line"):
+            return _axis_config(hint, title, labels, measure, x=dimension)
+        if categories <= COLUMN_MAX_CATEGORIES:
+            return _axis_config("column", title, labels, measure, x=dimension)
+        if categories <= BAR_MAX_CATEGORIES:
+            return _axis_config("bar", title, labels, measure, x=dimension)
+        return _table_config(columns, title, labels)
+
+    # 双维度对比：基数较低的维度作为分类
+    if len(dimensions) == 2 and hint in ("", "column", "bar", "line"):
+        x, series = sorted(dimensions, key=lambda c: cardinality[c], reverse=True)
+        if cardinality[series] > SERIES_MAX_CATEGORIES or cardinality[x] > BAR_MAX_CATEGORIES:
+            return None
+        return _axis_config(hint or "column", title, labels, measure, x=x, series=series)
+
+    return None
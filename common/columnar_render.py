@@ -0,0 +1,86 @@
+"""
+结果集列式渲染
+数据渲染节点需要把结果取值转换为可 JSON 序列化的类型（Decimal -> float、日期时间 -> 字符串），
+并把列名替换为中文名称。这里先按列取出取值，每列只判断一次取值类型：
+不需要转换的列（整数、浮点、字符串、布尔）原样保留，类型单一的列使用专门的转换，
+其余列逐值调用 convert_value，最后按显示名称组装记录，代替逐行逐值判断类型并构造新字典。
+结果与逐行调用 convert_value 完全一致（不经过 pandas 类型推断，含 NULL 的整数列不会变为浮点数）。
+"""
+
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+DATE_FORMAT = "%Y-%m-%d"
+
+# 不需要转换的取值类型
+_PLAIN_TYPES = frozenset((int, float, str, bool, type(None)))
+
+
+def convert_value(v):
+    """转换单个取值（列类型无法统一处理时使用）"""
+    if isinstance(v, Decimal):
+        return float(v)
+    elif isinstance(v, datetime):
+        return v.strftime(DATETIME_FORMAT)
+    elif isinstance(v, date):
+        return v.strftime(DATE_FORMAT)
+    return v
+
+
+def _convert_column(values: List[Any]) -> List[Any]:
+    """按列转换取值类型"""
+    types = set(map(type, values))
+    if types <= _PLAIN_TYPES:
+        return values
+
+    types.discard(type(None))
+    if len(types) == 1:
+        kind = types.pop()
+        if kind is Decimal:
+            return [None if v is None else float(v) for v in values]
+        # isoformat 比 strftime 快数倍，输出相同（无时区、年份为 4 位时），其余情况仍使用 strftime
+        if kind is datetime:
+            return [
+                None if v is None
+                else v.isoformat(" ", "seconds") if v.tzinfo is None and v.year >= 1000
+                else v.strftime(DATETIME_FORMAT)
+                for v in values
+            ]
+        if kind is date:
+            return [
+                None if v is None else v.isoformat() if v.year >= 1000 else v.strftime(DATE_FORMAT)
+                for v in values
+            ]
+    return [convert_value(v) for v in values]
+
+
+def render_records(
+    rows: Sequence[Dict[str, Any]],
+    columns: Optional[List[str]] = None,
+    names: Optional[List[str]] = None,
+) -> Tuple[List[str], List[Dict[str, Any]]]:
+    """
+    将结果行转换为渲染用的记录：取值转换为可 JSON 序列化的类型，列名替换为显示名称
+
+    :param rows: 结果行
+    :param columns: 输出的列及顺序，默认使用第一行的列（行中缺少的列取 None）
+    :param names: 与 columns 一一对应的显示名称，默认使用原列名；
+        显示名称重复时保留最后一列的取值（与逐行构造字典的结果一致）
+    :return: (显示名称列表, 记录列表)
+    """
+    if not rows:
+        return list(names or columns or []), []
+
+    columns = list(columns) if columns is not None else list(rows[0].keys())
+    names = list(names) if names is not None else list(columns)
+
+    converted = {column: _convert_column([row.get(column) for row in rows]) for column in dict.fromkeys(columns)}
+    # 同名显示列保留最后一列的取值，位置保持第一次出现的位置（与按 zip 顺序构造字典的语义一致）
+    unique_names = list(dict.fromkeys(names))
+    records = [dict(zip(names, values)) for values in zip(*(converted[column] for column in columns))]
+    return unique_names, records
@@ -2,20 +2,29 @@
 数据源工具类
 """
 
+import hashlib
 import json
 import logging
+import os
 import platform
+import time
 import urllib.parse
 from base64 import b64encode
+from collections import OrderedDict
+from contextlib import closing
 from decimal import Decimal
 from enum import Enum
-from typing import Dict, Any, List, Optional, Tuple
+from itertools import islice
+from threading import Lock
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
 
 import pymysql
 import psycopg2
 import requests
 from elasticsearch import Elasticsearch
 from sqlalchemy import create_engine, text, inspect
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import NullPool
 from sqlalchemy.exc import SQLAlchemyError
 
 # 达梦数据库驱动（可选依赖）
@@ -129,6 +138,28 @@ class DatasourceConnectionUtil:
         else:
             raise ValueError(f"不支持使用 SQLAlchemy 连接的数据源类型: {ds_type}")
 
+    @staticmethod
+    def build_engine(ds_type: str, config: Dict[str, Any], **engine_kwargs) -> Engine:
+        """
+        构建数据源 SQLAlchemy 引擎（统一处理各驱动的连接参数差异）
+        :param ds_type: 数据源类型
+        :param config: 解密后的数据源配置
+        :param engine_kwargs: 透传给 create_engine 的连接池参数
+        """
+        uri = DatasourceConnectionUtil.build_connection_uri(ds_type, config)
+        timeout = config.get("timeout", 30)
+        engine_kwargs.setdefault("pool_pre_ping", True)
+        # 注意：部分驱动（如 oracledb）不支持 connect_timeout 关键字参数
+        if ds_type == "oracle":
+            return create_engine(uri, **engine_kwargs)
+        elif ds_type == "sqlServer":
+            # SQL Server 2022 需要禁用加密以兼容 pymssql
+            # pymssql 不支持 connect_timeout，使用 login_timeout 和 timeout
+            return create_engine(
+                uri, connect_args={"timeout": timeout, "login_timeout": timeout, "encryption": "off"}, **engine_kwargs
+            )
+        return create_engine(uri, connect_args={"connect_timeout": timeout}, **engine_kwargs)
+
     @staticmethod
     def _get_extra_config(config: Dict[str, Any]) -> Dict[str, Any]:
         """解析额外的JDBC参数"""
@@ -180,20 +211,13 @@ class DatasourceConnectionUtil:
 
             if db.connect_type == ConnectType.sqlalchemy:
                 # SQLAlchemy 驱动的数据库
-                uri = DatasourceConnectionUtil.build_connection_uri(ds_type, config)
-                # 注意：部分驱动（如 oracledb）不支持 connect_timeout 关键字参数
-                if ds_type == "oracle":
-                    engine = create_engine(uri, pool_pre_ping=True)
-                elif ds_type == "sqlServer":
-                    # SQL Server 2022 需要禁用加密以兼容 pymssql
-                    # pymssql 不支持 connect_timeout，使用 login_timeout 和 timeout
-                    engine = create_engine(
-                        uri, pool_pre_ping=True, connect_args={"timeout": timeout, "login_timeout": timeout, "encryption": "off"}
-                    )
-                else:
-                    engine = create_engine(uri, pool_pre_ping=True, connect_args={"connect_timeout": timeout})
-                with engine.connect() as conn:
-                    conn.execute(text("SELECT 1"))
+                # 测试连接使用一次性引擎（不进入连接池注册表），用完即释放
+                engine = DatasourceConnectionUtil.build_engine(ds_type, config, poolclass=NullPool)
+                try:
+                    with engine.connect() as conn:
+                        conn.execute(text("SELECT 1"))
+                finally:
+                    engine.dispose()
                 return True, ""
 
             else:
@@ -373,7 +397,7 @@ class DatasourceConnectionUtil:
             raise ValueError(f"不支持的数据源类型: {ds_type}")
 
     @staticmethod
-    def get_tables(ds_type: str, config: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def get_tables(ds_type: str, config: Dict[str, Any], ds_id: Optional[int] = None) -> List[Dict[str, Any]]:
         """获取数据库表列表"""
         try:
             db = DB.get_db(ds_type)
@@ -385,17 +409,7 @@ class DatasourceConnectionUtil:
 
             if db.connect_type == ConnectType.sqlalchemy:
                 # SQLAlchemy 驱动的数据库
-                uri = DatasourceConnectionUtil.build_connection_uri(ds_type, config)
-                if ds_type == "oracle":
-                    engine = create_engine(uri, pool_pre_ping=True)
-                elif ds_type == "sqlServer":
-                    # SQL Server 2022 需要禁用加密以兼容 pymssql
-                    # pymssql 不支持 connect_timeout，使用 login_timeout 和 timeout
-                    engine = create_engine(
-                        uri, pool_pre_ping=True, connect_args={"timeout": timeout, "login_timeout": timeout, "encryption": "off"}
-                    )
-                else:
-                    engine = create_engine(uri, pool_pre_ping=True, connect_args={"connect_timeout": timeout})
+                engine = DatasourceEngineRegistry.get_engine(ds_type, config, ds_id)
                 with engine.connect() as conn:
                     result = conn.execute(text(sql), {"param": sql_param})
                     for row in result.fetchall():
@@ -658,7 +672,9 @@ class DatasourceConnectionUtil:
             raise ValueError(f"不支持的数据源类型: {ds_type}")
 
     @staticmethod
-    def get_fields(ds_type: str, config: Dict[str, Any], table_name: str) -> List[Dict[str, Any]]:
+    def get_fields(
+        ds_type: str, config: Dict[str, Any], table_name: str, ds_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
         """获取指定表的字段列表（名称/类型/注释）"""
         try:
             db = DB.get_db(ds_type)
@@ -670,17 +686,7 @@ class DatasourceConnectionUtil:
 
             if db.connect_type == ConnectType.sqlalchemy:
                 # SQLAlchemy 驱动的数据库
-                uri = DatasourceConnectionUtil.build_connection_uri(ds_type, config)
-                if ds_type == "oracle":
-                    engine = create_engine(uri, pool_pre_ping=True)
-                elif ds_type == "sqlServer":
-                    # SQL Server 2022 需要禁用加密以兼容 pymssql
-                    # pymssql 不支持 connect_timeout，使用 login_timeout 和 timeout
-                    engine = create_engine(
-                        uri, pool_pre_ping=True, connect_args={"timeout": timeout, "login_timeout": timeout, "encryption": "off"}
-                    )
-                else:
-                    engine = create_engine(uri, pool_pre_ping=True, connect_args={"connect_timeout": timeout})
+                engine = DatasourceEngineRegistry.get_engine(ds_type, config, ds_id)
                 with engine.connect() as conn:
                     result = conn.execute(text(sql), {"param1": p1, "param2": p2})
                     for idx, row in enumerate(result.fetchall()):
@@ -812,149 +818,347 @@ class DatasourceConnectionUtil:
         return value
 
     @staticmethod
-    def execute_query(ds_type: str, config: Dict[str, Any], sql: str) -> List[Dict[str, Any]]:
-        """执行SQL查询并返回结果"""
+    def _estimate_value_size(value: Any) -> int:
+        """粗略估算单个值占用的字节数（用于结果集字节预算）"""
+        if value is None:
+            return 0
+        if isinstance(value, (str, bytes, bytearray)):
+            return len(value)
+        return 16
+
+    @staticmethod
+    def _iter_cursor_batches(
+        fetchmany: Callable[[int], Any],
+        describe: Callable[[], List[str]],
+        batch_size: int,
+        convert: bool = True,
+    ) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        """
+        按批次读取游标数据并转换为字典列表
+        :param fetchmany: 游标的 fetchmany
+        :param describe: 获取列名（服务端游标在首次 fetch 后才有 description）
+        :param convert: 是否将 Decimal/日期等转换为 JSON 友好的类型
+        """
+        columns: Optional[List[str]] = None
+        while True:
+            rows = fetchmany(batch_size)
+            if columns is None:
+                columns = describe()
+            if not rows:
+                return
+            if convert:
+                process = DatasourceConnectionUtil._process_row_value
+                batch = [{col: process(row[i]) for i, col in enumerate(columns)} for row in rows]
+            else:
+                batch = [dict(zip(columns, row)) for row in rows]
+            yield columns, batch
+
+    @staticmethod
+    def iter_engine_batches(
+        engine: Engine, sql: str, batch_size: Optional[int] = None, convert: bool = True
+    ) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        """
+        使用 SQLAlchemy 服务端游标（stream_results）分批读取查询结果，
+        不支持服务端游标的方言会退化为普通游标，但仍按批次转换
+        提前结束（超出预算或异常）时作废连接而不是关闭游标：mysql+pymysql 的 SSCursor 关闭时会读完剩余结果
+        """
+        batch_size = batch_size or QueryResultBudget.FETCH_BATCH_SIZE
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, max_row_buffer=batch_size).execute(text(sql))
+            exhausted = False
+            try:
+                yield from DatasourceConnectionUtil._iter_cursor_batches(
+                    result.fetchmany, lambda: list(result.keys()), batch_size, convert
+                )
+                exhausted = True
+            finally:
+                if exhausted:
+                    result.close()
+                else:
+                    # 直接关闭底层连接丢弃未读取的结果，连接不再归还连接池
+                    conn.invalidate()
+                    try:
+                        result.close()
+                    except Exception as e:
+                        logger.debug(f"关闭已作废连接上的游标失败: {e}")
+
+    @staticmethod
+    def iter_query_batches(
+        ds_type: str, config: Dict[str, Any], sql: str, ds_id: Optional[int] = None,
+        batch_size: Optional[int] = None,
+    ) -> Iterator[Tuple[List[str], List[Dict[str, Any]]]]:
+        """
+        流式执行SQL查询，按批次返回 (列名, 行字典列表)
+        提前关闭生成器即可中断读取并释放连接
+        """
         # 移除末尾的分号
         while sql.endswith(';'):
             sql = sql[:-1]
 
-        try:
-            db = DB.get_db(ds_type)
-            timeout = config.get("timeout", 30)
-            extra_config = DatasourceConnectionUtil._get_extra_config(config)
+        batch_size = batch_size or QueryResultBudget.FETCH_BATCH_SIZE
+        db = DB.get_db(ds_type)
+        timeout = config.get("timeout", 30)
+        extra_config = DatasourceConnectionUtil._get_extra_config(config)
 
-            if db.connect_type == ConnectType.sqlalchemy:
-                # SQLAlchemy 驱动的数据库
-                uri = DatasourceConnectionUtil.build_connection_uri(ds_type, config)
-                if ds_type == "oracle":
-                    engine = create_engine(uri, pool_pre_ping=True)
-                elif ds_type == "sqlServer":
-                    # SQL Server 2022 需要禁用加密以兼容 pymssql
-                    # pymssql 不支持 connect_timeout，使用 login_timeout 和 timeout
-                    engine = create_engine(
-                        uri, pool_pre_ping=True, connect_args={"timeout": timeout, "login_timeout": timeout, "encryption": "off"}
-                    )
-                else:
-                    engine = create_engine(uri, pool_pre_ping=True, connect_args={"connect_timeout": timeout})
-                with engine.connect() as conn:
-                    result = conn.execute(text(sql))
-                    rows = result.fetchall()
-                    columns = list(result.keys())
-                    data = []
-                    for row in rows:
-                        row_dict = {}
-                        for i, col in enumerate(columns):
-                            row_dict[col] = DatasourceConnectionUtil._process_row_value(row[i])
-                        data.append(row_dict)
-                    return data
-            else:
-                # Python 原生驱动的数据库
-                host = config.get("host", "")
-                port = config.get("port", 3306)
-                username = config.get("username", "")
-                password = config.get("password", "")
-                database = config.get("database", "")
+        if db.connect_type == ConnectType.sqlalchemy:
+            # SQLAlchemy 驱动的数据库
+            engine = DatasourceEngineRegistry.get_engine(ds_type, config, ds_id)
+            yield from DatasourceConnectionUtil.iter_engine_batches(engine, sql, batch_size)
+            return
 
-                if ds_type == "dm":
-                    if dmPython is None:
-                        raise Exception("未安装达梦数据库驱动 dmPython")
-                    with dmPython.connect(user=username, password=password, server=host,
-                                          port=port, **extra_config) as conn:
-                        with conn.cursor() as cursor:
-                            cursor.execute(sql, timeout=timeout)
-                            rows = cursor.fetchall()
-                            columns = [field[0] for field in cursor.description]
-                            data = []
-                            for row in rows:
-                                row_dict = {}
-                                for i, col in enumerate(columns):
-                                    row_dict[col] = DatasourceConnectionUtil._process_row_value(row[i])
-                                data.append(row_dict)
-                            return data
+        # Python 原生驱动的数据库
+        host = config.get("host", "")
+        port = config.get("port", 3306)
+        username = config.get("username", "")
+        password = config.get("password", "")
+        database = config.get("database", "")
 
-                elif ds_type in ("doris", "starrocks"):
-                    with pymysql.connect(user=username, passwd=password, host=host,
-                                         port=port, db=database, connect_timeout=timeout,
-                                         read_timeout=timeout, **extra_config) as conn:
-                        with conn.cursor() as cursor:
-                            cursor.execute(sql)
-                            rows = cursor.fetchall()
-                            columns = [field[0] for field in cursor.description]
-                            data = []
-                            for row in rows:
-                                row_dict = {}
-                                for i, col in enumerate(columns):
-                                    row_dict[col] = DatasourceConnectionUtil._process_row_value(row[i])
-                                data.append(row_dict)
-                            return data
+        def describe(cursor) -> Callable[[], List[str]]:
+            return lambda: [field[0] for field in cursor.description or []]
+
+        if ds_type == "dm":
+            if dmPython is None:
+                raise Exception("未安装达梦数据库驱动 dmPython")
+            with dmPython.connect(user=username, password=password, server=host,
+                                  port=port, **extra_config) as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql, timeout=timeout)
+                    yield from DatasourceConnectionUtil._iter_cursor_batches(
+                        cursor.fetchmany, describe(cursor), batch_size
+                    )
 
-                elif ds_type == "redshift":
-                    if redshift_connector is None:
-                        raise Exception("未安装 redshift_connector 驱动")
-                    with redshift_connector.connect(host=host, port=port, database=database,
-                                                    user=username, password=password,
-                                                    timeout=timeout, **extra_config) as conn:
-                        with conn.cursor() as cursor:
-                            cursor.execute(sql)
-                            rows = cursor.fetchall()
-                            columns = [field[0] for field in cursor.description]
-                            data = []
-                            for row in rows:
-                                row_dict = {}
-                                for i, col in enumerate(columns):
-                                    row_dict[col] = DatasourceConnectionUtil._process_row_value(row[i])
-                                data.append(row_dict)
-                            return data
+        elif ds_type in ("doris", "starrocks"):
+            with pymysql.connect(user=username, passwd=password, host=host,
+                                 port=port, db=database, connect_timeout=timeout,
+                                 read_timeout=timeout, **extra_config) as conn:
+                # 无缓冲游标逐批读取；不使用 with 关闭游标，提前结束时由连接关闭直接丢弃剩余结果，避免读完整个结果集
+                cursor = conn.cursor(pymysql.cursors.SSCursor)
+                cursor.execute(sql)
+                yield from DatasourceConnectionUtil._iter_cursor_batches(
+                    cursor.fetchmany, describe(cursor), batch_size
+                )
 
-                elif ds_type == "kingbase":
-                    with psycopg2.connect(host=host, port=port, database=database,
-                                          user=username, password=password,
-                                          options=f"-c statement_timeout={timeout * 1000}",
-                                          **extra_config) as conn:
-                        with conn.cursor() as cursor:
-                            cursor.execute(sql)
-                            rows = cursor.fetchall()
-                            columns = [field[0] for field in cursor.description]
-                            data = []
-                            for row in rows:
-                                row_dict = {}
-                                for i, col in enumerate(columns):
-                                    row_dict[col] = DatasourceConnectionUtil._process_row_value(row[i])
-                                data.append(row_dict)
-                            return data
+        elif ds_type == "redshift":
+            if redshift_connector is None:
+                raise Exception("未安装 redshift_connector 驱动")
+            with redshift_connector.connect(host=host, port=port, database=database,
+                                            user=username, password=password,
+                                            timeout=timeout, **extra_config) as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(sql)
+                    yield from DatasourceConnectionUtil._iter_cursor_batches(
+                        cursor.fetchmany, describe(cursor), batch_size
+                    )
 
-                elif ds_type == "es":
-                    # Elasticsearch：通过 SQL API 执行查询
-                    host_url = config.get("host", "")
-                    while host_url.endswith('/'):
-                        host_url = host_url[:-1]
-                    url = f'{host_url}/_sql?format=json'
-                    response = requests.post(
-                        url,
-                        data=json.dumps({"query": sql}),
-                        headers=DatasourceConnectionUtil._get_es_auth(config),
-                        verify=False
+        elif ds_type == "kingbase":
+            with psycopg2.connect(host=host, port=port, database=database,
+                                  user=username, password=password,
+                                  options=f"-c statement_timeout={timeout * 1000}",
+                                  **extra_config) as conn:
+                # 命名游标即服务端游标，按 itersize 分批拉取
+                with conn.cursor(name="aix_query_stream") as cursor:
+                    cursor.itersize = batch_size
+                    cursor.execute(sql)
+                    yield from DatasourceConnectionUtil._iter_cursor_batches(
+                        cursor.fetchmany, describe(cursor), batch_size
                     )
-                    res = response.json()
-                    if res.get('error'):
-                        raise Exception(json.dumps(res))
-                    columns = [col.get('name') for col in res.get('columns', [])]
-                    rows = res.get('rows', [])
-                    data = []
-                    for row in rows:
-                        row_dict = {}
-                        for i, col in enumerate(columns):
-                            row_dict[col] = DatasourceConnectionUtil._process_row_value(row[i])
-                        data.append(row_dict)
-                    return data
 
-                else:
-                    raise Exception(f"不支持的数据源类型: {ds_type}")
+        elif ds_type == "es":
+            # Elasticsearch：通过 SQL API 执行查询
+            host_url = config.get("host", "")
+            while host_url.endswith('/'):
+                host_url = host_url[:-1]
+            url = f'{host_url}/_sql?format=json'
+            response = requests.post(
+                url,
+                data=json.dumps({"query": sql}),
+                headers=DatasourceConnectionUtil._get_es_auth(config),
+                verify=False
+            )
+            res = response.json()
+            if res.get('error'):
+                raise Exception(json.dumps(res))
+            columns = [col.get('name') for col in res.get('columns', [])]
+            rows = iter(res.get('rows', []))
+            yield from DatasourceConnectionUtil._iter_cursor_batches(
+                lambda size: list(islice(rows, size)), lambda: columns, batch_size
+            )
+
+        else:
+            raise Exception(f"不支持的数据源类型: {ds_type}")
 
+    @staticmethod
+    def collect_batches(
+        batches: Iterator[Tuple[List[str], List[Dict[str, Any]]]],
+        max_rows: Optional[int] = None,
+        max_bytes: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        在行数/字节预算内收集批次数据，超出预算时停止读取并关闭游标
+        :param max_rows: 最大行数，None 使用 QueryResultBudget 默认值，0 表示不限制
+        :param max_bytes: 最大字节数（估算值），None 使用默认值，0 表示不限制
+        :return: (行字典列表, 是否被截断)
+        """
+        max_rows = QueryResultBudget.MAX_ROWS if max_rows is None else max_rows
+        max_bytes = QueryResultBudget.MAX_BYTES if max_bytes is None else max_bytes
+        estimate = DatasourceConnectionUtil._estimate_value_size
+
+        data: List[Dict[str, Any]] = []
+        used_bytes = 0
+        with closing(batches):
+            for _, batch in batches:
+                for row in batch:
+                    if max_rows and len(data) >= max_rows:
+                        return data, True
+                    if max_bytes:
+                        used_bytes += sum(estimate(value) for value in row.values())
+                        # 至少保留一行，避免单行超大时结果为空
+                        if used_bytes > max_bytes and data:
+                            return data, True
+                    data.append(row)
+        return data, False
+
+    @staticmethod
+    def execute_query_bounded(
+        ds_type: str, config: Dict[str, Any], sql: str, ds_id: Optional[int] = None,
+        max_rows: Optional[int] = None, max_bytes: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        执行SQL查询，结果受行数/字节预算限制
+        :return: (行字典列表, 是否被截断)
+        """
+        try:
+            return DatasourceConnectionUtil.collect_batches(
+                DatasourceConnectionUtil.iter_query_batches(ds_type, config, sql, ds_id),
+                max_rows=max_rows,
+                max_bytes=max_bytes,
+            )
         except Exception as e:
             logger.error(f"执行查询失败: {e}")
             raise
 
+    @staticmethod
+    def execute_query(
+        ds_type: str, config: Dict[str, Any], sql: str, ds_id: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """执行SQL查询并返回结果（不限制结果大小，调用方需自行在 SQL 中限制行数）"""
+        data, _ = DatasourceConnectionUtil.execute_query_bounded(
+            ds_type, config, sql, ds_id, max_rows=0, max_bytes=0
+        )
+        return data
+
+
+class QueryResultBudget:
+    """
+    查询结果预算配置
+    Text2SQL 等场景执行的 SQL 不可控，超出预算的部分不再读取，并在执行结果中标记截断
+    """
+
+    # 最大返回行数（0 表示不限制）
+    MAX_ROWS = int(os.getenv("QUERY_RESULT_MAX_ROWS", "10000"))
+    # 最大返回字节数（按值长度估算，0 表示不限制），默认 64MB
+    MAX_BYTES = int(os.getenv("QUERY_RESULT_MAX_BYTES", str(64 * 1024 * 1024)))
+    # 服务端游标每批读取的行数
+    FETCH_BATCH_SIZE = int(os.getenv("QUERY_FETCH_BATCH_SIZE", "1000"))
+
+
+class DatasourceEngineRegistry:
+    """
+    数据源 SQLAlchemy 引擎注册表（进程级）
+    按 (数据源ID, 配置指纹) 复用 engine 及其连接池，避免每次查询都新建 TCP/TLS 连接；
+    空闲超时的 engine 自动回收，数据源编辑/删除时通过 dispose 显式释放。
+    """
+
+    # 单个数据源连接池大小
+    POOL_SIZE = int(os.getenv("DATASOURCE_POOL_SIZE", "5"))
+    # 连接池最大溢出连接数
+    MAX_OVERFLOW = int(os.getenv("DATASOURCE_POOL_MAX_OVERFLOW", "10"))
+    # 连接回收时间（秒），避免数据库端主动断开的长连接
+    POOL_RECYCLE = int(os.getenv("DATASOURCE_POOL_RECYCLE", "1800"))
+    # 连接池等待超时时间（秒）
+    POOL_TIMEOUT = int(os.getenv("DATASOURCE_POOL_TIMEOUT", "30"))
+    # engine 空闲回收时间（秒）
+    IDLE_TTL = int(os.getenv("DATASOURCE_ENGINE_IDLE_TTL", "1800"))
+    # 最多保留的 engine 数量，超出时按最近最少使用淘汰
+    MAX_ENGINES = int(os.getenv("DATASOURCE_ENGINE_MAX", "64"))
+
+    _engines: "OrderedDict[Tuple[Optional[int], str], Tuple[Engine, float]]" = OrderedDict()
+    _lock = Lock()
+
+    @staticmethod
+    def fingerprint(ds_type: str, config: Dict[str, Any]) -> str:
+        """计算数据源配置指纹，配置变化后自动对应新的 engine"""
+        raw = json.dumps({"type": ds_type, "config": config}, sort_keys=True, default=str)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def get_engine(cls, ds_type: str, config: Dict[str, Any], ds_id: Optional[int] = None) -> Engine:
+        """
+        获取（或创建）数据源对应的 engine
+        :param ds_type: 数据源类型（仅支持 SQLAlchemy 驱动的类型）
+        :param config: 解密后的数据源配置
+        :param ds_id: 数据源ID，未入库的临时配置（如新建数据源时预览表）传 None
+        """
+        key = (ds_id, cls.fingerprint(ds_type, config))
+        expired: List[Engine] = []
+        with cls._lock:
+            now = time.time()
+            entry = cls._engines.get(key)
+            if entry:
+                engine = entry[0]
+                cls._engines[key] = (engine, now)
+                cls._engines.move_to_end(key)
+            else:
+                engine = DatasourceConnectionUtil.build_engine(
+                    ds_type,
+                    config,
+                    pool_size=cls.POOL_SIZE,
+                    max_overflow=cls.MAX_OVERFLOW,
+                    pool_recycle=cls.POOL_RECYCLE,
+                    pool_timeout=cls.POOL_TIMEOUT,
+                )
+                cls._engines[key] = (engine, now)
+                logger.info(f"创建数据源连接池: ds_id={ds_id}, type={ds_type}")
+
+            # 回收空闲超时的 engine
+            for other_key, (other_engine, last_used) in list(cls._engines.items()):
+                if other_key != key and now - last_used > cls.IDLE_TTL:
+                    expired.append(cls._engines.pop(other_key)[0])
+            # 超出数量上限时淘汰最久未使用的 engine
+            while len(cls._engines) > cls.MAX_ENGINES:
+                oldest_key = next(iter(cls._engines))
+                if oldest_key == key:
+                    break
+                expired.append(cls._engines.pop(oldest_key)[0])
+
+        for old_engine in expired:
+            old_engine.dispose()
+        return engine
+
+    @classmethod
+    def dispose(cls, ds_id: int) -> int:
+        """
+        释放指定数据源的所有 engine（数据源编辑或删除时调用）
+        :return: 释放的 engine 数量
+        """
+        with cls._lock:
+            keys = [key for key in cls._engines if key[0] == ds_id]
+            engines = [cls._engines.pop(key)[0] for key in keys]
+        for engine in engines:
+            engine.dispose()
+        if engines:
+            logger.info(f"已释放数据源 {ds_id} 的 {len(engines)} 个连接池")
+        return len(engines)
+
+    @classmethod
+    def dispose_all(cls):
+        """释放所有 engine"""
+        with cls._lock:
+            engines = [engine for engine, _ in cls._engines.values()]
+            cls._engines.clear()
+        for engine in engines:
+            engine.dispose()
+
 
 class DatasourceConfigUtil:
     """数据源配置工具类 - 加密/解密"""
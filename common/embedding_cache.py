@@ -0,0 +1,161 @@
+"""
+查询向量缓存
+表结构检索、术语检索、训练示例检索共用同一份 LRU 缓存，按“模型标识 + 规范化文本”缓存问题的 embedding，
+同一问题在一次请求内只向量化一次，重复问题直接命中缓存。
+线程安全；同一文本的并发请求只计算一次，其余调用方（线程或事件循环）等待同一结果。
+"""
+
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+from concurrent.futures import Future
+from threading import Lock
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+import numpy as np
+
+from common.invalidation_bus import InvalidationTopic, subscribe
+
+logger = logging.getLogger(__name__)
+
+# 缓存的最大条目数（0 表示禁用缓存）
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 1024))
+
+CacheKey = Tuple[str, str]
+
+# 以 float32 数组保存，内存占用约为 Python float 列表的 1/8，读取时再转换为列表
+_cache: "OrderedDict[CacheKey, np.ndarray]" = OrderedDict()
+# 正在计算中的 embedding，用于合并同一文本的并发请求
+_inflight: Dict[CacheKey, Future] = {}
+_cache_lock = Lock()
+
+
+def online_model_key(base_model: str, base_url: Optional[str] = None) -> str:
+    """在线模型标识（服务地址 + 模型名），不同调用方对 base_url 的补全方式不同，这里只取主机部分"""
+    host = ""
+    if base_url:
+        url = base_url.strip()
+        host = urlparse(url if "://" in url else f"//{url}").netloc
+    return f"online:{host}/{base_model}"
+
+
+def local_model_key(model_id: str) -> str:
+    """离线模型标识"""
+    return f"local:{model_id}"
+
+
+def normalize_text(text: str) -> str:
+    """规范化文本：去除首尾空白并合并连续空白"""
+    return " ".join((text or "").split())
+
+
+def _make_key(model_key: str, text: str) -> CacheKey:
+    return model_key, normalize_text(text)
+
+
+def get_cached_embedding(model_key: str, text: str) -> Optional[List[float]]:
+    """读取缓存，未命中返回 None"""
+    key = _make_key(model_key, text)
+    with _cache_lock:
+        embedding = _cache.get(key)
+        if embedding is None:
+            return None
+        _cache.move_to_end(key)
+    return embedding.tolist()
+
+
+def _store(key: CacheKey, embedding: Optional[List[float]]):
+    """写入缓存（失败结果不缓存），超过容量时淘汰最久未使用的条目"""
+    if embedding is None or len(embedding) == 0 or EMBEDDING_CACHE_SIZE <= 0:
+        return
+    _cache[key] = np.asarray(embedding, dtype=np.float32)
+    _cache.move_to_end(key)
+    while len(_cache) > EMBEDDING_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def _acquire(key: CacheKey) -> Tuple[Optional[List[float]], Optional[Future], bool]:
+    """
+    查询缓存并登记计算任务
+    :return: (缓存结果, 计算中的 Future, 当前调用方是否负责计算)
+    """
+    with _cache_lock:
+        embedding = _cache.get(key)
+        if embedding is not None:
+            _cache.move_to_end(key)
+            return embedding.tolist(), None, False
+        future = _inflight.get(key)
+        if future is not None:
+            return None, future, False
+        future = Future()
+        _inflight[key] = future
+        return None, future, True
+
+
+def _release(key: CacheKey, future: Future, embedding: Optional[List[float]]):
+    """保存计算结果并唤醒等待方"""
+    with _cache_lock:
+        _store(key, embedding)
+        _inflight.pop(key, None)
+    future.set_result(embedding)
+
+
+def get_or_compute_embedding(
+    model_key: str, text: str, compute: Callable[[str], Optional[List[float]]]
+) -> Optional[List[float]]:
+    """
+    同步获取 embedding：命中缓存直接返回，否则调用 compute 计算并写入缓存
+    :param model_key: 模型标识（online_model_key / local_model_key）
+    :param text: 待向量化的文本
+    :param compute: 实际的向量化函数，计算失败返回 None
+    """
+    key = _make_key(model_key, text)
+    embedding, future, is_owner = _acquire(key)
+    if future is None:
+        return embedding
+    if not is_owner:
+        return future.result()
+
+    embedding = None
+    try:
+        embedding = compute(text)
+    finally:
+        _release(key, future, embedding)
+    return embedding
+
+
+async def aget_or_compute_embedding(
+    model_key: str, text: str, compute: Callable[[str], Awaitable[Optional[List[float]]]]
+) -> Optional[List[float]]:
+    """
+    异步获取 embedding，语义同 get_or_compute_embedding
+    等待其他调用方的计算结果时不阻塞事件循环
+    """
+    key = _make_key(model_key, text)
+    embedding, future, is_owner = _acquire(key)
+    if future is None:
+        return embedding
+    if not is_owner:
+        return await asyncio.wrap_future(future)
+
+    embedding = None
+    try:
+        embedding = await compute(text)
+    finally:
+        _release(key, future, embedding)
+    return embedding
+
+
+def clear_embedding_cache():
+    """清空缓存（切换或修改 embedding 模型后调用）"""
+    with _cache_lock:
+        size = len(_cache)
+        _cache.clear()
+    if size:
+        logger.info(f"已清空查询向量缓存（{size} 条）")
+
+
+# 查询向量与 embedding 模型绑定，模型配置变更后清空
+subscribe(InvalidationTopic.AI_MODEL, lambda event: clear_embedding_cache())
@@ -0,0 +1,162 @@
+"""
+缓存失效事件总线
+数据源、表/字段、术语、训练数据、权限、AI 模型等元数据变更后，由对应的服务发布带版本号的变更事件，
+请求链路中的缓存订阅事件并主动失效，因此缓存可以使用较长的有效期而不会返回过期的表结构或权限。
+目前术语（TERMINOLOGY）和训练数据（TRAINING）的检索直接查询数据库，没有进程内缓存订阅这两个主题；
+对应的服务仍然发布事件，供后续增加的缓存订阅。
+
+事件先在当前进程内同步分发；配置了 REDIS_HOST 时再通过 Redis pub/sub 广播给其它 worker，
+各 worker 的后台监听线程收到后在本进程内分发（忽略自己发出的事件）。
+
+事件格式：
+    {"topic": str, "ds_id": Optional[int], "version": int, "origin": str, "ts": float, ...附加字段}
+"""
+
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from common.redis_tool import get_shared_redis_tool
+
+logger = logging.getLogger(__name__)
+
+# Redis 广播频道
+INVALIDATION_CHANNEL = os.getenv("INVALIDATION_CHANNEL", "aix:invalidation")
+VERSION_KEY_PREFIX = "aix:invalidation:version:"
+
+
+class InvalidationTopic:
+    """变更事件主题"""
+
+    DATASOURCE = "datasource"  # 数据源及其表/字段
+    TERMINOLOGY = "terminology"  # 术语
+    TRAINING = "training"  # SQL 示例（训练数据）
+    PERMISSION = "permission"  # 行/列权限规则、用户角色
+    AI_MODEL = "ai_model"  # AI 模型配置
+
+
+Subscriber = Callable[[Dict[str, Any]], None]
+
+# 当前进程标识，用于忽略 Redis 回传的本进程事件
+_origin = uuid.uuid4().hex
+_subscribers: Dict[str, List[Subscriber]] = {}
+# 每个主题已收到的最大版本号
+_versions: Dict[str, int] = {}
+_lock = threading.Lock()
+
+_listener_thread: Optional[threading.Thread] = None
+
+
+def subscribe(topic: str, callback: Subscriber):
+    """
+    订阅主题的变更事件，回调在发布方线程或监听线程中同步执行，应只做轻量的缓存清理
+    """
+    with _lock:
+        callbacks = _subscribers.setdefault(topic, [])
+        if callback not in callbacks:
+            callbacks.append(callback)
+
+
+def _next_version(topic: str) -> int:
+    """生成主题的下一个版本号：配置 Redis 时全局递增，否则进程内递增"""
+    redis_tool = get_shared_redis_tool()
+    if redis_tool is not None:
+        try:
+            version = redis_tool.incr(f"{VERSION_KEY_PREFIX}{topic}")
+            if version is not None:
+                return int(version)
+        except Exception as e:
+            logger.warning(f"⚠️ 生成缓存失效事件版本号失败: {e}")
+    with _lock:
+        return _versions.get(topic, 0) + 1
+
+
+def _dispatch(event: Dict[str, Any]):
+    """在当前进程内分发事件"""
+    topic = event.get("topic")
+    with _lock:
+        _versions[topic] = max(_versions.get(topic, 0), int(event.get("version") or 0))
+        callbacks = list(_subscribers.get(topic, []))
+
+    for callback in callbacks:
+        try:
+            callback(event)
+        except Exception as e:
+            logger.warning(f"⚠️ 处理缓存失效事件失败 topic={topic}, callback={callback}: {e}", exc_info=True)
+
+
+def publish(topic: str, ds_id: Optional[int] = None, **payload) -> Dict[str, Any]:
+    """
+    发布变更事件（应在数据库事务提交之后调用）
+
+    :param topic: 主题，见 InvalidationTopic
+    :param ds_id: 关联的数据源ID，为 None 表示影响全部数据源
+    :param payload: 附加字段
+    :return: 事件
+    """
+    event = {
+        **payload,
+        "topic": topic,
+        "ds_id": ds_id,
+        "version": _next_version(topic),
+        "origin": _origin,
+        "ts": time.time(),
+    }
+    _dispatch(event)
+    logger.info(f"发布缓存失效事件: topic={topic}, ds_id={ds_id}, version={event['version']}")
+
+    redis_tool = get_shared_redis_tool()
+    if redis_tool is not None:
+        try:
+            redis_tool.publish(INVALIDATION_CHANNEL, json.dumps(event, ensure_ascii=False, default=str))
+        except Exception as e:
+            logger.warning(f"⚠️ 广播缓存失效事件失败: {e}")
+    return event
+
+
+def _listen():
+    """后台监听 Redis 广播的事件，连接断开后自动重连"""
+    while True:
+        pubsub = None
+        try:
+            pubsub = get_shared_redis_tool().pubsub()
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            logger.info(f"✅ 缓存失效事件监听已启动: {INVALIDATION_CHANNEL}")
+            while True:
+                message = pubsub.get_message(timeout=1.0)
+                if not message or message.get("type") != "message":
+                    continue
+                try:
+                    event = json.loads(message["data"])
+                except Exception:
+                    logger.warning(f"⚠️ 无法解析缓存失效事件: {message.get('data')}")
+                    continue
+                if event.get("origin") != _origin:
+                    _dispatch(event)
+        except Exception as e:
+            logger.warning(f"⚠️ 缓存失效事件监听中断，稍后重连: {e}")
+            time.sleep(3)
+        finally:
+            if pubsub is not None:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+
+
+def start_invalidation_listener():
+    """
+    启动 Redis 事件监听线程（每个 worker 进程一个），未配置 Redis 时只使用进程内分发
+    """
+    global _listener_thread
+    if get_shared_redis_tool() is None:
+        return
+    with _lock:
+        if _listener_thread is not None and _listener_thread.is_alive():
+            return
+        _listener_thread = threading.Thread(target=_listen, name="invalidation-bus-listener", daemon=True)
+        _listener_thread.start()
@@ -1,17 +1,57 @@
+import hashlib
 import json
+import logging
+import os
+import time
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
 
+from common.invalidation_bus import InvalidationTopic, subscribe
 from model.db_connection_pool import get_db_pool
 from model.db_models import TAiModel
 
+logger = logging.getLogger(__name__)
 pool = get_db_pool()
 
+# 默认模型配置的本地缓存时间（秒），未配置 Redis 时其他 worker 修改默认模型后最多延迟该时间生效
+MODEL_CONFIG_TTL = int(os.getenv("MODEL_CONFIG_TTL", 60))
+# 所有 LLM 客户端共用的 HTTP 连接池大小
+LLM_HTTP_POOL_SIZE = int(os.getenv("LLM_HTTP_POOL_SIZE", 50))
+
+# LLM 客户端缓存：(模型ID, 配置指纹, 温度) -> 客户端
+_llm_cache: Dict[Tuple[int, str, float], Any] = {}
+# 默认模型配置缓存：(配置, 读取时间)
+_default_model: Optional[Tuple[Dict[str, Any], float]] = None
+_llm_lock = Lock()
+_http_client = None
+_http_client_lock = Lock()
+
+
+def _get_http_client():
+    """获取共享的 keep-alive HTTP 客户端（同步调用共用，避免每个模型客户端各自建立连接和 TLS 握手）"""
+    global _http_client
+    if _http_client is None:
+        with _http_client_lock:
+            if _http_client is None:
+                import httpx
+
+                _http_client = httpx.Client(
+                    timeout=httpx.Timeout(600.0, connect=10.0),
+                    limits=httpx.Limits(
+                        max_connections=LLM_HTTP_POOL_SIZE,
+                        max_keepalive_connections=LLM_HTTP_POOL_SIZE,
+                    ),
+                )
+    return _http_client
+
+
+def _get_default_model_config() -> Dict[str, Any]:
+    """读取默认 LLM 配置（缓存 MODEL_CONFIG_TTL 秒）"""
+    global _default_model
+    cached = _default_model
+    if cached is not None and time.time() - cached[1] < MODEL_CONFIG_TTL:
+        return cached[0]
 
-def get_llm(temperature=0.75):
-    """
-    获取LLM模型
-    :param temperature: 温度参数
-    :return: LLM模型实例
-    """
     with pool.get_session() as session:
         # Fetch default model
         model = session.query(TAiModel).filter(
@@ -21,67 +61,125 @@ def get_llm(temperature=0.75):
         if not model:
             raise ValueError("No default AI model configured in database.")
 
-        # Map supplier to model type string used in map
-        # 1:OpenAI, 2:Azure, 3:Ollama, 4:vLLM, 5:DeepSeek, 6:Qwen, 7:Moonshot, 8:ZhipuAI, 9:Other
-        supplier = model.supplier
+        config = {
+            "id": model.id,
+            "supplier": model.supplier,
+            "base_model": model.base_model,
+            "api_key": model.api_key,
+            "api_domain": model.api_domain,
+        }
+
+    raw = "|".join(str(config[k] or "") for k in ("supplier", "base_model", "api_key", "api_domain"))
+    config["fingerprint"] = hashlib.sha256(raw.encode("utf-8")).hexdigest()
+    _default_model = (config, time.time())
+    return config
+
+
+def invalidate_llm_cache():
+    """默认模型或模型配置变更后清空 LLM 客户端缓存（由 AI 模型服务调用）"""
+    global _default_model
+    with _llm_lock:
+        _llm_cache.clear()
+        _default_model = None
+
+
+subscribe(InvalidationTopic.AI_MODEL, lambda event: invalidate_llm_cache())
+
+
+def get_llm(temperature=0.75):
+    """
+    获取LLM模型
+    按（模型ID, 温度）缓存客户端实例，默认模型配置变化时自动重建
+    :param temperature: 温度参数
+    :return: LLM模型实例
+    """
+    try:
+        temperature = float(temperature)
+    except (TypeError, ValueError):
+        temperature = 0.75
+
+    config = _get_default_model_config()
+    cache_key = (config["id"], config["fingerprint"], temperature)
+    llm = _llm_cache.get(cache_key)
+    if llm is not None:
+        return llm
+
+    with _llm_lock:
+        llm = _llm_cache.get(cache_key)
+        if llm is None:
+            # 丢弃同一模型旧配置下的客户端
+            for key in [k for k in _llm_cache if k[0] == config["id"] and k[1] != config["fingerprint"]]:
+                _llm_cache.pop(key, None)
+            llm = _create_llm(config, temperature)
+            _llm_cache[cache_key] = llm
+            logger.info(f"✅ 已创建 LLM 客户端: {config['base_model']} (temperature={temperature})")
+    return llm
+
+
+def _create_llm(config: Dict[str, Any], temperature: float):
+    """
+    根据模型配置创建 LLM 客户端
+    :param config: 默认模型配置
+    :param temperature: 温度参数
+    :return: LLM模型实例
+    """
+    # Map supplier to model type string used in map
+    # 1:OpenAI, 2:Azure, 3:Ollama, 4:vLLM, 5:DeepSeek, 6:Qwen, 7:Moonshot, 8:ZhipuAI, 9:Other
+    supplier = config["supplier"]
 
-        # 目前统一将 Qwen 也视为通过 OpenAI 协议接入，避免 ChatTongyi 及其 LangSmith/OpenTelemetry 依赖
-        if supplier == 3:
-            model_type = "ollama"
-        else:
-            # Default to openai for others (OpenAI, Qwen, DeepSeek, Moonshot, Zhipu, vLLM, etc.)
-            model_type = "openai"
+    # 目前统一将 Qwen 也视为通过 OpenAI 协议接入，避免 ChatTongyi 及其 LangSmith/OpenTelemetry 依赖
+    if supplier == 3:
+        model_type = "ollama"
+    else:
+        # Default to openai for others (OpenAI, Qwen, DeepSeek, Moonshot, Zhipu, vLLM, etc.)
+        model_type = "openai"
 
-        model_name = model.base_model
-        model_api_key = model.api_key
-        model_base_url = model.api_domain
+    model_name = config["base_model"]
+    model_api_key = config["api_key"]
+    model_base_url = config["api_domain"]
 
+    # 为了避免在模块加载时就触发第三方依赖（如 OpenTelemetry/LangSmith）的副作用，
+    # 对各类模型做统一的延迟导入和降级处理
+    def _get_openai():
+        """
+        延迟导入 ChatOpenAI，避免在应用启动阶段因 langsmith/opentelemetry 初始化失败导致进程退出。
+        如果导入失败，直接抛异常，由上层决定如何处理（通常是显式配置问题）。
+        """
         try:
-            temperature = float(temperature)
-        except ValueError:
-            temperature = 0.75
-
-        # 为了避免在模块加载时就触发第三方依赖（如 OpenTelemetry/LangSmith）的副作用，
-        # 对各类模型做统一的延迟导入和降级处理
-        def _get_openai():
-            """
-            延迟导入 ChatOpenAI，避免在应用启动阶段因 langsmith/opentelemetry 初始化失败导致进程退出。
-            如果导入失败，直接抛异常，由上层决定如何处理（通常是显式配置问题）。
-            """
-            try:
-                from langchain_openai import ChatOpenAI
-            except Exception as e:
-                # 这里打印日志而不是在导入阶段崩溃
-                print(f"[ERROR] Failed to import ChatOpenAI, please check langchain-openai/langsmith/opentelemetry installation: {e}")
-                raise
-
-            return ChatOpenAI(
-                model=model_name,
-                temperature=temperature,
-                base_url=model_base_url,
-                api_key=model_api_key or "empty",  # Ensure not None
-            )
-
-        def _get_ollama():
-            """
-            延迟导入 ChatOllama，避免在模块加载阶段触发不必要的依赖。
-            """
-            try:
-                from langchain_ollama import ChatOllama
-            except Exception as e:
-                print(f"[WARN] Failed to import ChatOllama, fallback to ChatOpenAI: {e}")
-                return _get_openai()
-
-            return ChatOllama(model=model_name, temperature=temperature, base_url=model_base_url)
-
-        # Qwen 也统一走 OpenAI 协议客户端，避免引入 ChatTongyi 及其 LangSmith/OpenTelemetry 依赖
-        model_map = {
-            "openai": _get_openai,
-            "ollama": _get_ollama,
-        }
+            from langchain_openai import ChatOpenAI
+        except Exception as e:
+            # 这里打印日志而不是在导入阶段崩溃
+            print(f"[ERROR] Failed to import ChatOpenAI, please check langchain-openai/langsmith/opentelemetry installation: {e}")
+            raise
+
+        return ChatOpenAI(
+            model=model_name,
+            temperature=temperature,
+            base_url=model_base_url,
+            api_key=model_api_key or "empty",  # Ensure not None
+            http_client=_get_http_client(),
+        )
+
+    def _get_ollama():
+        """
+        延迟导入 ChatOllama，避免在模块加载阶段触发不必要的依赖。
+        """
+        try:
+            from langchain_ollama import ChatOllama
+        except Exception as e:
+            print(f"[WARN] Failed to import ChatOllama, fallback to ChatOpenAI: {e}")
+            return _get_openai()
+
+        return ChatOllama(model=model_name, temperature=temperature, base_url=model_base_url)
+
+    # Qwen 也统一走 OpenAI 协议客户端，避免引入 ChatTongyi 及其 LangSmith/OpenTelemetry 依赖
+    model_map = {
+        "openai": _get_openai,
+        "ollama": _get_ollama,
+    }
 
-        if model_type in model_map:
-            return model_map[model_type]()
-        else:
-            # Should not happen given logic above, but fallback to openai
-            return model_map["openai"]()
+    if model_type in model_map:
+        return model_map[model_type]()
+    else:
+        # Should not happen given logic above, but fallback to openai
+        return model_map["openai"]()
@@ -1,12 +1,20 @@
 """
 离线 Embedding 模型支持
 当没有配置在线 embedding 模型时，使用本地 CPU 模式模型作为回退
+所有推理由单个后台线程按微批次（embed_documents）执行：并发的单条请求会在短暂等待后合并为一批，
+批量请求按批次大小切分，推理线程数受 LOCAL_EMBEDDING_THREADS 限制
 """
 
+import asyncio
 import logging
 import os
+import queue
 import threading
-from typing import List, Optional
+import time
+from concurrent.futures import Future, InvalidStateError
+from typing import List, Optional, Sequence, Tuple
+
+from common.embedding_cache import aget_or_compute_embedding, get_or_compute_embedding, local_model_key
 
 logger = logging.getLogger(__name__)
 
@@ -20,6 +28,12 @@ DEFAULT_EMBEDDING_MODEL_ID = os.getenv(
     "DEFAULT_EMBEDDING_MODEL", "shibing624/text2vec-base-chinese"
 )
 
+# 微批次配置
+LOCAL_EMBEDDING_BATCH_SIZE = int(os.getenv("LOCAL_EMBEDDING_BATCH_SIZE", 32))  # 每批最大文本数
+LOCAL_EMBEDDING_MAX_WAIT_MS = float(os.getenv("LOCAL_EMBEDDING_MAX_WAIT_MS", 10))  # 凑批最长等待时间（毫秒）
+# 模型推理使用的 CPU 线程数，避免与服务本身争抢 CPU
+LOCAL_EMBEDDING_THREADS = int(os.getenv("LOCAL_EMBEDDING_THREADS", min(4, os.cpu_count() or 1)))
+
 
 # 模型会下载到: {LOCAL_MODEL_PATH}/embedding/{model_name}/ 或标准 HuggingFace 缓存目录
 def _get_local_model_path():
@@ -77,6 +91,7 @@ def _get_local_embedding_model():
         try:
             # 设置环境变量，避免 tokenizers 并行警告
             os.environ["TOKENIZERS_PARALLELISM"] = "false"
+            _limit_inference_threads()
 
             # 禁用 HuggingFace Hub 连接，避免网络不可达时的连接错误
             # 使用离线模式，仅使用本地缓存的模型
@@ -183,9 +198,102 @@ def _get_local_embedding_model():
             return None
 
 
+def _limit_inference_threads():
+    """限制模型推理使用的 CPU 线程数（需在模型加载前调用）"""
+    os.environ.setdefault("OMP_NUM_THREADS", str(LOCAL_EMBEDDING_THREADS))
+    try:
+        import torch
+
+        torch.set_num_threads(LOCAL_EMBEDDING_THREADS)
+        logger.debug(f"Local embedding inference threads limited to {LOCAL_EMBEDDING_THREADS}")
+    except Exception as e:
+        logger.debug(f"Failed to limit torch threads: {e}")
+
+
+class LocalEmbeddingBatcher:
+    """
+    本地模型微批次执行器
+    请求放入队列后由单个后台线程取出：凑满 batch_size 或等待超过 max_wait 后调用一次 embed_documents，
+    结果通过 concurrent.futures.Future 返回，线程和协程均可等待。
+    """
+
+    def __init__(self, batch_size: int = LOCAL_EMBEDDING_BATCH_SIZE, max_wait_ms: float = LOCAL_EMBEDDING_MAX_WAIT_MS):
+        self.batch_size = max(1, batch_size)
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="local-embedding-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, text: str) -> Future:
+        """提交单条文本，返回结果 Future（失败时结果为 None）"""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future
+
+    def _collect_batch(self) -> List[Tuple[str, Future]]:
+        """阻塞等待第一条请求，然后在 max_wait 内尽量凑满一批"""
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining > 0:
+                    batch.append(self._queue.get(timeout=remaining))
+                else:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            try:
+                self._process(batch)
+            except Exception as e:
+                logger.error(f"Local embedding batch failed: {e}", exc_info=True)
+                for _, future in batch:
+                    self._set_result(future, None)
+
+    @staticmethod
+    def _set_result(future: Future, result: Optional[List[float]]):
+        # 等待方（如被取消的协程）可能已取消 Future
+        try:
+            future.set_result(result)
+        except InvalidStateError:
+            pass
+
+    def _process(self, batch: List[Tuple[str, Future]]):
+        model = _get_local_embedding_model()
+        if not model:
+            logger.warning("Local embedding model not available")
+            for _, future in batch:
+                self._set_result(future, None)
+            return
+
+        # 同一批次内的重复文本只计算一次
+        unique_texts = list(dict.fromkeys(text for text, _ in batch))
+        vectors = model.embed_documents(unique_texts)
+        by_text = dict(zip(unique_texts, vectors))
+        for text, future in batch:
+            self._set_result(future, by_text.get(text))
+
+
+_batcher = LocalEmbeddingBatcher()
+
+
 async def generate_embedding_local(text: str) -> Optional[List[float]]:
     """
-    使用本地模型生成 embedding（异步包装）
+    使用本地模型生成 embedding（异步包装，与其他并发请求合并为微批次）
 
     Args:
         text: 要生成 embedding 的文本
@@ -196,18 +304,11 @@ async def generate_embedding_local(text: str) -> Optional[List[float]]:
     if not text:
         return None
 
-    model = _get_local_embedding_model()
-    if not model:
-        logger.warning("Local embedding model not available")
-        return None
+    async def _embed(query: str) -> Optional[List[float]]:
+        return await asyncio.wrap_future(_batcher.submit(query))
 
     try:
-        # embed_query 是同步方法，在异步环境中需要在线程池中执行
-        import asyncio
-
-        loop = asyncio.get_event_loop()
-        embedding = await loop.run_in_executor(None, model.embed_query, text)
-        return embedding
+        return await aget_or_compute_embedding(local_model_key(DEFAULT_EMBEDDING_MODEL_ID), text, _embed)
     except Exception as e:
         logger.error(
             f"Failed to generate embedding with local model: {e}", exc_info=True
@@ -217,7 +318,7 @@ async def generate_embedding_local(text: str) -> Optional[List[float]]:
 
 def generate_embedding_local_sync(text: str) -> Optional[List[float]]:
     """
-    使用本地模型生成 embedding（同步版本）
+    使用本地模型生成 embedding（同步版本，与其他并发请求合并为微批次）
 
     Args:
         text: 要生成 embedding 的文本
@@ -228,17 +329,36 @@ def generate_embedding_local_sync(text: str) -> Optional[List[float]]:
     if not text:
         return None
 
-    model = _get_local_embedding_model()
-    if not model:
-        logger.warning("Local embedding model not available")
-        return None
-
     try:
-        embedding = model.embed_query(text)
-        return embedding
+        return get_or_compute_embedding(
+            local_model_key(DEFAULT_EMBEDDING_MODEL_ID), text, lambda query: _batcher.submit(query).result()
+        )
     except Exception as e:
         logger.error(
             f"Failed to generate embedding with local model: {e}", exc_info=True
         )
         return None
-        return None
+
+
+def generate_embeddings_local_batch(texts: Sequence[str]) -> List[Optional[List[float]]]:
+    """
+    使用本地模型批量生成 embedding（同步版本，按 LOCAL_EMBEDDING_BATCH_SIZE 分批推理）
+    用于表结构、术语等批量计算场景，不写入查询向量缓存
+
+    Args:
+        texts: 要生成 embedding 的文本列表
+
+    Returns:
+        与输入顺序一致的 embedding 列表，失败或空文本对应位置为 None
+    """
+    # 依次入队，由后台线程按批次大小切分
+    futures = [_batcher.submit(text) if text else None for text in texts]
+    return [future.result() if future else None for future in futures]
+
+
+async def agenerate_embeddings_local_batch(texts: Sequence[str]) -> List[Optional[List[float]]]:
+    """
+    使用本地模型批量生成 embedding（异步版本）
+    """
+    futures = [_batcher.submit(text) if text else None for text in texts]
+    return [await asyncio.wrap_future(future) if future else None for future in futures]
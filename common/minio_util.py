@@ -6,6 +6,7 @@ import mimetypes
 import os
 import traceback
 from datetime import timedelta
+from typing import Optional
 from uuid import uuid4
 
 import pandas as pd
@@ -186,6 +187,19 @@ class MinioUtils:
             traceback.print_exception(err)
             raise MyException(SysCode.c_9999)
 
+    def get_object_etag(
+        self, object_key: str, bucket_name: str = "filedata"
+    ) -> Optional[str]:
+        """
+        获取对象的 ETag（由 MinIO 根据文件内容计算，可作为内容指纹），失败返回 None
+        """
+        try:
+            stat = self.client.stat_object(bucket_name=bucket_name, object_name=object_key)
+            return (stat.etag or "").strip('"') or None
+        except Exception as err:
+            logger.warning(f"获取文件 {object_key} 的 ETag 失败: {err}")
+            return None
+
     def upload_file_and_parse_from_request(
         self, request: Request, bucket_name: str = "filedata"
     ) -> dict:
@@ -2,15 +2,57 @@
 权限工具函数
 """
 
+import os
+import time
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
 from common.exception import MyException
+from common.invalidation_bus import InvalidationTopic, subscribe
 from constants.code_enum import SysCodeEnum
 from model.db_connection_pool import get_db_pool
 from model.db_models import TUser
 
+# 用户角色缓存有效期（秒），用户增删或角色变更时通过失效事件即时清理
+USER_ROLE_CACHE_TTL = int(os.getenv("USER_ROLE_CACHE_TTL", "600"))
+
+# 用户ID -> (角色, 读取时间)，用户不存在时角色为 None
+_role_cache: Dict[int, Tuple[Optional[str], float]] = {}
+_role_cache_lock = Lock()
+
+
+def _get_user_role(user_id: int) -> Optional[str]:
+    """读取用户角色（带缓存），查询失败时抛出异常且不缓存"""
+    with _role_cache_lock:
+        cached = _role_cache.get(user_id)
+    if cached is not None and time.time() - cached[1] < USER_ROLE_CACHE_TTL:
+        return cached[0]
+
+    db_pool = get_db_pool()
+    with db_pool.get_session() as session:
+        user = session.query(TUser).filter(TUser.id == user_id).first()
+        role = user.role if user else None
+
+    with _role_cache_lock:
+        _role_cache[user_id] = (role, time.time())
+    return role
+
+
+def invalidate_user_role_cache(user_id: Optional[int] = None):
+    """
+    使用户角色缓存失效
+    :param user_id: 用户ID，为 None 时清空全部
+    """
+    with _role_cache_lock:
+        if user_id is None:
+            _role_cache.clear()
+        else:
+            _role_cache.pop(user_id, None)
+
 
 def is_admin(user_id: int) -> bool:
     """
-    判断用户是否为管理员（根据 role 字段判断）
+    判断用户是否为管理员（根据 role 字段判断，结果按用户缓存）
     
     Args:
         user_id: 用户ID
@@ -22,12 +64,7 @@ def is_admin(user_id: int) -> bool:
         return False
     
     try:
-        db_pool = get_db_pool()
-        with db_pool.get_session() as session:
-            user = session.query(TUser).filter(TUser.id == user_id).first()
-            if user and user.role == 'admin':
-                return True
-            return False
+        return _get_user_role(int(user_id)) == 'admin'
     except Exception:
         # 如果查询失败，返回False（安全起见，默认非管理员）
         return False
@@ -51,3 +88,5 @@ async def check_admin_permission(request):
     if role != 'admin':
         raise MyException(SysCodeEnum.c_401, "权限不足，只有管理员才能操作。")
 
+
+subscribe(InvalidationTopic.PERMISSION, lambda event: invalidate_user_role_cache(event.get("user_id")))
@@ -1,23 +1,35 @@
+import os
+
 import redis
 from redis.exceptions import ConnectionError
-from config import serv
 
 
 class RedisTool:
     """
     redis 工具类
+    连接参数默认读取环境变量 REDIS_HOST / REDIS_PORT / REDIS_PASSWORD / REDIS_DB
     """
 
     def __init__(
-        self, host=serv.host, port=serv.port, db=0, password=serv.redis_password
+        self,
+        host=os.getenv("REDIS_HOST", "127.0.0.1"),
+        port=int(os.getenv("REDIS_PORT", "6379")),
+        db=int(os.getenv("REDIS_DB", "0")),
+        password=os.getenv("REDIS_PASSWORD") or None,
     ):
         self.redis_client = redis.Redis(
-            host=host, port=port, db=db, password=password, decode_responses=True
+            host=host,
+            port=port,
+            db=db,
+            password=password,
+            decode_responses=True,
+            socket_connect_timeout=2,
+            socket_timeout=2,
         )
 
-    def set_key(self, key, value):
+    def set_key(self, key, value, ex=None):
         try:
-            return self.redis_client.set(key, value)
+            return self.redis_client.set(key, value, ex=ex)
         except ConnectionError as e:
             print(f"Connection error: {e}")
             return False
@@ -50,10 +62,42 @@ class RedisTool:
             print(f"Connection error: {e}")
             return False
 
+    def incr(self, key):
+        try:
+            return self.redis_client.incr(key)
+        except ConnectionError as e:
+            print(f"Connection error: {e}")
+            return None
+
+    def publish(self, channel, message):
+        try:
+            return self.redis_client.publish(channel, message)
+        except ConnectionError as e:
+            print(f"Connection error: {e}")
+            return 0
+
+    def pubsub(self):
+        return self.redis_client.pubsub(ignore_subscribe_messages=True)
+
     def close(self):
         self.redis_client.close()
 
 
+_shared_redis_tool = None
+
+
+def get_shared_redis_tool():
+    """
+    获取进程内共享的 RedisTool（配置了 REDIS_HOST 时启用），未配置时返回 None，调用方应回退到进程内缓存
+    """
+    global _shared_redis_tool
+    if not os.getenv("REDIS_HOST"):
+        return None
+    if _shared_redis_tool is None:
+        _shared_redis_tool = RedisTool()
+    return _shared_redis_tool
+
+
 # 使用示例
 if __name__ == "__main__":
     redis_tool = RedisTool(host="localhost", port=16379, password="difyai123456")
@@ -0,0 +1,439 @@
+"""
+查询结果统计摘要
+为结果总结、图表生成等提示词计算结果集的紧凑摘要，代替把全部结果行序列化进提示词：
+列类型与角色、数值分布（最值/均值/分位数/异常值）、类别 TopK、时间范围、时间趋势，以及分层抽样的样例行。
+摘要长度受字符预算约束，结果从 100 行增长到 100 万行时提示词长度保持不变。
+"""
+
+import json
+import logging
+import os
+import re
+from datetime import date, datetime, time as dt_time
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# 摘要序列化后的最大字符数
+RESULT_DIGEST_MAX_CHARS = int(os.getenv("RESULT_DIGEST_MAX_CHARS", "6000"))
+# 抽样的样例行数
+RESULT_DIGEST_SAMPLE_ROWS = int(os.getenv("RESULT_DIGEST_SAMPLE_ROWS", "20"))
+# 结果行数不超过该值时直接给出全部行（仍受字符预算约束）
+RESULT_DIGEST_FULL_ROWS = int(os.getenv("RESULT_DIGEST_FULL_ROWS", "50"))
+# 类别列保留的 TopK 取值数
+RESULT_DIGEST_TOP_K = int(os.getenv("RESULT_DIGEST_TOP_K", "8"))
+# 摘要中包含的最大列数
+RESULT_DIGEST_MAX_COLUMNS = int(os.getenv("RESULT_DIGEST_MAX_COLUMNS", "40"))
+
+# 单个取值的最大字符数
+_MAX_VALUE_CHARS = 64
+# 类别列的最大基数（不同取值数），超过后视为标识列或文本列
+_CATEGORICAL_MAX_DISTINCT = 50
+# 字符串形式的日期/时间，如 2024、2024-01、2024/01/02、2024年1月、2024-01-02 12:00:00
+_TEMPORAL_PATTERN = re.compile(
+    r"^\d{4}(?:[-/.年]\d{1,2}(?:[-/.月]\d{1,2}日?)?月?)?(?:[ T]\d{1,2}:\d{2}(?::\d{2})?(?:\.\d+)?)?$"
+)
+# 像时间的列名：英文按单词或后缀匹配（order_date、createTime、updatetime），中文按后缀或完整列名匹配，
+# 避免“月销售额”“年度收入”这类度量列因包含“月”“年”被当作时间列
+_TEMPORAL_NAME_WORDS = ("date", "time", "datetime", "timestamp", "day", "week", "month", "year", "quarter")
+_TEMPORAL_NAME_SUFFIXES = ("日期", "时间", "年份", "月份", "年度", "季度")
+_TEMPORAL_NAMES = frozenset(("年", "月", "日", "周"))
+# 英文列名拆分为单词（下划线、空格、驼峰）
+_NAME_WORD_PATTERN = re.compile(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])")
+_IDENTIFIER_NAME_PATTERN = re.compile(r"(?:^id$|_id$|^no$|_no$|^code$|_code$|编号|编码|单号)", re.IGNORECASE)
+# 驼峰命名的标识列，如 userId
+_CAMEL_IDENTIFIER_PATTERN = re.compile(r"[a-z]Id$")
+
+
+class ColumnRole:
+    """结果列的角色"""
+
+    NUMERIC = "numeric"  # 数值度量
+    TEMPORAL = "temporal"  # 日期/时间
+    CATEGORICAL = "categorical"  # 低基数类别
+    IDENTIFIER = "identifier"  # 编号、主键等高基数标识
+    TEXT = "text"  # 长文本或高基数自由文本
+    BOOLEAN = "boolean"  # 布尔
+
+
+def to_dataframe(rows: Sequence[Dict[str, Any]]) -> pd.DataFrame:
+    """将结果行转换为 DataFrame，Decimal 列转换为 float，嵌套结构（如 ES 返回的对象）转换为字符串"""
+    df = pd.DataFrame.from_records(list(rows))
+    for column in df.columns:
+        series = df[column]
+        if series.dtype == object:
+            first = series.dropna()
+            if first.empty:
+                continue
+            if isinstance(first.iloc[0], Decimal):
+                df[column] = pd.to_numeric(series, errors="coerce")
+            elif isinstance(first.iloc[0], (dict, list, tuple, set)):
+                df[column] = series.map(lambda v: None if v is None else str(v))
+    return df
+
+
+def _has_temporal_hint(name: str) -> bool:
+    name = str(name).strip()
+    if name in _TEMPORAL_NAMES or name.endswith(_TEMPORAL_NAME_SUFFIXES):
+        return True
+    words = [word.lower() for word in _NAME_WORD_PATTERN.findall(name)]
+    return any(word in _TEMPORAL_NAME_WORDS for word in words) or name.lower().endswith(_TEMPORAL_NAME_WORDS)
+
+
+def _has_identifier_hint(name: str) -> bool:
+    return bool(_IDENTIFIER_NAME_PATTERN.search(str(name)) or _CAMEL_IDENTIFIER_PATTERN.search(str(name)))
+
+
+def _infer_role(name: str, series: pd.Series) -> str:
+    """根据数据类型、取值形态、基数和列名推断列角色"""
+    non_null = series.dropna()
+    if pd.api.types.is_bool_dtype(series):
+        return ColumnRole.BOOLEAN
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return ColumnRole.TEMPORAL
+    if non_null.empty:
+        return ColumnRole.TEXT
+
+    distinct = non_null.nunique()
+    unique_ratio = distinct / len(non_null)
+
+    if pd.api.types.is_numeric_dtype(series):
+        # 年份列（如 year=2024）按时间处理
+        if _has_temporal_hint(name) and pd.api.types.is_integer_dtype(series) and non_null.between(1900, 2100).all():
+            return ColumnRole.TEMPORAL
+        if _has_identifier_hint(name) and pd.api.types.is_integer_dtype(series) and unique_ratio > 0.9:
+            return ColumnRole.IDENTIFIER
+        return ColumnRole.NUMERIC
+
+    sample = non_null.head(200)
+    if isinstance(sample.iloc[0], (date, datetime)):
+        return ColumnRole.TEMPORAL
+    sample_str = sample.astype(str).str.strip()
+    if sample_str.str.match(_TEMPORAL_PATTERN).all():
+        # 纯四位数字（如编码 1001）只有列名像时间时才按年份处理
+        if _has_temporal_hint(name) or not sample_str.str.fullmatch(r"\d{4}").all():
+            return ColumnRole.TEMPORAL
+
+    if distinct <= _CATEGORICAL_MAX_DISTINCT or unique_ratio <= 0.5:
+        return ColumnRole.CATEGORICAL
+    if sample_str.str.len().mean() > _MAX_VALUE_CHARS:
+        return ColumnRole.TEXT
+    return ColumnRole.IDENTIFIER
+
+
+def infer_column_roles(df: pd.DataFrame) -> Dict[str, str]:
+    """推断每一列的角色，返回 {列名: ColumnRole}"""
+    return {column: _infer_role(column, df[column]) for column in df.columns}
+
+
+def _to_datetime(series: pd.Series) -> pd.Series:
+    """将时间列统一转换为 datetime64"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+    if pd.api.types.is_numeric_dtype(series):
+        # 年份列
+        return pd.to_datetime(series.astype("Int64").astype(str), format="%Y", errors="coerce")
+    first = series.dropna()
+    if not first.empty and isinstance(first.iloc[0], (date, datetime)):
+        return pd.to_datetime(series, errors="coerce")
+    # 字符串日期：统一 2024年1月2日、2024/01/02 等写法
+    values = (
+        series.astype(str)
+        .str.strip()
+        .str.replace(r"[年月/]", "-", regex=True)
+        .str.replace("日", "", regex=False)
+        .str.rstrip("-")
+    )
+    return pd.to_datetime(values.where(series.notna()), errors="coerce")
+
+
+def _number(value) -> Optional[float]:
+    """NumPy 数值转换为可序列化的 Python 数值，保留 4 位小数"""
+    if value is None:
+        return None
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not np.isfinite(value):
+        return None
+    if value.is_integer():
+        return int(value)
+    return round(value, 4)
+
+
+def _json_value(value) -> Any:
+    """将单个取值转换为可序列化的紧凑形式"""
+    if value is None or value is pd.NaT:
+        return None
+    if isinstance(value, float) and np.isnan(value):
+        return None
+    if isinstance(value, (Decimal, np.integer, np.floating)):
+        return _number(value)
+    if isinstance(value, pd.Timestamp):
+        return value.strftime("%Y-%m-%d %H:%M:%S") if (value.hour or value.minute or value.second) else value.strftime("%Y-%m-%d")
+    if isinstance(value, datetime):
+        return value.strftime("%Y-%m-%d %H:%M:%S")
+    if isinstance(value, (date, dt_time)):
+        return value.isoformat()
+    if isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    return text if len(text) <= _MAX_VALUE_CHARS else text[:_MAX_VALUE_CHARS] + "…"
+
+
+def _numeric_profile(values: pd.Series) -> Dict[str, Any]:
+    """数值列：最值、均值、合计、分位数、标准差与 IQR 异常值"""
+    values = values.dropna()
+    if values.empty:
+        return {}
+    array = values.to_numpy(dtype=float)
+    p25, p50, p75 = np.percentile(array, [25, 50, 75])
+    profile = {
+        "min": _number(array.min()),
+        "max": _number(array.max()),
+        "mean": _number(array.mean()),
+        "sum": _number(array.sum()),
+        "p25": _number(p25),
+        "p50": _number(p50),
+        "p75": _number(p75),
+        "std": _number(array.std()),
+    }
+    if len(array) >= 8:
+        iqr = p75 - p25
+        if iqr > 0:
+            low, high = p25 - 1.5 * iqr, p75 + 1.5 * iqr
+            outliers = array[(array < low) | (array > high)]
+            if len(outliers):
+                # 按偏离中位数的程度取示例
+                examples = outliers[np.argsort(-np.abs(outliers - p50))][:3]
+                profile["outliers"] = {"count": int(len(outliers)), "examples": [_number(v) for v in examples]}
+    return profile
+
+
+def _categorical_profile(values: pd.Series, top_k: int) -> Dict[str, Any]:
+    """类别列：TopK 取值及其行数"""
+    counts = values.dropna().astype(str).value_counts()
+    top = counts.head(top_k)
+    profile = {"top": [[_json_value(value), int(count)] for value, count in top.items()]}
+    others = int(counts.iloc[top_k:].sum()) if len(counts) > top_k else 0
+    if others:
+        profile["others"] = others
+    return profile
+
+
+def _temporal_profile(values: pd.Series) -> Dict[str, Any]:
+    """时间列：时间范围"""
+    values = values.dropna()
+    if values.empty:
+        return {}
+    start, end = values.min(), values.max()
+    return {"min": _json_value(start), "max": _json_value(end), "span_days": int((end - start).days)}
+
+
+def _trend_profile(df: pd.DataFrame, time_column: str, times: pd.Series, measures: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    时间趋势：按时间点汇总各度量（同一时间点有多行时求和），以线性拟合判断方向，并给出首末值、变化率与峰谷
+    """
+    frame = pd.DataFrame({"_t": times})
+    for measure in measures:
+        frame[measure] = pd.to_numeric(df[measure], errors="coerce")
+    frame = frame.dropna(subset=["_t"])
+    if frame["_t"].nunique() < 3:
+        return None
+
+    grouped = frame.groupby("_t", sort=True)[measures].sum(min_count=1)
+    trend = {"by": time_column, "points": int(len(grouped)), "measures": {}}
+    x = np.arange(len(grouped), dtype=float)
+    for measure in measures:
+        y = grouped[measure].to_numpy(dtype=float)
+        mask = np.isfinite(y)
+        if mask.sum() < 3:
+            continue
+        slope = np.polyfit(x[mask], y[mask], 1)[0]
+        scale = np.abs(y[mask]).mean()
+        # 拟合的整体变化幅度不足均值 5% 视为平稳
+        relative = slope * (mask.sum() - 1) / scale if scale else 0.0
+        direction = "上升" if relative > 0.05 else ("下降" if relative < -0.05 else "平稳")
+        first, last = y[mask][0], y[mask][-1]
+        series = grouped[measure][mask]
+        trend["measures"][measure] = {
+            "direction": direction,
+            "first": _number(first),
+            "last": _number(last),
+            "change_pct": _number((last - first) / abs(first) * 100) if first else None,
+            "peak": [_json_value(series.idxmax()), _number(series.max())],
+            "trough": [_json_value(series.idxmin()), _number(series.min())],
+        }
+    return trend if trend["measures"] else None
+
+
+def _sample_positions(df: pd.DataFrame, roles: Dict[str, str], sample_rows: int) -> Tuple[List[int], str]:
+    """
+    选择样例行位置：存在低基数类别列时按类别分层抽样（每个类别至少一行，其余按占比分配），
+    否则在全部行上等间隔抽样（保留首尾行和原有顺序）
+    """
+    total = len(df)
+    if total <= sample_rows:
+        return list(range(total)), "all"
+
+    strata_column = None
+    for column, role in roles.items():
+        if role == ColumnRole.CATEGORICAL and 2 <= df[column].nunique() <= sample_rows:
+            strata_column = column
+            break
+
+    if strata_column is not None:
+        groups = df.groupby(df[strata_column].astype(str), sort=False).indices
+        positions = []
+        for indices in groups.values():
+            quota = max(1, int(round(sample_rows * len(indices) / total)))
+            picks = np.linspace(0, len(indices) - 1, min(quota, len(indices))).round().astype(int)
+            positions.extend(int(indices[i]) for i in np.unique(picks))
+        return sorted(positions), f"stratified:{strata_column}"
+
+    picks = np.unique(np.linspace(0, total - 1, sample_rows).round().astype(int))
+    return [int(i) for i in picks], "systematic"
+
+
+def profile_result(
+    rows: Sequence[Dict[str, Any]],
+    truncated: bool = False,
+    sample_rows: int = RESULT_DIGEST_SAMPLE_ROWS,
+    top_k: int = RESULT_DIGEST_TOP_K,
+) -> Dict[str, Any]:
+    """
+    计算结果集摘要
+
+    :param rows: 结果行（字典列表）
+    :param truncated: 结果是否因超出上限被截断
+    :param sample_rows: 样例行数
+    :param top_k: 类别列保留的 TopK 取值数
+    :return: 摘要字典
+    """
+    df = to_dataframe(rows)
+    digest: Dict[str, Any] = {"row_count": int(len(df)), "truncated": bool(truncated), "columns": []}
+    if df.empty:
+        digest["rows"] = []
+        return digest
+
+    roles = infer_column_roles(df)
+    temporal_values: Dict[str, pd.Series] = {}
+
+    for column in list(df.columns)[:RESULT_DIGEST_MAX_COLUMNS]:
+        series = df[column]
+        role = roles[column]
+        profile: Dict[str, Any] = {
+            "name": str(column),
+            "role": role,
+            "nulls": int(series.isna().sum()),
+            "distinct": int(series.nunique(dropna=True)),
+        }
+        try:
+            if role == ColumnRole.NUMERIC:
+                profile.update(_numeric_profile(pd.to_numeric(series, errors="coerce")))
+            elif role == ColumnRole.TEMPORAL:
+                times = _to_datetime(series)
+                temporal_values[column] = times
+                profile.update(_temporal_profile(times))
+            elif role in (ColumnRole.CATEGORICAL, ColumnRole.BOOLEAN):
+                profile.update(_categorical_profile(series, top_k))
+            else:
+                profile["examples"] = [_json_value(v) for v in series.dropna().head(3)]
+        except Exception as e:
+            logger.debug(f"计算列 {column} 的统计摘要失败: {e}")
+        digest["columns"].append(profile)
+
+    if len(df.columns) > RESULT_DIGEST_MAX_COLUMNS:
+        digest["omitted_columns"] = len(df.columns) - RESULT_DIGEST_MAX_COLUMNS
+
+    # 时间趋势：取第一个时间列与全部数值列
+    measures = [column for column, role in roles.items() if role == ColumnRole.NUMERIC]
+    if temporal_values and measures:
+        time_column, times = next(iter(temporal_values.items()))
+        try:
+            trend = _trend_profile(df, time_column, times, measures[:RESULT_DIGEST_MAX_COLUMNS])
+            if trend:
+                digest["trend"] = trend
+        except Exception as e:
+            logger.debug(f"计算时间趋势失败: {e}")
+
+    limit = max(sample_rows, RESULT_DIGEST_FULL_ROWS) if len(df) <= RESULT_DIGEST_FULL_ROWS else sample_rows
+    positions, strategy = _sample_positions(df, roles, limit)
+    digest["sample"] = strategy
+    records = df.iloc[positions].to_dict(orient="records")
+    digest["rows"] = [{str(k): _json_value(v) for k, v in record.items()} for record in records]
+    return digest
+
+
+def _dumps(digest: Dict[str, Any]) -> str:
+    return json.dumps(digest, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+def format_result_digest(
+    rows: Sequence[Dict[str, Any]],
+    truncated: bool = False,
+    sample_rows: int = RESULT_DIGEST_SAMPLE_ROWS,
+    max_chars: int = RESULT_DIGEST_MAX_CHARS,
+) -> str:
+    """
+    生成用于提示词的结果摘要文本，超出字符预算时依次减少样例行、TopK 取值和列数
+
+    :param rows: 结果行（字典列表）
+    :param truncated: 结果是否因超出上限被截断
+    :param sample_rows: 样例行数
+    :param max_chars: 字符预算
+    :return: 摘要文本
+    """
+    try:
+        digest = profile_result(rows, truncated=truncated, sample_rows=sample_rows)
+    except Exception as e:
+        # 统计失败时退化为前若干行样例，仍受字符预算约束
+        logger.warning(f"计算查询结果摘要失败，使用前 {sample_rows} 行作为样例: {e}", exc_info=True)
+        sample = [{str(k): _json_value(v) for k, v in row.items()} for row in list(rows[:sample_rows])]
+        digest = {"row_count": len(rows), "truncated": bool(truncated), "columns": [], "sample": "head", "rows": sample}
+    text = _dumps(digest)
+
+    while len(text) > max_chars and len(digest.get("rows", [])) > 3:
+        digest["rows"] = digest["rows"][:: 2]
+        # 已丢弃部分行，样例不再是全部（或前若干）记录
+        if digest.get("sample") in ("all", "head"):
+            digest["sample"] = "systematic"
+        text = _dumps(digest)
+    if len(text) > max_chars:
+        for column in digest["columns"]:
+            if "top" in column:
+                column["top"] = column["top"][:3]
+            column.pop("examples", None)
+        text = _dumps(digest)
+    while len(text) > max_chars and len(digest["columns"]) > 1:
+        digest["columns"] = digest["columns"][:-1]
+        digest["omitted_columns"] = digest.get("omitted_columns", 0) + 1
+        text = _dumps(digest)
+    # 仍超出预算时按字段整体删除（不截断文本，保证输出为合法 JSON）
+    for key in ("trend", "rows", "columns"):
+        if len(text) <= max_chars:
+            break
+        removed = digest.pop(key, None)
+        if key == "rows":
+            digest.pop("sample", None)
+        elif key == "columns" and removed:
+            digest["omitted_columns"] = digest.get("omitted_columns", 0) + len(removed)
+        text = _dumps(digest)
+
+    row_count = digest["row_count"]
+    note = "，查询结果过大已截断，统计仅基于已返回的记录" if truncated else ""
+    parts = []
+    if "columns" in digest:
+        parts.append(f"columns 为各列的角色与统计值（基于全部 {row_count} 行）")
+    if "trend" in digest:
+        parts.append("trend 为按时间汇总的趋势")
+    if "rows" in digest:
+        parts.append(f"rows 为{'全部记录' if digest.get('sample') == 'all' else '抽样记录'}")
+    desc = f"：{'，'.join(parts)}" if parts else ""
+    header = f"以下为查询结果的统计摘要（共 {row_count} 行{note}）{desc}。"
+    return f"{header}\n{text}"
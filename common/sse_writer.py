@@ -0,0 +1,184 @@
+"""
+SSE 流式响应写入
+各智能体按 token / 步骤逐条推送 SSE 消息，每条消息都单独 json.dumps 并调用一次 response.write。
+这里统一负责：
+    1. 序列化：优先使用 orjson，其余类型（Decimal、日期时间、bytes、Pydantic 模型等）交给 CustomJSONEncoder 处理；
+       NumPy 标量统一转换为对应的 Python 取值（orjson 不把 np.float64 视为数值，CustomJSONEncoder 会将其输出为 null）
+    2. 合并：短时间窗口（SSE_FLUSH_INTERVAL_MS）内的多条小消息合并为一次写入，减少 CPU 和系统调用
+    3. 背压：底层写入（等待连接可写）未完成时新消息留在缓冲区，缓冲区超过 SSE_MAX_BUFFER_BYTES 时发送方等待写入完成
+    4. 统计：每个流的消息数、写入次数、字节数、写入等待时间，流结束时记录日志，并累计到进程级统计
+
+使用方式：用 SSEWriter 包装 Sanic 的流式响应对象，原有的 response.write(...) 调用保持不变，流结束时调用 close()。
+"""
+
+import asyncio
+import logging
+import os
+import time
+from threading import Lock
+from typing import Any, Dict, Optional, Union
+
+import numpy as np
+
+from common.res_decorator import CustomJSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# 合并窗口（毫秒），0 表示每条消息立即写入
+SSE_FLUSH_INTERVAL_MS = int(os.getenv("SSE_FLUSH_INTERVAL_MS", "20"))
+# 缓冲区达到该字节数时立即写入（发送方等待写入完成）
+SSE_MAX_BUFFER_BYTES = int(os.getenv("SSE_MAX_BUFFER_BYTES", "65536"))
+
+
+class _SSEJSONEncoder(CustomJSONEncoder):
+    """SSE 消息编码器：NumPy 标量转换为 Python 取值，其余类型与 CustomJSONEncoder 一致"""
+
+    def default(self, obj):
+        if isinstance(obj, np.generic):
+            return obj.item()
+        return super().default(obj)
+
+
+_json_encoder = _SSEJSONEncoder(ensure_ascii=False)
+# 日期时间交给 CustomJSONEncoder 处理（保持 "%Y-%m-%d %H:%M:%S" 等既有格式），非字符串的 key 转为字符串
+_ORJSON_OPTIONS = (orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS) if orjson else 0
+
+# 进程级累计统计
+_totals = {"streams": 0, "frames": 0, "writes": 0, "bytes": 0}
+_totals_lock = Lock()
+
+
+def dumps(obj: Any) -> str:
+    """序列化为 JSON 字符串（不转义中文）"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, default=_json_encoder.default, option=_ORJSON_OPTIONS).decode("utf-8")
+        except TypeError:
+            # orjson 不支持的取值（如超过 64 位的整数）回退到标准库
+            pass
+    return _json_encoder.encode(obj)
+
+
+def sse_frame(obj: Any) -> str:
+    """构造一条 SSE 消息：data:<json>\\n\\n"""
+    return "data:" + dumps(obj) + "\n\n"
+
+
+def get_sse_totals() -> Dict[str, int]:
+    """当前进程的 SSE 累计统计（流数、消息数、写入次数、字节数）"""
+    with _totals_lock:
+        return dict(_totals)
+
+
+class SSEWriter:
+    """
+    SSE 流式响应写入器（包装 Sanic ResponseStream 的 response 对象，一个流一个实例）
+    """
+
+    def __init__(
+        self,
+        response,
+        stream_name: str = "",
+        flush_interval_ms: int = SSE_FLUSH_INTERVAL_MS,
+        max_buffer_bytes: int = SSE_MAX_BUFFER_BYTES,
+    ):
+        self._response = response
+        self.stream_name = stream_name
+        self._flush_interval = max(flush_interval_ms, 0) / 1000
+        self._max_buffer_bytes = max_buffer_bytes
+        self._buffer: list = []
+        self._buffered_bytes = 0
+        self._write_lock = asyncio.Lock()
+        self._flush_task: Optional[asyncio.Task] = None
+        # 后台写入失败（如客户端断开）的异常，在下一次写入时抛出
+        self._error: Optional[BaseException] = None
+        self._closed = False
+        self._start_time = time.perf_counter()
+
+        # 单个流的统计
+        self.frames = 0
+        self.writes = 0
+        self.bytes = 0
+        self.write_wait = 0.0
+        self.max_buffer_bytes = 0
+
+    def __getattr__(self, name):
+        # 其它属性（如 request）透传给原响应对象
+        return getattr(self._response, name)
+
+    async def write(self, data: Union[str, bytes]):
+        """写入一条已格式化的 SSE 消息（与 response.write 用法一致）"""
+        if self._error is not None:
+            raise self._error
+        if self._closed:
+            logger.warning(f"SSE 流已关闭，丢弃消息: stream={self.stream_name}")
+            return
+
+        chunk = data.encode("utf-8") if isinstance(data, str) else data
+        self._buffer.append(chunk)
+        self._buffered_bytes += len(chunk)
+        self.frames += 1
+        self.max_buffer_bytes = max(self.max_buffer_bytes, self._buffered_bytes)
+
+        if self._flush_interval <= 0 or self._buffered_bytes >= self._max_buffer_bytes:
+            await self.flush()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_later())
+
+    async def send(self, obj: Any):
+        """序列化并写入一条 SSE 消息"""
+        await self.write(sse_frame(obj))
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self._flush_interval)
+            self._flush_task = None
+            await self.flush()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            self._error = e
+            logger.warning(f"⚠️ SSE 写入失败: stream={self.stream_name}, {e}")
+
+    async def flush(self):
+        """立即写入缓冲区中的消息（底层写入未完成时等待）"""
+        async with self._write_lock:
+            if not self._buffer:
+                return
+            payload = b"".join(self._buffer)
+            self._buffer.clear()
+            self._buffered_bytes = 0
+
+            start = time.perf_counter()
+            await self._response.write(payload)
+            self.write_wait += time.perf_counter() - start
+            self.writes += 1
+            self.bytes += len(payload)
+
+    async def close(self):
+        """写入剩余消息并记录统计（可重复调用）"""
+        if self._closed:
+            return
+        self._closed = True
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+        try:
+            if self._error is None:
+                await self.flush()
+        finally:
+            with _totals_lock:
+                _totals["streams"] += 1
+                _totals["frames"] += self.frames
+                _totals["writes"] += self.writes
+                _totals["bytes"] += self.bytes
+            logger.info(
+                f"SSE 流结束: stream={self.stream_name}, 消息 {self.frames} 条, 写入 {self.writes} 次, "
+                f"{self.bytes} 字节, 最大缓冲 {self.max_buffer_bytes} 字节, 写入等待 {self.write_wait:.3f}s, "
+                f"耗时 {time.perf_counter() - self._start_time:.3f}s"
+            )
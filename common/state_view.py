@@ -0,0 +1,40 @@
+"""
+图状态的写时复制视图
+并行任务（图表生成、结果总结、推荐问题）共享同一份只读的基础状态，各自的写入落在私有覆盖层中，
+避免为每个任务深拷贝包含全部结果行的状态。
+"""
+
+from collections import ChainMap
+from typing import Any, Dict, Mapping, MutableMapping
+
+
+class TaskStateView(ChainMap):
+    """
+    单个并行任务的状态视图：读取时先查私有覆盖层再查共享基础状态，写入/删除只作用于覆盖层。
+    基础状态中的嵌套对象（如结果行）在任务间共享，任务只能读取，不能原地修改。
+    """
+
+    def __init__(self, base: Mapping[str, Any]):
+        super().__init__({}, base)
+
+    @property
+    def overlay(self) -> MutableMapping[str, Any]:
+        """当前任务写入的字段"""
+        return self.maps[0]
+
+    def copy(self) -> Dict[str, Any]:
+        """返回合并后的普通字典（浅拷贝）"""
+        return dict(self)
+
+
+def build_shared_state(state: Mapping[str, Any]) -> Dict[str, Any]:
+    """
+    构建并行任务共享的只读基础状态：顶层字段浅拷贝，执行结果的行列表替换为不可变的 tuple
+    只复制行引用、不复制行数据，原始状态保持不变；对结果列表的误修改会直接抛出异常而不是影响其他任务
+    """
+    shared = dict(state)
+    execution_result = shared.get("execution_result")
+    data = getattr(execution_result, "data", None)
+    if data is not None and not isinstance(data, tuple):
+        shared["execution_result"] = execution_result.model_copy(update={"data": tuple(data)})
+    return shared
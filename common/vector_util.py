@@ -0,0 +1,67 @@
+"""
+向量二进制编解码工具
+表结构 embedding 以 float32 小端字节串存储，读取时整批拼接后一次性转换为 NumPy 矩阵，避免逐行 JSON 解析
+"""
+
+import json
+from typing import Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# 统一使用小端 float32，保证不同平台写入的数据可以互相读取
+VECTOR_DTYPE = np.dtype("<f4")
+
+
+def encode_vector(vector: Optional[Sequence[float]]) -> Optional[bytes]:
+    """
+    将向量编码为 float32 字节串
+    :param vector: 向量（list / ndarray）
+    :return: 字节串，空向量返回 None
+    """
+    if vector is None or len(vector) == 0:
+        return None
+    return np.asarray(vector, dtype=VECTOR_DTYPE).tobytes()
+
+
+def decode_vector(raw: Optional[bytes]) -> Optional[np.ndarray]:
+    """
+    将单个 float32 字节串解码为向量（零拷贝，只读）
+    """
+    if not raw or len(raw) % VECTOR_DTYPE.itemsize != 0:
+        return None
+    return np.frombuffer(raw, dtype=VECTOR_DTYPE)
+
+
+def decode_vector_matrix(blobs: Iterable[Optional[bytes]]) -> Tuple[Optional[np.ndarray], List[bool]]:
+    """
+    将一批 float32 字节串解码为矩阵，行顺序与输入一致
+    以第一个有效向量的维度为准，缺失或维度不一致的行填充零向量
+
+    :return: (float32 矩阵, 每行是否为有效向量)；没有任何有效向量时矩阵为 None
+    """
+    blobs = list(blobs)
+    row_bytes = next((len(raw) for raw in blobs if raw and len(raw) % VECTOR_DTYPE.itemsize == 0), None)
+    if row_bytes is None:
+        return None, [False] * len(blobs)
+
+    valid = [bool(raw) and len(raw) == row_bytes for raw in blobs]
+    zero_row = b"\x00" * row_bytes
+    # 拼接到 bytearray 中，得到的矩阵可直接写入（如 faiss.normalize_L2），无需再复制一份
+    buffer = bytearray().join(raw if ok else zero_row for raw, ok in zip(blobs, valid))
+    matrix = np.frombuffer(buffer, dtype=VECTOR_DTYPE).reshape(len(blobs), row_bytes // VECTOR_DTYPE.itemsize)
+    return matrix.astype(np.float32, copy=False), valid
+
+
+def json_to_vector_bytes(raw: Optional[str]) -> Optional[bytes]:
+    """
+    将旧版 JSON 数组字符串格式的 embedding 转换为 float32 字节串（数据迁移使用）
+    """
+    if not raw:
+        return None
+    try:
+        vector = json.loads(raw)
+    except Exception:
+        return None
+    if not isinstance(vector, list) or not vector:
+        return None
+    return encode_vector(vector)
@@ -10,6 +10,7 @@ from sanic_ext import openapi
 
 from services.datasource_service import DatasourceService
 from model.db_connection_pool import get_db_pool
+from common.datasource_util import DatasourceEngineRegistry
 from common.res_decorator import async_json_resp
 from common.exception import MyException
 from constants.code_enum import SysCodeEnum
@@ -225,6 +226,9 @@ async def update_datasource(req: request.Request, body: UpdateDatasourceRequest)
             if not datasource:
                 raise MyException(SysCodeEnum.DATA_NOT_FOUND, "数据源不存在")
 
+            # 连接配置可能已变更，释放旧的连接池
+            DatasourceEngineRegistry.dispose(ds_id)
+
             return {
                 "id": datasource.id,
                 "name": datasource.name,
@@ -326,6 +330,9 @@ async def delete_datasource(req: request.Request, ds_id: int):
             if not success:
                 raise MyException(SysCodeEnum.DATA_NOT_FOUND.value, "数据源不存在")
 
+            # 释放已删除数据源的连接池
+            DatasourceEngineRegistry.dispose(ds_id)
+
             return {"message": "删除成功"}
     except MyException:
         raise
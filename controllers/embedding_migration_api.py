@@ -17,6 +17,7 @@ from services.embedding_migration_service import (
     recalculate_terminology_embeddings,
     recalculate_training_embeddings,
     recalculate_table_embeddings,
+    migrate_table_embeddings_to_binary,
 )
 
 logger = logging.getLogger(__name__)
@@ -151,3 +152,15 @@ async def recalculate_embeddings_sync(request: Request):
     result = await recalculate_all_embeddings(modules, progress_callback)
     return result
 
+
+@bp.post("/convert-table-storage")
+@openapi.summary("将表结构 embedding 转换为二进制存储")
+@openapi.tag("数据迁移")
+@check_token
+@async_json_resp
+async def convert_table_embedding_storage(request: Request):
+    """
+    将旧版 JSON 字符串格式的表结构 embedding 转换为 float32 二进制存储（幂等，可重复执行）
+    """
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, migrate_table_embeddings_to_binary)
@@ -6,6 +6,7 @@ from sanic_ext import openapi
 
 from common.exception import MyException
 from common.res_decorator import async_json_resp
+from common.sse_writer import SSEWriter
 from common.token_decorator import check_token
 from constants.code_enum import SysCodeEnum
 from common.param_parser import parse_params
@@ -95,7 +96,12 @@ async def get_answer(req: Request, body: LLMGetAnswerRequest):
                         return response.json(error_body, status=403)
 
         async def stream_fn(response):
-            await llm.exec_query(response, req_obj=req_dict, token=token)
+            # 统一的 SSE 写入器：快速序列化、合并小消息、背压与流统计
+            writer = SSEWriter(response, stream_name=f"{req_dict.get('qa_type')}:{req_dict.get('chat_id')}")
+            try:
+                await llm.exec_query(writer, req_obj=req_dict, token=token)
+            finally:
+                await writer.close()
 
         response = ResponseStream(stream_fn, content_type="text/event-stream")
         return response
@@ -45,7 +45,8 @@ CREATE TABLE t_datasource_table (
   table_name TEXT NOT NULL,
   table_comment TEXT,
   custom_comment TEXT,
-  embedding TEXT
+  embedding TEXT,
+  embedding_vector BYTEA
 );
 
 COMMENT ON TABLE t_datasource_table IS '数据源表信息';
@@ -54,7 +55,8 @@ COMMENT ON COLUMN t_datasource_table.checked IS '是否选中';
 COMMENT ON COLUMN t_datasource_table.table_name IS '表名';
 COMMENT ON COLUMN t_datasource_table.table_comment IS '表注释';
 COMMENT ON COLUMN t_datasource_table.custom_comment IS '自定义注释';
-COMMENT ON COLUMN t_datasource_table.embedding IS '表结构 embedding (JSON 数组字符串)';
+COMMENT ON COLUMN t_datasource_table.embedding IS '表结构 embedding (JSON 数组字符串，已废弃)';
+COMMENT ON COLUMN t_datasource_table.embedding_vector IS '表结构 embedding (float32 二进制)';
 
 -- t_datasource_field definition
 DROP TABLE IF EXISTS t_datasource_field CASCADE;
@@ -3,7 +3,7 @@
 """
 import datetime
 from typing import Optional, List
-from sqlalchemy import Column, BigInteger, DateTime, Text, JSON, Boolean
+from sqlalchemy import Column, BigInteger, DateTime, Text, JSON, Boolean, LargeBinary
 from sqlalchemy.orm import Mapped, mapped_column
 from model.db_connection_pool import Base
 
@@ -37,8 +37,12 @@ class DatasourceTable(Base):
     table_name: Mapped[str] = mapped_column(Text, nullable=False, comment="表名")
     table_comment: Mapped[Optional[str]] = mapped_column(Text, nullable=True, comment="表注释")
     custom_comment: Mapped[Optional[str]] = mapped_column(Text, nullable=True, comment="自定义注释")
-    # 表结构向量：基于“表名 + 注释 + 字段名 + 字段注释”的文本生成的 embedding，存为 JSON 数组字符串
-    embedding: Mapped[Optional[str]] = mapped_column(Text, nullable=True, comment="表结构 embedding (JSON 数组字符串)")
+    # 旧版表结构向量（JSON 数组字符串），已由 embedding_vector 取代，仅用于历史数据迁移
+    embedding: Mapped[Optional[str]] = mapped_column(Text, nullable=True, comment="表结构 embedding (JSON 数组字符串，已废弃)")
+    # 表结构向量：基于“表名 + 注释 + 字段名 + 字段注释”的文本生成的 embedding，存为 float32 小端字节串
+    embedding_vector: Mapped[Optional[bytes]] = mapped_column(
+        LargeBinary, nullable=True, comment="表结构 embedding (float32 二进制)"
+    )
 
 
 class DatasourceField(Base):
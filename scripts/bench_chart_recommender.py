@@ -0,0 +1,91 @@
+"""
+规则图表推荐基准
+用一组常见的查询结果形态（时间趋势、分类统计、占比、明细、宽表等）评估 common.chart_recommender：
+    - 规则命中率：recommend_chart 直接给出配置、无需调用 LLM 的比例
+    - 每个形态的推荐结果与期望是否一致
+    - 规则推荐耗时
+
+用法：
+    python scripts/bench_chart_recommender.py [--rows 200] [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.chart_recommender import recommend_chart  # noqa: E402
+
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "成都", "武汉", "西安", "南京", "重庆", "天津", "苏州"]
+CHANNELS = ["线上", "线下", "分销"]
+
+
+def build_corpus(n: int):
+    """
+    构造结果形态语料：(名称, 问题, 结果行, 期望的图表类型，None 表示应交给 LLM)
+    """
+    rng = np.random.default_rng(42)
+    days = [date(2024, 1, 1) + timedelta(days=i) for i in range(n)]
+    months = [f"2024-{m:02d}" for m in range(1, 13)]
+    many = [f"商品{i:04d}" for i in range(n)]
+
+    return [
+        ("按日趋势", "最近每天的销售额趋势", [{"dt": d, "amount": Decimal(f"{v:.2f}")} for d, v in zip(days, rng.random(n) * 1e4)], "line"),
+        ("按月趋势", "2024 年每月订单数", [{"month": m, "orders": int(v)} for m, v in zip(months, rng.integers(100, 900, 12))], "line"),
+        ("趋势+渠道", "各渠道每月销售额", [{"month": m, "channel": c, "amount": float(rng.random() * 1e4)} for m in months for c in CHANNELS], "line"),
+        ("城市排行", "各城市的销售额", [{"city": c, "amount": float(rng.random() * 1e5)} for c in CITIES[:6]], "column"),
+        ("城市占比", "各渠道销售额占比", [{"channel": c, "amount": float(rng.random() * 1e5)} for c in CHANNELS], "pie"),
+        ("多类别排行", "各商品的销量", [{"product": p, "qty": int(q)} for p, q in zip(many[:40], rng.integers(1, 500, 40))], "bar"),
+        ("城市×渠道", "各城市不同渠道的订单数", [{"city": c, "channel": ch, "orders": int(rng.integers(10, 99))} for c in CITIES[:6] for ch in CHANNELS], "column"),
+        ("单行汇总", "今年总销售额是多少", [{"total_amount": 123456.78}], "table"),
+        ("单行多指标", "今年订单数和销售额", [{"orders": 321, "amount": 98765.4}], "table"),
+        ("明细列表", "列出最近的订单明细", [{"order_no": f"SO{i:06d}", "customer": f"客户{i}", "city": CITIES[i % 12]} for i in range(n)], "table"),
+        ("多指标分类", "各城市的订单数、销售额和客单价", [{"city": c, "orders": int(rng.integers(10, 99)), "amount": float(rng.random() * 1e5), "avg": float(rng.random() * 500)} for c in CITIES], None),
+        ("多时间列", "订单的下单时间和发货时间", [{"created": d, "shipped": d + timedelta(days=2), "amount": float(v)} for d, v in zip(days, rng.random(n))], None),
+        ("高基数标识", "每个用户的消费金额", [{"user_id": 100000 + i, "amount": float(v)} for i, v in enumerate(rng.random(n) * 1e3)], None),
+        ("宽表", "客户画像", [{f"f{j}": float(rng.random()) for j in range(12)} | {"name": f"客户{i}"} for i in range(n)], None),
+        ("类别过多", "各商品销量", [{"product": p, "qty": int(q)} for p, q in zip(many, rng.integers(1, 500, n))], None),
+        ("指定表格", "用表格展示各城市销售额", [{"city": c, "amount": float(rng.random() * 1e5)} for c in CITIES[:6]], "table"),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200, help="明细/趋势类形态的行数")
+    parser.add_argument("--repeat", type=int, default=20, help="每个形态重复推荐的次数")
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.rows)
+    hits = matches = 0
+    total_time = 0.0
+    print(f"{'形态':<10}{'行数':>6}  {'期望':<8}{'结果':<8}{'一致':<6}{'耗时(ms)':>10}")
+    for name, question, rows, expected in corpus:
+        chart_type = "table" if "表格" in question else None
+        start = time.perf_counter()
+        for _ in range(args.repeat):
+            config = recommend_chart(rows, chart_type=chart_type, question=question)
+        elapsed = (time.perf_counter() - start) / args.repeat
+        total_time += elapsed
+
+        actual = config["type"] if config else None
+        hits += config is not None
+        matches += actual == expected
+        print(
+            f"{name:<10}{len(rows):>6}  {expected or 'LLM':<8}{actual or 'LLM':<8}"
+            f"{'✓' if actual == expected else '✗':<6}{elapsed * 1000:>10.2f}"
+        )
+
+    print(
+        f"\n形态 {len(corpus)} 个，规则命中 {hits} 个（命中率 {hits / len(corpus):.0%}），"
+        f"与期望一致 {matches} 个，规则推荐平均耗时 {total_time / len(corpus) * 1000:.2f}ms"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+"""
+结果渲染对比基准
+对比逐行渲染（改造前的实现）与列式渲染的输出与耗时：
+    1. 数据渲染节点：逐行 convert_value + 列名映射  vs  common.columnar_render.render_records
+    2. ECharts 数据处理：逐值 format_value 的表格/柱状图/折线图/饼图处理  vs  services.db_qadata_process.process_chart_data
+两种实现的输出逐条比较（取值与类型都需一致），不一致时打印前几条差异。
+结果集包含含 NULL 的整数列、超过 2^53 的整数、Decimal、日期时间、日期、浮点比例和字符串列。
+
+用法：
+    python scripts/bench_columnar_render.py [--rows 10000,1000000]
+第 2 部分依赖 services.db_qadata_process 的运行环境（sqlalchemy 等），无法导入时跳过。
+"""
+
+import argparse
+import gc
+import os
+import re
+import sys
+import time
+from datetime import date, datetime, timedelta
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.columnar_render import render_records  # noqa: E402
+
+COLUMNS = ["id", "qty", "amount", "ratio", "created_at", "biz_date", "city"]
+NAMES = ["编号", "数量", "金额", "占比", "创建时间", "业务日期", "城市"]
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", None]
+
+
+def build_rows(n: int):
+    """构造结果行（约 5% 的取值为 NULL）"""
+    rng = np.random.default_rng(7)
+    qty = rng.integers(0, 1000, n)
+    cents = rng.integers(0, 10_000_000, n)
+    ratio = rng.random(n)
+    seconds = rng.integers(0, 365 * 86400, n)
+    nulls = rng.random((n, 5)) < 0.05
+    base = datetime(2024, 1, 1)
+    rows = []
+    for i in range(n):
+        created = base + timedelta(seconds=int(seconds[i]))
+        rows.append(
+            {
+                "id": None if nulls[i, 0] else 9007199254740993 + i,
+                "qty": None if nulls[i, 1] else int(qty[i]),
+                "amount": None if nulls[i, 2] else Decimal(int(cents[i])) / 100,
+                "ratio": None if nulls[i, 3] else round(float(ratio[i]), 4),
+                "created_at": created,
+                "biz_date": None if nulls[i, 4] else created.date(),
+                "city": CITIES[i % len(CITIES)],
+            }
+        )
+    return rows
+
+
+# ---------------------------------------------------------------- 改造前的逐行实现
+
+
+def legacy_convert_value(v):
+    if isinstance(v, Decimal):
+        return float(v)
+    elif isinstance(v, (datetime,)):
+        return v.strftime("%Y-%m-%d %H:%M:%S")
+    elif isinstance(v, date):
+        return v.strftime("%Y-%m-%d")
+    else:
+        return v
+
+
+def legacy_render(rows, column_mapping):
+    formatted_data = []
+    for row in rows:
+        formatted_row = {}
+        for col_name, value in row.items():
+            formatted_row[column_mapping.get(col_name, col_name)] = legacy_convert_value(value)
+        formatted_data.append(formatted_row)
+    return formatted_data
+
+
+_count_pattern = r"\* (100(\.0)?)"
+_pattern = re.compile(".*[一-龥]+.*")
+
+
+def _is_number(str_num):
+    if not str_num:
+        return False
+    try:
+        float(str_num)
+        return True
+    except ValueError:
+        return False
+
+
+def _is_numeric(value) -> bool:
+    try:
+        float(value)
+        return True
+    except (ValueError, TypeError):
+        return False
+
+
+def _is_valid_date(value) -> bool:
+    return bool(re.compile(r"^\d{4}-\d{2}-\d{2}$").match(value))
+
+
+def legacy_format_value(table_or_pie, llm_info, key, value_str):
+    if _is_number(value_str):
+        decimal = Decimal(value_str)
+        if any(kw in key for kw in ["比例", "占比", "比率", "百分比", "概率"]):
+            if re.search(_count_pattern, llm_info.get("sql", "")):
+                decimal = decimal.quantize(Decimal(".01"), rounding=ROUND_HALF_UP)
+            else:
+                decimal *= Decimal("100")
+                decimal = decimal.quantize(Decimal(".01"), rounding=ROUND_HALF_UP)
+            return f"{decimal}%" if table_or_pie else str(decimal)
+        else:
+            decimal = decimal.quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+        return str(decimal)
+    return value_str or "0"
+
+
+def legacy_process(chart_type, columns, rows):
+    """改造前 process 中各图表类型的处理（输入为 JSON 序列化/反序列化后的结果行）"""
+    llm_info = {"type": chart_type}
+    if chart_type == "response_table":
+        return [{col: legacy_format_value(True, llm_info, col, data.get(col, "")) for col in columns} for data in rows]
+    if chart_type == "response_pie_chart":
+        pie_data_list = []
+        for data_map in rows:
+            pie_data = {}
+            for key, value in data_map.items():
+                if key == columns[0]:
+                    pie_data["name"] = "" if value is None else value
+                else:
+                    pie_value = legacy_format_value(True, llm_info, key, value)
+                    if pie_value and "%" in pie_value:
+                        pie_data["value"] = pie_value.split("%")[0]
+                        pie_data["percent"] = True
+                    else:
+                        pie_data["value"] = pie_value
+                        pie_data["percent"] = False
+            pie_data_list.append(pie_data)
+        return pie_data_list
+    if chart_type == "response_bar_chart":
+        column_array = columns.copy()
+        column_array[0] = "product"
+        for k in range(1, len(column_array)):
+            if column_array[k] and not re.match(r"^[一-龥]+$", column_array[k]):
+                for key, item_value in rows[0].items():
+                    if _is_numeric(item_value):
+                        column_array[k] = "数量"
+                    elif _is_valid_date(item_value):
+                        column_array[k] = "日期"
+        data_list = [column_array]
+        for item in rows:
+            item_data = []
+            for column_key in columns:
+                value = item.get(column_key, "")
+                if not _is_numeric(value):
+                    item_data.append("未知" if not value else value)
+                else:
+                    item_data.append(legacy_format_value(False, llm_info, column_key, value))
+            data_list.append(item_data)
+        return data_list
+    # response_line_chart
+    item_date, item_value = [], []
+    for result in rows:
+        for key, value in result.items():
+            if key == columns[0]:
+                item_date.append(value)
+            else:
+                item_value.append(legacy_format_value(False, llm_info, key, value))
+    return [item_date, item_value]
+
+
+# ---------------------------------------------------------------- 对比
+
+
+def compare(expected, actual, label: str, limit: int = 5) -> int:
+    """逐条比较（取值与类型），返回不一致的条数"""
+    mismatches = 0
+    if len(expected) != len(actual):
+        print(f"    ✗ {label}: 条数不一致 {len(expected)} != {len(actual)}")
+        return abs(len(expected) - len(actual))
+    for i, (a, b) in enumerate(zip(expected, actual)):
+        if a == b and _types(a) == _types(b):
+            continue
+        mismatches += 1
+        if mismatches <= limit:
+            print(f"    ✗ {label} 第 {i} 条:\n      旧: {a!r}\n      新: {b!r}")
+    return mismatches
+
+
+def _types(value):
+    if isinstance(value, dict):
+        return [(k, type(v)) for k, v in value.items()]
+    if isinstance(value, list):
+        return [type(v) for v in value]
+    return type(value)
+
+
+def timed(func, *args):
+    gc.collect()
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def bench_render(rows):
+    mapping = dict(zip(COLUMNS, NAMES))
+    legacy, t_old = timed(legacy_render, rows, mapping)
+    (_, columnar), t_new = timed(render_records, rows, COLUMNS, NAMES)
+    mismatches = compare(legacy, columnar, "render_records")
+    print(
+        f"  数据渲染        逐行 {t_old:8.3f}s  列式 {t_new:8.3f}s  加速 {t_old / t_new:5.1f}x  "
+        f"不一致 {mismatches} 条"
+    )
+    return columnar
+
+
+def bench_chart(rendered):
+    try:
+        from services.db_qadata_process import process_chart_data
+    except ImportError as e:
+        print(f"  ECharts 数据处理：无法导入 services.db_qadata_process（{e}），跳过")
+        return
+
+    import json
+
+    cases = {
+        "response_table": NAMES,
+        "response_bar_chart": ["城市", "数量", "金额"],
+        "response_line_chart": ["创建时间", "金额"],
+        "response_pie_chart": ["城市", "占比"],
+    }
+    for chart_type, columns in cases.items():
+        rows = [{col: row[col] for col in columns} for row in rendered]
+        # 改造前经过 json.dumps + json.loads，取值为 JSON 反序列化后的类型
+        legacy_rows = json.loads(json.dumps(rows, ensure_ascii=False))
+        legacy, t_old = timed(legacy_process, chart_type, columns, legacy_rows)
+        payload = {"llm": {"type": chart_type}, "data": {"column": columns, "result": rows}}
+        result, t_new = timed(process_chart_data, payload)
+        mismatches = compare(legacy, result["data"], chart_type)
+        print(
+            f"  {chart_type:<20}逐值 {t_old:8.3f}s  列式 {t_new:8.3f}s  加速 {t_old / t_new:5.1f}x  "
+            f"不一致 {mismatches} 条"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,1000000", help="结果行数，逗号分隔")
+    args = parser.parse_args()
+
+    for n in (int(v) for v in args.rows.split(",")):
+        print(f"\n{n} 行：")
+        rows = build_rows(n)
+        rendered = bench_render(rows)
+        del rows
+        bench_chart(rendered)
+        del rendered
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Excel 工作簿加载基准
+对比 1 / 10 / 50 个 Sheet 的工作簿通过 URL 加载的耗时：
+    1. 逐 Sheet 读取（改造前的实现）：pd.ExcelFile(url) 获取 Sheet 列表，再对每个 Sheet 调用 pd.read_excel(url, sheet_name)
+    2. 单缓冲区：agent.excel.excel_loader 下载一次，从同一缓冲区一次解析全部 Sheet
+    3. 进程池：同 2，Sheet 分组交给 EXCEL_LOAD_WORKERS 个解析进程（进程池预先启动，不计入耗时）
+工作簿由 openpyxl 生成，通过本地 HTTP 服务提供下载，同时统计每种方式的下载次数；
+三种方式解析出的 DataFrame 逐个比较，确保结果一致。
+
+用法：
+    python scripts/bench_excel_loader.py [--sheets 1,10,50] [--rows 2000] [--workers 2] [--repeat 3]
+"""
+
+import argparse
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.excel import excel_loader  # noqa: E402
+
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "成都"]
+
+
+class _CountingHandler(SimpleHTTPRequestHandler):
+    """静态文件服务，统计 GET 请求次数"""
+
+    requests = 0
+
+    def do_GET(self):
+        _CountingHandler.requests += 1
+        super().do_GET()
+
+    def log_message(self, format, *args):
+        pass
+
+
+def build_workbook(path: str, sheets: int, rows: int):
+    """生成工作簿：每个 Sheet 包含整数、浮点、字符串、日期列"""
+    rng = np.random.default_rng(sheets)
+    base = datetime(2024, 1, 1)
+    wb = Workbook(write_only=True)
+    for s in range(sheets):
+        ws = wb.create_sheet(f"销售明细{s + 1}")
+        ws.append(["订单号", "城市", "数量", "单价", "金额", "折扣", "下单时间", "备注"])
+        qty = rng.integers(1, 100, rows)
+        price = rng.random(rows) * 1000
+        for i in range(rows):
+            ws.append(
+                [
+                    f"SO{s:02d}{i:06d}",
+                    CITIES[i % len(CITIES)],
+                    int(qty[i]),
+                    round(float(price[i]), 2),
+                    round(float(qty[i] * price[i]), 2),
+                    round(float(rng.random()), 3),
+                    base + timedelta(minutes=int(i)),
+                    f"第 {i} 行",
+                ]
+            )
+    wb.save(path)
+
+
+def legacy_load(url: str):
+    """改造前：每个 Sheet 重新下载并解压工作簿"""
+    excel_file_data = pd.ExcelFile(url)
+    dataframes = []
+    for sheet_name in excel_file_data.sheet_names:
+        df = pd.read_excel(url, sheet_name=sheet_name)
+        dataframes.append((sheet_name, df))
+    return dataframes
+
+
+def single_buffer_load(url: str, workers: int):
+    excel_loader.EXCEL_LOAD_WORKERS = workers
+    return excel_loader.load_workbook_sheets(excel_loader.fetch_file_bytes(url), url)
+
+
+def measure(func, url: str, repeat: int):
+    """返回 (解析结果, 最短耗时, 每次加载的下载次数)"""
+    best = float("inf")
+    result = None
+    _CountingHandler.requests = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(url)
+        best = min(best, time.perf_counter() - start)
+    return result, best, _CountingHandler.requests // repeat
+
+
+def same_frames(expected, actual) -> bool:
+    if [name for name, _ in expected] != [name for name, _ in actual]:
+        return False
+    return all(a.equals(b) for (_, a), (_, b) in zip(expected, actual))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sheets", default="1,10,50", help="工作簿的 Sheet 数，逗号分隔")
+    parser.add_argument("--rows", type=int, default=2000, help="每个 Sheet 的行数")
+    parser.add_argument("--workers", type=int, default=2, help="进程池方式的解析进程数")
+    parser.add_argument("--repeat", type=int, default=3, help="每种方式重复次数（取最短耗时）")
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="bench_excel_")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(_CountingHandler, directory=work_dir))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+    try:
+        workbooks = []
+        for sheets in (int(v) for v in args.sheets.split(",")):
+            name = f"sheets_{sheets}.xlsx"
+            path = os.path.join(work_dir, name)
+            build_workbook(path, sheets, args.rows)
+            workbooks.append((sheets, f"{base_url}/{name}", os.path.getsize(path)))
+
+        # 预先启动解析进程（spawn 启动耗时不计入）
+        excel_loader.EXCEL_PARALLEL_MIN_SHEETS = 2
+        single_buffer_load(workbooks[-1][1], args.workers)
+
+        print(
+            f"每个 Sheet {args.rows} 行 × 8 列，解析引擎: {excel_loader._get_engine() or 'openpyxl'}，"
+            f"CPU {os.cpu_count()} 核，进程池 {args.workers} 个进程，重复 {args.repeat} 次取最短"
+        )
+        print(f"{'Sheet 数':>8} {'文件大小':>10} {'逐 Sheet 读取':>16} {'单缓冲区':>16} {'进程池':>16}")
+        for sheets, url, size in workbooks:
+            legacy, t_legacy, d_legacy = measure(legacy_load, url, args.repeat)
+            single, t_single, d_single = measure(lambda u: single_buffer_load(u, 0), url, args.repeat)
+            parallel, t_parallel, d_parallel = measure(lambda u: single_buffer_load(u, args.workers), url, args.repeat)
+            if not (same_frames(legacy, single) and same_frames(legacy, parallel)):
+                print(f"  ✗ {sheets} 个 Sheet：解析结果不一致")
+            print(
+                f"{sheets:>8} {size / 1024:>8.0f}KB "
+                f"{t_legacy:>8.2f}s/{d_legacy:>2}次下载 "
+                f"{t_single:>8.2f}s/{d_single:>2}次下载 "
+                f"{t_parallel:>8.2f}s/{d_parallel:>2}次下载   "
+                f"单缓冲区加速 {t_legacy / t_single:.1f}x，进程池加速 {t_legacy / t_parallel:.1f}x"
+            )
+    finally:
+        server.shutdown()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+本地 Embedding 吞吐基准
+使用 common.local_embedding 加载的本地 CPU 模型（LOCAL_MODEL_PATH / DEFAULT_EMBEDDING_MODEL），对比：
+    1. 逐条推理（改造前的实现）：每条文本单独调用 embed_query
+    2. 批量推理：embed_documents，按不同批次大小切分
+    3. 微批次合并：大量协程并发提交单条文本，由 LocalEmbeddingBatcher 在 max_wait 内合并为一批推理
+输出每种方式每秒处理的文本数；微批次方式同时输出实际的平均批次大小。
+文本为模拟的表结构描述（表名、注释、字段列表），与表结构 embedding 计算场景一致。
+
+用法：
+    python scripts/bench_local_embedding.py [--texts 256] [--batch-sizes 1,8,16,32,64] [--max-wait-ms 10]
+依赖 sentence-transformers / langchain-huggingface，以及本地已下载的模型。
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common import local_embedding  # noqa: E402
+from common.local_embedding import LocalEmbeddingBatcher  # noqa: E402
+
+SUBJECTS = ["订单", "客户", "商品", "库存", "门店", "供应商", "告警", "设备", "合同", "员工"]
+FIELDS = ["编号", "名称", "状态", "金额", "数量", "创建时间", "更新时间", "所属区域", "负责人", "备注"]
+
+
+def build_texts(n: int):
+    """模拟表结构描述（长度 80~200 字）"""
+    texts = []
+    for i in range(n):
+        subject = SUBJECTS[i % len(SUBJECTS)]
+        fields = "，".join(f"{subject}{FIELDS[(i + j) % len(FIELDS)]}" for j in range(4 + i % 7))
+        texts.append(f"表名: t_{subject}_{i:04d}，注释: {subject}信息表（第 {i} 张），字段: {fields}")
+    return texts
+
+
+class _CountingModel:
+    """记录 embed_documents 的调用次数（用于统计微批次的平均大小）"""
+
+    def __init__(self, model):
+        self._model = model
+        self.calls = 0
+
+    def embed_documents(self, texts):
+        self.calls += 1
+        return self._model.embed_documents(texts)
+
+
+def bench_single(model, texts):
+    start = time.perf_counter()
+    for text in texts:
+        model.embed_query(text)
+    return time.perf_counter() - start
+
+
+def bench_batch(model, texts, batch_size: int):
+    start = time.perf_counter()
+    for i in range(0, len(texts), batch_size):
+        model.embed_documents(texts[i : i + batch_size])
+    return time.perf_counter() - start
+
+
+async def bench_coalesced(batcher: LocalEmbeddingBatcher, texts):
+    """每条文本一个协程，同时提交"""
+    start = time.perf_counter()
+    await asyncio.gather(*(asyncio.wrap_future(batcher.submit(text)) for text in texts))
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=256, help="文本数量")
+    parser.add_argument("--batch-sizes", default="1,8,16,32,64", help="批次大小，逗号分隔")
+    parser.add_argument("--max-wait-ms", type=float, default=10, help="微批次凑批的最长等待时间（毫秒）")
+    args = parser.parse_args()
+
+    model = local_embedding._get_local_embedding_model()
+    if model is None:
+        print("本地 embedding 模型不可用（检查 LOCAL_MODEL_PATH 与依赖），跳过")
+        return
+
+    texts = build_texts(args.texts)
+    # 预热（首次推理的初始化开销不计入）
+    model.embed_documents(texts[:8])
+
+    print(
+        f"模型: {local_embedding.DEFAULT_EMBEDDING_MODEL_ID}，文本 {len(texts)} 条，"
+        f"推理线程 {local_embedding.LOCAL_EMBEDDING_THREADS}，CPU {os.cpu_count()} 核"
+    )
+    elapsed = bench_single(model, texts)
+    print(f"  逐条 embed_query               {len(texts) / elapsed:8.1f} 条/秒")
+
+    for batch_size in (int(v) for v in args.batch_sizes.split(",")):
+        elapsed = bench_batch(model, texts, batch_size)
+        print(f"  embed_documents 批次 {batch_size:>3}         {len(texts) / elapsed:8.1f} 条/秒")
+
+    counting = _CountingModel(model)
+    local_embedding._embedding_model = counting
+    try:
+        for batch_size in (int(v) for v in args.batch_sizes.split(",")):
+            batcher = LocalEmbeddingBatcher(batch_size=batch_size, max_wait_ms=args.max_wait_ms)
+            counting.calls = 0
+            elapsed = asyncio.run(bench_coalesced(batcher, texts))
+            print(
+                f"  并发单条 → 微批次 上限 {batch_size:>3}    {len(texts) / elapsed:8.1f} 条/秒  "
+                f"（{counting.calls} 批，平均 {len(texts) / counting.calls:.1f} 条/批）"
+            )
+    finally:
+        local_embedding._embedding_model = model
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+并行任务状态共享基准
+parallel_collect 为图表生成、结果总结、推荐问题 3 个并行任务准备状态，对比 10k / 100k / 500k 行执行结果下：
+    1. 深拷贝（改造前的实现）：每个任务 copy.deepcopy(state)
+    2. 写时复制：common.state_view.build_shared_state 构建一份只读基础状态，每个任务一个 TaskStateView
+输出准备状态的耗时和 tracemalloc 统计的新增内存峰值（单独运行一次，不计入耗时），
+并检查各任务写入互不影响、原始状态保持不变、共享的结果行不可被原地修改。
+
+用法：
+    python scripts/bench_state_view.py [--rows 10000,100000,500000] [--tasks 3]
+"""
+
+import argparse
+import copy
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agent.text2sql.state.agent_state import ExecutionResult  # noqa: E402
+from common.state_view import TaskStateView, build_shared_state  # noqa: E402
+
+CITIES = ["北京", "上海", "广州", "深圳", "杭州", "成都"]
+
+
+def build_state(n: int):
+    """构造 sql_executor 之后的图状态"""
+    rows = [
+        {
+            "order_id": 100000 + i,
+            "city": CITIES[i % len(CITIES)],
+            "product": f"商品{i % 500:03d}",
+            "qty": i % 97,
+            "amount": round(i * 1.37 % 10000, 2),
+            "ratio": (i % 1000) / 1000,
+            "created_at": f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d} 12:00:00",
+            "remark": f"第 {i} 笔订单",
+        }
+        for i in range(n)
+    ]
+    return {
+        "user_query": "各城市的销售额",
+        "db_info": {"tables": {f"t_{i}": {"columns": {"id": {"type": "INT"}}} for i in range(50)}},
+        "generated_sql": "SELECT * FROM t_order",
+        "execution_result": ExecutionResult(success=True, data=rows),
+        "attempts": 1,
+    }
+
+
+def prepare_deepcopy(state, tasks: int):
+    return [copy.deepcopy(state) for _ in range(tasks)]
+
+
+def prepare_shared(state, tasks: int):
+    shared_state = build_shared_state(state)
+    return [TaskStateView(shared_state) for _ in range(tasks)]
+
+
+def timed(func, state, tasks: int) -> float:
+    gc.collect()
+    start = time.perf_counter()
+    func(state, tasks)
+    return time.perf_counter() - start
+
+
+def peak_memory(func, state, tasks: int) -> int:
+    gc.collect()
+    tracemalloc.start()
+    views = func(state, tasks)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del views
+    return peak
+
+
+def check_isolation(state, tasks: int) -> bool:
+    """各任务写入互不影响，原始状态不变，共享行列表只读"""
+    views = prepare_shared(state, tasks)
+    for i, view in enumerate(views):
+        view["chart_config"] = {"task": i}
+    isolated = all(view["chart_config"] == {"task": i} for i, view in enumerate(views))
+    untouched = "chart_config" not in state and isinstance(state["execution_result"].data, list)
+    try:
+        views[0]["execution_result"].data.append({})
+        read_only = False
+    except AttributeError:
+        read_only = True
+    same_rows = views[0]["execution_result"].data[0] is state["execution_result"].data[0]
+    return isolated and untouched and read_only and same_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", default="10000,100000,500000", help="结果行数，逗号分隔")
+    parser.add_argument("--tasks", type=int, default=3, help="并行任务数")
+    args = parser.parse_args()
+
+    mb = 1024 * 1024
+    print(f"并行任务 {args.tasks} 个，每行 8 个字段")
+    print(f"{'行数':>8} {'耗时 深拷贝/写时复制':>28} {'新增内存峰值 深拷贝/写时复制':>30}  隔离检查")
+    for n in (int(v) for v in args.rows.split(",")):
+        state = build_state(n)
+        t_copy = timed(prepare_deepcopy, state, args.tasks)
+        t_shared = timed(prepare_shared, state, args.tasks)
+        m_copy = peak_memory(prepare_deepcopy, state, args.tasks)
+        m_shared = peak_memory(prepare_shared, state, args.tasks)
+        print(
+            f"{n:>8} {t_copy:>10.3f}s/{t_shared:>8.4f}s（{t_copy / t_shared:7.0f}x） "
+            f"{m_copy / mb:>12.1f}MB/{m_shared / mb:>7.1f}MB  "
+            f"{'通过' if check_isolation(state, args.tasks) else '✗ 失败'}"
+        )
+        del state
+        gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+表结构 embedding 存储格式基准
+对比 1k / 10k / 50k 张表的 embedding 从元数据库加载为 NumPy 矩阵的耗时与内存：
+    1. JSON 文本（改造前的实现）：t_datasource_table.embedding 逐行 json.loads，再整体转换为 float32 矩阵
+    2. float32 二进制：t_datasource_table.embedding_vector 由 common.vector_util.decode_vector_matrix 整批解码
+元数据表用本地 SQLite 模拟（两种方式都只查询表名和向量列），同时统计两种格式的存储字节数，
+并比较两种方式得到的矩阵是否完全一致。内存为 tracemalloc 统计的加载过程峰值（单独运行一次，不计入耗时）。
+每次加载在独立子进程中运行，内存不足被系统终止时记为 OOM，不影响其它测量。
+
+用法：
+    python scripts/bench_vector_storage.py [--tables 1000,10000,50000] [--dim 1024]
+"""
+
+import argparse
+import gc
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from common.vector_util import decode_vector_matrix, encode_vector  # noqa: E402
+
+
+def build_fixture(path: str, tables: int, dim: int):
+    """生成元数据表：同一向量分别以 JSON 文本和 float32 字节串保存"""
+    rng = np.random.default_rng(tables)
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE t_datasource_table (table_name TEXT, embedding TEXT, embedding_vector BLOB)")
+    for start in range(0, tables, 1000):
+        vectors = rng.standard_normal((min(1000, tables - start), dim)).astype(np.float32)
+        conn.executemany(
+            "INSERT INTO t_datasource_table VALUES (?, ?, ?)",
+            [
+                (f"t_{start + i:06d}", json.dumps(vector.tolist()), encode_vector(vector))
+                for i, vector in enumerate(vectors)
+            ],
+        )
+    conn.commit()
+    sizes = conn.execute("SELECT SUM(LENGTH(embedding)), SUM(LENGTH(embedding_vector)) FROM t_datasource_table").fetchone()
+    conn.close()
+    return sizes
+
+
+def load_json(path: str) -> np.ndarray:
+    """改造前：逐行解析 JSON 文本"""
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT table_name, embedding FROM t_datasource_table").fetchall()
+    conn.close()
+    embeddings = [json.loads(raw) for _, raw in rows]
+    return np.array(embeddings).astype("float32")
+
+
+def load_binary(path: str) -> np.ndarray:
+    """float32 二进制：整批拼接后一次解码"""
+    conn = sqlite3.connect(path)
+    rows = conn.execute("SELECT table_name, embedding_vector FROM t_datasource_table").fetchall()
+    conn.close()
+    matrix, _ = decode_vector_matrix(raw for _, raw in rows)
+    return matrix
+
+
+def _measure(func, path, traced: bool, conn):
+    """子进程：返回 (耗时或峰值内存, 矩阵摘要)"""
+    gc.collect()
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    matrix = func(path)
+    elapsed = time.perf_counter() - start
+    if traced:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    conn.send((peak if traced else elapsed, hashlib.sha1(matrix.tobytes()).hexdigest()))
+    conn.close()
+
+
+def run_isolated(func, path, traced: bool = False):
+    """在子进程中加载一次，被系统终止（内存不足）时返回 (None, None)"""
+    ctx = multiprocessing.get_context("fork")
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_measure, args=(func, path, traced, child_conn))
+    process.start()
+    child_conn.close()
+    try:
+        result = parent_conn.recv()
+    except EOFError:
+        result = (None, None)
+    process.join()
+    return result
+
+
+def _fmt(value, template: str, scale: float = 1) -> str:
+    """格式化测量值，子进程内存不足时显示 OOM"""
+    return "OOM" if value is None else template.format(value / scale)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", default="1000,10000,50000", help="表数量，逗号分隔")
+    parser.add_argument("--dim", type=int, default=1024, help="向量维度")
+    args = parser.parse_args()
+
+    mb = 1024 * 1024
+    print(f"向量维度 {args.dim}")
+    print(f"{'表数量':>8} {'存储 JSON/二进制':>20} {'加载耗时 JSON/二进制':>24} {'峰值内存 JSON/二进制':>24}")
+    work_dir = tempfile.mkdtemp(prefix="bench_vector_")
+    try:
+        for tables in (int(v) for v in args.tables.split(",")):
+            path = os.path.join(work_dir, f"meta_{tables}.db")
+            json_bytes, binary_bytes = build_fixture(path, tables, args.dim)
+
+            t_json, digest_json = run_isolated(load_json, path)
+            t_binary, digest_binary = run_isolated(load_binary, path)
+            if digest_json is not None and digest_json != digest_binary:
+                print(f"  ✗ {tables} 张表：两种方式加载的矩阵不一致")
+            m_json, _ = run_isolated(load_json, path, traced=True)
+            m_binary, _ = run_isolated(load_binary, path, traced=True)
+
+            speedup = f"{t_json / t_binary:5.1f}x" if t_json and t_binary else "  -  "
+            print(
+                f"{tables:>8} {json_bytes / mb:>9.1f}MB/{binary_bytes / mb:>7.1f}MB "
+                f"{_fmt(t_json, '{:.3f}s'):>10}/{_fmt(t_binary, '{:.3f}s'):>8}（{speedup}） "
+                f"{_fmt(m_json, '{:.1f}MB', mb):>9}/{_fmt(m_binary, '{:.1f}MB', mb):>7}"
+            )
+            os.remove(path)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
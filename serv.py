@@ -84,6 +84,45 @@ async def init_minio(app, loop):
         )
 
 
+@app.main_process_start
+async def migrate_table_embedding_storage(app, loop):
+    """
+    在主进程启动时将旧版 JSON 格式的表结构 embedding 迁移为 float32 二进制存储（只执行一次，幂等）
+    """
+    import logging
+
+    logger = logging.getLogger(__name__)
+
+    try:
+        from services.embedding_migration_service import migrate_table_embeddings_to_binary
+
+        result = await loop.run_in_executor(None, migrate_table_embeddings_to_binary)
+        if result["total"]:
+            logger.info(f"✅ [SERV] {result['message']}")
+    except Exception as e:
+        logger.warning(f"⚠️ [SERV] Table embedding storage migration failed: {e}")
+
+
+@app.after_server_start
+async def start_duckdb_session_reaper(app, loop):
+    """
+    在每个 worker 启动后注册表格问答 DuckDB 会话的后台回收任务
+    """
+    from agent.excel.excel_duckdb_manager import run_session_reaper
+
+    app.add_task(run_session_reaper(), name="duckdb_session_reaper")
+
+
+@app.after_server_start
+async def start_invalidation_listener(app, loop):
+    """
+    在每个 worker 启动后监听其它 worker 发布的缓存失效事件（未配置 Redis 时不启动）
+    """
+    from common import invalidation_bus
+
+    invalidation_bus.start_invalidation_listener()
+
+
 autodiscover(
     app,
     controllers,
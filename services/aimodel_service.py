@@ -7,6 +7,7 @@ from typing import List, Optional
 from sqlalchemy import desc
 
 from common.exception import MyException
+from common.invalidation_bus import InvalidationTopic, publish
 from constants.code_enum import SysCodeEnum
 from model.db_connection_pool import get_db_pool
 from model.db_models import TAiModel
@@ -15,6 +16,17 @@ from model.serializers import model_to_dict
 logger = logging.getLogger(__name__)
 pool = get_db_pool()
 
+
+def _invalidate_model_caches():
+    """
+    AI 模型配置变更后发布失效事件，使所有 worker 中依赖模型配置的运行时缓存失效
+    （已编译图和 DatabaseService 缓存、LLM 及 embedding / rerank 客户端，查询向量缓存与模型绑定）
+    """
+    try:
+        publish(InvalidationTopic.AI_MODEL)
+    except Exception as e:
+        logger.warning(f"清理模型相关缓存失败: {e}")
+
 async def query_model_list(keyword: str = None, model_type: int = None) -> List[dict]:
     with pool.get_session() as session:
         query = session.query(TAiModel)
@@ -80,6 +92,7 @@ async def add_model(data: dict) -> bool:
         )
         session.add(new_model)
         session.commit()
+        _invalidate_model_caches()
         return True
 
 async def update_model(model_id: int, data: dict) -> bool:
@@ -108,6 +121,7 @@ async def update_model(model_id: int, data: dict) -> bool:
             model.config = json.dumps(data['config_list'])
             
         session.commit()
+        _invalidate_model_caches()
         return True
 
 async def delete_model(model_id: int) -> bool:
@@ -121,6 +135,7 @@ async def delete_model(model_id: int) -> bool:
              
         session.delete(model)
         session.commit()
+        _invalidate_model_caches()
         return True
 
 async def set_default_model(model_id: int) -> bool:
@@ -143,6 +158,7 @@ async def set_default_model(model_id: int) -> bool:
         
         model.default_model = True
         session.commit()
+        _invalidate_model_caches()
         return True
 
 async def get_default_model() -> Optional[dict]:
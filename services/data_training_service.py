@@ -6,6 +6,7 @@ from typing import Optional, List, Dict, Any
 from sqlalchemy import select, func, desc, or_, and_
 
 from common.exception import MyException
+from common.invalidation_bus import InvalidationTopic, publish
 from constants.code_enum import SysCodeEnum
 from model.db_connection_pool import get_db_pool
 from model.db_models import TDataTraining, TAiModel
@@ -103,6 +104,7 @@ async def create_training(data: Dict[str, Any], oid: int = 1) -> bool:
         )
         session.add(new_training)
         session.commit()
+        publish(InvalidationTopic.TRAINING, datasource)
         return True
 
 
@@ -156,6 +158,7 @@ async def update_training(data: Dict[str, Any], oid: int = 1) -> bool:
             training.enabled = data.get("enabled", training.enabled)
 
             session.commit()
+            publish(InvalidationTopic.TRAINING, training.datasource)
             return True
         return False
 
@@ -164,6 +167,7 @@ async def delete_training(ids: List[int]) -> bool:
     with pool.get_session() as session:
         session.query(TDataTraining).filter(TDataTraining.id.in_(ids)).delete(synchronize_session=False)
         session.commit()
+        publish(InvalidationTopic.TRAINING)
         return True
 
 
@@ -175,4 +179,5 @@ async def enable_training(training_id: int, enabled: bool) -> bool:
 
         training.enabled = enabled
         session.commit()
+        publish(InvalidationTopic.TRAINING, training.datasource)
         return True
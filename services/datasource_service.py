@@ -13,9 +13,10 @@ from sqlalchemy import and_
 from sqlalchemy.orm import Session
 
 from model.datasource_models import Datasource, DatasourceTable, DatasourceField, DatasourceAuth
+from common.invalidation_bus import InvalidationTopic, publish
 from common.permission_util import is_admin
+from common.vector_util import encode_vector
 from model.db_connection_pool import get_db_pool
-from model.db_models import TAiModel
 # 延迟导入 langfuse，避免在模块加载时触发 OpenTelemetry 初始化问题
 # from langfuse.openai import OpenAI
 
@@ -25,6 +26,33 @@ logger = logging.getLogger(__name__)
 class DatasourceService:
     """数据源服务类"""
 
+    @staticmethod
+    def _invalidate_runtime_caches(ds_id: Optional[int], **payload):
+        """
+        数据源元数据变更后发布失效事件，订阅方（已编译图、DatabaseService、表结构缓存等）在所有 worker 中失效
+        """
+        try:
+            publish(InvalidationTopic.DATASOURCE, ds_id, **payload)
+        except Exception as e:
+            logger.warning(f"清理数据源 {ds_id} 的运行时缓存失败: {e}")
+
+    @staticmethod
+    def _refresh_retrieval_index(ds_id: int, table_ids: Optional[List[int]] = None):
+        """
+        表同步后全量重建数据源的检索索引，表/字段注释变更后增量更新
+        :param ds_id: 数据源ID
+        :param table_ids: 需要增量更新的表ID，为 None 时全量重建
+        """
+        try:
+            from agent.text2sql.database.retrieval_index import build_retrieval_index, update_retrieval_index
+
+            if table_ids is None:
+                build_retrieval_index(ds_id)
+            else:
+                update_retrieval_index(ds_id, table_ids)
+        except Exception as e:
+            logger.warning(f"更新数据源 {ds_id} 的检索索引失败: {e}", exc_info=True)
+
     @staticmethod
     def get_datasource_list(session: Session, user_id: Optional[int] = None) -> List[Datasource]:
         """
@@ -105,6 +133,7 @@ class DatasourceService:
         if tables:
             DatasourceService._save_tables_and_fields(session, datasource, tables)
             session.commit()
+            DatasourceService._refresh_retrieval_index(datasource.id)
 
         return datasource
 
@@ -123,7 +152,7 @@ class DatasourceService:
 
         # 获取源库总表数，用于 num 统计
         try:
-            all_db_tables = DatasourceConnectionUtil.get_tables(datasource.type, config)
+            all_db_tables = DatasourceConnectionUtil.get_tables(datasource.type, config, datasource.id)
             total_count = len(all_db_tables)
         except Exception:
             total_count = len(tables)
@@ -161,7 +190,7 @@ class DatasourceService:
 
             # 同步字段
             try:
-                fields = DatasourceConnectionUtil.get_fields(datasource.type, config, table_name)
+                fields = DatasourceConnectionUtil.get_fields(datasource.type, config, table_name, datasource.id)
             except Exception:
                 fields = []
 
@@ -242,48 +271,20 @@ class DatasourceService:
     @staticmethod
     def _get_embedding_client():
         """
-        获取 embedding 客户端和模型名称
+        获取在线 embedding 客户端
         表结构 embedding 支持在线模型和离线模型切换
-        优先使用在线模型，如果没有配置则使用离线模型
+        优先使用在线模型，如果没有配置则返回 None（使用离线模型）
         """
         try:
-            db_pool = get_db_pool()
-            with db_pool.get_session() as session:
-                # model_type: 2 -> Embedding
-                model = session.query(TAiModel).filter(TAiModel.model_type == 2, TAiModel.default_model == True).first()
-                
-                if not model:
-                    # 尝试查找任何 embedding 模型
-                    model = session.query(TAiModel).filter(TAiModel.model_type == 2).first()
-                
-                if not model:
-                    logger.info("未配置在线嵌入模型（model_type=2），将使用离线模型计算表 embedding")
-                    return None, None
-                
-                # 处理 base_url，确保包含协议前缀
-                base_url = (model.api_domain or "").strip()
-                if not base_url:
-                    logger.warning("表结构 embedding 在线模型的 API Domain 为空，将使用离线模型")
-                    return None, None
-                
-                if not base_url.startswith(("http://", "https://")):
-                    # 本地地址默认 http，其它默认 https
-                    if base_url.startswith(("localhost", "127.0.0.1", "0.0.0.0")):
-                        base_url = f"http://{base_url}"
-                    else:
-                        base_url = f"https://{base_url}"
-                
-                # 延迟导入，避免在模块加载时触发 OpenTelemetry 初始化问题
-                from langfuse.openai import OpenAI
-                embedding_client = OpenAI(
-                    api_key=model.api_key or "empty",
-                    base_url=base_url
-                )
-                logger.info(f"✅ 使用在线模型计算表 embedding: {model.base_model} ({base_url})")
-                return embedding_client, model.base_model
+            from services.model_client_registry import ModelClientRegistry
+
+            embedding_client = ModelClientRegistry.get_embedding_client()
+            if not embedding_client:
+                logger.info("未配置在线嵌入模型（model_type=2），将使用离线模型计算表 embedding")
+            return embedding_client
         except Exception as e:
             logger.warning(f"获取在线 embedding 客户端失败: {e}，将使用离线模型")
-            return None, None
+            return None
 
     @staticmethod
     def _build_table_document(table: DatasourceTable, fields: List[Dict[str, Any]]) -> str:
@@ -326,7 +327,7 @@ class DatasourceService:
             fields: 字段列表
         """
         # 检查是否有 embedding 字段
-        if not hasattr(table, 'embedding'):
+        if not hasattr(table, 'embedding_vector'):
             logger.debug(f"表 {table.table_name} 没有 embedding 字段，跳过计算")
             return
         
@@ -338,14 +339,16 @@ class DatasourceService:
             return
         
         # 获取 embedding 客户端（支持在线/离线模型切换）
-        embedding_client, model_name = DatasourceService._get_embedding_client()
+        embedding_client = DatasourceService._get_embedding_client()
         
         try:
-            if embedding_client and model_name:
+            if embedding_client:
                 # 使用在线模型
-                logger.info(f"计算表 {table.table_name} 的 embedding（在线模型: {model_name}）...")
-                response = embedding_client.embeddings.create(model=model_name, input=document)
-                embedding_vec = response.data[0].embedding
+                logger.info(f"计算表 {table.table_name} 的 embedding（在线模型: {embedding_client.model_name}）...")
+                embedding_vec = embedding_client.embed_query(document)
+                if not embedding_vec:
+                    logger.warning(f"在线模型生成表 {table.table_name} 的 embedding 失败")
+                    return
             else:
                 # 使用离线模型
                 logger.info(f"计算表 {table.table_name} 的 embedding（离线模型）...")
@@ -355,9 +358,9 @@ class DatasourceService:
                     logger.warning(f"离线模型生成表 {table.table_name} 的 embedding 失败")
                     return
             
-            # 将 embedding 转换为 JSON 字符串并保存
-            embedding_json = json.dumps(embedding_vec)
-            table.embedding = embedding_json
+            # 将 embedding 编码为 float32 二进制并保存，同时清理旧版 JSON 字段
+            table.embedding_vector = encode_vector(embedding_vec)
+            table.embedding = None
             
             logger.info(f"✅ 表 {table.table_name} 的 embedding 计算并保存成功（维度: {len(embedding_vec)}）")
             
@@ -385,7 +388,7 @@ class DatasourceService:
             table: DatasourceTable = item.get("table")
             fields: List[Dict[str, Any]] = item.get("fields") or []
 
-            if not table or not hasattr(table, "embedding"):
+            if not table or not hasattr(table, "embedding_vector"):
                 continue
 
             doc = DatasourceService._build_table_document(table, fields)
@@ -399,47 +402,40 @@ class DatasourceService:
             return
 
         # 获取 embedding 客户端（支持在线/离线模型切换）
-        embedding_client, model_name = DatasourceService._get_embedding_client()
+        embedding_client = DatasourceService._get_embedding_client()
 
         try:
-            if embedding_client and model_name:
-                # 使用在线模型批量计算
-                logger.info(f"批量计算 {len(docs)} 个表的 embedding（在线模型: {model_name}）...")
-                response = embedding_client.embeddings.create(model=model_name, input=docs)
-                data = response.data or []
-
-                if len(data) != len(tables_for_embedding):
-                    logger.warning(
-                        f"批量 embedding 返回数量与请求数量不一致: 请求 {len(tables_for_embedding)}, 返回 {len(data)}"
-                    )
-
-                for idx, table in enumerate(tables_for_embedding):
-                    if idx >= len(data):
-                        break
-                    embedding_vec = data[idx].embedding
-                    embedding_json = json.dumps(embedding_vec)
-                    table.embedding = embedding_json
-
-                logger.info(f"✅ 批量表 embedding 计算并保存成功（维度: {len(data[0].embedding) if data else 'unknown'}）")
+            if embedding_client:
+                # 使用在线模型批量计算（按批次大小分批请求）
+                logger.info(f"批量计算 {len(docs)} 个表的 embedding（在线模型: {embedding_client.model_name}）...")
+                data = embedding_client.embed_documents(docs)
+
+                missing = sum(1 for vec in data if not vec)
+                if missing:
+                    logger.warning(f"批量 embedding 有 {missing} 个表未返回结果（请求 {len(tables_for_embedding)}）")
+
+                for table, embedding_vec in zip(tables_for_embedding, data):
+                    if embedding_vec:
+                        table.embedding_vector = encode_vector(embedding_vec)
+                        table.embedding = None
+
+                dimension = next((len(vec) for vec in data if vec), "unknown")
+                logger.info(f"✅ 批量表 embedding 计算并保存成功（维度: {dimension}）")
             else:
-                # 使用离线模型逐个计算
+                # 使用离线模型按微批次计算
                 logger.info(f"批量计算 {len(docs)} 个表的 embedding（离线模型）...")
-                from common.local_embedding import generate_embedding_local_sync
-                
+                from common.local_embedding import generate_embeddings_local_batch
+
                 success_count = 0
-                for idx, table in enumerate(tables_for_embedding):
-                    try:
-                        embedding_vec = generate_embedding_local_sync(docs[idx])
-                        if embedding_vec:
-                            embedding_json = json.dumps(embedding_vec)
-                            table.embedding = embedding_json
-                            success_count += 1
-                        else:
-                            logger.warning(f"离线模型生成表 {table.table_name} 的 embedding 失败")
-                    except Exception as e:
-                        logger.error(f"生成表 {table.table_name} 的 embedding 失败: {e}")
-                
-                logger.info(f"✅ 批量表 embedding 计算并保存成功（成功: {success_count}/{len(tables_for_embedding)}，维度: 768）")
+                for table, embedding_vec in zip(tables_for_embedding, generate_embeddings_local_batch(docs)):
+                    if embedding_vec:
+                        table.embedding_vector = encode_vector(embedding_vec)
+                        table.embedding = None
+                        success_count += 1
+                    else:
+                        logger.warning(f"离线模型生成表 {table.table_name} 的 embedding 失败")
+
+                logger.info(f"✅ 批量表 embedding 计算并保存成功（成功: {success_count}/{len(tables_for_embedding)}）")
         except Exception as e:
             logger.error(f"批量计算表 embedding 失败: {e}", exc_info=True)
 
@@ -478,6 +474,9 @@ class DatasourceService:
 
         session.commit()
         session.refresh(datasource)
+        if tables is not None:
+            DatasourceService._refresh_retrieval_index(ds_id)
+        DatasourceService._invalidate_runtime_caches(ds_id)
         return datasource
 
     @staticmethod
@@ -488,6 +487,8 @@ class DatasourceService:
             return False
         DatasourceService._save_tables_and_fields(session, datasource, tables)
         session.commit()
+        DatasourceService._refresh_retrieval_index(ds_id)
+        DatasourceService._invalidate_runtime_caches(ds_id)
         return True
 
     @staticmethod
@@ -510,6 +511,13 @@ class DatasourceService:
         session.query(DatasourceTable).filter(DatasourceTable.ds_id == ds_id).delete()
         session.delete(datasource)
         session.commit()
+        try:
+            from agent.text2sql.database.retrieval_index import remove_retrieval_index
+
+            remove_retrieval_index(ds_id)
+        except Exception as e:
+            logger.warning(f"删除数据源 {ds_id} 的检索索引失败: {e}")
+        DatasourceService._invalidate_runtime_caches(ds_id, deleted=True)
         return True
 
     @staticmethod
@@ -596,6 +604,8 @@ class DatasourceService:
             logger.warning(f"更新表 {table.table_name} 的 embedding 失败: {e}", exc_info=True)
 
         session.commit()
+        DatasourceService._refresh_retrieval_index(table.ds_id, [table.id])
+        DatasourceService._invalidate_runtime_caches(table.ds_id)
         return True
 
     @staticmethod
@@ -634,6 +644,8 @@ class DatasourceService:
                 logger.warning(f"更新表 {table.table_name} 的 embedding 失败: {e}", exc_info=True)
 
         session.commit()
+        DatasourceService._refresh_retrieval_index(field.ds_id, [field.table_id])
+        DatasourceService._invalidate_runtime_caches(field.ds_id)
         return True
 
     @staticmethod
@@ -691,7 +703,7 @@ class DatasourceService:
 
         try:
             # 执行查询
-            result = DatasourceConnectionUtil.execute_query(datasource.type, config, sql)
+            result = DatasourceConnectionUtil.execute_query(datasource.type, config, sql, datasource.id)
 
             if not result:
                 return {"data": [], "fields": []}
@@ -1,5 +1,6 @@
 import json
 import logging
+import math
 from decimal import Decimal, ROUND_HALF_UP
 from datetime import datetime
 from enum import Enum
@@ -7,6 +8,7 @@ import re
 import traceback
 from typing import Dict, Any, List
 
+import numpy as np
 from sqlalchemy import text
 from model.db_connection_pool import get_db_pool
 
@@ -112,6 +114,87 @@ def format_value(type_enum, llm_info, key, value_str):
     return value_str or "0"
 
 
+# 比例类字段的关键词
+ratio_keywords = ["比例", "占比", "比率", "百分比", "概率"]
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+def _format_floats(type_enum, llm_info, key, values: List[Any], missing: str) -> List[Any]:
+    """
+        浮点列向量化格式化：按 ROUND_HALF_UP（远离零方向）舍入，
+        接近 .5 的取值和超出双精度整数范围的取值逐值调用 format_value，保证与 Decimal 计算结果一致
+    """
+    raw = np.array([np.nan if v is None else v for v in values], dtype=float)
+    if any(kw in key for kw in ratio_keywords):
+        # 以 0.01 为单位舍入
+        units = raw * 100 if re.search(count_pattern, llm_info.get("sql", "")) else raw * 10000
+        text_values = np.char.mod("%.2f", np.sign(units) * np.floor(np.abs(units) + 0.5) / 100)
+        if type_enum in [ChartTypeEnum.TABLE_CHART, ChartTypeEnum.PIE_CHART]:
+            text_values = np.char.add(text_values, "%")
+    else:
+        units = raw
+        text_values = np.char.mod("%.0f", np.sign(units) * np.floor(np.abs(units) + 0.5))
+
+    result = text_values.astype(object)
+    magnitude = np.abs(units)
+    with np.errstate(invalid="ignore"):
+        inexact = (np.abs(magnitude - np.floor(magnitude) - 0.5) <= 1e-9 + magnitude * 1e-12) | (magnitude >= 2**52)
+    for i in np.flatnonzero(inexact & np.isfinite(raw)):
+        result[i] = format_value(type_enum, llm_info, key, values[i])
+    # format_value 对 0 不做格式化
+    result[raw == 0] = "0"
+    result[~np.isfinite(raw)] = missing
+    return result.tolist()
+
+
+def format_column(type_enum, llm_info, key, values: List[Any], missing: str = "0") -> List[Any]:
+    """
+        按列格式化样式，结果与逐值调用 format_value 一致
+        整数列直接按整数拼接（不经过浮点数，保留超过 2^53 的精度），浮点列使用向量化运算，
+        其它列（字符串、布尔、Decimal、混合类型）逐值调用 format_value，重复的字符串只格式化一次
+    :param type_enum:
+    :param llm_info:
+    :param key: 列名
+    :param values: 列取值
+    :param missing: 空值的显示值
+    :return: 格式化后的列
+    """
+    types = set(map(type, values))
+    types.discard(type(None))
+
+    if types <= {int}:
+        if not any(kw in key for kw in ratio_keywords):
+            return [missing if v is None else str(v) for v in values]
+        scale = 1 if re.search(count_pattern, llm_info.get("sql", "")) else 100
+        suffix = "%" if type_enum in [ChartTypeEnum.TABLE_CHART, ChartTypeEnum.PIE_CHART] else ""
+        return [missing if v is None else "0" if v == 0 else f"{v * scale}.00{suffix}" for v in values]
+
+    if types == {float}:
+        return _format_floats(type_enum, llm_info, key, values, missing)
+
+    formatted_str: Dict[str, Any] = {}
+    result = []
+    for v in values:
+        if _is_missing(v) or v == "":
+            result.append(missing)
+        elif type(v) is str:
+            text_value = formatted_str.get(v)
+            if text_value is None:
+                text_value = formatted_str[v] = format_value(type_enum, llm_info, key, v)
+            result.append(text_value)
+        else:
+            result.append(format_value(type_enum, llm_info, key, v))
+    return result
+
+
+def _column_values(chart_data: list, key: str) -> list:
+    """按列取出结果行的取值，行中缺少的列为 None"""
+    return [row.get(key) for row in chart_data]
+
+
 # 定义正则表达式模式，用于匹配包含中文字符的字符串
 patternStr = ".*[\u4e00-\u9fa5]+.*"
 pattern = re.compile(patternStr)
@@ -125,17 +208,34 @@ def process(data):
     """
 
     try:
-        default_result = {
-            "chart_type": ChartTypeEnum.TABLE_CHART,
-            "template_code": ChartTypeEnum.TABLE_CHART.value[2],
-            "data": [],
-            "note": "数据来源: xxx数据库，以上数据仅供参考，具体情况可能会根据xx进一步调查和统计而有所变化",
-        }
-
         if not data.strip():
-            return default_result
+            return _default_result()
+
+        return process_chart_data(json.loads(data))
+    except Exception as e:
+        logging.error(f"Error processing data: {e}")
+        traceback.print_exception(e)
+
+
+def _default_result():
+    return {
+        "chart_type": ChartTypeEnum.TABLE_CHART,
+        "template_code": ChartTypeEnum.TABLE_CHART.value[2],
+        "data": [],
+        "note": "数据来源: xxx数据库，以上数据仅供参考，具体情况可能会根据xx进一步调查和统计而有所变化",
+    }
+
+
+def process_chart_data(json_data: dict):
+    """
+        数据处理（已解析的数据，避免调用方序列化后再解析）
+    :param json_data: {"llm": {"type": ...}, "data": {"column": [...], "result": [...]}}
+    :return:
+    """
+
+    try:
+        default_result = _default_result()
 
-        json_data = json.loads(data)
         llm_info = json_data.get("llm")
         chart_type = llm_info.get("type")
         type_enum = ChartTypeEnum.get_enum_by_code(chart_type)
@@ -196,8 +296,14 @@ def process_table_chart(llm_info, column_data, chart_data):
     :param chart_data:
     :return:
     """
-    # 简化处理，实际可能需要根据具体需求调整
-    return [dict((col, format_value(ChartTypeEnum.TABLE_CHART, llm_info, col, data.get(col, ""))) for col in column_data) for data in chart_data]
+    columns = list(dict.fromkeys(column_data))
+    if not chart_data or not columns:
+        return [{} for _ in chart_data]
+
+    formatted = [
+        format_column(ChartTypeEnum.TABLE_CHART, llm_info, col, _column_values(chart_data, col)) for col in columns
+    ]
+    return [dict(zip(columns, values)) for values in zip(*formatted)]
 
 
 def process_pie_chart(llm_info: dict, column_data: list, chart_data: list) -> List[dict]:
@@ -208,23 +314,26 @@ def process_pie_chart(llm_info: dict, column_data: list, chart_data: list) -> Li
     :param chart_data:
     :return:
     """
-    pie_data_list = []
-    for data_map in chart_data:
-        pie_data = {}
-        for key, value in data_map.items():
-            if key == column_data[0]:
-                pie_data["name"] = "" if value is None else value
-            else:
-                pie_value = format_value(ChartTypeEnum.PIE_CHART, llm_info, key, value)
-                if pie_value and "%" in pie_value:
-                    pie_data["value"] = pie_value.split("%")[0]
-                    pie_data["percent"] = True
-                else:
-                    pie_data["value"] = pie_value
-                    pie_data["percent"] = False
-        pie_data_list.append(pie_data)
+    if not chart_data:
+        return []
 
-    return pie_data_list
+    name_key = column_data[0]
+    # 除名称列外的列作为取值（多列时与逐行处理一致，取最后一列）
+    value_keys = [key for key in chart_data[0].keys() if key != name_key]
+
+    pie_columns = {}
+    if name_key in chart_data[0]:
+        pie_columns["name"] = ["" if value is None else value for value in _column_values(chart_data, name_key)]
+    if value_keys:
+        key = value_keys[-1]
+        pie_values = format_column(ChartTypeEnum.PIE_CHART, llm_info, key, _column_values(chart_data, key))
+        percent = [isinstance(value, str) and "%" in value for value in pie_values]
+        pie_columns["value"] = [value.split("%")[0] if p else value for value, p in zip(pie_values, percent)]
+        pie_columns["percent"] = percent
+
+    if not pie_columns:
+        return [{} for _ in chart_data]
+    return [dict(zip(pie_columns, values)) for values in zip(*pie_columns.values())]
 
 
 def is_numeric(value: str) -> bool:
@@ -279,15 +388,13 @@ def process_bar_chart(llm_info: Dict[str, Any], column_data: List[str], chart_da
 
         data_list.append(column_array)
 
-        for item in chart_data:
-            item_data = []
-            for column_key in column_data:
-                value = item.get(column_key, "")
-                if not is_numeric(value):
-                    item_data.append("未知" if not value else value)
-                else:
-                    item_data.append(format_value(ChartTypeEnum.BAR_CHART, llm_info, column_key, value))
-            data_list.append(item_data)
+        # 数值按列格式化，空值显示为"未知"，非数值保持原值
+        columns = list(dict.fromkeys(column_data))
+        formatted = {
+            col: format_column(ChartTypeEnum.BAR_CHART, llm_info, col, _column_values(chart_data, col), missing="未知")
+            for col in columns
+        }
+        data_list.extend(list(item_data) for item_data in zip(*(formatted[col] for col in column_data)))
 
     return data_list
 
@@ -303,15 +410,18 @@ def process_line_chart(llm_info: dict, column_data: list, chart_data: list) -> L
     data_list = []
 
     if chart_data:
-        item_date = []
-        item_value = []
-        for result in chart_data:
-            for key, value in result.items():
-                # 查询列第一个则是折线的x轴
-                if key == column_data[0]:
-                    item_date.append(value)
-                else:
-                    item_value.append(format_value(ChartTypeEnum.LINE_CHART, llm_info, key, value))
+        # 查询列第一个则是折线的x轴，其余列为取值（按行展开）
+        date_key = column_data[0]
+        value_keys = [key for key in chart_data[0].keys() if key != date_key]
+
+        item_date = _column_values(chart_data, date_key) if date_key in chart_data[0] else []
+        value_columns = [
+            format_column(ChartTypeEnum.LINE_CHART, llm_info, key, _column_values(chart_data, key)) for key in value_keys
+        ]
+        if len(value_columns) == 1:
+            item_value = value_columns[0]
+        else:
+            item_value = [value for values in zip(*value_columns) for value in values]
         data_list.append(item_date)
         data_list.append(item_value)
 
@@ -4,20 +4,26 @@ Embedding 数据迁移服务
 """
 import logging
 import asyncio
+import os
 from typing import Dict, List, Optional, Any, Callable
-from sqlalchemy import select, update
+from sqlalchemy import inspect, select, update
 from sqlalchemy.orm import Session
+from sqlalchemy.sql.expression import text
 
 from model.db_connection_pool import get_db_pool
 from model.db_models import TTerminology, TDataTraining
 from model.datasource_models import DatasourceTable, DatasourceField
-from services.embedding_service import get_default_embedding_model, generate_embedding
+from services.embedding_service import get_default_embedding_model, generate_embedding, generate_embeddings
 from services.datasource_service import DatasourceService
 from common.local_embedding import generate_embedding_local_sync, _get_local_embedding_model
+from common.vector_util import json_to_vector_bytes
 
 logger = logging.getLogger(__name__)
 pool = get_db_pool()
 
+# 术语 / 训练数据重新计算时每批向量化的条目数
+RECALCULATE_BATCH_SIZE = int(os.getenv("EMBEDDING_RECALCULATE_BATCH_SIZE", 64))
+
 
 async def get_current_embedding_model_info() -> Dict[str, Any]:
     """
@@ -99,64 +105,48 @@ async def recalculate_terminology_embeddings(progress_callback: Optional[Callabl
             if progress_callback:
                 await progress_callback(0, total, f"开始重新计算 {total} 个术语的 embedding...")
             
-            # 收集所有术语ID
-            terminology_ids = [term.id for term in terminology_list]
-            
-            # 使用现有的批量计算函数
             success_count = 0
             failed_count = 0
             
             try:
-                # 重新计算每个术语的 embedding
-                from sqlalchemy import update
-                
-                for idx, term in enumerate(terminology_list):
+                # 按批次重新计算术语及其同义词（子节点）的 embedding，每批只调用一次批量向量化
+                for batch_start in range(0, total, RECALCULATE_BATCH_SIZE):
+                    batch = terminology_list[batch_start:batch_start + RECALCULATE_BATCH_SIZE]
                     try:
-                        if not term.word:
-                            failed_count += 1
-                            continue
-                        
-                        # 生成新的 embedding
-                        embedding = await generate_embedding(term.word)
+                        children = session.query(TTerminology).filter(
+                            TTerminology.pid.in_([term.id for term in batch])
+                        ).all()
+                        targets = [term for term in batch + children if term.word]
+                        embeddings = await generate_embeddings([term.word for term in targets])
+                        embedding_by_id = {
+                            term.id: embedding for term, embedding in zip(targets, embeddings) if embedding
+                        }
                         
-                        if embedding:
-                            # 更新 embedding
-                            stmt = update(TTerminology).where(
-                                TTerminology.id == term.id
-                            ).values(embedding=embedding)
-                            session.execute(stmt)
-                            session.commit()
-                            success_count += 1
-                            
-                            # 更新子节点（同义词）的 embedding
-                            children = session.query(TTerminology).filter(
-                                TTerminology.pid == term.id
-                            ).all()
-                            
-                            for child in children:
-                                if child.word:
-                                    child_embedding = await generate_embedding(child.word)
-                                    if child_embedding:
-                                        child_stmt = update(TTerminology).where(
-                                            TTerminology.id == child.id
-                                        ).values(embedding=child_embedding)
-                                        session.execute(child_stmt)
-                                        session.commit()
-                            
-                            if progress_callback and (idx + 1) % 10 == 0:
-                                await progress_callback(
-                                    idx + 1,
-                                    total,
-                                    f"术语 embedding 重新计算中: {idx + 1}/{total}"
+                        for term in targets:
+                            if term.id in embedding_by_id:
+                                # 使用显式 UPDATE 更新 embedding
+                                session.execute(
+                                    update(TTerminology)
+                                    .where(TTerminology.id == term.id)
+                                    .values(embedding=embedding_by_id[term.id])
                                 )
-                        else:
-                            failed_count += 1
-                            logger.warning(f"术语 {term.id} 的 embedding 生成失败")
-                            
+                        session.commit()
+                        
+                        for term in batch:
+                            if term.id in embedding_by_id:
+                                success_count += 1
+                            else:
+                                failed_count += 1
+                                logger.warning(f"术语 {term.id} 的 embedding 生成失败")
+                        
                     except Exception as e:
-                        failed_count += 1
-                        logger.error(f"重新计算术语 {term.id} 的 embedding 失败: {e}")
+                        failed_count += len(batch)
+                        logger.error(f"重新计算术语 embedding 失败（批次起始 {batch_start}）: {e}")
                         session.rollback()
+                    
+                    if progress_callback:
+                        current = min(batch_start + len(batch), total)
+                        await progress_callback(current, total, f"术语 embedding 重新计算中: {current}/{total}")
                 
                 if progress_callback:
                     await progress_callback(total, total, f"术语 embedding 重新计算完成：成功 {success_count}，失败 {failed_count}")
@@ -223,43 +213,43 @@ async def recalculate_training_embeddings(progress_callback: Optional[Callable[[
             success_count = 0
             failed_count = 0
             
-            for idx, training in enumerate(training_list):
-                # 提前缓存 id，避免回滚后访问属性触发加载异常
-                training_id = getattr(training, "id", None)
+            # 提前缓存 id 和问题，避免回滚后访问属性触发加载异常
+            items = [(training.id, training.question) for training in training_list]
+            
+            for batch_start in range(0, total, RECALCULATE_BATCH_SIZE):
+                batch = items[batch_start:batch_start + RECALCULATE_BATCH_SIZE]
+                targets = [(training_id, question) for training_id, question in batch if question]
+                failed_count += len(batch) - len(targets)
                 try:
-                    if not training.question:
-                        failed_count += 1
-                        continue
+                    # 每批只调用一次批量向量化
+                    embeddings = await generate_embeddings([question for _, question in targets])
+                    batch_success = 0
                     
-                    # 生成新的 embedding
-                    embedding = await generate_embedding(training.question)
-                    
-                    if embedding:
-                        # 使用显式 UPDATE，避免 SQLAlchemy 在比较旧值/新值时触发
-                        # numpy 向量维度不一致导致的广播错误
-                        stmt = (
-                            update(TDataTraining)
-                            .where(TDataTraining.id == training_id)
-                            .values(embedding=embedding)
-                        )
-                        session.execute(stmt)
-                        session.commit()
-                        success_count += 1
-                        
-                        if progress_callback and (idx + 1) % 10 == 0:
-                            await progress_callback(
-                                idx + 1,
-                                total,
-                                f"训练数据 embedding 重新计算中: {idx + 1}/{total}"
+                    for (training_id, _), embedding in zip(targets, embeddings):
+                        if embedding:
+                            # 使用显式 UPDATE，避免 SQLAlchemy 在比较旧值/新值时触发
+                            # numpy 向量维度不一致导致的广播错误
+                            stmt = (
+                                update(TDataTraining)
+                                .where(TDataTraining.id == training_id)
+                                .values(embedding=embedding)
                             )
-                    else:
-                        failed_count += 1
-                        logger.warning(f"训练数据 {training_id} 的 embedding 生成失败")
-                        
+                            session.execute(stmt)
+                            batch_success += 1
+                        else:
+                            logger.warning(f"训练数据 {training_id} 的 embedding 生成失败")
+                    session.commit()
+                    success_count += batch_success
+                    failed_count += len(targets) - batch_success
+                    
                 except Exception as e:
-                    failed_count += 1
-                    logger.error(f"重新计算训练数据 {training_id} 的 embedding 失败: {e}")
+                    failed_count += len(targets)
+                    logger.error(f"重新计算训练数据 embedding 失败（批次起始 {batch_start}）: {e}")
                     session.rollback()
+                
+                if progress_callback:
+                    current = min(batch_start + len(batch), total)
+                    await progress_callback(current, total, f"训练数据 embedding 重新计算中: {current}/{total}")
             
             if progress_callback:
                 await progress_callback(
@@ -363,7 +353,7 @@ async def recalculate_table_embeddings(progress_callback: Optional[Callable[[int
                         # 检查成功数量
                         updated_tables = session.query(DatasourceTable).filter(
                             DatasourceTable.ds_id == ds.id,
-                            DatasourceTable.embedding.isnot(None)
+                            DatasourceTable.embedding_vector.isnot(None)
                         ).count()
                         
                         success_count += updated_tables
@@ -410,6 +400,118 @@ async def recalculate_table_embeddings(progress_callback: Optional[Callable[[int
         }
 
 
+def ensure_table_embedding_vector_column() -> bool:
+    """
+    确保 t_datasource_table 存在 embedding_vector 列（旧库升级时自动补齐）
+    create_all 不会为已存在的表新增列，因此需要显式执行 ALTER TABLE
+
+    Returns:
+        是否存在（或已成功创建）该列
+    """
+    engine = pool.get_engine()
+    try:
+        with engine.begin() as conn:
+            if engine.dialect.name == "postgresql":
+                conn.execute(text("ALTER TABLE t_datasource_table ADD COLUMN IF NOT EXISTS embedding_vector BYTEA"))
+                conn.execute(
+                    text("COMMENT ON COLUMN t_datasource_table.embedding_vector IS '表结构 embedding (float32 二进制)'")
+                )
+            else:
+                columns = {col["name"] for col in inspect(conn).get_columns("t_datasource_table")}
+                if "embedding_vector" not in columns:
+                    conn.execute(text("ALTER TABLE t_datasource_table ADD COLUMN embedding_vector BLOB"))
+        return True
+    except Exception as e:
+        logger.error(f"补齐 t_datasource_table.embedding_vector 列失败: {e}", exc_info=True)
+        return False
+
+
+def migrate_table_embeddings_to_binary(batch_size: int = 500) -> Dict[str, Any]:
+    """
+    将旧版 JSON 字符串格式的表结构 embedding 转换为 float32 二进制存储
+    转换成功后清空旧的 JSON 列；无法解析的数据保留原样，可通过重新计算表 embedding 修复
+
+    Args:
+        batch_size: 每批处理的表数量
+
+    Returns:
+        {
+            "success": bool,
+            "total": int,
+            "success_count": int,
+            "failed_count": int,
+            "message": str
+        }
+    """
+    if not ensure_table_embedding_vector_column():
+        return {
+            "success": False,
+            "total": 0,
+            "success_count": 0,
+            "failed_count": 0,
+            "message": "t_datasource_table.embedding_vector 列不存在且创建失败",
+        }
+
+    total = 0
+    success_count = 0
+    failed_ids: List[int] = []
+    last_id = 0
+    try:
+        with pool.get_session() as session:
+            while True:
+                # 按主键分批读取，避免一次性加载全部 JSON 文本
+                rows = (
+                    session.query(DatasourceTable.id, DatasourceTable.embedding)
+                    .filter(
+                        DatasourceTable.id > last_id,
+                        DatasourceTable.embedding.isnot(None),
+                        DatasourceTable.embedding_vector.is_(None),
+                    )
+                    .order_by(DatasourceTable.id)
+                    .limit(batch_size)
+                    .all()
+                )
+                if not rows:
+                    break
+
+                last_id = rows[-1][0]
+                total += len(rows)
+                updates = []
+                for table_id, raw in rows:
+                    blob = json_to_vector_bytes(raw)
+                    if blob is None:
+                        failed_ids.append(table_id)
+                        continue
+                    updates.append({"id": table_id, "embedding_vector": blob, "embedding": None})
+
+                if updates:
+                    session.execute(update(DatasourceTable), updates)
+                    session.commit()
+                    success_count += len(updates)
+
+        if total:
+            logger.info(f"✅ 表结构 embedding 已迁移为二进制存储：成功 {success_count}，失败 {len(failed_ids)}")
+        if failed_ids:
+            logger.warning(f"以下表的 embedding 无法解析，请重新计算表结构 embedding: {failed_ids[:50]}")
+
+        return {
+            "success": not failed_ids,
+            "total": total,
+            "success_count": success_count,
+            "failed_count": len(failed_ids),
+            "message": f"表结构 embedding 存储迁移完成：成功 {success_count}，失败 {len(failed_ids)}",
+        }
+    except Exception as e:
+        logger.error(f"迁移表结构 embedding 存储格式异常: {e}", exc_info=True)
+        return {
+            "success": False,
+            "total": total,
+            "success_count": success_count,
+            "failed_count": total - success_count,
+            "message": f"迁移失败: {str(e)}",
+        }
+
+
 async def recalculate_all_embeddings(
     modules: List[str] = None,
     progress_callback: Optional[Callable[[str, int, int, str], Any]] = None
@@ -2,42 +2,18 @@ import logging
 import traceback
 from typing import List, Optional
 
-from openai import AsyncOpenAI
-
-from model.db_connection_pool import get_db_pool
-from model.db_models import TAiModel
+from common.embedding_cache import aget_or_compute_embedding
+from services.model_client_registry import MODEL_TYPE_EMBEDDING, ModelClientRegistry, load_model_config
 
 logger = logging.getLogger(__name__)
-pool = get_db_pool()
 
 
 async def get_default_embedding_model():
     """
     获取默认的 embedding 模型配置
-    只查找 Embedding 类型的模型（model_type=2），不回退到 LLM
+    只查找 Embedding 类型的模型（model_type=2），不回退到 LLM；没有配置时返回 None（将使用离线模型）
     """
-    with pool.get_session() as session:
-        # 优先查找默认的 embedding 模型 (model_type=2)
-        model = session.query(TAiModel).filter(
-            TAiModel.model_type == 2,
-            TAiModel.default_model == True
-        ).first()
-
-        # 如果没有默认的，查找任何可用的 embedding 模型
-        if not model:
-            model = session.query(TAiModel).filter(TAiModel.model_type == 2).first()
-
-        # 如果找到了 embedding 模型，返回配置
-        if model:
-            return {
-                "supplier": model.supplier,
-                "api_key": model.api_key,
-                "api_domain": model.api_domain,
-                "base_model": model.base_model
-            }
-        
-        # 没有配置 embedding 模型，返回 None（将使用离线模型）
-        return None
+    return load_model_config(MODEL_TYPE_EMBEDDING)
 
 
 async def generate_embedding(text: str) -> Optional[List[float]]:
@@ -45,44 +21,20 @@ async def generate_embedding(text: str) -> Optional[List[float]]:
     if not text:
         return None
 
-    model = await get_default_embedding_model()
-    
-    # 如果没有配置 embedding 模型，使用离线本地模型
-    if not model:
+    # 复用注册表中的常驻客户端，不再每次查询模型配置并新建客户端
+    client = ModelClientRegistry.get_embedding_client()
+
+    # 如果没有配置 embedding 模型（或 API Domain 为空），使用离线本地模型
+    if not client:
         logger.info("No embedding model configured, falling back to local CPU model")
         from common.local_embedding import generate_embedding_local
         return await generate_embedding_local(text)
 
     try:
-        api_key = model["api_key"] or "empty"
-        base_url = model.get("api_domain") or ""
-
-        # 验证 base_url 是否有效
-        if not base_url or not base_url.strip():
-            logger.warning("API domain is empty, falling back to local CPU model")
-            from common.local_embedding import generate_embedding_local
-            return await generate_embedding_local(text)
-
-        # 确保 base_url 包含协议前缀
-        base_url = base_url.strip()
-        if not base_url.startswith(("http://", "https://")):
-            # 默认使用 https，如果是本地地址则使用 http
-            if base_url.startswith(("localhost", "127.0.0.1", "0.0.0.0")):
-                base_url = f"http://{base_url}"
-            else:
-                base_url = f"https://{base_url}"
-
-        # Special handling for Ollama to ensure OpenAI compatibility
-        if model["supplier"] == 3:  # Ollama
-            if not base_url.endswith("/v1"):
-                base_url = f"{base_url.rstrip('/')}/v1"
-
-        # 使用 async with 确保客户端被正确关闭
-        async with AsyncOpenAI(api_key=api_key, base_url=base_url) as client:
-            response = await client.embeddings.create(model=model["base_model"], input=text)
-
-            if response.data:
-                return response.data[0].embedding
+        # 命中查询向量缓存时不再请求在线模型
+        embedding = await aget_or_compute_embedding(client.model_key, text, client.aembed_query)
+        if embedding:
+            return embedding
 
     except Exception as e:
         traceback.print_exc()
@@ -92,3 +44,22 @@ async def generate_embedding(text: str) -> Optional[List[float]]:
         return await generate_embedding_local(text)
 
     return None
+
+
+async def generate_embeddings(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    批量生成 embedding（数据迁移等批量场景使用），返回结果与输入顺序一致，失败的位置为 None
+    在线模型按批次请求，未配置或请求失败时回退到本地模型的微批次推理
+    """
+    if not texts:
+        return []
+
+    client = ModelClientRegistry.get_embedding_client()
+    if client:
+        try:
+            return await client.aembed_documents(texts)
+        except Exception as e:
+            logger.warning(f"Failed to generate embeddings with online model: {e}, falling back to local CPU model")
+
+    from common.local_embedding import agenerate_embeddings_local_batch
+    return await agenerate_embeddings_local_batch(texts)
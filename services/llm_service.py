@@ -14,6 +14,7 @@ from agent.deepagent.deep_research_agent import DeepAgent
 from agent.excel.excel_agent import ExcelAgent
 from agent.text2sql.text2_sql_agent import Text2SqlAgent
 from common.exception import MyException
+from common.sse_writer import sse_frame
 from constants.code_enum import DataTypeEnum, DiFyCodeEnum, IntentEnum, SysCodeEnum
 from constants.dify_rest_api import DiFyRestApi
 from services.db_qadata_process import process
@@ -254,8 +255,7 @@ class LLMRequest:
                                         f"Error 调用dify失败错误信息: {data_json}"
                                     )
                                     await res.write(
-                                        "data:"
-                                        + json.dumps(
+                                        sse_frame(
                                             {
                                                 "data": {
                                                     "messageType": "error",
@@ -265,10 +265,8 @@ class LLMRequest:
                                                 "dataType": DataTypeEnum.ANSWER.value[
                                                     0
                                                 ],
-                                            },
-                                            ensure_ascii=False,
+                                            }
                                         )
-                                        + "\n\n"
                                     )
 
                                 elif DiFyCodeEnum.MESSAGE_END.value[0] == event_name:
@@ -399,7 +397,7 @@ class LLMRequest:
         :param message: 要发送的消息数据
         :param answer: 原始回答内容
         """
-        # await response.write("data:" + json.dumps(message, ensure_ascii=False) + "\n\n")
+        # await response.write(sse_frame(message))
 
         # 检查是否需要特殊处理 < think > 标签
         if answer and ("<think>" in answer):
@@ -420,35 +418,32 @@ class LLMRequest:
                     "dataType": "t02",
                 }
                 await response.write(
-                    "data:" + json.dumps(formatted_message, ensure_ascii=False) + "\n\n"
+                    sse_frame(formatted_message)
                 )
             except Exception as e:
                 # 处理异常情况
                 logging.warning(f"处理<think>标签时出错: {e}")
                 await response.write(
-                    "data:" + json.dumps(message, ensure_ascii=False) + "\n\n"
+                    sse_frame(message)
                 )
         else:
             # # 只有在 content 存在时才添加 </details>
             if answer and ("</think>" in answer):
                 think_content = answer.replace("<think>", "").replace("</think>", "")
                 await response.write(
-                    "data:"
-                    + json.dumps(
+                    sse_frame(
                         {
                             "data": {
                                 "messageType": "continue",
                                 "content": "</details>\n" + think_content,
                             },
                             "dataType": "t02",
-                        },
-                        ensure_ascii=False,
+                        }
                     )
-                    + "\n\n"
                 )
             else:
                 await response.write(
-                    "data:" + json.dumps(message, ensure_ascii=False) + "\n\n"
+                    sse_frame(message)
                 )
 
     @staticmethod
@@ -460,14 +455,12 @@ class LLMRequest:
         :return:
         """
         await res.write(
-            "data:"
-            + json.dumps(
+            sse_frame(
                 {
                     "data": {"id": chat_id},
                     "dataType": DataTypeEnum.TASK_ID.value[0],
                 }
             )
-            + "\n\n"
         )
 
     @staticmethod
@@ -477,14 +470,12 @@ class LLMRequest:
         :return:
         """
         await res.write(
-            "data:"
-            + json.dumps(
+            sse_frame(
                 {
                     "data": "DONE",
                     "dataType": DataTypeEnum.STREAM_END.value[0],
                 }
             )
-            + "\n\n"
         )
 
     @staticmethod
@@ -0,0 +1,335 @@
+"""
+Embedding / Rerank 模型客户端注册表
+按已配置的模型维护常驻的 keep-alive HTTP 客户端，避免每次调用都查询模型配置并新建客户端；
+模型配置变更（本进程内的模型管理接口调用，或其他 worker 修改后超过配置 TTL）时自动重建客户端。
+同时提供异步批量接口和重排结果缓存。
+"""
+
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import httpx
+import requests
+from openai import OpenAI
+from requests.adapters import HTTPAdapter
+
+from common.embedding_cache import normalize_text, online_model_key
+from common.invalidation_bus import InvalidationTopic, subscribe
+from model.db_connection_pool import get_db_pool
+from model.db_models import TAiModel
+
+logger = logging.getLogger(__name__)
+pool = get_db_pool()
+
+# 模型配置的本地缓存时间（秒），其他 worker 修改模型配置后最多延迟该时间生效
+MODEL_CONFIG_TTL = int(os.getenv("MODEL_CONFIG_TTL", 60))
+# 每个模型的最大连接数
+MODEL_CLIENT_POOL_SIZE = int(os.getenv("MODEL_CLIENT_POOL_SIZE", 20))
+# 请求超时（秒）
+EMBEDDING_REQUEST_TIMEOUT = float(os.getenv("EMBEDDING_REQUEST_TIMEOUT", 30))
+RERANK_REQUEST_TIMEOUT = float(os.getenv("RERANK_REQUEST_TIMEOUT", 30))
+# 单次 embedding 请求的最大文本数
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", 32))
+# 重排结果缓存条目数（0 表示禁用）
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", 512))
+
+# 模型类型：2 -> Embedding，3 -> Rerank
+MODEL_TYPE_EMBEDDING = 2
+MODEL_TYPE_RERANK = 3
+# 供应商：3 -> Ollama
+SUPPLIER_OLLAMA = 3
+
+
+def normalize_base_url(api_domain: Optional[str], supplier: Optional[int] = None) -> str:
+    """
+    补全模型服务地址：缺少协议时本地地址默认 http，其它默认 https；Ollama 需要 /v1 后缀以兼容 OpenAI 接口
+    """
+    base_url = (api_domain or "").strip()
+    if not base_url:
+        return ""
+    if not base_url.startswith(("http://", "https://")):
+        if base_url.startswith(("localhost", "127.0.0.1", "0.0.0.0")):
+            base_url = f"http://{base_url}"
+        else:
+            base_url = f"https://{base_url}"
+    if supplier == SUPPLIER_OLLAMA and not base_url.endswith("/v1"):
+        base_url = f"{base_url.rstrip('/')}/v1"
+    return base_url
+
+
+def load_model_config(model_type: int) -> Optional[Dict[str, Any]]:
+    """读取指定类型的默认模型配置（没有默认模型时取任意一个），未配置返回 None"""
+    with pool.get_session() as session:
+        model = (
+            session.query(TAiModel)
+            .filter(TAiModel.model_type == model_type, TAiModel.default_model == True)
+            .first()
+        )
+        if not model:
+            model = session.query(TAiModel).filter(TAiModel.model_type == model_type).first()
+        if not model:
+            return None
+        return {
+            "supplier": model.supplier,
+            "api_key": model.api_key,
+            "api_domain": model.api_domain,
+            "base_model": model.base_model,
+        }
+
+
+class EmbeddingClient:
+    """在线 embedding 模型客户端（线程安全，连接复用）"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.model_name: str = config["base_model"]
+        self.base_url: str = normalize_base_url(config.get("api_domain"), config.get("supplier"))
+        # 与查询向量缓存共用的模型标识
+        self.model_key = online_model_key(self.model_name, self.base_url)
+        self._http_client = httpx.Client(
+            timeout=EMBEDDING_REQUEST_TIMEOUT,
+            limits=httpx.Limits(
+                max_connections=MODEL_CLIENT_POOL_SIZE,
+                max_keepalive_connections=MODEL_CLIENT_POOL_SIZE,
+            ),
+        )
+        self._client = OpenAI(
+            api_key=config.get("api_key") or "empty",
+            base_url=self.base_url,
+            http_client=self._http_client,
+        )
+
+    def embed_query(self, text: str) -> Optional[List[float]]:
+        """向量化单条文本"""
+        response = self._client.embeddings.create(model=self.model_name, input=text)
+        return response.data[0].embedding if response.data else None
+
+    def embed_documents(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """批量向量化，按 EMBEDDING_BATCH_SIZE 分批请求，返回结果与输入顺序一致"""
+        results: List[Optional[List[float]]] = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            batch = list(texts[start : start + EMBEDDING_BATCH_SIZE])
+            response = self._client.embeddings.create(model=self.model_name, input=batch)
+            data = sorted(response.data or [], key=lambda item: item.index)
+            batch_results: List[Optional[List[float]]] = [None] * len(batch)
+            for item in data:
+                if 0 <= item.index < len(batch):
+                    batch_results[item.index] = item.embedding
+            results.extend(batch_results)
+        return results
+
+    async def aembed_query(self, text: str) -> Optional[List[float]]:
+        """异步向量化单条文本（在线程池中执行，连接池不绑定事件循环）"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_query, text)
+
+    async def aembed_documents(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """异步批量向量化"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_documents, texts)
+
+
+class RerankClient:
+    """在线重排模型客户端（兼容 DashScope 与通用 rerank 接口，连接复用）"""
+
+    def __init__(self, config: Dict[str, Any]):
+        self.model_name: str = config["base_model"]
+        self.base_url: str = normalize_base_url(config.get("api_domain"))
+        self._is_dashscope = "aliyuncs" in self.base_url or "Qwen" in (self.model_name or "")
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=MODEL_CLIENT_POOL_SIZE)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers.update(
+            {"Authorization": f"Bearer {config.get('api_key')}", "Content-Type": "application/json"}
+        )
+
+    def _build_payload(self, query: str, documents: List[str]) -> Dict[str, Any]:
+        if self._is_dashscope:
+            # 阿里云 DashScope 格式
+            return {
+                "model": self.model_name,
+                "input": {"query": query, "documents": documents},
+                "parameters": {"top_n": len(documents), "return_documents": False},
+            }
+        # 其他格式（如本地模型或通用rerank API）
+        return {"query": query, "documents": documents}
+
+    @staticmethod
+    def _parse_results(result_data: Any, documents: List[str]) -> Optional[List[Tuple[int, float]]]:
+        """解析重排结果为 [(文档下标, 得分)]，格式无法识别时返回 None"""
+        items = None
+        if isinstance(result_data, dict):
+            if isinstance(result_data.get("output"), dict) and "results" in result_data["output"]:
+                # 阿里云格式响应
+                items = result_data["output"]["results"]
+            elif "results" in result_data:
+                items = result_data["results"]
+        elif isinstance(result_data, list):
+            # 直接返回了排序后的列表
+            return [
+                (int(item["index"]), float(item.get("score", 1.0 - i * 0.01)))
+                for i, item in enumerate(result_data)
+                if isinstance(item, dict) and "index" in item
+            ]
+
+        if items is None:
+            return None
+
+        doc_positions = {doc: i for i, doc in enumerate(documents)}
+        results = []
+        for item in items:
+            if "relevance_score" not in item:
+                continue
+            idx = item.get("index")
+            # 返回了文档内容时以内容为准
+            document = item.get("document")
+            if isinstance(document, dict) and document.get("text") in doc_positions:
+                idx = doc_positions[document["text"]]
+            if idx is None:
+                continue
+            results.append((int(idx), float(item["relevance_score"])))
+        results.sort(key=lambda x: x[1], reverse=True)
+        return results
+
+    def rerank(self, query: str, documents: List[str]) -> Optional[List[Tuple[int, float]]]:
+        """
+        对文档重排序
+        :return: 按得分降序排列的 [(文档下标, 得分)]；请求失败或返回格式异常时返回 None
+        """
+        if not documents:
+            return []
+
+        cache_key = self._cache_key(query, documents)
+        cached = _get_cached_rerank(cache_key)
+        if cached is not None:
+            return cached
+
+        response = self._session.post(
+            self.base_url, json=self._build_payload(query, documents), timeout=RERANK_REQUEST_TIMEOUT
+        )
+        if response.status_code != 200:
+            logger.warning(f"⚠️ Rerank API 调用失败: {response.status_code} - {response.text}")
+            return None
+
+        results = self._parse_results(response.json(), documents)
+        if results is None:
+            logger.warning("⚠️ Rerank API 返回格式异常")
+            return None
+        _put_cached_rerank(cache_key, results)
+        return results
+
+    async def arerank(self, query: str, documents: List[str]) -> Optional[List[Tuple[int, float]]]:
+        """异步重排序（在线程池中执行）"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.rerank, query, documents)
+
+    def _cache_key(self, query: str, documents: List[str]) -> Tuple[str, str, str]:
+        """重排缓存键：模型 + 规范化问题 + 候选文档集合（有序）的摘要"""
+        digest = hashlib.sha1("\x1f".join(documents).encode("utf-8")).hexdigest()
+        return f"{self.base_url}/{self.model_name}", normalize_text(query), digest
+
+
+# 重排结果缓存
+_rerank_cache: "OrderedDict[Tuple[str, str, str], List[Tuple[int, float]]]" = OrderedDict()
+_rerank_cache_lock = Lock()
+
+
+def _get_cached_rerank(key: Tuple[str, str, str]) -> Optional[List[Tuple[int, float]]]:
+    with _rerank_cache_lock:
+        results = _rerank_cache.get(key)
+        if results is not None:
+            _rerank_cache.move_to_end(key)
+        return results
+
+
+def _put_cached_rerank(key: Tuple[str, str, str], results: List[Tuple[int, float]]):
+    if RERANK_CACHE_SIZE <= 0:
+        return
+    with _rerank_cache_lock:
+        _rerank_cache[key] = results
+        _rerank_cache.move_to_end(key)
+        while len(_rerank_cache) > RERANK_CACHE_SIZE:
+            _rerank_cache.popitem(last=False)
+
+
+class ModelClientRegistry:
+    """
+    按模型类型缓存客户端：
+    - 配置缓存 MODEL_CONFIG_TTL 秒，过期后重新读取；配置指纹变化时重建客户端
+    - 模型管理接口修改配置后调用 invalidate() 立即生效
+    旧客户端可能仍有请求在执行，替换时不主动关闭，由垃圾回收释放连接
+    """
+
+    # model_type -> (配置指纹, 客户端, 配置读取时间)
+    _clients: Dict[int, Tuple[Optional[str], Any, float]] = {}
+    _lock = Lock()
+
+    @staticmethod
+    def _fingerprint(config: Optional[Dict[str, Any]]) -> Optional[str]:
+        if not config:
+            return None
+        raw = "|".join(str(config.get(k) or "") for k in ("supplier", "api_domain", "api_key", "base_model"))
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    @classmethod
+    def _get_client(cls, model_type: int, factory) -> Any:
+        now = time.time()
+        entry = cls._clients.get(model_type)
+        if entry is not None and now - entry[2] < MODEL_CONFIG_TTL:
+            return entry[1]
+
+        with cls._lock:
+            entry = cls._clients.get(model_type)
+            if entry is not None and now - entry[2] < MODEL_CONFIG_TTL:
+                return entry[1]
+
+            try:
+                config = load_model_config(model_type)
+            except Exception as e:
+                logger.warning(f"读取模型配置失败（model_type={model_type}）: {e}")
+                # 读取失败时沿用已有客户端
+                return entry[1] if entry is not None else None
+
+            if config and not normalize_base_url(config.get("api_domain")):
+                logger.warning(f"模型 {config.get('base_model')} 的 API Domain 为空，视为未配置")
+                config = None
+
+            fingerprint = cls._fingerprint(config)
+            if entry is not None and entry[0] == fingerprint:
+                # 配置未变化，仅刷新读取时间
+                cls._clients[model_type] = (fingerprint, entry[1], now)
+                return entry[1]
+
+            client = None
+            if config:
+                try:
+                    client = factory(config)
+                    logger.info(f"✅ 已创建模型客户端: {config.get('base_model')} (model_type={model_type})")
+                except Exception as e:
+                    logger.error(f"创建模型客户端失败（model_type={model_type}）: {e}")
+            cls._clients[model_type] = (fingerprint, client, now)
+        return client
+
+    @classmethod
+    def get_embedding_client(cls) -> Optional[EmbeddingClient]:
+        """获取在线 embedding 客户端，未配置在线模型时返回 None（调用方使用离线模型）"""
+        return cls._get_client(MODEL_TYPE_EMBEDDING, EmbeddingClient)
+
+    @classmethod
+    def get_rerank_client(cls) -> Optional[RerankClient]:
+        """获取重排客户端，未配置重排模型时返回 None"""
+        return cls._get_client(MODEL_TYPE_RERANK, RerankClient)
+
+    @classmethod
+    def invalidate(cls):
+        """模型配置变更后清理所有客户端和重排缓存"""
+        with cls._lock:
+            cls._clients.clear()
+        with _rerank_cache_lock:
+            _rerank_cache.clear()
+
+
+subscribe(InvalidationTopic.AI_MODEL, lambda event: ModelClientRegistry.invalidate())
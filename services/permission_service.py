@@ -6,6 +6,7 @@ from typing import List, Dict, Any, Optional
 from sqlalchemy import select, update, delete
 from sqlalchemy.orm import Session
 
+from common.invalidation_bus import InvalidationTopic, publish
 from model.db_models import TDsRules, TDsPermission
 from model.schemas import SavePermissionRequest
 
@@ -158,7 +159,10 @@ class PermissionService:
                 return False
         else:
             session.add(rule_obj)
-            
+
+        # 先提交再发布失效事件，避免其它 worker 在提交前重新加载到旧规则
+        session.commit()
+        publish(InvalidationTopic.PERMISSION)
         return True
 
     @staticmethod
@@ -170,5 +174,7 @@ class PermissionService:
             # For simplicity, we just delete the rule now. 
             # In a real system, we might check if permissions are used by other rules.
             session.delete(rule)
+            session.commit()
+            publish(InvalidationTopic.PERMISSION)
             return True
         return False
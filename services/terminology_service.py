@@ -9,6 +9,7 @@ from sqlalchemy.orm import Session
 from langchain_core.messages import HumanMessage
 
 from common.exception import MyException
+from common.invalidation_bus import InvalidationTopic, publish
 from constants.code_enum import SysCodeEnum
 from common.llm_util import get_llm
 from model import Datasource
@@ -155,7 +156,8 @@ async def create_terminology(word: str, description: str, other_words: List[str]
             except Exception as e:
                 logger.warning(f"保存术语 embedding 失败: {e}", exc_info=True)
                 # 不抛出异常，避免影响创建流程
-        
+
+        publish(InvalidationTopic.TERMINOLOGY)
         return True
 
 async def update_terminology(id: int, word: str, description: str, other_words: List[str], specific_ds: bool, datasource_ids: List[int], oid: int = 1):
@@ -208,7 +210,8 @@ async def update_terminology(id: int, word: str, description: str, other_words:
             except Exception as e:
                 logger.warning(f"保存术语 embedding 失败: {e}", exc_info=True)
                 # 不抛出异常，避免影响更新流程
-        
+
+        publish(InvalidationTopic.TERMINOLOGY)
         return True
 
 async def delete_terminology(ids: List[int]):
@@ -216,6 +219,7 @@ async def delete_terminology(ids: List[int]):
         # 删除父节点和子节点
         session.query(TTerminology).filter(or_(TTerminology.id.in_(ids), TTerminology.pid.in_(ids))).delete(synchronize_session=False)
         session.commit()
+        publish(InvalidationTopic.TERMINOLOGY)
         return True
 
 async def enable_terminology(id: int, enabled: bool):
@@ -223,6 +227,7 @@ async def enable_terminology(id: int, enabled: bool):
         # 更新父节点和子节点
         session.query(TTerminology).filter(or_(TTerminology.id == id, TTerminology.pid == id)).update({TTerminology.enabled: enabled}, synchronize_session=False)
         session.commit()
+        publish(InvalidationTopic.TERMINOLOGY)
         return True
 
 async def get_terminology_detail(id: int):
@@ -13,6 +13,7 @@ from sqlalchemy.orm import Session
 
 from common.exception import MyException
 from constants.code_enum import SysCodeEnum, IntentEnum, DataTypeEnum
+from common.invalidation_bus import InvalidationTopic, publish
 from constants.dify_rest_api import DiFyRestApi
 from model.db_connection_pool import get_db_pool
 from model.db_models import TUserQaRecord, TUser
@@ -615,6 +616,8 @@ async def add_user(username, password, mobile, role="user"):
         )
         session.add(new_user)
         session.commit()
+        # 新用户ID可能已被缓存为“不存在”的角色
+        publish(InvalidationTopic.PERMISSION, user_id=new_user.id)
         return True
 
 
@@ -693,6 +696,8 @@ async def delete_user(user_id):
         user = session.query(TUser).filter(TUser.id == user_id).first()
         if not user:
             raise MyException(SysCodeEnum.PARAM_ERROR, "用户不存在")
+        deleted_user_id = user.id
         session.delete(user)
         session.commit()
+        publish(InvalidationTopic.PERMISSION, user_id=deleted_user_id)
         return True